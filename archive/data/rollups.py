@@ -0,0 +1,91 @@
+"""
+Rollups of the finance screen computed in pandas.
+
+Fallback for the get_finance_rollup / get_sales_rollup RPCs (migration 017)
+when they are not deployed: same output shape, same rules. The SQL mirrors
+these functions; tests/test_finance_rollups.py runs both on the same rows.
+"""
+
+import pandas as pd
+
+FINANCE_TOP_N = 10
+LABEL_JUNK = r"[%@_\$]"
+
+
+def normalize_financeiro_df(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return df
+    out = df.copy()
+    for col in ["data_vencimento", "data_pagamento", "data_emissao", "competencia_mes"]:
+        if col in out.columns:
+            out[col] = pd.to_datetime(out[col], errors="coerce", utc=True)
+    if "valor" in out.columns:
+        out["valor"] = pd.to_numeric(out["valor"], errors="coerce").fillna(0.0)
+    for col in ["tipo", "status_texto", "categoria", "descricao"]:
+        if col in out.columns:
+            out[col] = out[col].fillna("-").astype(str)
+    for col in ["is_atrasado", "is_realizado"]:
+        if col in out.columns:
+            out[col] = out[col].fillna(False).astype(bool)
+    return out
+
+
+def finance_rollup_from_df(df_fin: pd.DataFrame) -> dict:
+    """Same shape as get_finance_rollup: totals, expenses by category and the top 5 + OUTROS donut."""
+    rollup = {"entradas": 0.0, "saidas": 0.0, "saldo": 0.0, "count": 0, "categorias": [], "categorias_donut": []}
+    if df_fin.empty:
+        return rollup
+    df_fin = normalize_financeiro_df(df_fin)
+    # Clean category - RELAXED REGEX to allow Accents (only %, @, $, _ removed)
+    df_fin["categoria"] = df_fin["categoria"].astype(str).str.replace(LABEL_JUNK, " ", regex=True).str.strip()
+
+    entradas = df_fin[df_fin["tipo"] == "Entrada"]["valor"].sum()
+    saidas = df_fin[df_fin["tipo"] == "Saída"]["valor"].sum()
+    rollup.update(entradas=entradas, saidas=saidas, saldo=entradas - saidas, count=len(df_fin))
+    if saidas <= 0:
+        return rollup
+
+    df_chart = df_fin[df_fin["tipo"] == "Saída"].groupby("categoria")["valor"].sum().reset_index()
+    df_chart["percent"] = (df_chart["valor"] / saidas) * 100
+    # empate no valor: nome em ordem de code point (COLLATE "C" na RPC)
+    df_chart = df_chart.sort_values(by=["valor", "categoria"], ascending=[False, True])
+    rollup["categorias"] = df_chart.to_dict("records")
+
+    # Top 5 + Outros
+    df_donut = df_chart.head(5)
+    if len(df_chart) > 5:
+        outros_val = df_chart.iloc[5:]["valor"].sum()
+        outros_row = pd.DataFrame([{"categoria": "OUTROS", "valor": outros_val, "percent": (outros_val / saidas) * 100}])
+        df_donut = pd.concat([df_donut, outros_row], ignore_index=True)
+    rollup["categorias_donut"] = df_donut.to_dict("records")
+    return rollup
+
+
+def sales_rollup_from_df(df_pedidos: pd.DataFrame, top_n: int = FINANCE_TOP_N) -> dict:
+    """Same shape as get_sales_rollup: order count and total, top clients and largest orders.
+
+    ``df_pedidos`` comes in fetch_view_data order (data_criacao, pedido_id desc);
+    the sorts are stable, so tied orders keep that order, as in the RPC.
+    """
+    rollup = {"pedidos": 0, "valor_total": 0.0, "top_clientes": [], "top_pedidos": []}
+    if df_pedidos.empty:
+        return rollup
+    df_pedidos = df_pedidos.copy()
+    df_pedidos["cliente_nome"] = (
+        df_pedidos["cliente_nome"].fillna("-").astype(str).str.replace(LABEL_JUNK, " ", regex=True).str.title()
+    )
+
+    top_clientes = df_pedidos.groupby("cliente_nome")["valor_total"].sum().reset_index()
+    top_clientes = top_clientes.sort_values(by=["valor_total", "cliente_nome"], ascending=[False, True]).head(top_n)
+    top_pedidos = (
+        df_pedidos[["cliente_nome", "data_criacao", "valor_total", "qtde_itens", "status_pedido"]]
+        .sort_values(by="valor_total", ascending=False, kind="stable")
+        .head(top_n)
+    )
+    rollup.update(
+        pedidos=len(df_pedidos),
+        valor_total=df_pedidos["valor_total"].sum(),
+        top_clientes=top_clientes.to_dict("records"),
+        top_pedidos=top_pedidos.to_dict("records"),
+    )
+    return rollup
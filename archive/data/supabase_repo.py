@@ -1,6 +1,8 @@
 import os
 import time
-from typing import Any, Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import pandas as pd
 import streamlit as st
@@ -13,6 +15,16 @@ PAGE_SIZE_DEFAULT = int(os.getenv("DASHBOARD_PAGE_SIZE", "500"))
 TTL_DATA = int(os.getenv("DASHBOARD_DATA_TTL_S", str(60 * 5)))  # 5 minutes default
 DATE_MIN = "1900-01-01"
 DATE_MAX = "2100-12-31"
+FETCH_MAX_ROWS = int(os.getenv("DASHBOARD_MAX_ROWS", "10000"))
+FETCH_WORKERS_DEFAULT = int(os.getenv("DASHBOARD_FETCH_WORKERS", "1"))
+
+# Unique key per view for keyset paging; (date column, id) indexes in migration 015
+KEYSET_ID_COLUMNS = {
+    "mv_dashboard_pedidos": "pedido_id",
+    "vw_dashboard_pedidos": "pedido_id",
+    "mv_dashboard_financeiro": "lancamento_id",
+    "vw_dashboard_financeiro": "lancamento_id",
+}
 
 def _read_runtime_secret(name: str) -> Optional[str]:
     try:
@@ -51,6 +63,148 @@ def fetch_snapshot_meta() -> Dict[str, Any]:
     data["is_configured"] = True
     return data
 
+def _apply_filters(query, filters: Optional[Dict[str, Any]]):
+    """Applies {col: val} / {col__op: val} filters to a PostgREST query."""
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+
+        if "__" in key:
+            col, op = key.split("__", 1)
+        else:
+            col, op = key, "eq"
+
+        # Handle specific operators
+        if op == "eq":
+            query = query.eq(col, value)
+        elif op == "ilike":
+            query = query.ilike(col, f"%{value}%")
+        elif op == "neq":
+            query = query.neq(col, value)
+        elif op == "gt":
+            query = query.gt(col, value)
+        elif op == "lt":
+            query = query.lt(col, value)
+        elif op == "is":
+            query = query.is_(col, value)
+    return query
+
+
+def _day_start(day: Any) -> str:
+    return f"{day}T00:00:00"
+
+
+def _next_day_start(day: Any) -> str:
+    return _day_start(date.fromisoformat(str(day)[:10]) + timedelta(days=1))
+
+
+def _date_bounds(start_date: Any, end_date: Any) -> Tuple[str, str]:
+    """Half-open [start_ts, end_ts) for an inclusive day range: gte start, lt the next day's start.
+
+    A "T23:59:59" upper bound dropped rows in the last second of the day
+    (timestamps with fractions). Explicit timestamps are passed through as-is.
+    """
+    s_ts = _day_start(start_date) if "T" not in str(start_date) else str(start_date)
+    e_ts = _next_day_start(end_date) if "T" not in str(end_date) else str(end_date)
+    return s_ts, e_ts
+
+
+def _date_partitions(start_date: Any, end_date: Any, parts: int) -> List[Tuple[str, str]]:
+    """Splits an inclusive day range into up to `parts` contiguous half-open (start_ts, end_ts) windows."""
+    if parts <= 1 or "T" in str(start_date) or "T" in str(end_date):
+        return [_date_bounds(start_date, end_date)]
+    try:
+        first = date.fromisoformat(str(start_date)[:10])
+        last = date.fromisoformat(str(end_date)[:10])
+    except ValueError:
+        return [_date_bounds(start_date, end_date)]
+    days = (last - first).days + 1
+    if days <= 1:
+        return [_date_bounds(start_date, end_date)]
+    step = -(-days // min(parts, days))  # ceil
+    windows = []
+    cursor = first
+    while cursor <= last:
+        window_end = min(cursor + timedelta(days=step - 1), last)
+        windows.append((_day_start(cursor.isoformat()), _next_day_start(window_end.isoformat())))
+        cursor = window_end + timedelta(days=1)
+    return windows
+
+
+def _pgrst_literal(value: Any) -> str:
+    """Quotes a value for use inside a PostgREST or=(...) expression."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _keyset_after(query, sort_col: Optional[str], id_col: str, last_row: Dict[str, Any], ascending: bool):
+    """
+    Restricts the query to rows after `last_row` in (sort_col, id_col) order.
+    NULLs follow the Postgres defaults: last when ascending, first when descending.
+    """
+    op = "gt" if ascending else "lt"
+    last_id = last_row[id_col]
+    if not sort_col:
+        return getattr(query, op)(id_col, last_id)
+
+    value = last_row.get(sort_col)
+    if value is None:
+        if ascending:  # already in the trailing NULL block
+            return getattr(query.is_(sort_col, "null"), op)(id_col, last_id)
+        return query.or_(f"and({sort_col}.is.null,{id_col}.{op}.{_pgrst_literal(last_id)}),{sort_col}.not.is.null")
+
+    literal = _pgrst_literal(value)
+    nulls_tail = f",{sort_col}.is.null" if ascending else ""
+    return query.or_(
+        f"{sort_col}.{op}.{literal},and({sort_col}.eq.{literal},{id_col}.{op}.{_pgrst_literal(last_id)}){nulls_tail}"
+    )
+
+
+def _fetch_pages(
+    build_query: Callable[[], Any],
+    sort_col: Optional[str],
+    id_col: Optional[str],
+    ascending: bool,
+    page_size: int,
+    max_rows: int,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Pages through a query until exhausted or `max_rows` rows; returns (rows, truncated).
+
+    With a unique `id_col` each page continues from the last row seen (keyset), so
+    every request is an index range scan. Without one, falls back to OFFSET paging.
+    One extra row is requested on the last page to tell "exactly max_rows" apart
+    from "more rows available".
+    """
+    results: List[Dict[str, Any]] = []
+    last_row: Optional[Dict[str, Any]] = None
+    while True:
+        remaining = max_rows - len(results)
+        current_limit = min(page_size, remaining + 1)
+
+        query = build_query()  # builders accumulate filters; one fresh query per page
+        if id_col:
+            if last_row is not None:
+                query = _keyset_after(query, sort_col, id_col, last_row, ascending)
+            if sort_col:
+                query = query.order(sort_col, desc=not ascending)
+            query = query.order(id_col, desc=not ascending)
+            response = query.limit(current_limit).execute()
+        else:
+            if sort_col:
+                query = query.order(sort_col, desc=not ascending)
+            response = query.range(len(results), len(results) + current_limit - 1).execute()
+
+        data = response.data or []
+        if len(data) > remaining:
+            results.extend(data[:remaining])
+            return results, True
+        results.extend(data)
+        if len(data) < current_limit or not data:
+            return results, False
+        last_row = data[-1]
+
+
 @st.cache_data(ttl=TTL_DATA)
 def fetch_view_data(
     view_name: str,
@@ -61,95 +215,94 @@ def fetch_view_data(
     order_by: Optional[str] = None,
     ascending: bool = False,
     limit: Optional[int] = None,
-    snapshot_key: Optional[str] = None
+    snapshot_key: Optional[str] = None,
+    page_size: Optional[int] = None,
+    workers: Optional[int] = None,
 ) -> pd.DataFrame:
     """
     Generic function to fetch data from any Supabase view.
-    
+
+    Pages are fetched by keyset on (order_by or date_column, unique id) for the
+    views in KEYSET_ID_COLUMNS, OFFSET paging otherwise. When the result hits
+    DASHBOARD_MAX_ROWS the DataFrame carries ``attrs["truncated"] = True``
+    (see ``warn_if_truncated``) instead of silently dropping the rest.
+
     Args:
         view_name: Database view name (e.g. 'vw_dashboard_pedidos')
         filters: Dict of filters {col: val} for equality, or {col__ilike: val}, etc.
         date_column: Column name to filter by date range
         start_date: ISO start date
         end_date: ISO end date
-        order_by: Column to sort by
+        order_by: Column to sort by (defaults to date_column for keyset paging)
         ascending: Sort direction
-        limit: Max rows to return (None = fetch all pages up to reasonable limit)
+        limit: Max rows to return (None = fetch all pages up to DASHBOARD_MAX_ROWS)
         snapshot_key: Used for cache invalidation
+        page_size: Rows per request (default DASHBOARD_PAGE_SIZE; keep <= PostgREST max-rows)
+        workers: Concurrent date partitions (default DASHBOARD_FETCH_WORKERS); only used
+            for date-range queries sorted by the date column and without `limit`
     """
     _ = snapshot_key # Used only for cache behavior
     client = get_supabase_client()
     if not client:
         return pd.DataFrame()
 
+    page_size = max(1, page_size or PAGE_SIZE_DEFAULT)
+    workers = max(1, workers or FETCH_WORKERS_DEFAULT)
+    max_rows = limit if limit else FETCH_MAX_ROWS
+    id_col = KEYSET_ID_COLUMNS.get(view_name)
+    sort_col = order_by or (date_column if id_col else None)
+    has_range = bool(date_column and start_date and end_date)
+
+    def _builder(window: Optional[Tuple[str, str]]) -> Callable[[], Any]:
+        def build():
+            query = _apply_filters(client.table(view_name).select("*"), filters)
+            # Date range filter
+            if window:
+                query = query.gte(date_column, window[0]).lt(date_column, window[1])
+            return query
+        return build
+
     try:
-        query = client.table(view_name).select("*")
-
-        # scalar filters (eq) and special filters (ilike, neq, etc)
-        if filters:
-            for key, value in filters.items():
-                if value is None:
-                    continue
-                
-                if "__" in key:
-                    col, op = key.split("__", 1)
-                else:
-                    col, op = key, "eq"
-
-                # Handle specific operators
-                if op == "eq":
-                    query = query.eq(col, value)
-                elif op == "ilike":
-                    query = query.ilike(col, f"%{value}%")
-                elif op == "neq":
-                    query = query.neq(col, value)
-                elif op == "gt":
-                    query = query.gt(col, value)
-                elif op == "lt":
-                    query = query.lt(col, value)
-                elif op == "is":
-                    query = query.is_(col, value)
-
-        # Date range filter
-        if date_column and start_date and end_date:
-            # Ensure ISO format timestamps
-            s_ts = f"{start_date}T00:00:00" if "T" not in str(start_date) else start_date
-            e_ts = f"{end_date}T23:59:59" if "T" not in str(end_date) else end_date
-            query = query.gte(date_column, s_ts).lte(date_column, e_ts)
-
-        # Ordering
-        if order_by:
-            query = query.order(order_by, desc=not ascending)
-
-        # Pagination / limit
-        results = []
-        page_size = PAGE_SIZE_DEFAULT
-        offset = 0
-        max_rows = limit if limit else 10000
-
-        while True:
-            current_limit = page_size
-            if limit and (offset + page_size > limit):
-                current_limit = limit - offset
-            
-            if current_limit <= 0:
-                break
-
-            response = query.range(offset, offset + current_limit - 1).execute()
-            data = response.data or []
-            results.extend(data)
-            
-            if len(data) < page_size or (limit and len(results) >= limit):
-                break
-            
-            offset += page_size
-
-        return pd.DataFrame(results)
+        windows: List[Optional[Tuple[str, str]]] = [_date_bounds(start_date, end_date)] if has_range else [None]
+        # Date windows are independent; concatenated in sort order they keep the global order.
+        if has_range and id_col and not limit and workers > 1 and sort_col == date_column:
+            windows = list(_date_partitions(start_date, end_date, workers))
+            if not ascending:
+                windows.reverse()
+
+        if len(windows) == 1:
+            results, truncated = _fetch_pages(_builder(windows[0]), sort_col, id_col, ascending, page_size, max_rows)
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(windows))) as pool:
+                parts = list(pool.map(
+                    lambda w: _fetch_pages(_builder(w), sort_col, id_col, ascending, page_size, max_rows),
+                    windows,
+                ))
+            results = [row for rows, _ in parts for row in rows]
+            truncated = any(t for _, t in parts) or len(results) > max_rows
+            results = results[:max_rows]
+
+        df = pd.DataFrame(results)
+        truncated = truncated and not limit  # an explicit limit is what the caller asked for
+        df.attrs["truncated"] = truncated
+        df.attrs["max_rows"] = max_rows
+        if truncated:
+            print(f"fetch_view_data('{view_name}'): truncated at {max_rows} rows (DASHBOARD_MAX_ROWS)")
+        return df
 
     except Exception as e:
         st.error(f"Erro ao buscar dados de '{view_name}': {e}")
         return pd.DataFrame()
 
+
+def warn_if_truncated(df: pd.DataFrame, label: str) -> None:
+    """Shows a warning when fetch_view_data stopped at DASHBOARD_MAX_ROWS."""
+    if df.attrs.get("truncated"):
+        st.warning(
+            f"{label}: exibindo apenas as primeiras {df.attrs.get('max_rows', len(df)):,} linhas. "
+            "Reduza o período ou aumente DASHBOARD_MAX_ROWS."
+        )
+
 @st.cache_data(ttl=TTL_DATA)
 def fetch_kpis_generic(
     view_name: str,
@@ -158,49 +311,63 @@ def fetch_kpis_generic(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     snapshot_key: Optional[str] = None
-) -> Dict[str, int]:
+) -> Dict[str, Union[int, float]]:
     """
-    Fetches counts for multiple scenarios efficiently.
+    Fetches counts for multiple scenarios in one round-trip (RPC get_dashboard_kpis,
+    migration 016). Falls back to one count request per probe if the RPC is missing.
     Args:
         probes: List of dicts, e.g. [{"label": "total", "filters": {}}, {"label": "delayed", "filters": {"is_atrasado": True}}]
+            An optional "sum": "<column>" also returns "<label>_sum".
     """
     _ = snapshot_key
     client = get_supabase_client()
     if not client:
         return {p["label"]: 0 for p in probes}
-    
+
+    s_ts, e_ts = _date_bounds(start_date, end_date) if (date_column and start_date and end_date) else (None, None)
+    try:
+        res = client.rpc("get_dashboard_kpis", {
+            "p_view": view_name,
+            "p_probes": [
+                {"label": p["label"], "filters": p.get("filters") or {}, **({"sum": p["sum"]} if p.get("sum") else {})}
+                for p in probes
+            ],
+            "p_date_column": date_column if s_ts else None,
+            "p_start": s_ts,
+            "p_end": e_ts,
+        }).execute()
+        data = res.data
+        if isinstance(data, list):
+            data = data[0] if data else {}
+        if isinstance(data, dict):
+            results: Dict[str, Union[int, float]] = {}
+            for probe in probes:
+                results[probe["label"]] = int(data.get(probe["label"]) or 0)
+                if probe.get("sum"):
+                    results[f"{probe['label']}_sum"] = float(data.get(f"{probe['label']}_sum") or 0)
+            return results
+    except Exception as e:
+        print(f"RPC get_dashboard_kpis indisponível, contando por probe: {e}")
+
     results = {}
-    
+
     for probe in probes:
         try:
             query = client.table(view_name).select("*", count="exact", head=True)
-            
+
             # Apply common date filter
-            if date_column and start_date and end_date:
-                s_ts = f"{start_date}T00:00:00" if "T" not in str(start_date) else start_date
-                e_ts = f"{end_date}T23:59:59" if "T" not in str(end_date) else end_date
-                query = query.gte(date_column, s_ts).lte(date_column, e_ts)
+            if s_ts:
+                query = query.gte(date_column, s_ts).lt(date_column, e_ts)
 
             # Apply specific probe filters
-            filters = probe.get("filters", {})
-            for key, value in filters.items():
-                if value is None: continue
-                
-                if "__" in key:
-                    col, op = key.split("__", 1)
-                else:
-                    col, op = key, "eq"
-                    
-                if op == "eq": query = query.eq(col, value)
-                elif op == "ilike": query = query.ilike(col, f"%{value}%")
-                elif op == "is": query = query.is_(col, value)
+            query = _apply_filters(query, probe.get("filters", {}))
 
             res = query.execute()
             results[probe["label"]] = res.count if res.count is not None else 0
-            
+
         except Exception:
             results[probe["label"]] = 0
-            
+
     return results
 
 # Legacy/Helper wrappers for specific complex logic (like RPCs) can stay or receive generic kwargs
@@ -223,3 +390,34 @@ def fetch_finance_kpis_rpc(start_date: str, end_date: str, snapshot_key: Optiona
         print(f"RPC Error: {e}")
     
     return default_kpis
+
+
+def _rpc_object(name: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Calls a jsonb RPC; None when the client/RPC is unavailable (caller falls back)."""
+    client = get_supabase_client()
+    if not client:
+        return None
+    try:
+        data = client.rpc(name, params).execute().data
+        if isinstance(data, list):
+            data = data[0] if data else None
+        return data if isinstance(data, dict) else None
+    except Exception as e:
+        print(f"RPC {name} indisponível: {e}")
+        return None
+
+
+@st.cache_data(ttl=TTL_DATA)
+def fetch_finance_rollup_rpc(start_date: str, end_date: str, snapshot_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Receitas, despesas e despesas por categoria já agregadas (migration 017)."""
+    _ = snapshot_key
+    return _rpc_object("get_finance_rollup", {"start_date": start_date, "end_date": end_date})
+
+
+@st.cache_data(ttl=TTL_DATA)
+def fetch_sales_rollup_rpc(
+    start_date: str, end_date: str, top_n: int = 10, snapshot_key: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Top clientes e maiores pedidos do período já agregados (migration 017)."""
+    _ = snapshot_key
+    return _rpc_object("get_sales_rollup", {"start_date": start_date, "end_date": end_date, "top_n": top_n})
@@ -20,7 +20,7 @@ def smoke_test() -> None:
     print("\n--- Testing Generic View Fetch (Pedidos) ---")
     try:
         df_pedidos = fetch_view_data(
-            view_name="vw_dashboard_pedidos",
+            view_name="mv_dashboard_pedidos",
             limit=5,
             order_by="data_criacao",
             ascending=False
@@ -34,7 +34,7 @@ def smoke_test() -> None:
     print("\n--- Testing Generic View Fetch (Financeiro) ---")
     try:
         df_financeiro = fetch_view_data(
-            view_name="vw_dashboard_financeiro",
+            view_name="mv_dashboard_financeiro",
             limit=5,
             order_by="data_vencimento",
             ascending=False
@@ -12,8 +12,12 @@ from data.supabase_repo import (
     fetch_snapshot_meta,
     fetch_view_data,
     fetch_kpis_generic,
-    fetch_finance_kpis_rpc
+    fetch_finance_kpis_rpc,
+    fetch_finance_rollup_rpc,
+    fetch_sales_rollup_rpc,
+    warn_if_truncated,
 )
+from data.rollups import FINANCE_TOP_N, finance_rollup_from_df, sales_rollup_from_df
 from services.n8n_service import send_message_to_n8n
 
 # --- 1. CONFIGURACAO ---
@@ -203,24 +207,6 @@ def _normalize_pedidos_df(df):
     return out
 
 
-def _normalize_financeiro_df(df):
-    if df.empty:
-        return df
-    out = df.copy()
-    for col in ["data_vencimento", "data_pagamento", "data_emissao", "competencia_mes"]:
-        if col in out.columns:
-            out[col] = pd.to_datetime(out[col], errors="coerce", utc=True)
-    if "valor" in out.columns:
-        out["valor"] = pd.to_numeric(out["valor"], errors="coerce").fillna(0.0)
-    for col in ["tipo", "status_texto", "categoria", "descricao"]:
-        if col in out.columns:
-            out[col] = out[col].fillna("-").astype(str)
-    for col in ["is_atrasado", "is_realizado"]:
-        if col in out.columns:
-            out[col] = out[col].fillna(False).astype(bool)
-    return out
-
-
 # =============================================================================
 # VIEW: INSTRUCOES
 # =============================================================================
@@ -299,6 +285,7 @@ e para evitar telas vazias durante o período de atualização.
                 "2. `etl/migrations/002_dashboard_views_rpc_grants.sql`",
                 "3. `etl/migrations/003_snapshot_meta.sql`",
                 "4. `etl/migrations/004_optimize_vw_dashboard_pedidos.sql` (recomendado - performance do PCP)",
+                "5. `etl/migrations/013_materialize_dashboard_views.sql` (obrigatória - o app lê `mv_dashboard_*`)",
             ]
         )
     )
@@ -376,19 +363,20 @@ def render_status_view():
 
     with st.spinner("Carregando pedidos do snapshot..."):
         base_df = fetch_view_data(
-            view_name="vw_dashboard_pedidos",
+            view_name="mv_dashboard_pedidos",
             start_date=data_inicio,
             end_date=data_fim,
             date_column="data_criacao",
             snapshot_key=snapshot_key,
         )
+    warn_if_truncated(base_df, "Pedidos")
     base_df = _normalize_pedidos_df(base_df)
 
 
     with st.spinner("Carregando KPIs..."):
         # Generic KPI fetching
         kpi_results = fetch_kpis_generic(
-            view_name="vw_dashboard_pedidos",
+            view_name="mv_dashboard_pedidos",
             probes=[
                 {"label": "total", "filters": {}},
                 {"label": "atrasados", "filters": {"is_atrasado": True}},
@@ -555,42 +543,40 @@ def render_finance_view():
     snapshot = fetch_snapshot_meta()
     
     # --- FETCH DATA ---
+    # Séries já agregadas no Postgres (migration 017); sem as RPCs, agrega as linhas em pandas.
+    cache_key = snapshot.get("cache_key")
     with st.spinner("Carregando dados..."):
-        df_fin = fetch_view_data(
-            view_name="vw_dashboard_financeiro",
-            start_date=comp_inicio,
-            end_date=comp_fim,
-            date_column="competencia_mes",
-            snapshot_key=snapshot.get("cache_key"),
-        )
-        
-        df_pedidos = fetch_view_data(
-            view_name="vw_dashboard_pedidos",
-            start_date=comp_inicio,
-            end_date=comp_fim,
-            date_column="data_criacao",
-            snapshot_key=snapshot.get("cache_key"),
-        )
+        fin = fetch_finance_rollup_rpc(comp_inicio, comp_fim, snapshot_key=cache_key)
+        if fin is None:
+            df_fin = fetch_view_data(
+                view_name="mv_dashboard_financeiro",
+                start_date=comp_inicio,
+                end_date=comp_fim,
+                date_column="competencia_mes",
+                snapshot_key=cache_key,
+            )
+            warn_if_truncated(df_fin, "Financeiro")
+            fin = finance_rollup_from_df(df_fin)
+
+        vendas = fetch_sales_rollup_rpc(comp_inicio, comp_fim, top_n=FINANCE_TOP_N, snapshot_key=cache_key)
+        if vendas is None:
+            df_pedidos = fetch_view_data(
+                view_name="mv_dashboard_pedidos",
+                start_date=comp_inicio,
+                end_date=comp_fim,
+                date_column="data_criacao",
+                snapshot_key=cache_key,
+            )
+            warn_if_truncated(df_pedidos, "Pedidos")
+            vendas = sales_rollup_from_df(df_pedidos)
 
     # --- BLOCO 1: FINANCEIRO (KPIs Estáticos) ---
     st.markdown("#### 💵 Resultados Financeiros")
-    
-    val_receitas = 0.0
-    val_despesas = 0.0
-    val_saldo = 0.0
-
-    if not df_fin.empty:
-        df_fin = _normalize_financeiro_df(df_fin)
-        # Clean string/category columns - RELAXED REGEX to allow Accents
-        # Removing only strictly unwanted chars: %, @, $, _
-        for col in ["categoria", "descricao", "fornecedor"]:
-            if col in df_fin.columns:
-                df_fin[col] = df_fin[col].astype(str).str.replace(r'[%@_\$]', ' ', regex=True).str.strip()
-
-        val_receitas = df_fin[df_fin["tipo"] == "Entrada"]["valor"].sum()
-        val_despesas = df_fin[df_fin["tipo"] == "Saída"]["valor"].sum()
-        val_saldo = val_receitas - val_despesas
-    
+
+    val_receitas = float(fin["entradas"] or 0)
+    val_despesas = float(fin["saidas"] or 0)
+    val_saldo = float(fin["saldo"] or 0)
+
     # Cards Estáticos
     c1, c2, c3 = st.columns(3)
     c1.metric("Faturamento Total", format_currency(val_receitas))
@@ -605,15 +591,11 @@ def render_finance_view():
         return "<br>".join(textwrap.wrap(text, width=width))
 
     # --- CHART: DESPESAS POR CATEGORIA (Dual View) ---
-    if val_despesas > 0 and not df_fin.empty:
+    if val_despesas > 0 and fin["categorias"]:
         st.markdown("##### 📉 Composição de Despesas")
-        
-        df_saidas = df_fin[df_fin["tipo"] == "Saída"].copy()
-        
-        # 1. Prepare Data
-        df_chart = df_saidas.groupby("categoria")["valor"].sum().reset_index()
-        df_chart["percent"] = (df_chart["valor"] / val_despesas) * 100
-        df_chart = df_chart.sort_values(by="valor", ascending=False)
+
+        # 1. Prepare Data (já ordenado por valor desc)
+        df_chart = pd.DataFrame(fin["categorias"], columns=["categoria", "valor", "percent"])
         
         # Palette sharing
         colors = px.colors.qualitative.Prism
@@ -624,15 +606,8 @@ def render_finance_view():
         with c_pie:
             st.caption("Distribuição (%)")
             
-            # Group for Donut (Top 5 + Outros)
-            if len(df_chart) > 5:
-                top_n = df_chart.head(5)
-                outros_val = df_chart.iloc[5:]["valor"].sum()
-                outros_pct = (outros_val / val_despesas) * 100
-                outros_row = pd.DataFrame([{"categoria": "OUTROS", "valor": outros_val, "percent": outros_pct}])
-                df_donut = pd.concat([top_n, outros_row], ignore_index=True)
-            else:
-                df_donut = df_chart
+            # Top 5 + Outros
+            df_donut = pd.DataFrame(fin["categorias_donut"], columns=["categoria", "valor", "percent"])
             
             # Custom Labels: Hide % if <= 2% to prevent overlap
             df_donut["text_label"] = df_donut["percent"].apply(lambda x: f"{x:.1f}%" if x > 2 else "")
@@ -720,17 +695,9 @@ def render_finance_view():
     # --- BLOCO 2: VENDAS (Clientes - Vertical Bar) ---
     st.markdown("#### 🏆 Top Clientes")
 
-    if not df_pedidos.empty:
-        # Clean client names
-        if "cliente_nome" in df_pedidos.columns:
-             df_pedidos["cliente_nome"] = df_pedidos["cliente_nome"].astype(str).str.replace(r'[%@_\$]', ' ', regex=True).str.title()
-        
-        # WRAP LABELS (No excessive truncation)
-        # WRAP LABELS (No excessive truncation)
-        df_pedidos["wrapped_name"] = df_pedidos["cliente_nome"].apply(lambda x: _wrap_text(x, width=12))
-
-        top_clientes = df_pedidos.groupby(["cliente_nome", "wrapped_name"])["valor_total"].sum().reset_index()
-        top_clientes = top_clientes.sort_values(by="valor_total", ascending=False).head(10)
+    if vendas["pedidos"]:
+        top_clientes = pd.DataFrame(vendas["top_clientes"], columns=["cliente_nome", "valor_total"])
+        top_clientes["cliente_nome"] = top_clientes["cliente_nome"].astype(str).str.title()
         
         # --- INSIGHT: CONCENTRAÇÃO DE RECEITA ---
         if val_receitas > 0:
@@ -779,18 +746,15 @@ def render_finance_view():
     else:
         st.info("Sem dados de vendas para o período.")
 
-    if not df_pedidos.empty:
+    if vendas["pedidos"]:
         st.divider()
         st.markdown("##### 📦 Maiores Pedidos")
-        
-        # Clean client name in orders too if strictly needed, but fetch_view usually has standard cols.
-        # df_pedidos already has 'cliente_nome' cleaned above if we used it.
-        
-        top_pedidos_table = (
-            df_pedidos[["cliente_nome", "data_criacao", "valor_total", "qtde_itens", "status_pedido"]]
-            .sort_values(by="valor_total", ascending=False)
-            .head(10)
+
+        top_pedidos_table = pd.DataFrame(
+            vendas["top_pedidos"],
+            columns=["cliente_nome", "data_criacao", "valor_total", "qtde_itens", "status_pedido"],
         )
+        top_pedidos_table["cliente_nome"] = top_pedidos_table["cliente_nome"].astype(str).str.title()
         
         st.dataframe(
             top_pedidos_table,
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks dos conversores e transforms do ETL, com baseline.
+
+Cada caso roda sobre um corpus fixo (semente fixa) e mede:
+  ns_per_row               melhor tempo entre --repeats passadas
+  alloc_peak_bytes_per_row pico de memória alocada (tracemalloc) guardando as saídas
+  retained_blocks_per_row  blocos ainda vivos no fim (objetos da saída)
+
+As métricas são comparadas com bench/baseline.json. Tempo acima de
+--time-tolerance (padrão 30%) ou alocação acima de --alloc-tolerance
+(padrão 10%) é regressão e o comando sai com código 1.
+
+Uso:
+  python bench/transform_bench.py
+  python bench/transform_bench.py --only to_ts,transform_row
+  python bench/transform_bench.py --update-baseline   # depois de uma melhora intencional
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from etl import run as etl_run  # noqa: E402
+from scripts import generate_synthetic_dump as gen  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_ROWS = 5_000
+DEFAULT_REPEATS = 3
+SEED = 20260125
+# Diferenças absolutas abaixo disso são ruído de medição, não regressão.
+TIME_NOISE_NS = 50.0
+ALLOC_NOISE_BYTES = 64.0
+
+# Tabelas com transform_row genérico medidas por linha (as de maior volume).
+TRANSFORM_ROW_TABLES = (
+    "is_pedidos",
+    "is_pedidos_itens",
+    "is_pedidos_historico",
+    "is_financeiro_lancamentos",
+    "is_clientes_extratos",
+    "is_produtos",
+)
+
+
+@dataclass
+class BenchCase:
+    name: str
+    fn: Callable[[Any], Any]
+    make_corpus: Callable[[], list[Any]]  # montado só para os casos selecionados
+
+
+# ============================================================================
+# CORPORA
+# ============================================================================
+
+def _scalar_corpus(rows: int, kind: str) -> list[Any]:
+    """Valores no formato que o mysql-connector entrega, incluindo sujeira."""
+    rng = random.Random(f"{SEED}:{kind}")
+    makers: dict[str, list[Callable[[], Any]]] = {
+        "int": [
+            lambda: rng.randint(0, 10_000),
+            lambda: str(rng.randint(0, 10_000)),
+            lambda: f"{rng.randint(0, 99)}.0",
+            lambda: None,
+            lambda: "",
+            lambda: True,
+        ],
+        "decimal": [
+            lambda: round(rng.uniform(0, 5000), 2),
+            lambda: f"{rng.uniform(0, 5000):.2f}",
+            lambda: f"{rng.randint(0, 999)},{rng.randint(0, 99):02d}",
+            lambda: f"{rng.randint(1, 30)}%",
+            lambda: None,
+            lambda: "null",
+        ],
+        "ts": [
+            lambda: dt.datetime(2020, 1, 1) + dt.timedelta(seconds=rng.randint(0, 200_000_000)),
+            lambda: (dt.datetime(2020, 1, 1) + dt.timedelta(seconds=rng.randint(0, 200_000_000))).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+            lambda: "0000-00-00 00:00:00",
+            lambda: None,
+            lambda: "2024-02-30",
+        ],
+        "bool": [
+            lambda: rng.randint(0, 1),
+            lambda: rng.choice(("0", "1", "s", "sim", "N", "")),
+            lambda: None,
+            lambda: rng.choice((True, False)),
+        ],
+        "legacy_id": [
+            lambda: rng.randint(1, 5_000_000),
+            lambda: str(rng.randint(1, 5_000_000)),
+            lambda: 0,
+            lambda: None,
+        ],
+        "text": [
+            lambda: f"{rng.choice(gen.FIRST_NAMES)} {rng.choice(gen.LAST_NAMES)}",
+            lambda: gen.mojibake(f"{rng.choice(gen.FIRST_NAMES)} {rng.choice(gen.LAST_NAMES)}"),
+            lambda: f"  {rng.choice(gen.WORDS)} &amp; {rng.choice(gen.WORDS)} *** (85) 99999-0000 ",
+            lambda: f"{rng.choice(gen.WORDS)}\\'s {rng.choice(gen.WORDS)}\r\n",
+            lambda: None,
+        ],
+    }
+    options = makers[kind]
+    return [rng.choice(options)() for _ in range(rows)]
+
+
+def _rejecting(fn: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Linha suja que o transform rejeita conta como processada (o ETL registra e segue)."""
+    def wrapper(item: Any) -> Any:
+        try:
+            return fn(item)
+        except ValueError:
+            return None
+    return wrapper
+
+
+def _row_corpus(mysql_table: str, rows: int, seed: int) -> list[dict]:
+    """Linhas MySQL sintéticas (mesmo gerador do benchmark ponta a ponta)."""
+    columns = gen.table_columns(mysql_table)
+    counts = {t: gen.rows_for(t, 1.0) for t in gen.source_tables()}
+    counts[mysql_table] = rows
+    factory = gen.RowFactory(
+        mysql_table, columns, counts, gen.DirtyRatios(), seed, dt.date(2026, 1, 25), gen.Counter()
+    )
+    names = [spec.name for spec in columns]
+    return [dict(zip(names, factory.row(row_id))) for row_id in range(1, rows + 1)]
+
+
+def build_cases(rows: int = DEFAULT_ROWS, only: list[str] | None = None) -> list[BenchCase]:
+    cases: list[BenchCase] = [
+        BenchCase("to_int", etl_run.to_int, lambda: _scalar_corpus(rows, "int")),
+        BenchCase("to_decimal", etl_run.to_decimal, lambda: _scalar_corpus(rows, "decimal")),
+        BenchCase("to_ts", etl_run.to_ts, lambda: _scalar_corpus(rows, "ts")),
+        BenchCase("to_bool", etl_run.to_bool, lambda: _scalar_corpus(rows, "bool")),
+        BenchCase(
+            "uuid5_for",
+            lambda v: etl_run.uuid5_for("is_pedidos", v),
+            lambda: _scalar_corpus(rows, "legacy_id"),
+        ),
+        BenchCase(
+            "clean_human_text",
+            lambda v: etl_run.clean_human_text(v, "nome"),
+            lambda: _scalar_corpus(rows, "text"),
+        ),
+    ]
+
+    for table in TRANSFORM_ROW_TABLES:
+        mapping = etl_run.COLUMN_MAPPING[table]
+        cases.append(
+            BenchCase(
+                f"transform_row:{table}",
+                _rejecting(lambda row, _t=table, _m=mapping: etl_run.transform_row(row, _t, _m)),
+                lambda _t=table: _row_corpus(_t, rows, SEED),
+            )
+        )
+
+    cases.append(
+        BenchCase(
+            "transform_cliente",
+            _rejecting(etl_run.transform_cliente),
+            lambda: _row_corpus("is_clientes", rows, SEED),
+        )
+    )
+    cases.append(
+        BenchCase(
+            "transform_pagamento",
+            _rejecting(etl_run.transform_pagamento),
+            lambda: _row_corpus("is_pedidos_pagamentos", rows, SEED),
+        )
+    )
+    slug_map: dict[str, int] = {}
+
+    def _categorias() -> list[dict]:
+        corpus = _row_corpus("is_produtos_categorias", rows, SEED)
+        slug_map.update({row["chave"]: row["id"] for row in corpus if row.get("chave")})
+        return corpus
+
+    cases.append(
+        BenchCase(
+            "transform_categoria",
+            lambda row: etl_run.transform_categoria(row, slug_map),
+            _categorias,
+        )
+    )
+
+    if only:
+        cases = [case for case in cases if any(case.name == o or case.name.startswith(o) for o in only)]
+    return cases
+
+
+# ============================================================================
+# MEDIÇÃO
+# ============================================================================
+
+def measure(case: BenchCase, repeats: int = DEFAULT_REPEATS) -> dict[str, float]:
+    fn, corpus = case.fn, case.make_corpus()
+    n = len(corpus)
+    for item in corpus[: min(n, 1000)]:  # aquecimento (caches de regex, imports tardios)
+        fn(item)
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        best = float("inf")
+        for _ in range(max(1, repeats)):
+            started = time.perf_counter_ns()
+            for item in corpus:
+                fn(item)
+            best = min(best, time.perf_counter_ns() - started)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        outputs = [fn(item) for item in corpus]
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained_blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    del outputs
+
+    return {
+        "ns_per_row": round(best / n, 1),
+        "alloc_peak_bytes_per_row": round(peak / n, 1),
+        "retained_blocks_per_row": round(retained_blocks / n, 2),
+    }
+
+
+def run_cases(cases: list[BenchCase], repeats: int = DEFAULT_REPEATS) -> dict[str, dict[str, float]]:
+    return {case.name: measure(case, repeats) for case in cases}
+
+
+# ============================================================================
+# BASELINE
+# ============================================================================
+
+def host_info() -> dict[str, Any]:
+    return {"python": platform.python_version(), "machine": platform.machine(), "platform": platform.platform()}
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict[str, Any]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_baseline(results: dict[str, dict[str, float]], rows: int, path: Path = BASELINE_PATH) -> None:
+    previous = load_baseline(path).get("cases") or {}
+    payload = {"host": host_info(), "rows": rows, "cases": {**previous, **results}}
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def compare_to_baseline(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, Any],
+    time_tolerance: float = 0.30,
+    alloc_tolerance: float = 0.10,
+) -> list[dict[str, Any]]:
+    """Uma linha por (caso, métrica); ``regression`` marca o que passou da tolerância."""
+    rows: list[dict[str, Any]] = []
+    base_cases = baseline.get("cases") or {}
+    for name, metrics in results.items():
+        base = base_cases.get(name)
+        if not base:
+            rows.append({"case": name, "metric": "ns_per_row", "old": None, "new": metrics["ns_per_row"],
+                         "delta_pct": None, "regression": False})
+            continue
+        for metric, tolerance, noise in (
+            ("ns_per_row", time_tolerance, TIME_NOISE_NS),
+            ("alloc_peak_bytes_per_row", alloc_tolerance, ALLOC_NOISE_BYTES),
+        ):
+            old, new = base.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            delta_pct = (new - old) / old * 100.0 if old else 0.0
+            regression = new > old * (1 + tolerance) and (new - old) > noise
+            rows.append({"case": name, "metric": metric, "old": old, "new": new,
+                         "delta_pct": round(delta_pct, 1), "regression": regression})
+    return rows
+
+
+def _format_report(rows: list[dict[str, Any]]) -> str:
+    lines = [f"{'caso':<40} {'métrica':<26} {'baseline':>10} {'atual':>10} {'delta':>8}"]
+    for row in rows:
+        old = "-" if row["old"] is None else f"{row['old']:.1f}"
+        delta = "novo" if row["delta_pct"] is None else f"{row['delta_pct']:+.1f}%"
+        flag = "  << REGRESSÃO" if row["regression"] else ""
+        lines.append(f"{row['case']:<40} {row['metric']:<26} {old:>10} {row['new']:>10.1f} {delta:>8}{flag}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos transforms do ETL")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Tamanho de cada corpus")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Passadas de tempo (vale a melhor)")
+    parser.add_argument("--only", help="Casos separados por vírgula (prefixo aceito, ex.: transform_row)")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Arquivo de baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.30, help="Folga de tempo (0.30 = +30%%)")
+    parser.add_argument("--alloc-tolerance", type=float, default=0.10, help="Folga de alocação (0.10 = +10%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Grava os resultados como nova baseline")
+    args = parser.parse_args()
+
+    only = [o.strip() for o in args.only.split(",") if o.strip()] if args.only else None
+    baseline_path = Path(args.baseline)
+    results = run_cases(build_cases(args.rows, only), args.repeats)
+
+    if args.update_baseline:
+        write_baseline(results, args.rows, baseline_path)
+        print(f"Baseline atualizada: {baseline_path} ({len(results)} casos)")
+        return
+
+    baseline = load_baseline(baseline_path)
+    if baseline.get("host") and baseline["host"].get("machine") != host_info()["machine"]:
+        print(f"AVISO: baseline gravada em outra arquitetura ({baseline['host'].get('machine')}); tempos são indicativos.")
+    rows = compare_to_baseline(results, baseline, args.time_tolerance, args.alloc_tolerance)
+    print(_format_report(rows))
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(regressions)} regressão(ões) | {len(results)} casos | {args.rows:,} linhas por corpus")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
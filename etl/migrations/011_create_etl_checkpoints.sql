@@ -0,0 +1,23 @@
+-- =============================================================================
+-- MIGRATION 011: Checkpoints do ETL (resume de cargas que falharam)
+--
+-- Uma linha por (run_id, tabela). status='done' quando a tabela terminou;
+-- last_id = último id legado cujo batch foi commitado (tabelas lidas em ordem
+-- de id). O ETL grava aqui e em backups/etl_checkpoint.json; com
+-- `daily_job.py --resume <run_id>` as tabelas concluídas são puladas.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.etl_checkpoints (
+  run_id text NOT NULL,
+  table_name text NOT NULL,
+  block integer,
+  status text NOT NULL CHECK (status IN ('running', 'done')),
+  last_id bigint,
+  rows_ok bigint NOT NULL DEFAULT 0,
+  rows_err bigint NOT NULL DEFAULT 0,
+  updated_at timestamp with time zone NOT NULL DEFAULT now(),
+  PRIMARY KEY (run_id, table_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_etl_checkpoints_updated_at
+  ON public.etl_checkpoints (updated_at DESC);
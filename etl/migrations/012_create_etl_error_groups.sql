@@ -0,0 +1,25 @@
+-- =============================================================================
+-- MIGRATION 012: Erros do ETL agregados por causa
+--
+-- Em vez de um evento por linha rejeitada em etl_error_logs, o ETL agrupa os
+-- erros por (tabela, etapa, constraint provável, template da mensagem) e carrega
+-- os grupos aqui via COPY. A lista completa por linha fica no artifact
+-- logs/etl_errors.jsonl.gz.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.etl_error_groups (
+  id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  run_id text NOT NULL,
+  table_name text,
+  stage text,
+  probable_constraint text,
+  message_template text NOT NULL,
+  error_count integer NOT NULL,
+  first_legacy_id text,
+  last_legacy_id text,
+  samples jsonb NOT NULL DEFAULT '[]'::jsonb,
+  created_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_etl_error_groups_run_id
+  ON public.etl_error_groups (run_id);
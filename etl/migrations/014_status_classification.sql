@@ -0,0 +1,88 @@
+-- =============================================================================
+-- MIGRATION 014: Classificação de status pré-calculada
+--
+-- A migration 004 simplifica o status de cada pedido com ~15 ILIKE '%...%'
+-- sobre o string_agg dos status dos itens, duas vezes (status_pedido e
+-- is_finalizado/is_atrasado). Os status distintos são poucos; o ETL passa a
+-- classificar cada um uma vez só (etl/run.py: build_status_classification):
+--
+-- - status_classification: status bruto de is_pedidos_itens → classe,
+--   prioridade (1 = Finalizado ... 5 = Em Análise) e flags
+-- - pedidos_status: uma linha por pedido com a classe de menor prioridade
+--   entre os itens, quantidade de itens e datas de prazo (< 2010 = NULL)
+-- - vw_dashboard_pedidos vira um JOIN simples nessas tabelas, mesmas colunas
+--   (a mv_dashboard_pedidos da migration 013 depende dela)
+--
+-- encerra_atraso é separado de is_finalizado porque a 004 não considera
+-- 'Concluído' no cálculo de atraso; o comportamento foi mantido.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.status_classification (
+    status_raw      text PRIMARY KEY,
+    status_nome     text NOT NULL,
+    classe          text NOT NULL,
+    prioridade      smallint NOT NULL,
+    is_finalizado   boolean NOT NULL DEFAULT false,
+    encerra_atraso  boolean NOT NULL DEFAULT false,
+    updated_at      timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS public.pedidos_status (
+    pedido_id          uuid PRIMARY KEY REFERENCES public.is_pedidos(id) ON DELETE CASCADE,
+    status_pedido      text,
+    status_prioridade  smallint,
+    is_finalizado      boolean NOT NULL DEFAULT false,
+    encerra_atraso     boolean NOT NULL DEFAULT false,
+    qtde_itens         integer NOT NULL DEFAULT 0,
+    data_prazo         timestamp,
+    data_entrega       timestamp
+);
+
+CREATE INDEX IF NOT EXISTS pedidos_status_status_pedido_idx
+    ON public.pedidos_status (status_pedido);
+
+CREATE OR REPLACE VIEW public.vw_dashboard_pedidos AS
+SELECT
+    p.id AS pedido_id,
+    p.cliente_id,
+    COALESCE(
+        NULLIF(TRIM(COALESCE(pf.nome, '') || ' ' || COALESCE(pf.sobrenome, '')), ''),
+        pj.razao_social,
+        'Cliente #' || LEFT(p.cliente_id::text, 8)
+    ) AS cliente_nome,
+    p.created_at AS data_criacao,
+
+    -- datas < 2010 já chegam NULL em pedidos_status
+    COALESCE(ps.data_entrega, ps.data_prazo) AS data_prazo_validada,
+
+    COALESCE(ps.status_pedido, 'Em Análise') AS status_pedido,
+    COALESCE(ps.qtde_itens, 0)::integer AS qtde_itens,
+    p.total AS valor_total,
+    p.frete_valor,
+    COALESCE(ps.is_finalizado, FALSE) AS is_finalizado,
+
+    -- Pedido sem nenhum status classificado nunca conta como atrasado (igual à 004)
+    CASE
+        WHEN COALESCE(ps.data_entrega, ps.data_prazo) < CURRENT_TIMESTAMP
+             AND ps.status_prioridade IS NOT NULL
+             AND NOT ps.encerra_atraso
+        THEN TRUE
+        ELSE FALSE
+    END AS is_atrasado,
+
+    CASE
+        WHEN COALESCE(ps.data_entrega, ps.data_prazo) < CURRENT_TIMESTAMP
+             AND ps.status_prioridade IS NOT NULL
+             AND NOT ps.encerra_atraso
+        THEN GREATEST(0, CURRENT_DATE - COALESCE(ps.data_entrega, ps.data_prazo)::date)
+        ELSE 0
+    END AS dias_em_atraso
+
+FROM public.is_pedidos p
+LEFT JOIN public.is_clientes_pf pf ON pf.cliente_id = p.cliente_id
+LEFT JOIN public.is_clientes_pj pj ON pj.cliente_id = p.cliente_id
+LEFT JOIN public.pedidos_status ps ON ps.pedido_id = p.id;
+
+GRANT SELECT ON public.status_classification TO anon, authenticated;
+GRANT SELECT ON public.pedidos_status TO anon, authenticated;
+GRANT SELECT ON public.vw_dashboard_pedidos TO anon, authenticated;
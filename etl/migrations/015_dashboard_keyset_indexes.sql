@@ -0,0 +1,22 @@
+-- =============================================================================
+-- MIGRATION 015: Índices para paginação keyset das mv_dashboard_*
+--
+-- fetch_view_data (app) pagina por (coluna de data, id) em vez de OFFSET:
+--   ORDER BY data_criacao, pedido_id
+--   WHERE data_criacao > :ultimo OR (data_criacao = :ultimo AND pedido_id > :id)
+-- Com o índice composto cada página é um range scan a partir do cursor.
+-- Os índices só de data da migration 013 ficam cobertos pelos compostos.
+-- =============================================================================
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_pedidos_keyset_idx
+    ON public.mv_dashboard_pedidos (data_criacao, pedido_id);
+
+DROP INDEX IF EXISTS public.mv_dashboard_pedidos_data_criacao_idx;
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_financeiro_competencia_keyset_idx
+    ON public.mv_dashboard_financeiro (competencia_mes, lancamento_id);
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_financeiro_vencimento_keyset_idx
+    ON public.mv_dashboard_financeiro (data_vencimento, lancamento_id);
+
+DROP INDEX IF EXISTS public.mv_dashboard_financeiro_data_vencimento_idx;
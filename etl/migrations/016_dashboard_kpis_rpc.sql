@@ -0,0 +1,132 @@
+-- =============================================================================
+-- MIGRATION 016: RPC genérica de KPIs do dashboard
+--
+-- fetch_kpis_generic (app) fazia um select count=exact por probe (total,
+-- atrasados, finalizados...), cada um reavaliando a view inteira. Esta RPC
+-- recebe todas as probes e devolve as contagens (e somas) numa passada só:
+--
+--   SELECT jsonb_build_object(
+--       'total',     COUNT(*) FILTER (WHERE TRUE),
+--       'atrasados', COUNT(*) FILTER (WHERE is_atrasado = 'true'), ...)
+--   FROM public.mv_dashboard_pedidos
+--   WHERE data_criacao >= :inicio AND data_criacao < :fim
+--
+-- p_probes: [{"label": "atrasados", "filters": {"is_atrasado": true}, "sum": "valor_total"}, ...]
+-- - filtros no formato do app: {col: val} (eq) ou {col__op: val}, op em
+--   eq | neq | gt | lt | ilike | is (is aceita null/true/false)
+-- - "sum" opcional devolve também '<label>_sum'
+-- - período semiaberto [p_start, p_end): o app manda p_end = início do dia
+--   seguinte ao fim (_date_bounds), sem perder o último segundo do dia
+-- - só as views de dashboard abaixo; colunas validadas contra o catálogo e
+--   valores sempre como literal (%L) — nada do cliente vira SQL cru
+-- - até 50 chaves no resultado (limite de argumentos do jsonb_build_object)
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION public.get_dashboard_kpis(
+    p_view text,
+    p_probes jsonb,
+    p_date_column text DEFAULT NULL,
+    p_start text DEFAULT NULL,
+    p_end text DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_cols text[];
+    v_where text := 'TRUE';
+    v_select text[] := '{}';
+    v_probe jsonb;
+    v_filter record;
+    v_col text;
+    v_op text;
+    v_val text;
+    v_preds text[];
+    v_pred text;
+    v_sum text;
+    v_result jsonb;
+BEGIN
+    IF p_view IS NULL OR p_view NOT IN (
+        'mv_dashboard_pedidos', 'mv_dashboard_financeiro',
+        'vw_dashboard_pedidos', 'vw_dashboard_financeiro'
+    ) THEN
+        RAISE EXCEPTION 'get_dashboard_kpis: view não permitida: %', p_view USING ERRCODE = '42501';
+    END IF;
+
+    v_cols := ARRAY(
+        SELECT a.attname::text
+        FROM pg_attribute a
+        WHERE a.attrelid = format('public.%I', p_view)::regclass
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+    );
+
+    IF p_date_column IS NOT NULL AND p_start IS NOT NULL AND p_end IS NOT NULL THEN
+        IF NOT p_date_column = ANY(v_cols) THEN
+            RAISE EXCEPTION 'get_dashboard_kpis: coluna inexistente: %', p_date_column USING ERRCODE = '42703';
+        END IF;
+        v_where := format('%I >= %L AND %I < %L', p_date_column, p_start, p_date_column, p_end);
+    END IF;
+
+    FOR v_probe IN SELECT value FROM jsonb_array_elements(COALESCE(p_probes, '[]'::jsonb)) LOOP
+        IF COALESCE(v_probe->>'label', '') = '' THEN
+            RAISE EXCEPTION 'get_dashboard_kpis: probe sem label' USING ERRCODE = '22023';
+        END IF;
+
+        v_preds := ARRAY['TRUE'];
+        FOR v_filter IN SELECT key, value FROM jsonb_each(COALESCE(v_probe->'filters', '{}'::jsonb)) LOOP
+            CONTINUE WHEN jsonb_typeof(v_filter.value) = 'null';
+
+            v_col := split_part(v_filter.key, '__', 1);
+            v_op := COALESCE(NULLIF(split_part(v_filter.key, '__', 2), ''), 'eq');
+            v_val := v_filter.value #>> '{}';
+            IF NOT v_col = ANY(v_cols) THEN
+                RAISE EXCEPTION 'get_dashboard_kpis: coluna inexistente: %', v_col USING ERRCODE = '42703';
+            END IF;
+
+            v_pred := CASE v_op
+                WHEN 'eq' THEN format('%I = %L', v_col, v_val)
+                WHEN 'neq' THEN format('%I <> %L', v_col, v_val)
+                WHEN 'gt' THEN format('%I > %L', v_col, v_val)
+                WHEN 'lt' THEN format('%I < %L', v_col, v_val)
+                WHEN 'ilike' THEN format('%I::text ILIKE %L', v_col, '%' || v_val || '%')
+                WHEN 'is' THEN CASE
+                    WHEN lower(v_val) IN ('null', 'true', 'false') THEN format('%I IS %s', v_col, upper(v_val))
+                END
+            END;
+            IF v_pred IS NULL THEN
+                RAISE EXCEPTION 'get_dashboard_kpis: filtro não permitido: % = %', v_filter.key, v_val USING ERRCODE = '22023';
+            END IF;
+            v_preds := v_preds || v_pred;
+        END LOOP;
+
+        v_pred := array_to_string(v_preds, ' AND ');
+        v_select := v_select || format('%L, COUNT(*) FILTER (WHERE %s)', v_probe->>'label', v_pred);
+
+        v_sum := v_probe->>'sum';
+        IF v_sum IS NOT NULL THEN
+            IF NOT v_sum = ANY(v_cols) THEN
+                RAISE EXCEPTION 'get_dashboard_kpis: coluna inexistente: %', v_sum USING ERRCODE = '42703';
+            END IF;
+            v_select := v_select || format(
+                '%L, COALESCE(SUM(%I) FILTER (WHERE %s), 0)', (v_probe->>'label') || '_sum', v_sum, v_pred
+            );
+        END IF;
+    END LOOP;
+
+    IF cardinality(v_select) = 0 THEN
+        RETURN '{}'::jsonb;
+    END IF;
+
+    EXECUTE format(
+        'SELECT jsonb_build_object(%s) FROM public.%I WHERE %s',
+        array_to_string(v_select, ', '), p_view, v_where
+    ) INTO v_result;
+    RETURN v_result;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_dashboard_kpis(text, jsonb, text, text, text) TO anon, authenticated;
@@ -13,9 +13,14 @@ COMO USAR:
 Variáveis de controle:
   ETL_VALIDATE_ONLY=1   → valida mapping vs schema e sai sem escrever
   ETL_ONLY_TABLES=t1,t2 → roda apenas as tabelas listadas
-  ETL_BATCH_SIZE = 4000   → tamanho do batch de insert
+  ETL_BATCH_SIZE = 4000   → tamanho inicial do batch (fetch/insert/self-ref)
+  ETL_BATCH_ADAPTIVE=0  → desliga o ajuste adaptativo por tabela
+  ETL_CHARSET_DETECT=0  → desliga a amostragem de charset por coluna
+                          (relatório em logs/etl_charset_report.json)
 """
 
+import argparse
+import gc
 import os
 import re
 import uuid
@@ -23,10 +28,11 @@ import json
 import sys
 import html
 import time
+import pickle
 import threading
 import datetime as dt
 from pathlib import Path
-from typing import Optional, Dict, Any, Set, List, Tuple, Callable
+from typing import Optional, Dict, Any, Set, List, Tuple, Callable, Iterable, Iterator
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
@@ -37,12 +43,20 @@ if sys.platform == "win32":
 
 from dotenv import load_dotenv # noqa: E402
 from scripts.error_log_sink import (  # noqa: E402
-    build_error_event,
     ensure_run_id,
     persist_error_event,
-    persist_error_events,
+    persist_error_groups,
     read_json_file, # noqa: F401
 )
+from scripts.etl_metrics import (  # noqa: E402
+    PROFILE_JSON_PATH,
+    RunMetrics,
+    current_rss_mb,
+    top_allocation_sites,
+)
+from scripts.etl_checkpoint import CheckpointStore  # noqa: E402
+from scripts.etl_error_groups import ErrorAggregator, write_errors_jsonl  # noqa: E402
+from scripts.etl_profiler import profiler_from_env  # noqa: E402
 
 load_dotenv()
 
@@ -60,8 +74,19 @@ SCHEMA_PATH_ENV = (os.getenv("ETL_SCHEMA_PATH", "") or "").strip()
 ERROR_REPORT_PATH = Path(
     os.getenv("ETL_ERRORS_PATH", os.path.join(os.getenv("LOGS_DIR", "./logs"), "etl_errors.json"))
 ).resolve()
-MAX_CAPTURED_ERRORS = int(os.getenv("ETL_MAX_ERROR_REPORT_ROWS", "10000"))
+MAX_CAPTURED_ERRORS = int(os.getenv("ETL_MAX_ERROR_REPORT_ROWS", "10000"))  # linhas no JSONL; grupos contam tudo
+ERROR_ROWS_PATH = Path(
+    os.getenv("ETL_ERRORS_JSONL_PATH", os.path.join(os.getenv("LOGS_DIR", "./logs"), "etl_errors.jsonl.gz"))
+).resolve()
+ERROR_GROUP_SAMPLE = int(os.getenv("ETL_ERROR_GROUP_SAMPLE", "5"))
 RUN_ID = ensure_run_id()
+METRICS = RunMetrics(run_id=RUN_ID)  # tempos por etapa/tabela → logs/etl_profile.json
+PROFILER = profiler_from_env(RUN_ID)  # ETL_PROFILE=sample|cprofile → logs/profile/
+MAX_RSS_MB = float(os.getenv("ETL_MAX_RSS_MB", "0") or 0)  # 0 = sem orçamento de memória
+RSS_SPILL_RATIO = float(os.getenv("ETL_RSS_SPILL_RATIO", "0.8"))  # fração do orçamento que dispara spill
+SPILL_DIR = Path(os.getenv("ETL_SPILL_DIR", os.path.join(os.getenv("LOGS_DIR", "./logs"), "spill"))).resolve()
+CHECKPOINT_ENABLED = os.getenv("ETL_CHECKPOINT", "1") == "1"
+RESUME_RUN_ID = (os.getenv("ETL_RESUME_RUN_ID", "") or "").strip()  # ou --resume <run_id>
 
 # MySQL → Supabase: nomes de tabela diferentes
 MYSQL_TABLE_NAME_MAP = {
@@ -112,6 +137,7 @@ NAME_LIKE_COLUMNS: Set[str] = {"nome", "sobrenome", "razao_social", "fantasia",
 
 ETL_ERRORS: List[dict] = []
 _ETL_ERRORS_LOCK = threading.Lock()  # thread-safe para execução paralela futura
+ERROR_GROUPS = ErrorAggregator(sample_size=ERROR_GROUP_SAMPLE)  # (tabela, etapa, constraint, template) → contagem
 
 # ============================================================================
 # LOGGING
@@ -152,74 +178,323 @@ def record_etl_error(
     stage: str = "insert",
     probable: Optional[str] = None,
 ) -> None:
+    item = {
+        "table": table,
+        "legacy_id": None if legacy_id in (None, "", "None") else str(legacy_id),
+        "stage": stage,
+        "probable_constraint": probable or _probable_constraint(message),
+        "message": _short_error_message(message),
+    }
+    ERROR_GROUPS.add(item)
     with _ETL_ERRORS_LOCK:
-        if len(ETL_ERRORS) >= MAX_CAPTURED_ERRORS:
+        if len(ETL_ERRORS) + len(ETL_ERRORS_SPILL) >= MAX_CAPTURED_ERRORS:
             return
-        ETL_ERRORS.append(
-            {
-                "table": table,
-                "legacy_id": None if legacy_id in (None, "", "None") else str(legacy_id),
-                "stage": stage,
-                "probable_constraint": probable or _probable_constraint(message),
-                "message": _short_error_message(message),
-            }
-        )
+        ETL_ERRORS.append(item)
+
+
+def captured_etl_errors() -> List[dict]:
+    """Erros capturados na ordem de registro (os despejados em disco vêm primeiro)."""
+    with _ETL_ERRORS_LOCK:
+        return list(ETL_ERRORS_SPILL) + list(ETL_ERRORS)
 
 
 def write_etl_error_report(total_errors: int) -> dict:
+    """Grava o relatório agregado (etl_errors.json) e a lista por linha (etl_errors.jsonl.gz)."""
     ERROR_REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    captured = write_errors_jsonl(ERROR_ROWS_PATH, captured_etl_errors())
     payload = {
         "run_id": RUN_ID,
         "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
         "total_errors": int(total_errors),
-        "captured_errors": len(ETL_ERRORS),
-        "errors": ETL_ERRORS,
+        "recorded_errors": ERROR_GROUPS.total,
+        "captured_errors": captured,
+        "errors_path": str(ERROR_ROWS_PATH),
+        "json_invalid": JSON_INVALID_COUNTS,
+        "group_count": len(ERROR_GROUPS),
+        "groups": [group.as_dict() for group in ERROR_GROUPS.groups()],
     }
     ERROR_REPORT_PATH.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-    log(f"Error report saved at {ERROR_REPORT_PATH}", "WARN")
+    log(
+        f"Error report saved at {ERROR_REPORT_PATH} ({len(ERROR_GROUPS)} grupo(s); "
+        f"{captured:,} linha(s) em {ERROR_ROWS_PATH.name})",
+        "WARN",
+    )
     return payload
 
 
 def persist_etl_error_report(total_errors: int, stats: Dict[str, Dict[str, int]]) -> dict | None:
-    if total_errors <= 0 and not ETL_ERRORS:
+    """Grava o relatório local e envia ao Supabase um evento-resumo + os grupos (COPY)."""
+    if total_errors <= 0 and not ERROR_GROUPS.total:
         return None
 
     payload = write_etl_error_report(total_errors)
-    events = [
-        build_error_event(
-            run_id=RUN_ID,
-            script_name="etl/run.py",
-            step_name="run_etl",
-            phase="etl",
-            event_type="etl_error_summary",
-            message=f"ETL finished with {total_errors} row-level error(s)",
-            error_class="RuntimeError" if total_errors > 0 else None,
-            details={
-                "stats": stats,
-                "error_report_path": str(ERROR_REPORT_PATH),
-                "error_report": payload,
-            },
-        )
-    ]
-    for item in ETL_ERRORS:
-        events.append(
-            build_error_event(
-                run_id=RUN_ID,
-                script_name="etl/run.py",
-                step_name=item.get("stage"),
-                phase="etl",
-                event_type="etl_row_error",
-                message=item.get("message") or "ETL row error",
-                table_name=item.get("table"),
-                legacy_id=item.get("legacy_id"),
-                probable_constraint=item.get("probable_constraint"),
-                details={"row_error": item},
-            )
-        )
-    persist_error_events(events)
+    persist_error_event(
+        run_id=RUN_ID,
+        script_name="etl/run.py",
+        step_name="run_etl",
+        phase="etl",
+        event_type="etl_error_summary",
+        message=f"ETL finished with {total_errors} row-level error(s) in {payload['group_count']} group(s)",
+        error_class="RuntimeError" if total_errors > 0 else None,
+        details={
+            "stats": stats,
+            "json_invalid": JSON_INVALID_COUNTS,
+            "error_report_path": str(ERROR_REPORT_PATH),
+            "errors_path": str(ERROR_ROWS_PATH),
+            "group_count": payload["group_count"],
+            "top_groups": ERROR_GROUPS.summary(),
+        },
+    )
+    persist_error_groups(RUN_ID, payload["groups"])
     return payload
 
 
+# ============================================================================
+# ORÇAMENTO DE MEMÓRIA (ETL_MAX_RSS_MB)
+# O runner tem pouca RAM. Acima de RSS_SPILL_RATIO × orçamento, as listas que
+# atravessam blocos (derivados de clientes, links de cupons, erros capturados)
+# são despejadas em disco; se mesmo assim o RSS passar do orçamento, o ETL para
+# com um diagnóstico em vez de ser morto pelo OOM killer sem log.
+# ============================================================================
+class MemoryBudgetExceeded(RuntimeError):
+    def __init__(self, diagnosis: Dict[str, Any]):
+        self.diagnosis = diagnosis
+        super().__init__(
+            f"RSS {diagnosis.get('rss_mb')} MiB acima do orçamento ETL_MAX_RSS_MB={diagnosis.get('budget_mb')} "
+            f"em {diagnosis.get('where')} (tabela={diagnosis.get('table')})"
+        )
+
+
+class SpillList:
+    """Lista só-append que pode despejar o conteúdo em disco (pickle sequencial).
+
+    Iteração devolve primeiro as linhas despejadas, depois as que estão em memória,
+    preservando a ordem de inserção e os tipos (Decimal, datetime, ...).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._rows: List[Any] = []
+        self._path: Optional[Path] = None
+        self._spilled = 0
+
+    def append(self, row: Any) -> None:
+        self._rows.append(row)
+
+    def extend(self, rows) -> None:
+        self._rows.extend(rows)
+
+    def __len__(self) -> int:
+        return self._spilled + len(self._rows)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self):
+        if self._path is not None and self._spilled:
+            with self._path.open("rb") as fh:
+                for _ in range(self._spilled):
+                    yield pickle.load(fh)
+        yield from self._rows
+
+    @property
+    def in_memory(self) -> int:
+        return len(self._rows)
+
+    def spill(self) -> int:
+        """Move as linhas em memória para o arquivo de spill; retorna quantas foram movidas."""
+        if not self._rows:
+            return 0
+        if self._path is None:
+            SPILL_DIR.mkdir(parents=True, exist_ok=True)
+            self._path = SPILL_DIR / f"{RUN_ID}.{self.name}.{os.getpid()}.pkl"
+            self._path.write_bytes(b"")
+        with self._path.open("ab") as fh:
+            for row in self._rows:
+                pickle.dump(row, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        moved = len(self._rows)
+        self._spilled += moved
+        self._rows = []
+        return moved
+
+    def clear(self) -> None:
+        self._rows = []
+        self._spilled = 0
+        if self._path is not None:
+            self._path.unlink(missing_ok=True)
+            self._path = None
+
+
+ETL_ERRORS_SPILL = SpillList("etl_errors")  # recebe ETL_ERRORS quando o orçamento aperta
+MEMORY_HOLDERS: Dict[str, Any] = {}  # nome → estrutura grande viva durante o run (para spill/diagnóstico)
+
+
+def register_memory_holder(name: str, holder: Any) -> Any:
+    MEMORY_HOLDERS[name] = holder
+    return holder
+
+
+def spill_memory_holders() -> Dict[str, int]:
+    """Despeja em disco tudo que aceita spill; retorna linhas movidas por estrutura."""
+    moved: Dict[str, int] = {}
+    for name, holder in MEMORY_HOLDERS.items():
+        if isinstance(holder, SpillList):
+            n = holder.spill()
+            if n:
+                moved[name] = n
+    with _ETL_ERRORS_LOCK:
+        if ETL_ERRORS:
+            ETL_ERRORS_SPILL.extend(ETL_ERRORS)
+            ETL_ERRORS.clear()
+            moved["etl_errors"] = ETL_ERRORS_SPILL.spill()
+    return moved
+
+
+def memory_holder_sizes() -> Dict[str, Any]:
+    sizes: Dict[str, Any] = {}
+    for name, holder in MEMORY_HOLDERS.items():
+        if isinstance(holder, SpillList):
+            sizes[name] = {"in_memory": holder.in_memory, "spilled": len(holder) - holder.in_memory}
+        else:
+            sizes[name] = len(holder)
+    sizes["etl_errors"] = {"in_memory": len(ETL_ERRORS), "spilled": len(ETL_ERRORS_SPILL)}
+    sizes["valid_fk_ids"] = sum(len(ids) for ids in VALID_FK_IDS.values())
+    return sizes
+
+
+def memory_diagnosis(where: str, rss_mb: Optional[float]) -> Dict[str, Any]:
+    sites = top_allocation_sites()
+    return {
+        "where": where,
+        "table": METRICS.current_table,
+        "rss_mb": rss_mb,
+        "budget_mb": MAX_RSS_MB,
+        "holders": memory_holder_sizes(),
+        "top_alloc_sites": sites,
+        "hint": None if sites else "rode com ETL_TRACEMALLOC=1 para ver os sites de alocação",
+    }
+
+
+def check_memory_budget(where: str) -> None:
+    """Confere o RSS contra ETL_MAX_RSS_MB: spill acima do limiar, falha acima do orçamento."""
+    if MAX_RSS_MB <= 0:
+        return
+    rss = current_rss_mb()
+    if rss is None or rss < MAX_RSS_MB * RSS_SPILL_RATIO:
+        return
+    moved = spill_memory_holders()
+    if moved:
+        gc.collect()
+        before, rss = rss, current_rss_mb()
+        METRICS.record_memory_event("spill", where=where, moved=moved, rss_before_mb=before)
+        log(f"[MEM] RSS {before} MiB ≥ {RSS_SPILL_RATIO:.0%} do orçamento em {where} — spill {moved} → {rss} MiB", "WARN")
+    if rss is not None and rss >= MAX_RSS_MB:
+        diagnosis = memory_diagnosis(where, rss)
+        METRICS.record_memory_event("budget_exceeded", **diagnosis)
+        raise MemoryBudgetExceeded(diagnosis)
+
+
+def report_memory_budget_failure(exc: MemoryBudgetExceeded, stats: Dict[str, Dict[str, int]]) -> None:
+    """Loga o diagnóstico, grava profile/erros e registra o evento antes de abortar."""
+    diagnosis = exc.diagnosis
+    log(f"[MEM] {exc}", "ERROR")
+    log(f"[MEM] estruturas em memória: {diagnosis['holders']}", "ERROR")
+    for site in diagnosis["top_alloc_sites"]:
+        log(f"[MEM]   {site['size_kb']:>10,.1f} KiB  {site['site']}", "ERROR")
+    if diagnosis.get("hint"):
+        log(f"[MEM] {diagnosis['hint']}", "ERROR")
+    try:
+        METRICS.write(status="memory_budget_exceeded")
+    except OSError as write_exc:
+        log(f"  Profile não gravado: {write_exc}", "WARN")
+    persist_error_event(
+        run_id=RUN_ID,
+        script_name="etl/run.py",
+        step_name="run_etl",
+        phase="etl",
+        event_type="etl_memory_budget_exceeded",
+        message=str(exc),
+        error_class="MemoryBudgetExceeded",
+        table_name=diagnosis.get("table"),
+        details={"diagnosis": diagnosis, "stats": stats},
+    )
+
+
+# ============================================================================
+# CHECKPOINT / RESUME
+# Cada tabela concluída vira "done"; as tabelas lidas em ordem de id guardam
+# também o último id com batch commitado. Com --resume <run_id>, tabelas
+# concluídas são puladas e as parciais continuam de WHERE id > last_id, em modo
+# upsert (idempotente para o batch em voo quando o processo caiu).
+# ============================================================================
+CHECKPOINT: Optional[CheckpointStore] = None
+RESUME_UPSERT_TABLES: Set[str] = set()  # tabelas que já receberam linhas neste run_id
+
+# Consumidor → produtor: listas derivadas vivem só em memória, então o produtor
+# precisa rodar de novo se o consumidor ainda não terminou.
+CHECKPOINT_PRODUCERS: Dict[str, str] = {
+    "is_clientes_pf": "is_clientes",
+    "is_clientes_pj": "is_clientes",
+    "is_clientes_enderecos": "is_clientes",
+    "is_mkt_cupons_produtos": "is_mkt_cupons",
+}
+
+
+def plan_resume(store: CheckpointStore, tables: Set[str]) -> Tuple[Set[str], Set[str]]:
+    """Retorna (tabelas a pular, tabelas a regravar em upsert) para um resume."""
+    skip = store.done_tables() & tables
+    for consumer, producer in CHECKPOINT_PRODUCERS.items():
+        if consumer in tables and consumer not in skip:
+            skip.discard(producer)
+    rerun = {t for t in tables - skip if store.get(t) is not None}
+    return skip, rerun
+
+
+def resume_position(table: str) -> Tuple[Optional[int], int, int]:
+    """(último id commitado, ok, err) de uma tabela parcial do run retomado."""
+    item = CHECKPOINT.get(table) if CHECKPOINT is not None and table in RESUME_UPSERT_TABLES else None
+    if item is None or item.done or item.last_id is None:
+        return None, 0, 0
+    return item.last_id, item.rows_ok, item.rows_err
+
+
+def ordered_source_sql(sql: str, after_id: Optional[int]) -> str:
+    """Lê em ordem de id (PK clusterizada, sem filesort) para o checkpoint ter posição."""
+    if CHECKPOINT is None:
+        return sql
+    where = f" WHERE `id` > {int(after_id)}" if after_id is not None else ""
+    return f"{sql}{where} ORDER BY `id`"
+
+
+def checkpoint_advance(table: str, rows: List[dict], ok: int, err: int) -> None:
+    if CHECKPOINT is not None and rows:
+        CHECKPOINT.advance(table, rows[-1].get("id"), ok, err)
+
+
+def setup_checkpoints() -> Optional[str]:
+    """Inicializa CHECKPOINT; no resume, carrega o estado e retorna de onde veio (local/supabase)."""
+    global CHECKPOINT
+    RESUME_UPSERT_TABLES.clear()
+    if not CHECKPOINT_ENABLED:
+        CHECKPOINT = None
+        if RESUME_RUN_ID:
+            log("ETL_CHECKPOINT=0 — --resume ignorado, carga completa", "WARN")
+        return None
+    CHECKPOINT = CheckpointStore(run_id=RESUME_RUN_ID or RUN_ID, warn=lambda msg: log(msg, "WARN"))
+    if not RESUME_RUN_ID:
+        CHECKPOINT.reset()
+        return None
+    source = CHECKPOINT.load()
+    if source is None:
+        log(f"[RESUME] nenhum checkpoint para run_id={RESUME_RUN_ID} — carga completa", "WARN")
+    return source
+
+
+def close_checkpoints() -> None:
+    if CHECKPOINT is not None:
+        CHECKPOINT.close()
+
+
 # ============================================================================
 # CONVERSORES DE TIPO
 # ============================================================================
@@ -305,6 +580,65 @@ def to_str(val: Any) -> Optional[str]:
     return s if s and s not in ("None", "null") else None
 
 
+# ============================================================================
+# JSON — cada payload é decodificado no máximo uma vez
+# ============================================================================
+# Texto JSON válido segue como texto direto para a coluna jsonb (o Postgres
+# faz o parse); apenas estruturas Python (dict/list) são serializadas.
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# tabela → {coluna: nº de payloads inválidos} (entra no resumo final)
+JSON_INVALID_COUNTS: Dict[str, Dict[str, int]] = {}
+_JSON_INVALID_LOCK = threading.Lock()
+
+
+def json_loads(text: str | bytes) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def json_dumps(obj: Any) -> str:
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _record_invalid_json(table: str, column: str) -> None:
+    with _JSON_INVALID_LOCK:
+        per_table = JSON_INVALID_COUNTS.setdefault(table, {})
+        per_table[column] = per_table.get(column, 0) + 1
+
+
+def decode_json_payload(raw: Any, table: str, column: str) -> Tuple[bool, Any]:
+    """Decodifica um payload JSON uma única vez. Retorna (válido, valor)."""
+    text = to_str(raw)
+    if text is None:
+        return False, None
+    try:
+        return True, json_loads(text)
+    except (ValueError, TypeError):
+        _record_invalid_json(table, column)
+        return False, None
+
+
+def validate_json_text(raw: Any, table: str, column: str) -> Optional[str]:
+    """Valida o texto JSON sem re-serializar: o texto original segue para o jsonb."""
+    text = to_str(raw)
+    if text is not None:
+        decode_json_payload(text, table, column)
+    return text
+
+
+def json_invalid_total() -> int:
+    return sum(n for cols in JSON_INVALID_COUNTS.values() for n in cols.values())
+
+
 EMAIL_RE = re.compile(r"\b[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}\b")
 PHONE_RE = re.compile(r"(\+?\d[\d\s().\-]{7,}\d)")
 CONTROL_CHARS_RE = re.compile(r"[\x00-\x1F\x7F]")
@@ -325,11 +659,12 @@ def _fix_mojibake(text: str) -> str:
     return text
 
 
-def clean_human_text(value: Any, field_name: str = "") -> Optional[str]:
+def clean_human_text(value: Any, field_name: str = "", repair_mojibake: bool = True) -> Optional[str]:
     s = to_str(value)
     if not s:
         return None
-    s = _fix_mojibake(s)
+    if repair_mojibake:
+        s = _fix_mojibake(s)
     s = html.unescape(s)
     s = ESCAPED_QUOTE_RE.sub("'", s).replace("\\\"", "\"")
     s = CONTROL_CHARS_RE.sub(" ", s)
@@ -341,9 +676,10 @@ def clean_human_text(value: Any, field_name: str = "") -> Optional[str]:
     return s or None
 
 
-def safe_str(val: Any, field_name: str = "") -> Optional[str]:
+def safe_str(val: Any, field_name: str = "", source_table: str = "") -> Optional[str]:
     if field_name and field_name in HUMAN_TEXT_COLUMNS and field_name not in TECHNICAL_TEXT_COLUMNS:
-        return clean_human_text(val, field_name=field_name)
+        repair = needs_mojibake_repair(source_table, field_name) if source_table else True
+        return clean_human_text(val, field_name=field_name, repair_mojibake=repair)
     return to_str(val)
 
 
@@ -389,6 +725,260 @@ def get_pg():
     return conn
 
 
+# ============================================================================
+# CHARSET DA ORIGEM
+# ============================================================================
+# O MySQL do Docker sobe com latin1 e o dump legado mistura colunas latin1 com
+# bytes UTF-8 gravados dentro delas. Antes da extração amostramos os bytes crus
+# de cada coluna textual e escolhemos UMA estratégia de leitura por coluna:
+#   session → leitura normal (a conversão do servidor já entrega texto correto)
+#   utf8    → lê CAST(col AS BINARY) e decodifica UTF-8 uma única vez
+#   mixed   → lê binário, decodifica UTF-8 com fallback latin1 e mantém o
+#             reparo de mojibake valor-a-valor (_fix_mojibake) só nessa coluna
+CHARSET_DETECT = os.getenv("ETL_CHARSET_DETECT", "1") == "1"
+CHARSET_SAMPLE_ROWS = int(os.getenv("ETL_CHARSET_SAMPLE_ROWS", "2000"))
+CHARSET_REPORT_PATH = Path(
+    os.getenv(
+        "ETL_CHARSET_REPORT_PATH",
+        os.path.join(os.getenv("LOGS_DIR", "./logs"), "etl_charset_report.json"),
+    )
+).resolve()
+TEXT_DATA_TYPES: Set[str] = {"char", "varchar", "tinytext", "text", "mediumtext", "longtext"}
+UTF8_CHARSETS: Set[str] = {"utf8", "utf8mb3", "utf8mb4"}
+
+# mysql_table → {coluna: estratégia} (apenas colunas != session)
+CHARSET_PLAN: Dict[str, Dict[str, str]] = {}
+# mysql_table → colunas na ordem física (usado para expandir SELECT *)
+SOURCE_COLUMNS_ORDERED: Dict[str, List[str]] = {}
+
+
+def classify_raw_text(raw: bytes) -> str:
+    """Classifica bytes crus de um valor: ascii | utf8 | double | latin1."""
+    if raw.isascii():
+        return "ascii"
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return "latin1"
+    if MOJIBAKE_HINT_RE.search(text):
+        return "double"  # UTF-8 válido que ainda carrega mojibake (dupla codificação)
+    return "utf8"
+
+
+def choose_charset_strategy(declared_charset: Optional[str], counts: Dict[str, int], exhaustive: bool = True) -> str:
+    """Escolhe a estratégia de leitura de uma coluna a partir das amostras.
+
+    Com a amostra truncada (LIMIT atingido), coluna sem nenhum valor não-ASCII
+    não é evidência de nada: fica "mixed" e o reparo por valor segue ativo.
+    """
+    utf8 = counts.get("utf8", 0)
+    latin1 = counts.get("latin1", 0)
+    if counts.get("double", 0) or (utf8 and latin1):
+        return "mixed"
+    if not exhaustive and not (counts.keys() - {"ascii"}):
+        return "mixed"
+    if utf8 and (declared_charset or "").lower() not in UTF8_CHARSETS:
+        return "utf8"
+    return "session"
+
+
+def decode_source_value(value: Any) -> Any:
+    if not isinstance(value, (bytes, bytearray)):
+        return value
+    raw = bytes(value)
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin1")
+
+
+def decode_source_rows(mysql_table: str, rows: List[dict]) -> List[dict]:
+    """Decodifica (in-place) as colunas lidas em binário conforme CHARSET_PLAN."""
+    plan = CHARSET_PLAN.get(mysql_table)
+    if not plan or not rows:
+        return rows
+    for row in rows:
+        for col in plan:
+            if col in row:
+                row[col] = decode_source_value(row[col])
+    return rows
+
+
+def source_select_sql(mysql_table: str, cols: Optional[List[str]] = None) -> str:
+    """Monta o SELECT de extração aplicando CAST(... AS BINARY) nas colunas planejadas."""
+    plan = CHARSET_PLAN.get(mysql_table, {})
+    if cols is None:
+        if not plan or mysql_table not in SOURCE_COLUMNS_ORDERED:
+            return f"SELECT * FROM `{mysql_table}`"
+        cols = SOURCE_COLUMNS_ORDERED[mysql_table]
+    exprs = [f"CAST(`{c}` AS BINARY) AS `{c}`" if c in plan else f"`{c}`" for c in cols]
+    return f"SELECT {','.join(exprs)} FROM `{mysql_table}`"
+
+
+def needs_mojibake_repair(mysql_table: str, column: str) -> bool:
+    """Sem plano para a tabela mantém o comportamento legado (reparo sempre ativo)."""
+    if mysql_table not in SOURCE_COLUMNS_ORDERED:
+        return True
+    return CHARSET_PLAN.get(mysql_table, {}).get(column) == "mixed"
+
+
+# tabela destino → {coluna MySQL: reparo de mojibake?}; resolvido uma vez por
+# coluna (fora do loop de linhas) e descartado junto com CHARSET_PLAN
+MOJIBAKE_REPAIR_COLUMNS: Dict[str, Dict[str, bool]] = {}
+
+
+def mojibake_repair_columns(table: str, mapping: Dict[str, str]) -> Dict[str, bool]:
+    columns = MOJIBAKE_REPAIR_COLUMNS.get(table)
+    if columns is None:
+        source_table = resolve_source_table(table)
+        columns = {col: needs_mojibake_repair(source_table, col) for col in mapping.values()}
+        MOJIBAKE_REPAIR_COLUMNS[table] = columns
+    return columns
+
+
+def reset_charset_plan() -> None:
+    CHARSET_PLAN.clear()
+    SOURCE_COLUMNS_ORDERED.clear()
+    MOJIBAKE_REPAIR_COLUMNS.clear()
+
+
+def build_charset_plan(cursor) -> Dict[str, Dict[str, str]]:
+    """
+    Amostra bytes crus das colunas textuais de cada tabela de origem e preenche
+    CHARSET_PLAN / SOURCE_COLUMNS_ORDERED. Grava o relatório em CHARSET_REPORT_PATH.
+    """
+    reset_charset_plan()
+    source_tables = sorted({resolve_source_table(t) for t in EXEC_ORDER})
+
+    cursor.execute(
+        """
+        SELECT table_name AS table_name, column_name AS column_name,
+               data_type AS data_type, character_set_name AS charset
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        ORDER BY table_name, ordinal_position
+        """
+    )
+    columns_by_table: Dict[str, List[dict]] = {}
+    for row in cursor.fetchall():
+        columns_by_table.setdefault(str(row["table_name"]), []).append(row)
+
+    report_tables: Dict[str, Dict[str, Any]] = {}
+    mixed_columns: List[str] = []
+    for mysql_table in source_tables:
+        columns = columns_by_table.get(mysql_table)
+        if not columns:
+            continue
+        SOURCE_COLUMNS_ORDERED[mysql_table] = [str(c["column_name"]) for c in columns]
+        text_cols = [c for c in columns if str(c["data_type"]).lower() in TEXT_DATA_TYPES]
+        if not text_cols:
+            continue
+
+        # Só interessam linhas com algum byte não-ASCII: em colunas latin1 a
+        # conversão para utf8mb4 muda o tamanho; em colunas UTF-8 o número de
+        # caracteres difere do número de bytes.
+        casts = ",".join(f"CAST(`{c['column_name']}` AS BINARY) AS `{c['column_name']}`" for c in text_cols)
+        predicate = " OR ".join(
+            f"(CHAR_LENGTH(`{c['column_name']}`) <> LENGTH(`{c['column_name']}`)"
+            f" OR LENGTH(CONVERT(`{c['column_name']}` USING utf8mb4)) <> LENGTH(`{c['column_name']}`))"
+            for c in text_cols
+        )
+        try:
+            cursor.execute(
+                f"SELECT {casts} FROM `{mysql_table}` WHERE {predicate} LIMIT {int(CHARSET_SAMPLE_ROWS)}"
+            )
+            samples = cursor.fetchall()
+        except Exception as exc:
+            log(f"[CHARSET] {mysql_table}: amostragem falhou ({exc}) — leitura legada", "WARN")
+            SOURCE_COLUMNS_ORDERED.pop(mysql_table, None)
+            continue
+
+        # Amostra menor que o LIMIT varreu a tabela inteira: ausência de não-ASCII é real.
+        exhaustive = len(samples) < CHARSET_SAMPLE_ROWS
+        plan: Dict[str, str] = {}
+        table_report: Dict[str, Any] = {}
+        for col in text_cols:
+            name = str(col["column_name"])
+            counts: Dict[str, int] = {}
+            for sample in samples:
+                raw = sample.get(name)
+                if raw is None:
+                    continue
+                kind = classify_raw_text(bytes(raw) if isinstance(raw, (bytes, bytearray)) else str(raw).encode("utf-8"))
+                counts[kind] = counts.get(kind, 0) + 1
+            strategy = choose_charset_strategy(col.get("charset"), counts, exhaustive)
+            if strategy != "session":
+                plan[name] = strategy
+            if strategy == "mixed":
+                mixed_columns.append(f"{mysql_table}.{name}")
+            if counts.keys() - {"ascii"} or strategy != "session":
+                table_report[name] = {
+                    "declared_charset": col.get("charset"),
+                    "strategy": strategy,
+                    "samples": counts,
+                }
+        if plan:
+            CHARSET_PLAN[mysql_table] = plan
+        if table_report:
+            report_tables[mysql_table] = table_report
+
+    payload = {
+        "run_id": RUN_ID,
+        "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "sample_rows": CHARSET_SAMPLE_ROWS,
+        "tables": report_tables,
+        "mixed_columns": mixed_columns,
+    }
+    try:
+        CHARSET_REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        CHARSET_REPORT_PATH.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    except OSError as exc:
+        log(f"[CHARSET] relatório não gravado: {exc}", "WARN")
+
+    binary_cols = sum(1 for plan in CHARSET_PLAN.values() for s in plan.values() if s == "utf8")
+    log(
+        f"[CHARSET] {len(SOURCE_COLUMNS_ORDERED)} tabelas amostradas │ "
+        f"utf8-binário={binary_cols} │ mixed={len(mixed_columns)}"
+    )
+    for item in mixed_columns[:20]:
+        log(f"[CHARSET] coluna mista (reparo por valor mantido): {item}", "WARN")
+    return CHARSET_PLAN
+
+
+def prepare_charset_plan(cursor) -> None:
+    if not CHARSET_DETECT:
+        log("[CHARSET] ETL_CHARSET_DETECT=0 — leitura legada com reparo de mojibake por valor")
+        return
+    try:
+        build_charset_plan(cursor)
+    except Exception as exc:
+        reset_charset_plan()
+        log(f"[CHARSET] detecção falhou ({exc}) — leitura legada", "WARN")
+
+
+def fetch_source_batch(cursor, mysql_table: str, table: Optional[str] = None) -> List[dict]:
+    started = time.monotonic()
+    rows = decode_source_rows(mysql_table, cursor.fetchmany(batch_size_for(table or mysql_table)))
+    METRICS.add_extract(time.monotonic() - started, len(rows))
+    check_memory_budget(f"fetch {mysql_table}")
+    return rows
+
+
+def iter_source_rows(cursor, mysql_table: Optional[str] = None) -> Iterator[dict]:
+    """Percorre o resultado com fetchmany(BATCH_SIZE) em vez de fetchall (precheck, listas auxiliares).
+
+    Com mysql_table, as colunas planejadas em CHARSET_PLAN são decodificadas.
+    """
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return
+        if mysql_table:
+            decode_source_rows(mysql_table, rows)
+        yield from rows
+        check_memory_budget(f"iter {mysql_table or 'query'}")
+
+
 # ============================================================================
 # FK MAP: pg_col → tabela referenciada para gerar UUID5
 # ============================================================================
@@ -1070,8 +1660,15 @@ def build_valid_fk_ids(cursor) -> Dict[str, Set[str]]:
 def transform_column(
     pg_col: str, mysql_col: str, val: Any, table: str,
     overrides: Dict[str, str],
+    repair: Optional[bool] = None,
 ) -> Any:
-    """Transforma um valor de coluna MySQL para o formato Supabase."""
+    """Transforma um valor de coluna MySQL para o formato Supabase.
+
+    ``repair`` vem de mojibake_repair_columns(); sem ele a estratégia é
+    resolvida aqui, e só quando o valor é texto humano.
+    """
+    if repair is None and pg_col in HUMAN_TEXT_COLUMNS and pg_col not in TECHNICAL_TEXT_COLUMNS:
+        repair = needs_mojibake_repair(resolve_source_table(table), mysql_col)
 
     # --- Override por tabela ---
     ov = overrides.get(pg_col)
@@ -1082,7 +1679,7 @@ def transform_column(
             return to_bool(val)
         if ov == "str":
             if pg_col in HUMAN_TEXT_COLUMNS and pg_col not in TECHNICAL_TEXT_COLUMNS:
-                return clean_human_text(val, field_name=pg_col)
+                return clean_human_text(val, field_name=pg_col, repair_mojibake=repair)
             return to_str(val)
         if ov == "money":
             return to_money(val)
@@ -1110,7 +1707,7 @@ def transform_column(
                 return s.lower()
             return "amount"  # default
         if pg_col in HUMAN_TEXT_COLUMNS and pg_col not in TECHNICAL_TEXT_COLUMNS:
-            return clean_human_text(val, field_name=pg_col)
+            return clean_human_text(val, field_name=pg_col, repair_mojibake=repair)
         return to_str(val)
 
     # --- FK columns → UUID5 ---
@@ -1151,12 +1748,12 @@ def transform_column(
 
     # --- JSONB columns ---
     if pg_col.endswith("_json"):
-        return to_str(val)  # Will be handled as Json in upsert
+        return validate_json_text(val, table, pg_col)
 
     # --- Default: string ---
     if isinstance(val, str):
         if pg_col in HUMAN_TEXT_COLUMNS and pg_col not in TECHNICAL_TEXT_COLUMNS:
-            return clean_human_text(val, field_name=pg_col)
+            return clean_human_text(val, field_name=pg_col, repair_mojibake=repair)
         return to_str(val)
     return val
 
@@ -1182,11 +1779,12 @@ def transform_row(
     else:
         return None
 
+    repair_cols = mojibake_repair_columns(table, mapping)
     for pg_col, mysql_col in mapping.items():
         if pg_col == "id":
             continue
         val = row.get(mysql_col)
-        new_row[pg_col] = transform_column(pg_col, mysql_col, val, table, overrides)
+        new_row[pg_col] = transform_column(pg_col, mysql_col, val, table, overrides, repair_cols.get(mysql_col))
 
     return new_row
 
@@ -1223,13 +1821,13 @@ def transform_cliente_pf(row: dict) -> Optional[dict]:
     cid = uuid5_for("is_clientes", row.get("id"))
     if not cid:
         return None
-    nome = safe_str(row.get("nome"), "nome")
+    nome = safe_str(row.get("nome"), "nome", "is_clientes")
     if not nome:
         return None  # CHECK constraint: nome IS NOT NULL
     return {
         "cliente_id": cid,
         "nome": nome,
-        "sobrenome": safe_str(row.get("sobrenome"), "sobrenome"),
+        "sobrenome": safe_str(row.get("sobrenome"), "sobrenome", "is_clientes"),
         "nascimento": to_ts(row.get("nascimento")),
         "cpf": to_str(row.get("cpf")),
         "sexo": to_str(row.get("sexo")),
@@ -1244,12 +1842,12 @@ def transform_cliente_pj(row: dict) -> Optional[dict]:
     cid = uuid5_for("is_clientes", row.get("id"))
     if not cid:
         return None
-    razao = safe_str(row.get("razao_social"), "razao_social")
+    razao = safe_str(row.get("razao_social"), "razao_social", "is_clientes")
     if not razao:
         # Fallback para não perder PJ legada com razão social vazia.
         razao = (
-            safe_str(row.get("nome"), "nome")
-            or safe_str(row.get("fantasia"), "fantasia")
+            safe_str(row.get("nome"), "nome", "is_clientes")
+            or safe_str(row.get("fantasia"), "fantasia", "is_clientes")
             or safe_str(row.get("cnpj"))
         )
     if not razao:
@@ -1257,7 +1855,7 @@ def transform_cliente_pj(row: dict) -> Optional[dict]:
     return {
         "cliente_id": cid,
         "razao_social": razao,
-        "fantasia": safe_str(row.get("fantasia"), "fantasia"),
+        "fantasia": safe_str(row.get("fantasia"), "fantasia", "is_clientes"),
         "ie": to_str(row.get("ie")),
         "cnpj": to_str(row.get("cnpj")),
     }
@@ -1340,18 +1938,15 @@ def transform_pedidos_fretes_entregas(row: dict) -> Optional[dict]:
 
     # Tentar parsear JSON detalhes
     if detalhes_raw:
-        try:
-            d = json.loads(detalhes_raw)
-            if isinstance(d, dict):
-                result["metodo_titulo"] = safe_str(d.get("titulo") or tipo, "titulo")
-                result["modulo"] = safe_str(d.get("modulo"))
-                result["prazo_dias"] = to_int(d.get("prazo")) or to_int(d.get("prazo_dias"))
-                result["valor"] = to_decimal(d.get("custo")) or to_decimal(d.get("valor"))
-                result["sucesso"] = to_bool(d.get("sucesso") if "sucesso" in d else d.get("status"))
-                result["hash"] = safe_str(d.get("hash"))
-                result["created_at"] = to_ts(d.get("data") or d.get("created_at"))
-        except (json.JSONDecodeError, TypeError):
-            pass
+        valid, d = decode_json_payload(detalhes_raw, "is_pedidos_fretes_entregas", "detalhes")
+        if valid and isinstance(d, dict):
+            result["metodo_titulo"] = safe_str(d.get("titulo") or tipo, "titulo")
+            result["modulo"] = safe_str(d.get("modulo"))
+            result["prazo_dias"] = to_int(d.get("prazo")) or to_int(d.get("prazo_dias"))
+            result["valor"] = to_decimal(d.get("custo")) or to_decimal(d.get("valor"))
+            result["sucesso"] = to_bool(d.get("sucesso") if "sucesso" in d else d.get("status"))
+            result["hash"] = safe_str(d.get("hash"))
+            result["created_at"] = to_ts(d.get("data") or d.get("created_at"))
 
     if result["prazo_dias"] is not None and result["prazo_dias"] < 0:
         result["prazo_dias"] = None
@@ -1386,6 +1981,7 @@ def transform_pagamento(row: dict) -> Optional[dict]:
     """
     mapping = COLUMN_MAPPING["is_pedidos_pagamentos"]
     overrides = TABLE_TYPE_OVERRIDES.get("is_pedidos_pagamentos", {})
+    repair_cols = mojibake_repair_columns("is_pedidos_pagamentos", mapping)
 
     new_row: dict = {}
     legacy_id = row.get("id")
@@ -1418,7 +2014,9 @@ def transform_pagamento(row: dict) -> Optional[dict]:
             new_row["status"] = to_int(val) or 0
             continue
 
-        new_row[pg_col] = transform_column(pg_col, mysql_col, val, "is_pedidos_pagamentos", overrides)
+        new_row[pg_col] = transform_column(
+            pg_col, mysql_col, val, "is_pedidos_pagamentos", overrides, repair_cols.get(mysql_col)
+        )
 
     return new_row
 
@@ -1435,7 +2033,7 @@ def build_categoria_slug_map(cursor) -> Dict[str, int]:
     """
     cursor.execute("SELECT `id`, `chave` FROM `is_produtos_categorias`")
     slug_map = {}
-    for row in cursor.fetchall():
+    for row in iter_source_rows(cursor, "is_produtos_categorias"):
         chave = row.get("chave") or ""
         if chave:
             slug_map[chave] = row["id"]
@@ -1473,6 +2071,187 @@ def transform_categoria(row: dict, slug_map: Dict[str, int]) -> Optional[dict]:
     return new_row
 
 
+# ============================================================================
+# BATCH ADAPTATIVO POR TABELA
+# ============================================================================
+# Cada tabela tem seu próprio tamanho de batch (fetchmany, páginas de insert e
+# chunks de self-ref). O controlador mede latência e bytes por linha de cada
+# round-trip e converge para ETL_BATCH_TARGET_S por envio: encolhe após
+# rejeição ou lentidão e cresce após sequências limpas. Os tamanhos finais são
+# gravados em ETL_BATCH_STATE_PATH e servem de ponto de partida na noite seguinte.
+BATCH_ADAPTIVE = os.getenv("ETL_BATCH_ADAPTIVE", "1") == "1"
+BATCH_MIN = int(os.getenv("ETL_BATCH_MIN", "200"))
+BATCH_MAX = int(os.getenv("ETL_BATCH_MAX", "20000"))
+BATCH_TARGET_SECONDS = float(os.getenv("ETL_BATCH_TARGET_S", "2.0"))
+BATCH_MAX_BYTES = int(os.getenv("ETL_BATCH_MAX_BYTES", str(16 * 1024 * 1024)))
+BATCH_GROW_STREAK = 3
+BATCH_STATE_PATH = Path(
+    os.getenv(
+        "ETL_BATCH_STATE_PATH",
+        os.path.join(os.getenv("BACKUP_LOCAL_DIR", "./backups"), "etl_batch_sizes.json"),
+    )
+).resolve()
+BATCH_MANIFEST_PATH = Path(os.getenv("BACKUP_LOCAL_DIR", "./backups")).resolve() / "manifest.json"
+
+
+def _clamp_batch(size: float) -> int:
+    return max(BATCH_MIN, min(BATCH_MAX, int(size)))
+
+
+class AdaptiveBatch:
+    """Controlador de tamanho de batch de uma tabela (EMA de s/linha e bytes/linha)."""
+
+    EMA_ALPHA = 0.3
+
+    def __init__(self, table: str, size: int):
+        self.table = table
+        self.size = _clamp_batch(size) if BATCH_ADAPTIVE else int(size)
+        self.sec_per_row: Optional[float] = None
+        self.bytes_per_row: Optional[float] = None
+        self.clean_streak = 0
+        self.rejections = 0
+        self.observations = 0
+
+    def _ema(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return current + self.EMA_ALPHA * (sample - current)
+
+    def _ideal_size(self) -> int:
+        ideal = float(BATCH_MAX)
+        if self.sec_per_row:
+            ideal = BATCH_TARGET_SECONDS / self.sec_per_row
+        if self.bytes_per_row:
+            ideal = min(ideal, BATCH_MAX_BYTES / self.bytes_per_row)
+        return _clamp_batch(ideal)
+
+    def observe(self, rows: int, seconds: float, nbytes: int = 0) -> int:
+        """Registra um round-trip bem-sucedido e devolve o novo tamanho."""
+        if rows <= 0:
+            return self.size
+        self.observations += 1
+        self.sec_per_row = self._ema(self.sec_per_row, max(seconds, 0.0) / rows)
+        if nbytes > 0:
+            self.bytes_per_row = self._ema(self.bytes_per_row, nbytes / rows)
+        if not BATCH_ADAPTIVE:
+            return self.size
+
+        ideal = self._ideal_size()
+        full_batch = rows >= self.size // 2
+        if seconds > BATCH_TARGET_SECONDS * 1.5 or ideal < self.size * 0.75:
+            self.size = _clamp_batch(min(self.size, max(ideal, self.size // 2)))
+            self.clean_streak = 0
+            return self.size
+
+        self.clean_streak += 1
+        if full_batch and self.clean_streak >= BATCH_GROW_STREAK and ideal > self.size:
+            self.size = _clamp_batch(min(ideal, self.size * 1.5))
+            self.clean_streak = 0
+        return self.size
+
+    def reject(self) -> int:
+        """Batch rejeitado: corta pela metade (o split recursivo fica mais barato)."""
+        self.rejections += 1
+        self.clean_streak = 0
+        if BATCH_ADAPTIVE:
+            self.size = _clamp_batch(self.size // 2)
+        return self.size
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "sec_per_row": round(self.sec_per_row, 8) if self.sec_per_row is not None else None,
+            "bytes_per_row": round(self.bytes_per_row, 1) if self.bytes_per_row is not None else None,
+            "rejections": self.rejections,
+            "observations": self.observations,
+        }
+
+
+BATCH_CONTROLLERS: Dict[str, AdaptiveBatch] = {}
+BATCH_SEEDS: Dict[str, int] = {}
+
+
+def batch_controller(table: str) -> AdaptiveBatch:
+    ctrl = BATCH_CONTROLLERS.get(table)
+    if ctrl is None:
+        seed = BATCH_SEEDS.get(table, BATCH_SIZE) if BATCH_ADAPTIVE else BATCH_SIZE
+        ctrl = BATCH_CONTROLLERS[table] = AdaptiveBatch(table, seed)
+    return ctrl
+
+
+def batch_size_for(table: str) -> int:
+    if not BATCH_ADAPTIVE:
+        return BATCH_SIZE
+    return batch_controller(table).size
+
+
+def load_batch_state(path: Optional[Path] = None) -> Dict[str, int]:
+    """Carrega os tamanhos da noite anterior (arquivo de estado ou manifest)."""
+    BATCH_SEEDS.clear()
+    BATCH_CONTROLLERS.clear()
+    if not BATCH_ADAPTIVE:
+        return {}
+    sizes: Dict[str, Any] = {}
+    state_path = path or BATCH_STATE_PATH
+    try:
+        sizes = json.loads(state_path.read_text(encoding="utf-8")).get("sizes") or {}
+    except (OSError, ValueError, AttributeError):
+        try:
+            manifest = json.loads(BATCH_MANIFEST_PATH.read_text(encoding="utf-8"))
+            sizes = (manifest.get("etl") or {}).get("batch_sizes") or {}
+        except (OSError, ValueError, AttributeError):
+            sizes = {}
+    for table, size in sizes.items():
+        parsed = to_int(size)
+        if parsed:
+            BATCH_SEEDS[str(table)] = _clamp_batch(parsed)
+    if BATCH_SEEDS:
+        log(f"[BATCH] {len(BATCH_SEEDS)} tamanhos herdados da execução anterior")
+    return dict(BATCH_SEEDS)
+
+
+def save_batch_state(path: Optional[Path] = None) -> Optional[dict]:
+    if not BATCH_ADAPTIVE or not BATCH_CONTROLLERS:
+        return None
+    state_path = path or BATCH_STATE_PATH
+    payload = {
+        "run_id": RUN_ID,
+        "updated_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "target_seconds": BATCH_TARGET_SECONDS,
+        "sizes": {t: c.size for t, c in sorted(BATCH_CONTROLLERS.items())},
+        "details": {t: c.as_dict() for t, c in sorted(BATCH_CONTROLLERS.items())},
+    }
+    try:
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        state_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    except OSError as exc:
+        log(f"[BATCH] estado não gravado: {exc}", "WARN")
+    return payload
+
+
+def upsert_in_chunks(conn, table: str, rows: Iterable[dict], conflict_col: str = "id") -> Tuple[int, int]:
+    """pg_upsert em páginas que acompanham o tamanho adaptativo da tabela.
+
+    Consome qualquer iterável (lista, SpillList, gerador) sem materializá-lo.
+    """
+    ok, err = 0, 0
+    page: List[dict] = []
+    size = batch_size_for(table)
+    for row in rows:
+        page.append(row)
+        if len(page) >= size:
+            ins, e = pg_upsert(conn, table, page, conflict_col)
+            ok += ins
+            err += e
+            page = []
+            size = batch_size_for(table)
+    if page:
+        ins, e = pg_upsert(conn, table, page, conflict_col)
+        ok += ins
+        err += e
+    return ok, err
+
+
 # ============================================================================
 # UPSERT via psycopg2
 # ============================================================================
@@ -1492,39 +2271,44 @@ def pg_upsert(
     cols_quoted = ", ".join(f'"{c}"' for c in columns)
     conflict_quoted = ", ".join(f'"{c}"' for c in conflict_cols)
 
-    if WRITE_MODE == "upsert" and update_cols:
+    resumed = table in RESUME_UPSERT_TABLES
+    if (WRITE_MODE == "upsert" or resumed) and update_cols:
         update_set = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in update_cols)
         sql = (
             f'INSERT INTO public."{table}" ({cols_quoted}) VALUES %s '
             f'ON CONFLICT ({conflict_quoted}) DO UPDATE SET {update_set}'
         )
+    elif resumed:
+        # Só colunas de conflito (junction): linhas já gravadas antes da queda são ignoradas.
+        sql = f'INSERT INTO public."{table}" ({cols_quoted}) VALUES %s ON CONFLICT ({conflict_quoted}) DO NOTHING'
     else:
         # Modo padrão (insert): usado no nightly após truncate.
         # É significativamente mais rápido que upsert com DO UPDATE.
         sql = f'INSERT INTO public."{table}" ({cols_quoted}) VALUES %s'
 
-    jsonb_cols = {c for c in columns if c.endswith("_json")}
-
     def _row_to_values(row: dict) -> Tuple[Any, ...]:
+        # Texto JSON (colunas *_json) já foi validado no transform e segue como
+        # texto para o jsonb, sem decode/encode aqui.
         row_vals = []
         for c in columns:
             v = row[c]
             if isinstance(v, (dict, list)):
-                row_vals.append(Json(v))
-            elif c in jsonb_cols and isinstance(v, str):
-                try:
-                    row_vals.append(Json(json.loads(v)))
-                except (json.JSONDecodeError, TypeError):
-                    row_vals.append(v)
+                row_vals.append(Json(v, dumps=json_dumps))
             else:
                 row_vals.append(v)
         return tuple(row_vals)
 
     values = [_row_to_values(row) for row in batch]
 
+    sent_bytes = {"last": 0}
+    counters = {"bytes": 0, "batches": 0, "splits": 0}
+
     def _execute_batch(batch_values: List[Tuple[Any, ...]]) -> None:
+        counters["batches"] += 1
         with conn.cursor() as cur:
             execute_values(cur, sql, batch_values, page_size=len(batch_values))
+            sent_bytes["last"] = len(getattr(cur, "query", None) or b"")
+            counters["bytes"] += sent_bytes["last"]
 
     row_error_logs = {"count": 0}
 
@@ -1562,17 +2346,22 @@ def pg_upsert(
                 record_etl_error(table, legacy_id, str(split_err), stage="row_insert")
                 return 0, 1
 
+            counters["splits"] += 1
             mid = len(rows_and_values) // 2
             left_ok, left_err = _retry_with_split(rows_and_values[:mid])
             right_ok, right_err = _retry_with_split(rows_and_values[mid:])
             return left_ok + right_ok, left_err + right_err
 
+    ctrl = batch_controller(table)
+    started = time.monotonic()
     try:
         _execute_batch(values)
         conn.commit()
+        ctrl.observe(len(batch), time.monotonic() - started, sent_bytes["last"])
         return len(batch), 0
     except Exception as batch_err:
         conn.rollback()
+        ctrl.reject()
         # Log do erro do batch
         err_str = str(batch_err)
         if len(err_str) > 300:
@@ -1581,6 +2370,14 @@ def pg_upsert(
         record_etl_error(table, None, str(batch_err), stage="batch_insert")
         # Fallback: split em blocos menores para evitar commit por linha quando há poucos erros.
         return _retry_with_split(list(zip(batch, values)))
+    finally:
+        METRICS.add_load(
+            table,
+            time.monotonic() - started,
+            nbytes=counters["bytes"],
+            batches=counters["batches"],
+            retry_splits=counters["splits"],
+        )
 
 
 def pg_flush(conn, table, batch, conflict_col, ok, err):
@@ -1622,9 +2419,14 @@ def _apply_self_ref_updates(
 
     applied = 0
     items = list(deduped.items())
-
-    for i in range(0, len(items), BATCH_SIZE):
-        chunk = items[i:i + BATCH_SIZE]
+    ctrl = batch_controller(f"{table}.{ref_col}")
+
+    self_ref_started = time.monotonic()
+    self_ref_bytes = 0
+    i = 0
+    while i < len(items):
+        chunk = items[i:i + ctrl.size]
+        started = time.monotonic()
         with conn.cursor() as cur:
             execute_values(
                 cur,
@@ -1634,7 +2436,12 @@ def _apply_self_ref_updates(
                 page_size=len(chunk),
             )
             applied += max(cur.rowcount, 0)
+            sent = len(getattr(cur, "query", None) or b"")
         conn.commit()
+        ctrl.observe(len(chunk), time.monotonic() - started, sent)
+        self_ref_bytes += sent
+        i += len(chunk)
+    METRICS.add_self_ref(table, time.monotonic() - self_ref_started, self_ref_bytes)
 
     skipped = len(items) - applied
     if skipped:
@@ -1664,6 +2471,224 @@ def _set_replication_role(pg, role: str) -> None:
     log(f"  [FK-BYPASS] session_replication_role → '{role}'")
 
 
+# ============================================================================
+# SNAPSHOT + VIEWS MATERIALIZADAS DO DASHBOARD
+# public.etl_snapshots (migration 003) diz ao app qual carga está valendo; as
+# mv_dashboard_* (migration 013) são atualizadas antes de marcar 'success',
+# para o app nunca ver um snapshot novo com as views ainda da carga anterior.
+# ============================================================================
+REFRESH_MATVIEWS = os.getenv("ETL_REFRESH_MATVIEWS", "1") == "1"
+DASHBOARD_MATVIEWS: List[str] = ["mv_dashboard_pedidos", "mv_dashboard_financeiro"]
+# Tabelas lidas pelas vw_dashboard_*: recém-carregadas (TRUNCATE + reload) ainda não
+# têm estatísticas, e o REFRESH planejaria os joins às cegas. O passo 4.5 do
+# daily_job (pg_maintenance) roda depois e não ajuda aqui.
+DASHBOARD_BASE_TABLES: List[str] = [
+    "is_pedidos", "is_pedidos_itens", "is_clientes_pf", "is_clientes_pj", "pedidos_status",
+    "is_financeiro_lancamentos",
+]
+
+
+def snapshot_begin(pg) -> Optional[int]:
+    """Abre a linha 'running' do snapshot; None se etl_snapshots não existe."""
+    try:
+        with pg.cursor() as cur:
+            # Run anterior que morreu sem fechar o snapshot não pode ficar 'running' para sempre.
+            cur.execute(
+                "UPDATE public.etl_snapshots SET status = 'failed', finished_at = now() WHERE status = 'running'"
+            )
+            cur.execute(
+                "INSERT INTO public.etl_snapshots (status, note) VALUES ('running', %s) RETURNING id",
+                (f"run_id={RUN_ID}",),
+            )
+            snapshot_id = cur.fetchone()[0]
+        pg.commit()
+    except Exception as exc:
+        pg.rollback()
+        log(f"etl_snapshots indisponível ({exc}) — snapshot não será registrado", "WARN")
+        return None
+    log(f"Snapshot #{snapshot_id} aberto (running)")
+    return snapshot_id
+
+
+def snapshot_row_counts(stats: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    """Linhas OK por tabela para o snapshot: num --resume, as tabelas concluídas no
+    run retomado que este processo não tocou (ex.: fora de --tables) vêm do checkpoint."""
+    counts: Dict[str, int] = {}
+    if CHECKPOINT is not None and RESUME_RUN_ID:
+        for table in sorted(CHECKPOINT.done_tables()):
+            counts[table] = CHECKPOINT.get(table).rows_ok
+    counts.update((t, s["ok"]) for t, s in stats.items())
+    return counts
+
+
+def snapshot_finish(pg, snapshot_id: Optional[int], status: str, row_counts: Dict[str, int]) -> None:
+    if snapshot_id is None:
+        return
+    try:
+        with pg.cursor() as cur:
+            cur.execute(
+                "UPDATE public.etl_snapshots SET status = %s, finished_at = now(), row_counts = %s::jsonb WHERE id = %s",
+                (status, json_dumps(row_counts), snapshot_id),
+            )
+        pg.commit()
+        log(f"Snapshot #{snapshot_id} → {status}")
+    except Exception as exc:
+        pg.rollback()
+        log(f"Snapshot #{snapshot_id} não atualizado: {exc}", "WARN")
+
+
+def analyze_dashboard_base_tables(pg) -> List[str]:
+    """ANALYZE nas tabelas-base das views do dashboard que existem; devolve as analisadas."""
+    started = time.monotonic()
+    with pg.cursor() as cur:
+        cur.execute(
+            "SELECT t FROM unnest(%s::text[]) AS t WHERE to_regclass('public.' || quote_ident(t)) IS NOT NULL",
+            (DASHBOARD_BASE_TABLES,),
+        )
+        tables = [row[0] for row in cur.fetchall()]
+        for table in tables:
+            cur.execute(f'ANALYZE public."{table}"')
+    pg.commit()
+    log(f"  [MATVIEW] ANALYZE em {len(tables)} tabelas-base em {time.monotonic() - started:.1f}s")
+    return tables
+
+
+def refresh_dashboard_views(pg) -> Dict[str, float]:
+    """REFRESH das mv_dashboard_* (CONCURRENTLY quando já populadas); segundos por view."""
+    with pg.cursor() as cur:
+        cur.execute(
+            "SELECT matviewname, ispopulated FROM pg_matviews WHERE schemaname = 'public' AND matviewname = ANY(%s)",
+            (DASHBOARD_MATVIEWS,),
+        )
+        populated = dict(cur.fetchall())
+    pg.commit()
+    if populated:
+        analyze_dashboard_base_tables(pg)
+
+    timings: Dict[str, float] = {}
+    for name in DASHBOARD_MATVIEWS:
+        if name not in populated:
+            log(f"  [MATVIEW] {name} inexistente (migration 013) — pulando", "WARN")
+            continue
+        # CONCURRENTLY não bloqueia leituras do app, mas exige a view já populada (e índice único).
+        mode = "CONCURRENTLY " if populated[name] else ""
+        started = time.monotonic()
+        with pg.cursor() as cur:
+            cur.execute(f"REFRESH MATERIALIZED VIEW {mode}public.{name}")
+        pg.commit()
+        timings[name] = round(time.monotonic() - started, 3)
+        log(f"  [MATVIEW] {name} atualizada{' (concurrently)' if mode else ''} em {timings[name]:.1f}s")
+    return timings
+
+
+# ============================================================================
+# CLASSIFICAÇÃO DE STATUS DOS PEDIDOS
+# Substitui as cadeias de ILIKE da migration 004: cada status distinto de
+# is_pedidos_itens é classificado uma vez (status_classification) e o status
+# por pedido fica pré-calculado em pedidos_status (migration 014).
+# ============================================================================
+# (classe, padrões) em ordem de prioridade — o pedido fica com a classe de
+# menor prioridade entre os seus itens, como o CASE da 004 sobre o string_agg.
+STATUS_CLASSES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("Finalizado", ("entregue", "retirado", "finalizado", "concluído", "cancelado")),
+    ("Enviado", ("enviado", "logística", "serviço de entrega")),
+    ("Em Produção", ("produção", "impressão", "acabamento", "arquivo aprovado", "cartão em produção", "pró-solução")),
+    ("Problema no Arquivo", ("reenviar", "fora do padrão", "pendencia", "erro")),
+]
+STATUS_DEFAULT_CLASS = "Em Análise"
+# is_atrasado da 004 não inclui 'Concluído'
+STATUS_ENCERRA_ATRASO = ("entregue", "retirado", "finalizado", "cancelado")
+
+
+def classify_status(nome: str) -> Dict[str, Any]:
+    """Classe, prioridade (1..5) e flags de um nome de status (ILIKE '%padrão%' da 004)."""
+    text = (nome or "").lower()
+    classe, prioridade = STATUS_DEFAULT_CLASS, len(STATUS_CLASSES) + 1
+    for index, (name, patterns) in enumerate(STATUS_CLASSES, start=1):
+        if any(p in text for p in patterns):
+            classe, prioridade = name, index
+            break
+    return {
+        "classe": classe,
+        "prioridade": prioridade,
+        "is_finalizado": classe == STATUS_CLASSES[0][0],
+        "encerra_atraso": any(p in text for p in STATUS_ENCERRA_ATRASO),
+    }
+
+
+def build_status_classification(pg) -> Optional[Dict[str, int]]:
+    """
+    Reconstrói status_classification e pedidos_status a partir do que está carregado.
+    None se a migration 014 não foi aplicada.
+    """
+    from psycopg2.extras import execute_values
+
+    with pg.cursor() as cur:
+        cur.execute(
+            "SELECT to_regclass('public.status_classification') IS NOT NULL "
+            "AND to_regclass('public.pedidos_status') IS NOT NULL"
+        )
+        available = cur.fetchone()[0]
+    if not available:
+        pg.commit()
+        log("  [STATUS] status_classification/pedidos_status inexistentes (migration 014) — pulando", "WARN")
+        return None
+
+    started = time.monotonic()
+    with pg.cursor() as cur:
+        cur.execute(
+            "SELECT DISTINCT i.status, COALESCE(st.nome, i.status) "
+            "FROM public.is_pedidos_itens i "
+            "LEFT JOIN public.is_extras_status st ON CAST(st.id AS text) = i.status "
+            "WHERE i.status IS NOT NULL"
+        )
+        rows = []
+        for status_raw, status_nome in cur.fetchall():
+            item = classify_status(status_nome)
+            rows.append((
+                status_raw, status_nome, item["classe"], item["prioridade"],
+                item["is_finalizado"], item["encerra_atraso"],
+            ))
+        if rows:
+            execute_values(
+                cur,
+                "INSERT INTO public.status_classification "
+                "(status_raw, status_nome, classe, prioridade, is_finalizado, encerra_atraso) VALUES %s "
+                "ON CONFLICT (status_raw) DO UPDATE SET status_nome = EXCLUDED.status_nome, "
+                "classe = EXCLUDED.classe, prioridade = EXCLUDED.prioridade, "
+                "is_finalizado = EXCLUDED.is_finalizado, encerra_atraso = EXCLUDED.encerra_atraso, "
+                "updated_at = now()",
+                rows,
+            )
+        # Rebuild inteiro na mesma transação: quem lê a view nunca vê pedidos_status pela metade.
+        cur.execute("TRUNCATE public.pedidos_status")
+        cur.execute(
+            """
+            INSERT INTO public.pedidos_status
+                (pedido_id, status_pedido, status_prioridade, is_finalizado, encerra_atraso,
+                 qtde_itens, data_prazo, data_entrega)
+            SELECT
+                i.pedido_id,
+                (%s::text[])[MIN(sc.prioridade)],
+                MIN(sc.prioridade),
+                COALESCE(bool_or(sc.is_finalizado), FALSE),
+                COALESCE(bool_or(sc.encerra_atraso), FALSE),
+                COUNT(*)::integer,
+                MIN(CASE WHEN i.previsao_producao < '2010-01-01' THEN NULL ELSE i.previsao_producao END),
+                MAX(CASE WHEN i.previsao_entrega < '2010-01-01' THEN NULL ELSE i.previsao_entrega END)
+            FROM public.is_pedidos_itens i
+            LEFT JOIN public.status_classification sc ON sc.status_raw = i.status
+            WHERE i.pedido_id IS NOT NULL
+            GROUP BY i.pedido_id
+            """,
+            ([name for name, _ in STATUS_CLASSES] + [STATUS_DEFAULT_CLASS],),
+        )
+        pedidos = cur.rowcount
+    pg.commit()
+    log(f"  [STATUS] {len(rows)} status classificados, {pedidos:,} pedidos em {time.monotonic() - started:.1f}s")
+    return {"status": len(rows), "pedidos": pedidos}
+
+
 # ============================================================================
 # ETL PRINCIPAL
 # ============================================================================
@@ -1714,11 +2739,11 @@ def run_precheck(mysql_cursor) -> bool:
         if len(mapping_errors) > 30:
             log(f"PRECHECK FAIL [mapping]: ... +{len(mapping_errors) - 30} erros", "ERROR")
 
-    mysql_cursor.execute("SELECT * FROM `is_clientes` ORDER BY `id`")
-    rows = mysql_cursor.fetchall()
+    mysql_cursor.execute(source_select_sql("is_clientes") + " ORDER BY `id`")
     seen_emails: Dict[str, int] = {}
-    kept = pf = pj = dropped_split = 0
-    for row in rows:
+    source = kept = pf = pj = dropped_split = 0
+    for row in iter_source_rows(mysql_cursor, "is_clientes"):
+        source += 1
         try:
             base = transform_cliente(row)
         except Exception:
@@ -1738,7 +2763,7 @@ def run_precheck(mysql_cursor) -> bool:
             dropped_split += 1
     dup_emails = sum(1 for _, n in seen_emails.items() if n > 1)
     log(
-        f"PRECHECK clientes: source={len(rows):,} kept={kept:,} PF={pf:,} "
+        f"PRECHECK clientes: source={source:,} kept={kept:,} PF={pf:,} "
         f"PJ={pj:,} split_drop={dropped_split:,} dup_emails={dup_emails:,}"
     )
     if dropped_split > 0:
@@ -1757,32 +2782,36 @@ def run_precheck(mysql_cursor) -> bool:
     mysql_cursor.execute(
         "SELECT `id`,`tipo`,`valor`,`produtos`,`cliente`,`codigo`,`uso`,`limite`,`inicio`,`fim`,`pedido_min`,`primeira_compra`,`arquivado` FROM `is_mkt_cupons`"
     )
-    cup_rows = mysql_cursor.fetchall()
+    cup_source = 0
     cupom_tipo_invalid = 0
     cupom_links = 0
-    for row in cup_rows:
+    for row in iter_source_rows(mysql_cursor):
+        cup_source += 1
         transformed = transform_row(row, "is_mkt_cupons", COLUMN_MAPPING["is_mkt_cupons"])
         if not transformed or transformed.get("tipo") not in ("amount", "percent"):
             cupom_tipo_invalid += 1
         cupom_links += len(transform_cupom_produtos(row))
     log(
-        f"PRECHECK cupons: source={len(cup_rows):,} tipo_invalid={cupom_tipo_invalid:,} links_produtos={cupom_links:,}"
+        f"PRECHECK cupons: source={cup_source:,} tipo_invalid={cupom_tipo_invalid:,} links_produtos={cupom_links:,}"
     )
     if cupom_tipo_invalid > 0:
         passed = False
         log("PRECHECK FAIL: mapeamento de tipo de cupons inválido", "ERROR")
 
     mysql_cursor.execute("SELECT `id`,`chave`,`pai` FROM `is_produtos_categorias`")
-    cat_rows = mysql_cursor.fetchall()
-    chave_map = {str(r.get("chave")).strip(): r.get("id") for r in cat_rows if r.get("chave")}
-    missing_parent = with_parent = 0
-    for row in cat_rows:
+    chaves: Set[str] = set()
+    pais: List[str] = []
+    cat_source = 0
+    for row in iter_source_rows(mysql_cursor):
+        cat_source += 1
+        if row.get("chave"):
+            chaves.add(str(row.get("chave")).strip())
         pai = str(row.get("pai") or "").strip()
         if pai and pai != "0":
-            with_parent += 1
-            if pai not in chave_map:
-                missing_parent += 1
-    log(f"PRECHECK categorias: source={len(cat_rows):,} com_parent={with_parent:,} parent_missing={missing_parent:,}")
+            pais.append(pai)
+    with_parent = len(pais)
+    missing_parent = sum(1 for pai in pais if pai not in chaves)
+    log(f"PRECHECK categorias: source={cat_source:,} com_parent={with_parent:,} parent_missing={missing_parent:,}")
     if missing_parent > 0:
         passed = False
         log("PRECHECK FAIL: categorias com pai não resolvido por chave", "ERROR")
@@ -1794,11 +2823,12 @@ def run_precheck(mysql_cursor) -> bool:
         FROM `is_financeiro_lancamentos`
         """
     )
-    fin_rows = mysql_cursor.fetchall()
+    fin_source = 0
     fin_tipo_invalid = 0
     fin_without_relations = 0
     fin_with_multiple_relations = 0
-    for row in fin_rows:
+    for row in iter_source_rows(mysql_cursor):
+        fin_source += 1
         try:
             mapped_tipo = transform_column(
                 "tipo",
@@ -1820,7 +2850,7 @@ def run_precheck(mysql_cursor) -> bool:
             fin_tipo_invalid += 1
     log(
         "PRECHECK financeiro: "
-        f"source={len(fin_rows):,} "
+        f"source={fin_source:,} "
         f"tipo_invalid={fin_tipo_invalid:,} "
         f"sem_relacoes={fin_without_relations:,} "
         f"multiplas_relacoes={fin_with_multiple_relations:,}"
@@ -1829,22 +2859,23 @@ def run_precheck(mysql_cursor) -> bool:
         passed = False
         log("PRECHECK FAIL: tipo financeiro inválido após transformação", "ERROR")
     expected_fin_min = int(os.getenv("PRECHECK_MIN_FINANCEIRO_LANCAMENTOS", "97985"))
-    if len(fin_rows) < expected_fin_min:
+    if fin_source < expected_fin_min:
         passed = False
         log(
-            f"PRECHECK FAIL: financeiro_lancamentos abaixo do mínimo esperado ({len(fin_rows)} < {expected_fin_min})",
+            f"PRECHECK FAIL: financeiro_lancamentos abaixo do mínimo esperado ({fin_source} < {expected_fin_min})",
             "ERROR",
         )
 
     mysql_cursor.execute("SELECT `id`,`parcelas` FROM `is_pedidos_pagamentos`")
-    pag_rows = mysql_cursor.fetchall()
+    pag_source = 0
     parcelas_invalid = 0
-    for row in pag_rows:
+    for row in iter_source_rows(mysql_cursor):
+        pag_source += 1
         transformed = transform_pagamento({"id": row.get("id"), "parcelas": row.get("parcelas")})
         qty = transformed.get("parcelas_qtd") if transformed else None
         if qty is not None and qty < 1:
             parcelas_invalid += 1
-    log(f"PRECHECK pagamentos: source={len(pag_rows):,} parcelas_invalid={parcelas_invalid:,}")
+    log(f"PRECHECK pagamentos: source={pag_source:,} parcelas_invalid={parcelas_invalid:,}")
     if parcelas_invalid > 0:
         passed = False
         log("PRECHECK FAIL: parcelas_qtd inválido (<1)", "ERROR")
@@ -1865,24 +2896,41 @@ def run_precheck(mysql_cursor) -> bool:
 def run_etl():
     global VALID_FK_IDS
     ETL_ERRORS.clear()
+    ETL_ERRORS_SPILL.clear()
+    ERROR_GROUPS.clear()
+    MEMORY_HOLDERS.clear()
+    JSON_INVALID_COUNTS.clear()
+    load_batch_state()
     etl_start = time.monotonic()
     mysql = None
     cursor = None
     pg = None
     total_ok = 0
     total_err = 0
-    report_payload = None
 
     log("=" * 70)
     log("ETL v12 — MySQL legado → Supabase │ Blocos Topológicos + FK-Bypass")
     log("=" * 70)
-    log(f"Blocos: {len(EXEC_BLOCKS)} │ Tabelas: {len(EXEC_ORDER)} │ Batch: {BATCH_SIZE} │ WriteMode: {WRITE_MODE}")
+    log(
+        f"Blocos: {len(EXEC_BLOCKS)} │ Tabelas: {len(EXEC_ORDER)} │ Batch: {BATCH_SIZE}"
+        f"{' (adaptativo)' if BATCH_ADAPTIVE else ''} │ WriteMode: {WRITE_MODE}"
+    )
+    if PROFILER.enabled:
+        log(f"Profiler ativo: ETL_PROFILE={PROFILER.mode} │ intervalo={PROFILER.interval_ms:g}ms → {PROFILER.out_dir}")
+    if METRICS.start_tracemalloc():
+        log("tracemalloc ativo (ETL_TRACEMALLOC) — top sites de alocação por tabela no profile")
+    if MAX_RSS_MB > 0:
+        log(
+            f"Orçamento de memória: ETL_MAX_RSS_MB={MAX_RSS_MB:g} │ spill ≥ {MAX_RSS_MB * RSS_SPILL_RATIO:.0f} MiB "
+            f"→ {SPILL_DIR}"
+        )
 
     if VALIDATE_ONLY:
         try:
             mysql = get_mysql()
             cursor = mysql.cursor(dictionary=True)
             VALID_FK_IDS = build_valid_fk_ids(cursor)
+            prepare_charset_plan(cursor)
             log("Modo ETL_VALIDATE_ONLY=1 — executando PRECHECK (dry-run) e encerrando.")
             ok = run_precheck(cursor)
             cursor.close()
@@ -1901,6 +2949,7 @@ def run_etl():
         cursor = mysql.cursor(dictionary=True)
         log("Conexão MySQL OK")
         VALID_FK_IDS = build_valid_fk_ids(cursor)
+        prepare_charset_plan(cursor)
         mapping_errors = validate_mapping_contract(cursor)
         if mapping_errors:
             for item in mapping_errors[:30]:
@@ -1913,6 +2962,7 @@ def run_etl():
     except Exception as e:
         log(f"ERRO de conexão: {e}", "ERROR")
         sys.exit(1)
+    snapshot_id = snapshot_begin(pg)
 
     # ── Tabelas a processar ──────────────────────────────────────────────────
     if ONLY_TABLES:
@@ -1921,29 +2971,50 @@ def run_etl():
     else:
         tables_to_process_set = set(EXEC_ORDER)
 
+    # ── Checkpoint / resume ──────────────────────────────────────────────────
+    skip_tables: Set[str] = set()
+    resume_source = setup_checkpoints()
+    if resume_source:
+        skip_tables, rerun_tables = plan_resume(CHECKPOINT, tables_to_process_set)
+        RESUME_UPSERT_TABLES.update(rerun_tables)
+        log(
+            f"[RESUME] run_id={RESUME_RUN_ID} (checkpoint {resume_source}): "
+            f"{len(skip_tables)} tabela(s) concluída(s) puladas │ upsert em {sorted(rerun_tables) or '-'}"
+        )
+
     # ── Estado compartilhado entre blocos ────────────────────────────────────
     stats: Dict[str, Dict[str, int]] = {}
     seen_emails: Dict[str, int] = {}
-    pf_list: List[dict] = []        # populado em Bloco 0 (is_clientes) → consumido em Bloco 1
-    pj_list: List[dict] = []        # populado em Bloco 0 (is_clientes) → consumido em Bloco 1
-    addr_list: List[dict] = []      # populado em Bloco 0 (is_clientes) → consumido em Bloco 1
-    cupons_produtos_list: List[dict] = []  # populado em Bloco 1 → consumido em Bloco 2
-    cupom_codigos: Set[str] = set()
-    categoria_slug_map: Dict[str, int] = {}
+    # Listas que atravessam blocos: SpillList vai para disco quando o orçamento de RSS aperta.
+    pf_list = register_memory_holder("pf_list", SpillList("pf_list"))      # Bloco 0 (is_clientes) → Bloco 1
+    pj_list = register_memory_holder("pj_list", SpillList("pj_list"))      # Bloco 0 (is_clientes) → Bloco 1
+    addr_list = register_memory_holder("addr_list", SpillList("addr_list"))  # Bloco 0 (is_clientes) → Bloco 1
+    cupons_produtos_list = register_memory_holder(
+        "cupons_produtos_list", SpillList("cupons_produtos_list")
+    )  # Bloco 1 → Bloco 2
+    cupom_codigos: Set[str] = register_memory_holder("cupom_codigos", set())
+    categoria_slug_map: Dict[str, int] = register_memory_holder("categoria_slug_map", {})
 
     try:
-        categoria_slug_map = build_categoria_slug_map(cursor)
+        categoria_slug_map.update(build_categoria_slug_map(cursor))
         log(f"Categorias slug map: {len(categoria_slug_map)} entradas")
+    except MemoryBudgetExceeded as exc:
+        report_memory_budget_failure(exc, stats)
+        raise
     except Exception:
         log("Aviso: não foi possível carregar slug map de categorias", "WARN")
 
     try:
         cursor.execute("SELECT `codigo` FROM `is_mkt_cupons`")
-        for row in cursor.fetchall():
+        for row in iter_source_rows(cursor):
             c = row.get("codigo")
             if c:
                 cupom_codigos.add(str(c).strip())
         log(f"Cupons códigos carregados: {len(cupom_codigos)}")
+    except MemoryBudgetExceeded as exc:
+        # estourar o orçamento aqui não é "tabela sem cupons": aborta como no loop
+        report_memory_budget_failure(exc, stats)
+        raise
     except Exception:
         log("Aviso: não foi possível carregar códigos de cupons", "WARN")
 
@@ -1973,46 +3044,64 @@ def run_etl():
             log(f"TABELA: {table}" + (f" (MySQL: {mysql_table})" if mysql_table != table else ""))
             log(f"{'─'*50}")
 
-            # ── Processadores especializados ──────────────────────────────
-            if table == "is_clientes":
-                ok, err = _process_clientes(cursor, pg, seen_emails, pf_list, pj_list, addr_list)
+            if table in skip_tables:
+                done = CHECKPOINT.get(table)
+                stats[table] = {"ok": done.rows_ok, "err": done.rows_err}
+                METRICS.set_result(table, done.rows_ok, done.rows_err)
+                log(f"  → concluída no run {RESUME_RUN_ID} (OK={done.rows_ok:,} ERR={done.rows_err:,}) — skip")
+                continue
+            if CHECKPOINT is not None:
+                CHECKPOINT.start_table(table, block_num)
 
-            elif table == "is_clientes_pf":
-                ok, err = _process_derived_pf(pg, pf_list)
+            try:
+                with METRICS.track_table(table, block_num), PROFILER.profile_table(table):
+                    # ── Processadores especializados ──────────────────────────────
+                    if table == "is_clientes":
+                        ok, err = _process_clientes(cursor, pg, seen_emails, pf_list, pj_list, addr_list)
 
-            elif table == "is_clientes_pj":
-                ok, err = _process_derived_pj(pg, pj_list)
+                    elif table == "is_clientes_pf":
+                        ok, err = _process_derived_pf(pg, pf_list)
 
-            elif table == "is_clientes_enderecos":
-                ok, err = _process_clientes_enderecos(cursor, pg, addr_list)
+                    elif table == "is_clientes_pj":
+                        ok, err = _process_derived_pj(pg, pj_list)
 
-            elif table == "is_mkt_cupons":
-                ok, err = _process_mkt_cupons(cursor, pg, cupons_produtos_list)
+                    elif table == "is_clientes_enderecos":
+                        ok, err = _process_clientes_enderecos(cursor, pg, addr_list)
 
-            elif table == "is_mkt_cupons_produtos":
-                ok, err = _process_mkt_cupons_produtos(pg, cupons_produtos_list)
+                    elif table == "is_mkt_cupons":
+                        ok, err = _process_mkt_cupons(cursor, pg, cupons_produtos_list)
 
-            elif table == "is_produtos_categorias":
-                # self-ref parent_id → usa session_replication_role
-                ok, err = _process_categorias(cursor, pg, categoria_slug_map)
+                    elif table == "is_mkt_cupons_produtos":
+                        ok, err = _process_mkt_cupons_produtos(pg, cupons_produtos_list)
 
-            elif table == "is_pedidos_fretes_entregas":
-                ok, err = _process_fretes_entregas(cursor, pg)
+                    elif table == "is_produtos_categorias":
+                        # self-ref parent_id → usa session_replication_role
+                        ok, err = _process_categorias(cursor, pg, categoria_slug_map)
 
-            elif table == "is_pedidos":
-                ok, err = _process_pedidos(cursor, pg, cupom_codigos)
+                    elif table == "is_pedidos_fretes_entregas":
+                        ok, err = _process_fretes_entregas(cursor, pg)
 
-            elif table == "is_pedidos_pagamentos":
-                # self-ref original_id → usa session_replication_role
-                ok, err = _process_pagamentos(cursor, pg)
+                    elif table == "is_pedidos":
+                        ok, err = _process_pedidos(cursor, pg, cupom_codigos)
 
-            else:
-                # Processador genérico (sem self-ref)
-                ok, err = _process_generic(
-                    cursor, pg, table, mysql_table, mapping, conflict_col, None, {}
-                )
+                    elif table == "is_pedidos_pagamentos":
+                        # self-ref original_id → usa session_replication_role
+                        ok, err = _process_pagamentos(cursor, pg)
+
+                    else:
+                        # Processador genérico (sem self-ref)
+                        ok, err = _process_generic(
+                            cursor, pg, table, mysql_table, mapping, conflict_col, None, {}
+                        )
+                check_memory_budget(f"fim de {table}")
+            except MemoryBudgetExceeded as exc:
+                report_memory_budget_failure(exc, stats)
+                raise
 
             stats[table] = {"ok": ok, "err": err}
+            METRICS.set_result(table, ok, err)
+            if CHECKPOINT is not None:
+                CHECKPOINT.finish_table(table, ok, err)
 
         # ── Resumo do bloco ───────────────────────────────────────────────
         block_elapsed = time.monotonic() - block_start
@@ -2020,12 +3109,14 @@ def run_etl():
         block_err = sum(stats.get(t, {}).get("err", 0) for t in tables_in_block)
         block_inserted  = block_ok
         block_rejected  = block_err
+        block_mem = METRICS.block_summary().get(str(block_num), {})
         log("")
         log(
             f"BLOCO {block_num} CONCLUÍDO │ "
             f"inseridas={block_inserted:,} │ "
             f"rejeitadas={block_rejected:,} │ "
-            f"{block_elapsed:.1f}s"
+            f"{block_elapsed:.1f}s │ "
+            f"RSS={block_mem.get('rss_end_mb')} MiB (pico {block_mem.get('peak_rss_mb')} MiB)"
         )
 
     # ── RESUMO FINAL ──────────────────────────────────────────────────────────
@@ -2048,15 +3139,56 @@ def run_etl():
             icon = "✓" if s["err"] == 0 else "✗"
             log(f"    {icon} {t:<42s}  inseridas={s['ok']:>7,}  rejeitadas={s['err']:>5,}")
 
+    if JSON_INVALID_COUNTS:
+        log("")
+        log(f"  JSON inválido: {json_invalid_total():,} payload(s)", "WARN")
+        for t, cols in sorted(JSON_INVALID_COUNTS.items()):
+            for c, n in sorted(cols.items()):
+                log(f"    {t}.{c}: {n:,}", "WARN")
+
     log("")
     log(f"  TOTAL: {total_ok:,} inseridas │ {total_err:,} rejeitadas │ {total_elapsed:.1f}s")
 
+    try:
+        METRICS.write(total_seconds=total_elapsed, status="failed" if total_err > 0 else "success")
+        log(f"  Profile: {PROFILE_JSON_PATH}")
+    except OSError as exc:
+        log(f"  Profile não gravado: {exc}", "WARN")
+
+    try:
+        summary_path = PROFILER.write_summary()
+        if summary_path:
+            log(f"  Profiler ({PROFILER.mode}): {summary_path.parent}")
+    except OSError as exc:
+        log(f"  Profiler não gravado: {exc}", "WARN")
+
+    batch_state = save_batch_state()
+    if batch_state:
+        sizes = ", ".join(f"{t}={n:,}" for t, n in batch_state["sizes"].items())
+        log(f"  Batch sizes (próxima execução): {sizes}")
+
+    # ── Views materializadas + snapshot ─────────────────────────────────────
+    snapshot_status = "failed" if total_err > 0 else "success"
+    if total_err == 0:
+        log("")
+        try:
+            build_status_classification(pg)
+            if REFRESH_MATVIEWS:
+                refresh_dashboard_views(pg)
+        except Exception as exc:
+            pg.rollback()
+            snapshot_finish(pg, snapshot_id, "failed", snapshot_row_counts(stats))
+            log(f"Pós-carga do dashboard (status/views materializadas) falhou: {exc}", "ERROR")
+            raise
+    snapshot_finish(pg, snapshot_id, snapshot_status, snapshot_row_counts(stats))
+
     cursor.close()
     mysql.close()
     pg.close()
+    close_checkpoints()
 
-    if total_err > 0 or ETL_ERRORS:
-        report_payload = persist_etl_error_report(total_err, stats)
+    if total_err > 0 or ERROR_GROUPS.total:
+        persist_etl_error_report(total_err, stats)
         if total_err > 0:
             persist_error_event(
                 run_id=RUN_ID,
@@ -2070,11 +3202,17 @@ def run_etl():
                     "stats": stats,
                     "total_ok": total_ok,
                     "total_err": total_err,
+                    "json_invalid": JSON_INVALID_COUNTS,
                     "error_report_path": str(ERROR_REPORT_PATH),
-                    "error_report": report_payload,
+                    "errors_path": str(ERROR_ROWS_PATH),
+                    "top_groups": ERROR_GROUPS.summary(),
                 },
             )
 
+    for holder in (*MEMORY_HOLDERS.values(), ETL_ERRORS_SPILL):
+        if isinstance(holder, SpillList):
+            holder.clear()  # remove os arquivos de spill
+
     if total_err > 0:
         log(f"  FAIL-FAST: {total_err} erros encontrados", "ERROR")
         raise RuntimeError(f"ETL failed with {total_err} row-level errors")
@@ -2101,13 +3239,13 @@ def _process_clientes(cursor, pg, seen_emails, pf_list, pj_list, addr_list):
         # Campos endereço
         "cep", "logradouro", "numero", "bairro", "complemento", "cidade", "estado",
     ]
-    cursor.execute(f"SELECT {','.join(f'`{c}`' for c in cols)} FROM `is_clientes`")
+    cursor.execute(source_select_sql("is_clientes", cols))
 
     ok, err = 0, 0
     batch: List[dict] = []
 
     while True:
-        rows = cursor.fetchmany(BATCH_SIZE)
+        rows = fetch_source_batch(cursor, "is_clientes")
         if not rows:
             break
         for row in rows:
@@ -2147,7 +3285,7 @@ def _process_clientes(cursor, pg, seen_emails, pf_list, pj_list, addr_list):
                 record_etl_error("is_clientes", row.get("id"), str(e), stage="transform")
                 err += 1
 
-        if len(batch) >= BATCH_SIZE:
+        if len(batch) >= batch_size_for("is_clientes"):
             batch, ok, err = pg_flush(pg, "is_clientes", batch, "id", ok, err)
 
     batch, ok, err = pg_flush(pg, "is_clientes", batch, "id", ok, err)
@@ -2163,16 +3301,11 @@ def _process_clientes_enderecos(cursor, pg, addr_from_clientes):
         cols.append("id")
 
     try:
-        cursor.execute(f"SELECT {','.join(f'`{c}`' for c in cols)} FROM `is_clientes_enderecos`")
+        cursor.execute(source_select_sql("is_clientes_enderecos", cols))
     except Exception as e:
         log(f"    Skip (MySQL table missing): {e}", "WARN")
         # Apenas inserir os endereços derivados
-        ok, err = 0, 0
-        for i in range(0, len(addr_from_clientes), BATCH_SIZE):
-            chunk = addr_from_clientes[i:i + BATCH_SIZE]
-            ins, e = pg_upsert(pg, "is_clientes_enderecos", chunk, "id")
-            ok += ins
-            err += e
+        ok, err = upsert_in_chunks(pg, "is_clientes_enderecos", addr_from_clientes, "id")
         log(f"  → OK={ok:,} (derivados)  ERR={err:,}")
         return ok, err
 
@@ -2180,7 +3313,7 @@ def _process_clientes_enderecos(cursor, pg, addr_from_clientes):
     batch: List[dict] = []
 
     while True:
-        rows = cursor.fetchmany(BATCH_SIZE)
+        rows = fetch_source_batch(cursor, "is_clientes_enderecos")
         if not rows:
             break
         for row in rows:
@@ -2192,26 +3325,24 @@ def _process_clientes_enderecos(cursor, pg, addr_from_clientes):
                 record_etl_error("is_clientes_enderecos", row.get("id"), str(e), stage="transform")
                 err += 1
 
-        if len(batch) >= BATCH_SIZE:
+        if len(batch) >= batch_size_for("is_clientes_enderecos"):
             batch, ok, err = pg_flush(pg, "is_clientes_enderecos", batch, "id", ok, err)
 
     batch, ok, err = pg_flush(pg, "is_clientes_enderecos", batch, "id", ok, err)
 
     # Adicionar endereços derivados de is_clientes (deduplicados por id)
-    dedup_addr = []
     seen_addr_ids: Set[str] = set()
-    for addr in addr_from_clientes:
-        addr_id = addr.get("id")
-        if not addr_id or addr_id in seen_addr_ids:
-            continue
-        seen_addr_ids.add(addr_id)
-        dedup_addr.append(addr)
-    addr_ok = 0
-    for i in range(0, len(dedup_addr), BATCH_SIZE):
-        chunk = dedup_addr[i:i + BATCH_SIZE]
-        ins, e = pg_upsert(pg, "is_clientes_enderecos", chunk, "id")
-        addr_ok += ins
-        err += e
+
+    def dedup_addr():
+        for addr in addr_from_clientes:
+            addr_id = addr.get("id")
+            if not addr_id or addr_id in seen_addr_ids:
+                continue
+            seen_addr_ids.add(addr_id)
+            yield addr
+
+    addr_ok, addr_err = upsert_in_chunks(pg, "is_clientes_enderecos", dedup_addr(), "id")
+    err += addr_err
 
     log(f"  → OK={ok:,} (tabela) + {addr_ok:,} (derivados)  ERR={err:,}")
     return ok + addr_ok, err
@@ -2227,24 +3358,30 @@ def _process_mkt_cupons(cursor, pg, cupons_produtos_list):
     if "produtos" not in cols:
         cols.append("produtos")
 
-    cursor.execute(f"SELECT {','.join(f'`{c}`' for c in cols)} FROM `is_mkt_cupons`")
+    cursor.execute(source_select_sql("is_mkt_cupons", cols))
 
     ok, err = 0, 0
     batch: List[dict] = []
 
-    for row in cursor.fetchall():
-        try:
-            t_row = transform_row(row, "is_mkt_cupons", mapping)
-            if t_row and t_row.get("id"):
-                batch.append(t_row)
-                # Extrair produtos
-                prods = transform_cupom_produtos(row)
-                cupons_produtos_list.extend(prods)
-        except Exception as e:
-            if err < 5:
-                log(f"    Err cupom {row.get('id')}: {e}", "WARN")
-            record_etl_error("is_mkt_cupons", row.get("id"), str(e), stage="transform")
-            err += 1
+    while True:
+        rows = fetch_source_batch(cursor, "is_mkt_cupons")
+        if not rows:
+            break
+        for row in rows:
+            try:
+                t_row = transform_row(row, "is_mkt_cupons", mapping)
+                if t_row and t_row.get("id"):
+                    batch.append(t_row)
+                    # Extrair produtos
+                    prods = transform_cupom_produtos(row)
+                    cupons_produtos_list.extend(prods)
+            except Exception as e:
+                if err < 5:
+                    log(f"    Err cupom {row.get('id')}: {e}", "WARN")
+                record_etl_error("is_mkt_cupons", row.get("id"), str(e), stage="transform")
+                err += 1
+        if len(batch) >= batch_size_for("is_mkt_cupons"):
+            batch, ok, err = pg_flush(pg, "is_mkt_cupons", batch, "id", ok, err)
 
     batch, ok, err = pg_flush(pg, "is_mkt_cupons", batch, "id", ok, err)
     log(f"  → OK={ok:,}  ERR={err:,}  (produtos_links={len(cupons_produtos_list)})")
@@ -2257,21 +3394,17 @@ def _process_mkt_cupons_produtos(pg, cupons_produtos_list):
         log("  → Nenhum registro")
         return 0, 0
 
-    # Deduplicar
+    # Deduplicar (gerador: a lista pode estar despejada em disco)
     seen = set()
-    unique = []
-    for row in cupons_produtos_list:
-        key = (row["cupom_id"], row["produto_id"])
-        if key not in seen:
-            seen.add(key)
-            unique.append(row)
 
-    ok, err = 0, 0
-    for i in range(0, len(unique), BATCH_SIZE):
-        chunk = unique[i:i + BATCH_SIZE]
-        ins, e = pg_upsert(pg, "is_mkt_cupons_produtos", chunk, "cupom_id,produto_id")
-        ok += ins
-        err += e
+    def unique():
+        for row in cupons_produtos_list:
+            key = (row["cupom_id"], row["produto_id"])
+            if key not in seen:
+                seen.add(key)
+                yield row
+
+    ok, err = upsert_in_chunks(pg, "is_mkt_cupons_produtos", unique(), "cupom_id,produto_id")
 
     log(f"  → OK={ok:,}  ERR={err:,}")
     return ok, err
@@ -2289,39 +3422,47 @@ def _process_categorias(cursor, pg, slug_map):
     ter slugs duplicados. O segundo registro com slug igual tem o slug zerado (NULL)
     para evitar violação da constraint e o consequente batch retry cascade.
     """
-    cursor.execute("SELECT * FROM `is_produtos_categorias`")
+    cursor.execute(source_select_sql("is_produtos_categorias"))
 
     ok, err = 0, 0
     batch: List[dict] = []
     self_ref_updates: List[Tuple[str, str]] = [] # noqa: F841
     seen_slugs: Set[str] = set()
+    kept = 0
 
-    for row in cursor.fetchall():
-        try:
-            t_row = transform_categoria(row, slug_map)
-            if t_row and t_row.get("id"):
-                # Deduplicar slug — UNIQUE constraint
-                slug = t_row.get("slug")
-                if slug:
-                    if slug in seen_slugs:
-                        t_row["slug"] = None  # null out duplicate slug
-                    else:
-                        seen_slugs.add(slug)
-                # status NOT NULL DEFAULT 1
-                if t_row.get("status") is None:
-                    t_row["status"] = 1
-                parent_id = t_row.get("parent_id")
-                if parent_id:
-                    self_ref_updates.append((t_row["id"], parent_id))
-                    t_row["parent_id"] = None
-                batch.append(t_row)  # parent_id já resolvido por transform_categoria
-        except Exception as e:
-            if err < 3:
-                log(f"    Err cat {row.get('id')}: {e}", "WARN")
-            record_etl_error("is_produtos_categorias", row.get("id"), str(e), stage="transform")
-            err += 1
+    while True:
+        rows = fetch_source_batch(cursor, "is_produtos_categorias")
+        if not rows:
+            break
+        for row in rows:
+            try:
+                t_row = transform_categoria(row, slug_map)
+                if t_row and t_row.get("id"):
+                    # Deduplicar slug — UNIQUE constraint
+                    slug = t_row.get("slug")
+                    if slug:
+                        if slug in seen_slugs:
+                            t_row["slug"] = None  # null out duplicate slug
+                        else:
+                            seen_slugs.add(slug)
+                    # status NOT NULL DEFAULT 1
+                    if t_row.get("status") is None:
+                        t_row["status"] = 1
+                    parent_id = t_row.get("parent_id")
+                    if parent_id:
+                        self_ref_updates.append((t_row["id"], parent_id))
+                        t_row["parent_id"] = None
+                    batch.append(t_row)  # parent_id já resolvido por transform_categoria
+                    kept += 1
+            except Exception as e:
+                if err < 3:
+                    log(f"    Err cat {row.get('id')}: {e}", "WARN")
+                record_etl_error("is_produtos_categorias", row.get("id"), str(e), stage="transform")
+                err += 1
+        if len(batch) >= batch_size_for("is_produtos_categorias"):
+            batch, ok, err = pg_flush(pg, "is_produtos_categorias", batch, "id", ok, err)
 
-    if not batch:
+    if not kept:
         log(f"  → OK=0  ERR={err:,}  (batch vazio)")
         return 0, err
 
@@ -2343,7 +3484,7 @@ def _process_categorias(cursor, pg, slug_map):
 def _process_fretes_entregas(cursor, pg):
     """Processa is_pedidos_fretes_envios (MySQL) → is_pedidos_fretes_entregas (Supabase)."""
     try:
-        cursor.execute("SELECT * FROM `is_pedidos_fretes_envios`")
+        cursor.execute(source_select_sql("is_pedidos_fretes_envios"))
     except Exception as e:
         log(f"    Skip: {e}", "WARN")
         return 0, 0
@@ -2352,7 +3493,7 @@ def _process_fretes_entregas(cursor, pg):
     batch: List[dict] = []
 
     while True:
-        rows = cursor.fetchmany(BATCH_SIZE)
+        rows = fetch_source_batch(cursor, "is_pedidos_fretes_envios", "is_pedidos_fretes_entregas")
         if not rows:
             break
         for row in rows:
@@ -2363,7 +3504,7 @@ def _process_fretes_entregas(cursor, pg):
             except Exception as e:
                 record_etl_error("is_pedidos_fretes_entregas", row.get("id"), str(e), stage="transform")
                 err += 1
-        if len(batch) >= BATCH_SIZE:
+        if len(batch) >= batch_size_for("is_pedidos_fretes_entregas"):
             batch, ok, err = pg_flush(pg, "is_pedidos_fretes_entregas", batch, "id", ok, err)
 
     batch, ok, err = pg_flush(pg, "is_pedidos_fretes_entregas", batch, "id", ok, err)
@@ -2378,16 +3519,18 @@ def _process_pedidos(cursor, pg, cupom_codigos):
     if "id" not in cols:
         cols.append("id")
 
-    cursor.execute(f"SELECT {','.join(f'`{c}`' for c in cols)} FROM `is_pedidos`")
+    after_id, ok, err = resume_position("is_pedidos")
+    cursor.execute(ordered_source_sql(source_select_sql("is_pedidos", cols), after_id))
+    if after_id is not None:
+        log(f"  [RESUME] continuando de id > {after_id:,} (OK={ok:,} ERR={err:,} já gravados)")
 
-    ok, err = 0, 0
     batch: List[dict] = []
     self_ref_updates: List[Tuple[str, str]] = [] # noqa: F841
     processed = 0
     next_progress = 20_000
 
     while True:
-        rows = cursor.fetchmany(BATCH_SIZE)
+        rows = fetch_source_batch(cursor, "is_pedidos")
         if not rows:
             break
         processed += len(rows)
@@ -2408,8 +3551,9 @@ def _process_pedidos(cursor, pg, cupom_codigos):
                     log(f"    Err pedido {row.get('id')}: {e}", "WARN")
                 record_etl_error("is_pedidos", row.get("id"), str(e), stage="transform")
                 err += 1
-        if len(batch) >= BATCH_SIZE:
+        if len(batch) >= batch_size_for("is_pedidos"):
             batch, ok, err = pg_flush(pg, "is_pedidos", batch, "id", ok, err)
+            checkpoint_advance("is_pedidos", rows, ok, err)
         if processed >= next_progress:
             log(f"  … progress is_pedidos: lidos={processed:,} OK={ok:,} ERR={err:,}")
             next_progress += 20_000
@@ -2427,13 +3571,8 @@ def _process_derived_pf(pg, pf_list: List[dict]) -> Tuple[int, int]:
     if not pf_list:
         log("  → OK=0  ERR=0  (pf_list vazia)")
         return 0, 0
-    valid = [p for p in pf_list if p.get("cliente_id")]
-    ok, err = 0, 0
-    for i in range(0, len(valid), BATCH_SIZE):
-        chunk = valid[i:i + BATCH_SIZE]
-        ins, e = pg_upsert(pg, "is_clientes_pf", chunk, "cliente_id")
-        ok += ins
-        err += e
+    valid = (p for p in pf_list if p.get("cliente_id"))
+    ok, err = upsert_in_chunks(pg, "is_clientes_pf", valid, "cliente_id")
     log(f"  → OK={ok:,}  ERR={err:,}")
     return ok, err
 
@@ -2446,13 +3585,8 @@ def _process_derived_pj(pg, pj_list: List[dict]) -> Tuple[int, int]:
     if not pj_list:
         log("  → OK=0  ERR=0  (pj_list vazia)")
         return 0, 0
-    valid = [p for p in pj_list if p.get("cliente_id")]
-    ok, err = 0, 0
-    for i in range(0, len(valid), BATCH_SIZE):
-        chunk = valid[i:i + BATCH_SIZE]
-        ins, e = pg_upsert(pg, "is_clientes_pj", chunk, "cliente_id")
-        ok += ins
-        err += e
+    valid = (p for p in pj_list if p.get("cliente_id"))
+    ok, err = upsert_in_chunks(pg, "is_clientes_pj", valid, "cliente_id")
     log(f"  → OK={ok:,}  ERR={err:,}")
     return ok, err
 
@@ -2470,7 +3604,7 @@ def _process_pagamentos(cursor, pg):
     if "id" not in cols:
         cols.append("id")
 
-    cursor.execute(f"SELECT {','.join(f'`{c}`' for c in cols)} FROM `is_pedidos_pagamentos`")
+    cursor.execute(source_select_sql("is_pedidos_pagamentos", cols))
 
     ok, err = 0, 0
     batch: List[dict] = []
@@ -2480,7 +3614,7 @@ def _process_pagamentos(cursor, pg):
 
     # Desativar FK checks para suportar original_id (self-ref) em passagem única
     while True:
-        rows = cursor.fetchmany(BATCH_SIZE)
+        rows = fetch_source_batch(cursor, "is_pedidos_pagamentos")
         if not rows:
             break
         processed += len(rows)
@@ -2511,7 +3645,7 @@ def _process_pagamentos(cursor, pg):
                     log(f"    Err pag {row.get('id')}: {e}", "WARN")
                 record_etl_error("is_pedidos_pagamentos", row.get("id"), str(e), stage="transform")
                 err += 1
-        if len(batch) >= BATCH_SIZE:
+        if len(batch) >= batch_size_for("is_pedidos_pagamentos"):
             batch, ok, err = pg_flush(pg, "is_pedidos_pagamentos", batch, "id", ok, err)
         if processed >= next_progress:
                 log(f"  … progress is_pedidos_pagamentos: lidos={processed:,} OK={ok:,} ERR={err:,}")
@@ -2538,24 +3672,27 @@ def _process_generic(cursor, pg, table, mysql_table, mapping, conflict_col, self
     if "id" not in cols and table not in TABLES_WITHOUT_ID:
         cols.append("id")
 
+    has_id = table not in TABLES_WITHOUT_ID
+    after_id, ok, err = resume_position(table) if has_id else (None, 0, 0)
+    sql = source_select_sql(mysql_table, cols)
     try:
-        cursor.execute(f"SELECT {','.join(f'`{c}`' for c in cols)} FROM `{mysql_table}`")
+        cursor.execute(ordered_source_sql(sql, after_id) if has_id else sql)
     except Exception as e:
         log(f"    Skip (MySQL): {e}", "WARN")
         return 0, 0
+    if after_id is not None:
+        log(f"  [RESUME] continuando de id > {after_id:,} (OK={ok:,} ERR={err:,} já gravados)")
 
     required_nonnull = REQUIRED_NONNULL_COLS.get(table, set())
     fallbacks = NONNULL_FALLBACKS.get(table, {})
 
-    ok, err = 0, 0
     batch: List[dict] = []
-    has_id = table not in TABLES_WITHOUT_ID
     skipped = 0
     processed = 0
     next_progress = 20_000
 
     while True:
-        rows = cursor.fetchmany(BATCH_SIZE)
+        rows = fetch_source_batch(cursor, mysql_table, table)
         if not rows:
             break
         processed += len(rows)
@@ -2596,8 +3733,10 @@ def _process_generic(cursor, pg, table, mysql_table, mapping, conflict_col, self
             except Exception as e:
                 record_etl_error(table, row.get("id"), str(e), stage="transform")
                 err += 1
-        if len(batch) >= BATCH_SIZE:
+        if len(batch) >= batch_size_for(table):
             batch, ok, err = pg_flush(pg, table, batch, conflict_col, ok, err)
+            if has_id:
+                checkpoint_advance(table, rows, ok, err)
         if processed >= next_progress:
             log(f"  … progress {table}: lidos={processed:,} OK={ok:,} ERR={err:,}")
             next_progress += 20_000
@@ -2612,4 +3751,16 @@ def _process_generic(cursor, pg, table, mysql_table, mapping, conflict_col, self
 # ENTRY POINT
 # ============================================================================
 if __name__ == "__main__":
-    run_etl()
+    parser = argparse.ArgumentParser(description="ETL MySQL legado → Supabase")
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Retoma o run indicado: pula tabelas concluídas e continua as parciais (sem truncate)",
+    )
+    args = parser.parse_args()
+    if args.resume:
+        RESUME_RUN_ID = args.resume.strip()
+    try:
+        run_etl()
+    finally:
+        close_checkpoints()
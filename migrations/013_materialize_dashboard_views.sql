@@ -0,0 +1,50 @@
+-- =============================================================================
+-- MIGRATION 013: Views materializadas do dashboard
+--
+-- vw_dashboard_pedidos recalcula o agregado dos itens (string_agg DISTINCT de
+-- status sobre is_pedidos_itens), o nome PF/PJ e as cadeias de ILIKE da
+-- migration 004 a cada consulta do app. As versões materializadas guardam o
+-- resultado do snapshot diário:
+--
+-- - a definição continua nas views vw_* (fonte única); mv_* = SELECT * delas
+-- - o ETL faz REFRESH (CONCURRENTLY quando já populadas) como último passo,
+--   antes de marcar public.etl_snapshots como 'success'
+-- - is_atrasado / dias_em_atraso / status ficam congelados no momento do
+--   refresh, como o resto do snapshot
+--
+-- Se vw_* mudar de colunas, recriar a mv_* correspondente (DROP + esta migration).
+-- =============================================================================
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.mv_dashboard_pedidos AS
+SELECT * FROM public.vw_dashboard_pedidos;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.mv_dashboard_financeiro AS
+SELECT * FROM public.vw_dashboard_financeiro;
+
+-- Índice único: exigido pelo REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_dashboard_pedidos_pedido_id_uidx
+    ON public.mv_dashboard_pedidos (pedido_id);
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_pedidos_data_criacao_idx
+    ON public.mv_dashboard_pedidos (data_criacao);
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_pedidos_status_pedido_idx
+    ON public.mv_dashboard_pedidos (status_pedido, data_criacao);
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_pedidos_is_atrasado_idx
+    ON public.mv_dashboard_pedidos (is_atrasado, data_criacao);
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_pedidos_cliente_id_idx
+    ON public.mv_dashboard_pedidos (cliente_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_dashboard_financeiro_lancamento_id_uidx
+    ON public.mv_dashboard_financeiro (lancamento_id);
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_financeiro_data_vencimento_idx
+    ON public.mv_dashboard_financeiro (data_vencimento);
+
+CREATE INDEX IF NOT EXISTS mv_dashboard_financeiro_is_atrasado_idx
+    ON public.mv_dashboard_financeiro (is_atrasado, data_vencimento);
+
+GRANT SELECT ON public.mv_dashboard_pedidos TO anon, authenticated;
+GRANT SELECT ON public.mv_dashboard_financeiro TO anon, authenticated;
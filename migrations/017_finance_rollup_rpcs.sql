@@ -0,0 +1,191 @@
+-- =============================================================================
+-- MIGRATION 017: RPCs de rollup da tela financeira
+--
+-- render_finance_view baixava todas as linhas de mv_dashboard_financeiro e
+-- mv_dashboard_pedidos do período e agregava em pandas (receitas, despesas,
+-- despesas por categoria, top 5 + OUTROS, top clientes, maiores pedidos).
+-- Estas RPCs devolvem as séries já agregadas (poucos KB) com as regras de
+-- archive/data/rollups.py (fallback em pandas quando a RPC não existe);
+-- tests/test_finance_rollups.py roda os dois caminhos nas mesmas linhas.
+--
+-- Semântica espelhada do pandas:
+-- - categoria: NULL → '-', [%@_$] → espaço, str.strip() — o btrim recebe
+--   exatamente os caracteres de str.isspace() (inclui NBSP, U+2000..U+200A,
+--   U+3000 etc.)
+-- - cliente_nome: NULL → '-' (fillna, como categoria), [%@_$] → espaço e
+--   str.title() via dashboard_title_case(); o agrupamento é pelo nome já
+--   em title case, como o groupby do pandas
+-- - empates de valor: nome em ordem de code point (COLLATE "C"), como o
+--   sort_values por (valor, nome)
+-- - maiores pedidos: sort estável do pandas sobre a ordem do fetch_view_data
+--   (data_criacao DESC, pedido_id DESC) → mesmo desempate aqui
+-- - categorias só com total de 'Saída' > 0; valores NULL contam como 0
+-- - filtros: competencia_mes entre as datas (financeiro), data_criacao em
+--   [início, dia seguinte ao fim) (pedidos) — iguais aos do fetch_view_data
+--
+-- Diferenças mantidas de propósito:
+-- - totais: a RPC soma o período inteiro; o pandas soma o DataFrame, que o
+--   fetch_view_data corta em DASHBOARD_MAX_ROWS (10000) avisando na tela
+--   (warn_if_truncated). Sem corte os dois coincidem; com corte o pandas
+--   está errado por construção e reproduzir o corte não faz sentido.
+-- - soma: numeric exato aqui, float64 no pandas (diferença < 1e-6)
+-- - str.title() usa o titlecase Unicode: 'ß' → 'Ss' e dígrafos como 'ǆ' →
+--   'ǅ'; upper() do Postgres mantém 'ß' e dá 'Ǆ'. "Letra com caixa" é
+--   [[:upper:][:lower:]] do ctype do banco. Nomes em português não têm
+--   esses casos.
+-- =============================================================================
+
+-- str.title() do Python: maiúscula em toda letra que não segue outra letra
+-- com caixa, minúscula nas demais.
+CREATE OR REPLACE FUNCTION public.dashboard_title_case(s text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+STRICT
+PARALLEL SAFE
+AS $$
+    SELECT COALESCE(string_agg(CASE WHEN prev_cased THEN lower(c) ELSE upper(c) END, '' ORDER BY i), '')
+    FROM (
+        SELECT c, i, COALESCE(lag(c ~ '[[:upper:][:lower:]]') OVER (ORDER BY i), false) AS prev_cased
+        FROM regexp_split_to_table(s, '') WITH ORDINALITY AS t(c, i)
+    ) chars;
+$$;
+
+CREATE OR REPLACE FUNCTION public.get_finance_rollup(start_date date, end_date date)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH lanc AS (
+        SELECT
+            tipo,
+            COALESCE(valor, 0) AS valor,
+            btrim(
+                regexp_replace(COALESCE(categoria, '-'), '[%@_$]', ' ', 'g'),
+                E' \t\n\v\f\r' || chr(28) || chr(29) || chr(30) || chr(31) || chr(133) || chr(160) || chr(5760)
+                || chr(8192) || chr(8193) || chr(8194) || chr(8195) || chr(8196) || chr(8197) || chr(8198)
+                || chr(8199) || chr(8200) || chr(8201) || chr(8202) || chr(8232) || chr(8233) || chr(8239)
+                || chr(8287) || chr(12288)
+            ) AS categoria
+        FROM public.mv_dashboard_financeiro
+        WHERE competencia_mes >= COALESCE(start_date, DATE '1900-01-01')
+          AND competencia_mes <= COALESCE(end_date, DATE '2100-12-31')
+    ),
+    totais AS (
+        SELECT
+            COALESCE(SUM(valor) FILTER (WHERE tipo = 'Entrada'), 0) AS entradas,
+            COALESCE(SUM(valor) FILTER (WHERE tipo = 'Saída'), 0) AS saidas,
+            COUNT(*) AS n
+        FROM lanc
+    ),
+    cats AS (
+        SELECT
+            c.categoria,
+            c.valor,
+            c.valor / t.saidas * 100 AS percent,
+            ROW_NUMBER() OVER (ORDER BY c.valor DESC, c.categoria COLLATE "C") AS pos
+        FROM (
+            SELECT categoria, SUM(valor) AS valor
+            FROM lanc
+            WHERE tipo = 'Saída'
+            GROUP BY categoria
+        ) c
+        CROSS JOIN totais t
+        WHERE t.saidas > 0
+    ),
+    donut AS (
+        SELECT categoria, valor, percent, pos
+        FROM cats
+        WHERE pos <= 5
+        UNION ALL
+        SELECT 'OUTROS', SUM(valor), SUM(valor) / (SELECT saidas FROM totais) * 100, 6
+        FROM cats
+        WHERE pos > 5
+        HAVING COUNT(*) > 0
+    )
+    SELECT jsonb_build_object(
+        'entradas', t.entradas,
+        'saidas', t.saidas,
+        'saldo', t.entradas - t.saidas,
+        'count', t.n,
+        'categorias', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('categoria', categoria, 'valor', valor, 'percent', percent) ORDER BY pos)
+            FROM cats
+        ), '[]'::jsonb),
+        'categorias_donut', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('categoria', categoria, 'valor', valor, 'percent', percent) ORDER BY pos)
+            FROM donut
+        ), '[]'::jsonb)
+    )
+    FROM totais t;
+$$;
+
+CREATE OR REPLACE FUNCTION public.get_sales_rollup(start_date date, end_date date, top_n integer DEFAULT 10)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH ped AS (
+        SELECT
+            pedido_id,
+            regexp_replace(COALESCE(cliente_nome, '-'), '[%@_$]', ' ', 'g') AS cliente_nome,
+            data_criacao,
+            valor_total,
+            qtde_itens,
+            status_pedido
+        FROM public.mv_dashboard_pedidos
+        WHERE data_criacao >= COALESCE(start_date, DATE '1900-01-01')
+          AND data_criacao < COALESCE(end_date, DATE '2100-12-31') + 1
+    ),
+    nomes AS (
+        -- title case uma vez por nome distinto, não por pedido
+        SELECT public.dashboard_title_case(cliente_nome) AS cliente_nome, COALESCE(SUM(valor_total), 0) AS valor_total
+        FROM ped
+        GROUP BY ped.cliente_nome
+    ),
+    clientes AS (
+        SELECT cliente_nome, SUM(valor_total) AS valor_total
+        FROM nomes
+        GROUP BY cliente_nome
+        ORDER BY SUM(valor_total) DESC, cliente_nome COLLATE "C"
+        LIMIT LEAST(GREATEST(COALESCE(top_n, 10), 1), 100)
+    ),
+    maiores AS (
+        SELECT *
+        FROM ped
+        ORDER BY valor_total DESC NULLS LAST, data_criacao DESC, pedido_id DESC
+        LIMIT LEAST(GREATEST(COALESCE(top_n, 10), 1), 100)
+    )
+    SELECT jsonb_build_object(
+        'pedidos', (SELECT COUNT(*) FROM ped),
+        'valor_total', (SELECT COALESCE(SUM(valor_total), 0) FROM ped),
+        'top_clientes', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_object('cliente_nome', c.cliente_nome, 'valor_total', c.valor_total)
+                ORDER BY c.valor_total DESC, c.cliente_nome COLLATE "C"
+            )
+            FROM clientes c
+        ), '[]'::jsonb),
+        'top_pedidos', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'cliente_nome', public.dashboard_title_case(m.cliente_nome),
+                    'data_criacao', m.data_criacao,
+                    'valor_total', m.valor_total,
+                    'qtde_itens', m.qtde_itens,
+                    'status_pedido', m.status_pedido
+                )
+                ORDER BY m.valor_total DESC NULLS LAST, m.data_criacao DESC, m.pedido_id DESC
+            )
+            FROM maiores m
+        ), '[]'::jsonb)
+    );
+$$;
+
+GRANT EXECUTE ON FUNCTION public.dashboard_title_case(text) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_finance_rollup(date, date) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_sales_rollup(date, date, integer) TO anon, authenticated;
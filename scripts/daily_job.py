@@ -23,9 +23,29 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from scripts.check_env import check_env  # noqa: E402
-from scripts.error_log_sink import capture_traceback, ensure_run_id, persist_error_event, read_json_file, read_text_file  # noqa: E402
-from scripts.fetch_backup import fetch_backup  # noqa: E402
-from scripts.import_dump import import_dump  # noqa: E402
+from scripts.etl_checkpoint import CHECKPOINT_PATH, CheckpointStore  # noqa: E402
+from scripts.error_log_sink import (  # noqa: E402
+    capture_traceback,
+    ensure_run_id,
+    persist_error_event,
+    read_json_file,
+    read_text_file,
+    recover_error_sink_wal,
+)
+from scripts.etl_metrics import PROFILE_JSON_PATH, PROFILE_PROM_PATH  # noqa: E402
+from scripts.etl_profiler import PROFILE_DIR  # noqa: E402
+from scripts.fetch_backup import (  # noqa: E402
+    BackupProbeResult,
+    BackupSession,
+    DumpTee,
+    download_backup_file,
+    dump_sha256,
+    probe_backup_source,
+    same_remote_file,
+    stream_backup_file,
+)
+from scripts.import_dump import import_dump, import_dump_stream  # noqa: E402
+from scripts.pg_maintenance import run_maintenance  # noqa: E402
 from scripts.truncate_supabase import truncate_supabase  # noqa: E402
 
 load_dotenv()
@@ -35,6 +55,12 @@ COMPOSE_FILE = os.getenv("DOCKER_COMPOSE_FILE", "docker-compose.yml")
 LOGS_DIR = Path(os.getenv("LOGS_DIR", "./logs"))
 BACKUPS_DIR = Path(os.getenv("BACKUP_LOCAL_DIR", "./backups"))
 MANIFEST_PATH = BACKUPS_DIR / "manifest.json"
+ETL_BATCH_STATE_PATH = Path(os.getenv("ETL_BATCH_STATE_PATH", str(BACKUPS_DIR / "etl_batch_sizes.json")))
+# Dedup: pula import/truncate/ETL quando o dump é o mesmo da última carga com sucesso.
+DEDUP_ENABLED = os.getenv("BACKUP_DEDUP", "1") == "1"
+DEDUP_REMOTE_PROBE = os.getenv("BACKUP_DEDUP_REMOTE_PROBE", "0") == "1"
+# ANALYZE / VACUUM (ANALYZE) nas tabelas carregadas, antes das views de dashboard serem consultadas.
+MAINTENANCE_ENABLED = os.getenv("PG_MAINTENANCE", "1") == "1"
 
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 BACKUPS_DIR.mkdir(parents=True, exist_ok=True)
@@ -81,6 +107,79 @@ def _persist_manifest(manifest: dict) -> None:
     MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
 
 
+def _carry_over_etl_state(previous: dict | None) -> dict:
+    """Keep last night's adaptive batch sizes so the ETL can start from them."""
+    etl = (previous or {}).get("etl") or {}
+    if etl.get("batch_sizes"):
+        return {"batch_sizes": etl["batch_sizes"], "batch_sizes_from_run": etl.get("batch_sizes_from_run")}
+    return {}
+
+
+def _record_etl_outputs(manifest: dict) -> None:
+    """Link the ETL run profile and the adaptive batch sizes from the manifest."""
+    etl = dict(manifest.get("etl") or {})
+    state = read_json_file(ETL_BATCH_STATE_PATH)
+    if isinstance(state, dict) and state.get("sizes"):
+        etl.update(
+            {
+                "batch_sizes": state["sizes"],
+                "batch_sizes_from_run": state.get("run_id"),
+                "batch_state_path": str(ETL_BATCH_STATE_PATH.resolve()),
+            }
+        )
+    profile = read_json_file(PROFILE_JSON_PATH)
+    if isinstance(profile, dict):
+        etl.update(
+            {
+                "profile_path": str(PROFILE_JSON_PATH.resolve()),
+                "prometheus_textfile": str(PROFILE_PROM_PATH.resolve()),
+                "profile_total_seconds": profile.get("total_seconds"),
+                "profile_peak_rss_mb": profile.get("peak_rss_mb"),
+            }
+        )
+    profiler = read_json_file(PROFILE_DIR / "summary.json")
+    if isinstance(profiler, dict) and isinstance(profile, dict) and profiler.get("run_id") == profile.get("run_id"):
+        etl["profiler"] = {"mode": profiler.get("mode"), "dir": str(PROFILE_DIR.resolve())}
+    if etl != manifest.get("etl"):
+        manifest["etl"] = etl
+        _persist_manifest(manifest)
+
+
+def _last_loaded(previous: dict | None) -> dict | None:
+    last = (previous or {}).get("last_loaded")
+    return last if isinstance(last, dict) else None
+
+
+def _loaded_record(manifest: dict, probe: BackupProbeResult | None) -> dict:
+    backup = manifest.get("backup") or {}
+    return {
+        "run_id": RUN_ID,
+        "name": probe.selected_file if probe else backup.get("name"),
+        "sha256": backup.get("sha256"),
+        "size_bytes": backup.get("size_bytes"),
+        "remote_size_bytes": probe.size_bytes if probe else None,
+        "remote_modified_at": probe.modified_at.isoformat() if probe and probe.modified_at else None,
+        "loaded_at": _utc_now(),
+    }
+
+
+def _finish_unchanged(manifest: dict, steps: list[dict], reason: str, skipped: tuple[str, ...]) -> None:
+    last = manifest.get("last_loaded") or {}
+    log.info(
+        "[OK] backup unchanged since run %s (%s) - skipping %s",
+        last.get("run_id"),
+        reason,
+        ", ".join(skipped),
+    )
+    for name in skipped:
+        steps.append({"name": f"{name} (unchanged)", "ok": True, "elapsed": 0.0})
+        _mark_step(manifest, name, "skipped", {"reason": "unchanged"})
+    manifest["status"] = "unchanged"
+    manifest["unchanged"] = {"reason": reason, "last_loaded_run_id": last.get("run_id")}
+    manifest["run_finished_at"] = _utc_now()
+    _persist_manifest(manifest)
+
+
 def _mark_step(manifest: dict, step: str, status: str, details: dict | None = None) -> None:
     payload = {
         "status": status,
@@ -92,13 +191,38 @@ def _mark_step(manifest: dict, step: str, status: str, details: dict | None = No
     _persist_manifest(manifest)
 
 
-def _run_etl(dry_run: bool) -> None:
+def _resolve_resume(resume_run_id: str | None) -> str | None:
+    """Return the run id to resume, or None when there is no checkpoint to continue from."""
+    if not resume_run_id:
+        return None
+    checkpoint = CheckpointStore(run_id=resume_run_id, path=CHECKPOINT_PATH)
+    try:
+        checkpoint.load()
+    finally:
+        checkpoint.close()  # load() pode ter aberto conexão com o Supabase
+    if not checkpoint.tables:
+        log.warning("[RESUME] no checkpoint for run_id=%s - running a full load", resume_run_id)
+        return None
+    done = checkpoint.done_tables()
+    log.info(
+        "[RESUME] run_id=%s: %d table(s) done, %d in progress - truncate will be skipped",
+        resume_run_id,
+        len(done),
+        len(checkpoint.tables) - len(done),
+    )
+    return resume_run_id
+
+
+def _run_etl(dry_run: bool, resume_run_id: str | None = None) -> None:
     etl_script = ROOT / "etl" / "run.py"
     env = os.environ.copy()
     if dry_run:
         env["ETL_VALIDATE_ONLY"] = "1"
 
-    result = subprocess.run([sys.executable, str(etl_script)], env=env, capture_output=False)
+    cmd = [sys.executable, str(etl_script)]
+    if resume_run_id and not dry_run:
+        cmd += ["--resume", resume_run_id]
+    result = subprocess.run(cmd, env=env, capture_output=False)
     if result.returncode != 0:
         raise RuntimeError(f"ETL failed with exit code {result.returncode}")
 
@@ -152,7 +276,11 @@ def run_daily_job(
     skip_fetch: bool = False,
     backup_path_override: Path | None = None,
     backup_date: date | None = None,
+    resume_run_id: str | None = None,
+    force: bool = False,
 ) -> None:
+    previous = read_json_file(MANIFEST_PATH)
+    previous = previous if isinstance(previous, dict) else None
     manifest = {
         "run_id": RUN_ID,
         "run_started_at": _utc_now(),
@@ -160,12 +288,22 @@ def run_daily_job(
         "status": "running",
         "steps": {},
         "backup": {},
+        "etl": _carry_over_etl_state(previous),
     }
+    last_loaded = _last_loaded(previous)
+    if last_loaded:
+        manifest["last_loaded"] = last_loaded
     _persist_manifest(manifest)
 
     steps: list[dict] = []
     backup_path: Path | None = backup_path_override
     truncate_enabled = os.getenv("TRUNCATE_ENABLED", "0") == "1"
+    # Streaming: o download alimenta o import enquanto chega (um fluxo, sem segmentos).
+    stream_import = os.getenv("BACKUP_STREAM_IMPORT", "0") == "1" and not dry_run
+    streamed: DumpTee | None = None
+    probe: BackupProbeResult | None = None
+    # Uma conexão autenticada para probe, SIZE e download (antes eram 2-3 logins).
+    source = BackupSession()
 
     try:
         _run_step(
@@ -175,10 +313,43 @@ def run_daily_job(
             lambda: check_env(mode="dry-run" if dry_run else "production"),
         )
 
-        if not skip_fetch:
+        resume_from = None if dry_run else _resolve_resume(resume_run_id)
+        if resume_from:
+            manifest["resumed_from"] = resume_from
+            manifest["etl"]["checkpoint_path"] = str(CHECKPOINT_PATH.resolve())
+            _persist_manifest(manifest)
+
+        # Resume precisa terminar a carga interrompida mesmo que o dump não tenha mudado.
+        dedup = DEDUP_ENABLED and not force and not dry_run and not resume_from and last_loaded is not None
+
+        if not skip_fetch and dedup and DEDUP_REMOTE_PROBE:
+            probe = probe_backup_source(target_date=backup_date, session=source)
+            if same_remote_file(probe, last_loaded):
+                _mark_step(manifest, "1. Fetch backup", "skipped", {"reason": "unchanged"})
+                _finish_unchanged(
+                    manifest,
+                    steps,
+                    "remote size+mtime",
+                    ("2. Import dump MySQL", "3. Truncate Supabase", "4. ETL MySQL -> Supabase"),
+                )
+                return
+
+        if not skip_fetch and stream_import:
+            def _fetch_and_import() -> None:
+                nonlocal backup_path, streamed, probe
+                probe = probe or probe_backup_source(target_date=backup_date, session=source)
+                streamed = stream_backup_file(probe.selected_file, session=source)
+                import_dump_stream(streamed, streamed.name)
+                backup_path = streamed.local_path
+
+            _run_step("1+2. Fetch + import dump (streaming)", manifest, steps, _fetch_and_import)
+            _mark_step(manifest, "1. Fetch backup", "ok", {"mode": "streaming"})
+            _mark_step(manifest, "2. Import dump MySQL", "ok", {"mode": "streaming"})
+        elif not skip_fetch:
             def _fetch() -> None:
-                nonlocal backup_path
-                backup_path = fetch_backup(target_date=backup_date)
+                nonlocal backup_path, probe
+                probe = probe or probe_backup_source(target_date=backup_date, session=source)
+                backup_path = download_backup_file(probe.selected_file, session=source)
 
             _run_step("1. Fetch backup", manifest, steps, _fetch)
         else:
@@ -200,14 +371,35 @@ def run_daily_job(
             "selected_for_date": backup_date.isoformat() if backup_date else "latest",
             "recorded_at": _utc_now(),
         }
+        manifest["backup"]["sha256"] = streamed.sha256 if streamed is not None else dump_sha256(backup_path)
+        source.close()
+        if source.logins:
+            manifest["backup"]["source_session"] = source.report()
+        if probe is not None:
+            manifest["backup"]["remote_size_bytes"] = probe.size_bytes
+            manifest["backup"]["remote_modified_at"] = probe.modified_at.isoformat() if probe.modified_at else None
         _persist_manifest(manifest)
 
-        if dry_run:
+        if dedup and manifest["backup"]["sha256"] == last_loaded.get("sha256"):
+            skipped = ("3. Truncate Supabase", "4. ETL MySQL -> Supabase")
+            if streamed is None:
+                skipped = ("2. Import dump MySQL",) + skipped
+            _finish_unchanged(manifest, steps, "sha256", skipped)
+            if streamed is not None:
+                _run_step("5. Stop MySQL Docker", manifest, steps, _docker_compose_stop_mysql)
+            return
+
+        if streamed is not None:
+            log.info("[OK] dump already imported while streaming (sha256=%s)", streamed.sha256)
+        elif dry_run:
             log.info("[OK] dry-run: skipping MySQL import")
             steps.append({"name": "2. Import dump MySQL (dry-run)", "ok": True, "elapsed": 0.0})
             _mark_step(manifest, "2. Import dump MySQL", "skipped")
         else:
-            _run_step("2. Import dump MySQL", manifest, steps, lambda: import_dump(backup_path))
+            def _import() -> None:
+                manifest["import"] = import_dump(backup_path)
+
+            _run_step("2. Import dump MySQL", manifest, steps, _import)
 
         # Validação obrigatória de transformação ANTES do truncate.
         # Garante fail-fast: se transformação estiver errada, não limpa o Supabase.
@@ -218,21 +410,40 @@ def run_daily_job(
             lambda: _run_etl(dry_run=True),
         )
 
-        if truncate_enabled and not dry_run:
+        if truncate_enabled and not dry_run and not resume_from:
             _run_step("3. Truncate Supabase", manifest, steps, lambda: truncate_supabase())
         else:
-            reason = "dry-run" if dry_run else "TRUNCATE_ENABLED=0"
+            reason = "dry-run" if dry_run else f"resume {resume_from}" if resume_from else "TRUNCATE_ENABLED=0"
             log.info("[OK] truncate skipped (%s)", reason)
             steps.append({"name": "3. Truncate Supabase (skipped)", "ok": True, "elapsed": 0.0})
             _mark_step(manifest, "3. Truncate Supabase", "skipped", {"reason": reason})
 
-        _run_step("4. ETL MySQL -> Supabase", manifest, steps, lambda: _run_etl(dry_run=dry_run))
+        try:
+            _run_step(
+                "4. ETL MySQL -> Supabase",
+                manifest,
+                steps,
+                lambda: _run_etl(dry_run=dry_run, resume_run_id=resume_from),
+            )
+        finally:
+            if not dry_run:
+                _record_etl_outputs(manifest)
+
+        if not dry_run and MAINTENANCE_ENABLED:
+            def _maintenance() -> None:
+                report = manifest["maintenance"] = run_maintenance()
+                if report["failed"]:
+                    log.warning("[WARN] maintenance failed for: %s", ", ".join(report["failed"]))
+
+            _run_step("4.5 Analyze Supabase", manifest, steps, _maintenance)
 
         if not dry_run:
             _run_step("5. Stop MySQL Docker", manifest, steps, _docker_compose_stop_mysql)
 
         manifest["status"] = "success"
         manifest["run_finished_at"] = _utc_now()
+        if not dry_run:
+            manifest["last_loaded"] = _loaded_record(manifest, probe)
         _persist_manifest(manifest)
 
     except Exception as exc:
@@ -255,6 +466,7 @@ def run_daily_job(
                 "backup_path": str(backup_path) if backup_path else None,
                 "backup_path_override": str(backup_path_override) if backup_path_override else None,
                 "backup_date": backup_date.isoformat() if backup_date else None,
+                "resume_run_id": resume_run_id,
                 "manifest": manifest,
                 "steps": steps,
                 "log_file": str(log_file.resolve()),
@@ -265,6 +477,7 @@ def run_daily_job(
         raise
 
     finally:
+        source.close()
         _write_summary(steps)
 
 
@@ -274,6 +487,16 @@ def main() -> None:
     parser.add_argument("--skip-fetch", action="store_true", help="Reuse existing backup file")
     parser.add_argument("--backup-file", metavar="PATH", help="Use specific backup file")
     parser.add_argument("--backup-date", metavar="YYYY-MM-DD", help="Target backup date")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Load even if the dump is identical to the last successful load",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Resume a failed ETL from its checkpoints (skips truncate and finished tables)",
+    )
     args = parser.parse_args()
 
     backup_path_override: Path | None = None
@@ -291,12 +514,18 @@ def main() -> None:
 
     log.info("=== NBL ETL Daily Job | %s | dry_run=%s ===", datetime.now().isoformat(timespec="seconds"), args.dry_run)
 
+    recovered = recover_error_sink_wal()
+    if recovered:
+        log.info("Error sink: %d evento(s) de uma tentativa anterior reenfileirados a partir do WAL", recovered)
+
     try:
         run_daily_job(
             dry_run=args.dry_run,
             skip_fetch=skip_fetch,
             backup_path_override=backup_path_override,
             backup_date=backup_date,
+            resume_run_id=args.resume,
+            force=args.force,
         )
         log.info("=== Job completed successfully ===")
     except Exception as exc:
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Compression codecs for MySQL dumps: detection by magic bytes and streaming (de)compression.
+
+Supported: gzip (``.gz``), zstd (``.zst``, needs the optional ``zstandard``
+package) and xz (``.xz``). Detection uses the first bytes of the content,
+never the extension, so a ``.sql`` that is actually gzip still imports.
+Decompression is incremental and in-process. It also handles concatenated
+members/frames, e.g. ``pigz``/``zstd -T0`` output and ``cat a.gz b.gz``.
+
+Used by ``fetch_backup`` (compressed local cache, content SHA-256) and
+``import_dump`` (streaming into ``mysql``).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import lzma
+import os
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+CHUNK_SIZE = 1024 * 1024
+PLAIN = "plain"
+MAGIC: tuple[tuple[str, bytes], ...] = (
+    ("gzip", b"\x1f\x8b"),
+    ("zstd", b"\x28\xb5\x2f\xfd"),
+    ("xz", b"\xfd7zXZ\x00"),
+)
+MAGIC_LEN = max(len(magic) for _, magic in MAGIC)
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "xz": ".xz"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3, "xz": 6}
+SHA256_SIDECAR_SUFFIX = ".sha256"
+
+
+def detect_codec(head: bytes) -> str:
+    for codec, magic in MAGIC:
+        if head.startswith(magic):
+            return codec
+    return PLAIN
+
+
+def codec_for_name(name: str) -> str | None:
+    """Codec implied by the file suffix (None for an uncompressed name)."""
+    for codec, suffix in SUFFIXES.items():
+        if name.endswith(suffix):
+            return codec
+    return None
+
+
+def strip_codec_suffix(name: str) -> str:
+    codec = codec_for_name(name)
+    return name[: -len(SUFFIXES[codec])] if codec else name
+
+
+def file_codec(path: Path) -> str:
+    with open(path, "rb") as handle:
+        return detect_codec(handle.read(MAGIC_LEN))
+
+
+def resolve_codec(codec: str) -> str:
+    """Requested cache codec -> usable codec (zstd falls back to gzip without ``zstandard``)."""
+    codec = (codec or PLAIN).strip().lower()
+    if codec in ("", "none", "off", "0"):
+        return PLAIN
+    if codec == "zst":
+        codec = "zstd"
+    if codec == "gz":
+        codec = "gzip"
+    if codec not in SUFFIXES:
+        raise ValueError(f"unknown dump codec {codec!r} (use zstd, gzip, xz or none)")
+    if codec == "zstd" and not HAS_ZSTD:
+        return "gzip"
+    return codec
+
+
+def _require_zstd() -> None:
+    if not HAS_ZSTD:
+        raise RuntimeError("zstandard is not installed - cannot handle .zst dumps (pip install zstandard)")
+
+
+class Decompressor:
+    """Incremental decompressor; restarts on each concatenated member/frame."""
+
+    def __init__(self, codec: str):
+        self.codec = codec
+        self._obj = self._new()
+
+    def _new(self):
+        if self.codec == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.codec == "xz":
+            return lzma.LZMADecompressor()
+        if self.codec == "zstd":
+            _require_zstd()
+            return zstandard.ZstdDecompressor().decompressobj()
+        return None
+
+    def _finished(self) -> bool:
+        return bool(getattr(self._obj, "eof", False))
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._obj is None:
+            return data
+        out: list[bytes] = []
+        while data:
+            # The previous member/frame may have ended exactly at the last chunk
+            # boundary; xz and zstd refuse more input after their end.
+            if self._finished():
+                self._obj = self._new()
+            out.append(self._obj.decompress(data))
+            data = self._obj.unused_data if self._finished() else b""
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        """Flush the tail and fail on a truncated stream (member/frame without its end)."""
+        if self._obj is None:
+            return b""
+        tail = self._obj.flush() if self.codec in ("gzip", "zstd") else b""
+        if not self._finished():
+            raise ValueError(f"truncated {self.codec} stream")
+        return tail
+
+
+class Compressor:
+    """Streaming compressor; zstd uses all cores (``threads=-1``)."""
+
+    def __init__(self, codec: str, level: int | None = None):
+        self.codec = codec
+        level = level if level is not None else DEFAULT_LEVELS.get(codec, 6)
+        if codec == "gzip":
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif codec == "xz":
+            self._obj = lzma.LZMACompressor(preset=level)
+        elif codec == "zstd":
+            _require_zstd()
+            self._obj = zstandard.ZstdCompressor(level=level, threads=-1).compressobj()
+        else:
+            raise ValueError(f"cannot compress with codec {codec!r}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+
+def peek(chunks: Iterable[bytes], size: int = MAGIC_LEN) -> tuple[bytes, Iterator[bytes]]:
+    """Read at least ``size`` bytes (or everything) from ``chunks``; returns (head, rest)."""
+    iterator = iter(chunks)
+    head = b""
+    for chunk in iterator:
+        head += chunk
+        if len(head) >= size:
+            break
+    return head, iterator
+
+
+def iter_file(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as handle:
+        yield from iter(lambda: handle.read(chunk_size), b"")
+
+
+def decompress_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Plain SQL bytes from a (possibly compressed) byte stream, codec detected from the content."""
+    head, rest = peek(chunks)
+    if not head:
+        return
+    decompressor = Decompressor(detect_codec(head))
+    for chunk in itertools.chain([head], rest):
+        out = decompressor.decompress(chunk)
+        if out:
+            yield out
+    tail = decompressor.finish()
+    if tail:
+        yield tail
+
+
+def open_dump(path: Path) -> Iterator[bytes]:
+    return decompress_stream(iter_file(path))
+
+
+def content_sha256(path: Path) -> str:
+    """SHA-256 of the uncompressed SQL, so the same dump hashes equal in any codec."""
+    digest = hashlib.sha256()
+    for chunk in open_dump(path):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compress_file(src: Path, dst: Path, codec: str, level: int | None = None) -> str:
+    """Compress ``src`` into ``dst`` (via ``dst.part``); returns the SHA-256 of the plain input."""
+    compressor = Compressor(codec, level)
+    digest = hashlib.sha256()
+    part = dst.with_name(dst.name + ".part")
+    with open(part, "wb") as out:
+        for chunk in iter_file(src):
+            digest.update(chunk)
+            out.write(compressor.compress(chunk))
+        out.write(compressor.flush())
+    os.replace(part, dst)
+    return digest.hexdigest()
+
+
+def sidecar_path(path: Path) -> Path:
+    return path.with_name(path.name + SHA256_SIDECAR_SUFFIX)
+
+
+def write_sha256_sidecar(path: Path, sha256: str) -> None:
+    """``sha256sum``-style sidecar: the hash of the uncompressed content, next to the cache file."""
+    sidecar_path(path).write_text(f"{sha256}  {strip_codec_suffix(path.name)}\n", encoding="utf-8")
+
+
+def read_sha256_sidecar(path: Path) -> str | None:
+    sidecar = sidecar_path(path)
+    try:
+        if sidecar.stat().st_mtime < path.stat().st_mtime:
+            return None
+        value = sidecar.read_text(encoding="utf-8").split()[0]
+    except (OSError, IndexError):
+        return None
+    return value if len(value) == 64 else None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Per-table sections of a mysqldump and their checksums, for the differential import.
+
+A dump is read line by line and split into:
+
+- the preamble, i.e. the session ``SET`` statements before the first table;
+- one section per table, from its ``-- Table structure`` comment (or
+  ``DROP TABLE IF EXISTS`` / ``CREATE TABLE``) through its ``INSERT`` blocks and ``UNLOCK TABLES``;
+- ``triggers:<table>``, the trigger block mysqldump writes right after the
+  table data (from its first ``/*!50003 SET @saved_cs_client`` / ``DELIMITER ;;``);
+- ``view:<view>``, both the ``-- Temporary view structure`` placeholder and the
+  ``-- Final view structure for view`` written after the tables;
+- ``routines:<database>`` / ``events:<database>``, from the ``-- Dumping routines``
+  (``-- Dumping events``) comment on;
+- the footer, i.e. the ``SET x=@OLD_x`` restores at the end.
+
+Table sections keep the bare table name as key; ``section_object`` splits the
+other keys into ``(kind, name)``.
+
+The checksum of a table is the SHA-256 of its section without ``--`` comment
+lines, so a new ``-- Dump completed on ...`` date does not count as a change,
+but a new ``CREATE TABLE`` or a changed ``INSERT`` does. ``filter_tables``
+re-emits the preamble, the selected sections and the footer. That is the
+partial dump ``import_dump`` feeds to ``mysql`` in ``MYSQL_IMPORT_MODE=diff``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Any, Iterable, Iterator
+
+from scripts.dump_codec import CHUNK_SIZE, decompress_stream
+
+PREAMBLE = "<preamble>"
+FOOTER = "<footer>"
+
+SECTION_KINDS = ("view", "triggers", "routines", "events")
+
+TABLE_START = re.compile(
+    rb"^(?:-- Table structure for table|DROP TABLE IF EXISTS|CREATE TABLE(?: IF NOT EXISTS)?) `([^`]+)`"
+)
+# mysqldump 8 escreve "Temporary view structure"; o 5.7, "Temporary table structure for view"
+VIEW_START = re.compile(rb"^-- (?:Temporary (?:view|table) structure|Final view structure) for view `([^`]+)`")
+OBJECTS_START = re.compile(rb"^-- Dumping (routines|events) for database '([^']+)'")
+TRIGGERS_START = re.compile(rb"^(?:/\*!50003 SET @saved_cs_client\b|DELIMITER ;;)")
+FOOTER_LINE = re.compile(rb"^/\*!\d+ SET \w+\s*=\s*@OLD_\w+")
+
+
+def section_object(section: str) -> tuple[str, str]:
+    """``(kind, name)`` of a section key; kind is ``table`` or one of ``SECTION_KINDS``."""
+    kind, sep, name = section.partition(":")
+    if sep and kind in SECTION_KINDS:
+        return kind, name
+    return "table", section
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Lines of a byte stream, each with its trailing newline (the last one may lack it)."""
+    parts: list[bytes] = []  # pedaços de uma linha longa (INSERT estendido) que atravessa chunks
+    for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                break
+            if parts:
+                parts.append(chunk[start : end + 1])
+                yield b"".join(parts)
+                parts = []
+            else:
+                yield chunk[start : end + 1]
+            start = end + 1
+        if start < len(chunk):
+            parts.append(chunk[start:])
+    if parts:
+        yield b"".join(parts)
+
+
+def _name(match: re.Match, group: int = 1) -> str:
+    return match.group(group).decode("utf-8", errors="replace")
+
+
+def iter_sections(lines: Iterable[bytes]) -> Iterator[tuple[str, bytes]]:
+    """``(section, line)`` pairs: section is a section key, ``PREAMBLE`` or ``FOOTER``."""
+    current = PREAMBLE
+    for line in lines:
+        view = VIEW_START.match(line)
+        objects = OBJECTS_START.match(line) if view is None else None
+        table = TABLE_START.match(line) if view is None and objects is None else None
+        if view:
+            current = f"view:{_name(view)}"
+        elif objects:
+            current = f"{_name(objects)}:{_name(objects, 2)}"
+        elif table:
+            # o placeholder da view também faz DROP TABLE IF EXISTS `view`
+            if current != f"view:{_name(table)}":
+                current = _name(table)
+        elif current not in (PREAMBLE, FOOTER) and section_object(current)[0] == "table" and TRIGGERS_START.match(line):
+            current = f"triggers:{current}"
+        elif current != PREAMBLE and FOOTER_LINE.match(line):
+            current = FOOTER
+        yield current, line
+
+
+def _is_comment(line: bytes) -> bool:
+    stripped = line.strip()
+    return not stripped or stripped.startswith(b"--")
+
+
+def table_checksums(chunks: Iterable[bytes]) -> dict[str, str]:
+    """SHA-256 of each section (comments and blank lines ignored), in dump order."""
+    digests: dict[str, Any] = {}
+    for section, line in iter_sections(iter_lines(decompress_stream(chunks))):
+        if section in (PREAMBLE, FOOTER) or _is_comment(line):
+            continue
+        digest = digests.get(section)
+        if digest is None:
+            digest = digests[section] = hashlib.sha256()
+        digest.update(line)
+    return {table: digest.hexdigest() for table, digest in digests.items()}
+
+
+def filter_tables(chunks: Iterable[bytes], tables: set[str]) -> Iterator[bytes]:
+    """Partial dump with the preamble, the sections keyed in ``tables`` and the footer, in ~1 MB chunks."""
+    buffer: list[bytes] = []
+    buffered = 0
+    for section, line in iter_sections(iter_lines(decompress_stream(chunks))):
+        if section not in (PREAMBLE, FOOTER) and section not in tables:
+            continue
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
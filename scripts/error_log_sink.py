@@ -1,24 +1,61 @@
 #!/usr/bin/env python3
-"""Persist ETL/runtime failures to Supabase for incident analysis."""
+"""Persist ETL/runtime failures to Supabase for incident analysis.
+
+By default events go through an asynchronous sink: ``persist_error_events``
+appends them to a local write-ahead log (``logs/error_sink_wal/<pid>.jsonl``)
+and returns at once; a background thread inserts them in batches (by size or
+every ``ETL_ERROR_SINK_FLUSH_S`` seconds) over a single connection, and an
+``atexit`` hook drains what is left. Events of a process that died before
+draining stay in its WAL and are re-sent by the next process that starts the
+sink (``recover_error_sink_wal``). ``ETL_ERROR_SINK_MODE=sync`` restores the
+old behaviour (one connection and one INSERT per call).
+
+Only transient failures (connection lost, Supabase down) are retried. A batch
+rejected for its content (NUL byte, constraint violation) is re-sent row by
+row and the rows Postgres refuses go to ``logs/error_sink_dead_letter.jsonl``
+instead of blocking every later event.
+"""
 
 from __future__ import annotations
 
+import atexit
+import csv
+import io
 import json
 import os
 import socket
+import threading
+import time
 import traceback
 import uuid
 from datetime import date, datetime
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable
 
 import psycopg2
 from psycopg2.extras import Json, execute_values
 
 ERROR_LOG_TABLE = os.getenv("ETL_ERROR_LOG_TABLE", "etl_error_logs").strip() or "etl_error_logs"
+ERROR_GROUPS_TABLE = os.getenv("ETL_ERROR_GROUPS_TABLE", "etl_error_groups").strip() or "etl_error_groups"
 LOCAL_FAILURE_LOG = Path(os.getenv("LOGS_DIR", "./logs")) / "error_sink_failures.log"
+DEAD_LETTER_LOG = Path(os.getenv("LOGS_DIR", "./logs")) / "error_sink_dead_letter.jsonl"
 MAX_TEXT_CAPTURE = int(os.getenv("ETL_ERROR_LOG_MAX_TEXT", "200000"))
 
+SINK_MODE = (os.getenv("ETL_ERROR_SINK_MODE", "async") or "async").strip().lower()
+SINK_WAL_DIR = Path(os.getenv("ETL_ERROR_SINK_WAL_DIR", str(Path(os.getenv("LOGS_DIR", "./logs")) / "error_sink_wal")))
+SINK_BATCH_SIZE = max(1, int(os.getenv("ETL_ERROR_SINK_BATCH", "200")))
+SINK_FLUSH_INTERVAL_S = float(os.getenv("ETL_ERROR_SINK_FLUSH_S", "2"))
+SINK_DRAIN_TIMEOUT_S = float(os.getenv("ETL_ERROR_SINK_DRAIN_S", "15"))
+SINK_MAX_BACKOFF_S = 30.0
+# Linhas já enviadas no início do WAL antes de compactá-lo (até lá só o .ack avança).
+SINK_WAL_COMPACT_LINES = 5000
+
+# Erros de conteúdo: repetir o mesmo lote não resolve.
+DATA_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, ValueError, TypeError)
+
+# Tabelas cujo DDL já foi aplicado (e commitado) neste processo.
+_DDL_DONE: set[str] = set()
+
 
 def ensure_run_id() -> str:
     current = (os.getenv("ETL_RUN_ID", "") or "").strip()
@@ -147,62 +184,452 @@ def _write_local_failure(note: str) -> None:
         pass
 
 
+def _insert_events(conn, rows: list[dict[str, Any]]) -> None:
+    create = ERROR_LOG_TABLE not in _DDL_DONE
+    with conn.cursor() as cur:
+        if create:
+            _ensure_table(cur)
+        execute_values(
+            cur,
+            f"""
+            INSERT INTO public.{ERROR_LOG_TABLE} (
+              run_id,
+              script_name,
+              step_name,
+              phase,
+              event_type,
+              severity,
+              table_name,
+              legacy_id,
+              error_class,
+              probable_constraint,
+              message,
+              traceback,
+              details
+            ) VALUES %s
+            """,
+            [
+                (
+                    row["run_id"],
+                    row["script_name"],
+                    row.get("step_name"),
+                    row.get("phase"),
+                    row["event_type"],
+                    row.get("severity", "error"),
+                    row.get("table_name"),
+                    row.get("legacy_id"),
+                    row.get("error_class"),
+                    row.get("probable_constraint"),
+                    row["message"],
+                    row.get("traceback"),
+                    Json(_json_safe(row.get("details") or {})),
+                )
+                for row in rows
+            ],
+        )
+    conn.commit()
+    if create:
+        _DDL_DONE.add(ERROR_LOG_TABLE)
+
+
+def _persist_sync(rows: list[dict[str, Any]]) -> int:
+    try:
+        conn = _connection()
+        try:
+            _insert_events(conn, rows)
+        finally:
+            conn.close()
+        return len(rows)
+    except Exception as exc:
+        _write_local_failure(f"persist_error_events failed: {exc}")
+        return 0
+
+
+def _pid_alive(name: str) -> bool:
+    try:
+        pid = int(name)
+    except ValueError:
+        return True  # arquivo que não é nosso: não mexe
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _write_dead_letter(row: dict[str, Any], exc: BaseException) -> None:
+    try:
+        DEAD_LETTER_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with DEAD_LETTER_LOG.open("a", encoding="utf-8") as fh:
+            record = {
+                "failed_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                "error_class": type(exc).__name__,
+                "error": str(exc),
+                "event": row,
+            }
+            fh.write(json.dumps(record, ensure_ascii=False, default=str))
+            fh.write("\n")
+    except Exception:
+        pass
+
+
+def _ack_path(wal_path: Path) -> Path:
+    return wal_path.with_suffix(".ack")
+
+
+def _read_ack(wal_path: Path) -> int:
+    try:
+        return max(0, int(_ack_path(wal_path).read_text(encoding="utf-8").strip() or 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def _read_wal(path: Path) -> list[dict[str, Any]]:
+    """Pending events of a WAL: lines after the count recorded in ``<pid>.ack``."""
+    rows: list[dict[str, Any]] = []
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue  # última linha truncada por um crash no meio do append
+    except OSError:
+        pass
+    return rows[_read_ack(path):]
+
+
+class ErrorSink:
+    """Background writer for the error log table, backed by a local JSONL WAL.
+
+    ``submit`` only appends to the WAL and to the in-memory queue. The flusher
+    thread owns the single Supabase connection and writes batches of up to
+    ``batch_size`` events. Sent events are acknowledged in ``<pid>.ack`` (line
+    count); the WAL itself is only rewritten every SINK_WAL_COMPACT_LINES lines
+    and removed once nothing is pending. On a transient failure it backs off
+    (1s..30s) and keeps the events; a data error moves the offending rows to the
+    dead-letter file. On ``close`` it makes one last attempt and leaves the WAL
+    behind if Supabase is still unreachable.
+    """
+
+    def __init__(
+        self,
+        wal_dir: Path = SINK_WAL_DIR,
+        batch_size: int = SINK_BATCH_SIZE,
+        flush_interval_s: float = SINK_FLUSH_INTERVAL_S,
+        connect: Callable[[], Any] = _connection,
+    ):
+        self.wal_dir = Path(wal_dir)
+        self.wal_path = self.wal_dir / f"{os.getpid()}.jsonl"
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.connect = connect
+        self._pending: list[dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._conn = None
+        self._stopping = False
+        self._flush_requested = False
+        self._failing = False
+        self._acked = 0
+
+    # ── produtor ─────────────────────────────────────────────────────────
+    def submit(self, rows: list[dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        with self._cond:
+            self._append_wal(rows)
+            self._pending.extend(rows)
+            self._start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return len(rows)
+
+    def recover(self) -> int:
+        """Adopt the WAL of dead processes; returns how many events were re-queued."""
+        adopted: list[dict[str, Any]] = []
+        orphans: list[Path] = []
+        if self.wal_dir.is_dir():
+            for path in sorted(self.wal_dir.glob("*.jsonl")):
+                if path == self.wal_path or _pid_alive(path.stem):
+                    continue
+                adopted.extend(_read_wal(path))
+                orphans.append(path)
+        if adopted:
+            self.submit(adopted)
+        for path in orphans:
+            path.unlink(missing_ok=True)
+            _ack_path(path).unlink(missing_ok=True)
+        return len(adopted)
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout: float = SINK_DRAIN_TIMEOUT_S) -> bool:
+        """Ask for an immediate flush and wait up to ``timeout``; True if nothing is pending."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending and self._thread is not None and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return not self._pending
+
+    def close(self, timeout: float = SINK_DRAIN_TIMEOUT_S) -> bool:
+        """Drain and stop the flusher; what could not be sent stays in the WAL."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        if thread is None or not thread.is_alive():
+            self._drop_connection()
+        with self._cond:
+            return not self._pending
+
+    # ── WAL ──────────────────────────────────────────────────────────────
+    def _append_wal(self, rows: list[dict[str, Any]]) -> None:
+        self.wal_dir.mkdir(parents=True, exist_ok=True)
+        with self.wal_path.open("a", encoding="utf-8") as fh:
+            for row in rows:
+                fh.write(json.dumps(row, ensure_ascii=False, default=str))
+                fh.write("\n")
+
+    def _ack_wal(self, count: int) -> None:
+        """Marks the first ``count`` pending lines as done; caller holds the lock."""
+        self._acked += count
+        ack = _ack_path(self.wal_path)
+        if not self._pending:
+            self.wal_path.unlink(missing_ok=True)
+            ack.unlink(missing_ok=True)
+            self._acked = 0
+        elif self._acked >= SINK_WAL_COMPACT_LINES:
+            tmp = self.wal_path.with_name(self.wal_path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as fh:
+                for row in self._pending:
+                    fh.write(json.dumps(row, ensure_ascii=False, default=str))
+                    fh.write("\n")
+            ack.unlink(missing_ok=True)  # sem .ack o WAL novo vale inteiro
+            os.replace(tmp, self.wal_path)
+            self._acked = 0
+        else:
+            tmp = ack.with_name(ack.name + ".tmp")
+            tmp.write_text(str(self._acked), encoding="utf-8")
+            os.replace(tmp, ack)
+
+    # ── flusher ──────────────────────────────────────────────────────────
+    def _start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="error-sink", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        backoff = 0.0
+        while True:
+            with self._cond:
+                if backoff and not self._stopping:
+                    self._cond.wait(backoff)
+                while not (self._stopping or self._flush_requested or len(self._pending) >= self.batch_size):
+                    if not self._cond.wait(self.flush_interval_s):
+                        break  # intervalo vencido: manda o que tiver
+                batch = list(self._pending[: self.batch_size])
+                stopping = self._stopping
+                if not batch:
+                    self._flush_requested = False
+                    if stopping:
+                        return
+                    continue
+            done = self._write(batch)
+            if done:
+                with self._cond:
+                    del self._pending[:done]
+                    self._ack_wal(done)
+                    self._cond.notify_all()
+            if done == len(batch):
+                backoff = 0.0
+            elif stopping:
+                return
+            else:
+                backoff = min(max(backoff * 2, 1.0), SINK_MAX_BACKOFF_S)
+
+    def _write(self, batch: list[dict[str, Any]]) -> int:
+        """Sends ``batch``; returns how many leading events are done (sent or dead-lettered)."""
+        try:
+            if self._conn is None or getattr(self._conn, "closed", 0):
+                self._conn = self.connect()
+            _insert_events(self._conn, batch)
+            self._failing = False
+            return len(batch)
+        except DATA_ERRORS:
+            self._rollback()
+            return self._write_rows(batch)
+        except Exception as exc:
+            self._transient_failure(exc)
+            return 0
+
+    def _write_rows(self, batch: list[dict[str, Any]]) -> int:
+        """Row by row after a data error: rejected rows go to the dead-letter file."""
+        for done, row in enumerate(batch):
+            try:
+                if self._conn is None:
+                    self._conn = self.connect()
+                _insert_events(self._conn, [row])
+            except DATA_ERRORS as exc:
+                self._rollback()
+                _write_dead_letter(row, exc)
+                _write_local_failure(f"error sink dropped event to {DEAD_LETTER_LOG}: {type(exc).__name__}: {exc}")
+            except Exception as exc:
+                self._transient_failure(exc)
+                return done
+        self._failing = False
+        return len(batch)
+
+    def _transient_failure(self, exc: BaseException) -> None:
+        self._drop_connection()
+        if not self._failing:
+            _write_local_failure(f"error sink flush failed, events kept in {self.wal_path}: {exc}")
+        self._failing = True
+
+    def _rollback(self) -> None:
+        try:
+            self._conn.rollback()
+        except Exception:
+            self._drop_connection()
+
+    def _drop_connection(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_SINK: ErrorSink | None = None
+_SINK_LOCK = threading.Lock()
+
+
+def get_error_sink() -> ErrorSink:
+    """Process-wide sink, drained by an ``atexit`` hook."""
+    global _SINK
+    with _SINK_LOCK:
+        if _SINK is None:
+            _SINK = ErrorSink()
+            atexit.register(_SINK.close, SINK_DRAIN_TIMEOUT_S)
+        return _SINK
+
+
+def recover_error_sink_wal() -> int:
+    """Re-send events left in the WAL by processes that died before draining."""
+    if SINK_MODE == "sync" or not SINK_WAL_DIR.is_dir():
+        return 0
+    try:
+        return get_error_sink().recover()
+    except Exception as exc:
+        _write_local_failure(f"error sink WAL recovery failed: {exc}")
+        return 0
+
+
 def persist_error_events(events: Iterable[dict[str, Any]]) -> int:
     rows = list(events)
+    if not rows:
+        return 0
+    if SINK_MODE == "sync":
+        return _persist_sync(rows)
+    try:
+        return get_error_sink().submit(rows)
+    except Exception as exc:
+        # WAL indisponível (disco cheio, permissão): cai para o envio síncrono.
+        _write_local_failure(f"error sink unavailable, sending synchronously: {exc}")
+        return _persist_sync(rows)
+
+
+def persist_error_event(**kwargs: Any) -> int:
+    return persist_error_events([build_error_event(**kwargs)])
+
+
+def _ensure_groups_table(cur) -> None:
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS public.{ERROR_GROUPS_TABLE} (
+          id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+          run_id text NOT NULL,
+          table_name text,
+          stage text,
+          probable_constraint text,
+          message_template text NOT NULL,
+          error_count integer NOT NULL,
+          first_legacy_id text,
+          last_legacy_id text,
+          samples jsonb NOT NULL DEFAULT '[]'::jsonb,
+          created_at timestamp with time zone NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_{ERROR_GROUPS_TABLE}_run_id ON public.{ERROR_GROUPS_TABLE} (run_id);
+        """
+    )
+
+
+def error_groups_csv(run_id: str, groups: Iterable[dict[str, Any]]) -> io.StringIO:
+    """CSV buffer in the column order used by ``persist_error_groups``' COPY."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for group in groups:
+        writer.writerow(
+            [
+                run_id,
+                group.get("table"),
+                group.get("stage"),
+                group.get("probable_constraint"),
+                group["template"],
+                int(group["count"]),
+                group.get("first_legacy_id"),
+                group.get("last_legacy_id"),
+                json.dumps(_json_safe(group.get("samples") or []), ensure_ascii=False),
+            ]
+        )
+    buffer.seek(0)
+    return buffer
+
+
+def persist_error_groups(run_id: str, groups: Iterable[dict[str, Any]]) -> int:
+    """Load aggregated ETL error groups with a single COPY; returns the number of groups."""
+    rows = list(groups)
     if not rows:
         return 0
     try:
         with _connection() as conn:
+            create = ERROR_GROUPS_TABLE not in _DDL_DONE
             with conn.cursor() as cur:
-                _ensure_table(cur)
-                execute_values(
-                    cur,
+                if create:
+                    _ensure_groups_table(cur)
+                cur.copy_expert(
                     f"""
-                    INSERT INTO public.{ERROR_LOG_TABLE} (
-                      run_id,
-                      script_name,
-                      step_name,
-                      phase,
-                      event_type,
-                      severity,
-                      table_name,
-                      legacy_id,
-                      error_class,
-                      probable_constraint,
-                      message,
-                      traceback,
-                      details
-                    ) VALUES %s
+                    COPY public.{ERROR_GROUPS_TABLE} (
+                      run_id, table_name, stage, probable_constraint, message_template,
+                      error_count, first_legacy_id, last_legacy_id, samples
+                    ) FROM STDIN WITH (FORMAT csv)
                     """,
-                    [
-                        (
-                            row["run_id"],
-                            row["script_name"],
-                            row.get("step_name"),
-                            row.get("phase"),
-                            row["event_type"],
-                            row.get("severity", "error"),
-                            row.get("table_name"),
-                            row.get("legacy_id"),
-                            row.get("error_class"),
-                            row.get("probable_constraint"),
-                            row["message"],
-                            row.get("traceback"),
-                            Json(_json_safe(row.get("details") or {})),
-                        )
-                        for row in rows
-                    ],
+                    error_groups_csv(run_id, rows),
                 )
+        if create:
+            _DDL_DONE.add(ERROR_GROUPS_TABLE)
         return len(rows)
     except Exception as exc:
-        _write_local_failure(f"persist_error_events failed: {exc}")
+        _write_local_failure(f"persist_error_groups failed: {exc}")
         return 0
 
 
-def persist_error_event(**kwargs: Any) -> int:
-    return persist_error_events([build_error_event(**kwargs)])
-
-
 def read_json_file(path: str | Path | None) -> Any:
     if not path:
         return None
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Durable checkpoints for etl/run.py, so a failed night can resume.
+
+For each table the ETL records whether it finished (``done``) or is in
+progress (``running``). For tables read in ``id`` order, it also records the
+last source id whose batch was committed to Postgres. The state is kept in
+two places:
+
+- locally in ``ETL_CHECKPOINT_PATH`` (default ``backups/etl_checkpoint.json``).
+  It is rewritten after every committed batch, so a retry on the same runner
+  loses nothing;
+- in Supabase, table ``public.etl_checkpoints`` (migration 011). Batch
+  progress is written at most every ``ETL_CHECKPOINT_PG_INTERVAL_S`` seconds;
+  table start and finish are written immediately. This copy lets a new runner
+  resume a run that failed on another one. One connection is opened lazily
+  and kept for the whole run; ``close()`` releases it.
+
+Resume: ``python etl/run.py --resume <run_id>`` or
+``python scripts/daily_job.py --resume <run_id>``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+BACKUPS_DIR = Path(os.getenv("BACKUP_LOCAL_DIR", "./backups"))
+CHECKPOINT_PATH = Path(os.getenv("ETL_CHECKPOINT_PATH", str(BACKUPS_DIR / "etl_checkpoint.json")))
+CHECKPOINT_TABLE = os.getenv("ETL_CHECKPOINT_TABLE", "etl_checkpoints").strip() or "etl_checkpoints"
+PG_INTERVAL_SECONDS = float(os.getenv("ETL_CHECKPOINT_PG_INTERVAL_S", "30"))
+
+STATUSES = ("running", "done")
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _pg_connection():
+    import psycopg2
+
+    dsn = (os.getenv("SUPABASE_DB_URL", "") or "").strip()
+    if not dsn:
+        raise RuntimeError("SUPABASE_DB_URL is missing; cannot persist ETL checkpoint")
+    return psycopg2.connect(dsn)
+
+
+def _ensure_table(cur) -> None:
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS public.{CHECKPOINT_TABLE} (
+          run_id text NOT NULL,
+          table_name text NOT NULL,
+          block integer,
+          status text NOT NULL CHECK (status IN ('running', 'done')),
+          last_id bigint,
+          rows_ok bigint NOT NULL DEFAULT 0,
+          rows_err bigint NOT NULL DEFAULT 0,
+          updated_at timestamp with time zone NOT NULL DEFAULT now(),
+          PRIMARY KEY (run_id, table_name)
+        );
+        """
+    )
+
+
+@dataclass
+class TableCheckpoint:
+    table: str
+    status: str = "running"
+    block: int | None = None
+    last_id: int | None = None
+    rows_ok: int = 0
+    rows_err: int = 0
+    updated_at: str = field(default_factory=_utc_now)
+
+    @property
+    def done(self) -> bool:
+        return self.status == "done"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "status": self.status,
+            "block": self.block,
+            "last_id": self.last_id,
+            "rows_ok": self.rows_ok,
+            "rows_err": self.rows_err,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, table: str, data: dict[str, Any]) -> "TableCheckpoint":
+        status = data.get("status") if data.get("status") in STATUSES else "running"
+        last_id = data.get("last_id")
+        return cls(
+            table=table,
+            status=status,
+            block=data.get("block"),
+            last_id=int(last_id) if last_id is not None else None,
+            rows_ok=int(data.get("rows_ok") or 0),
+            rows_err=int(data.get("rows_err") or 0),
+            updated_at=data.get("updated_at") or _utc_now(),
+        )
+
+
+@dataclass
+class CheckpointStore:
+    """Per-run table checkpoints, mirrored to a local JSON and to Supabase."""
+
+    run_id: str
+    path: Path = CHECKPOINT_PATH
+    pg_interval_s: float = PG_INTERVAL_SECONDS
+    connect: Callable[[], Any] | None = _pg_connection
+    tables: dict[str, TableCheckpoint] = field(default_factory=dict)
+    warn: Callable[[str], None] = print
+    _pg_synced_at: dict[str, float] = field(default_factory=dict, repr=False)
+    _pg_disabled: bool = field(default=False, repr=False)
+    _conn: Any = field(default=None, repr=False)
+    _table_checked: bool = field(default=False, repr=False)
+
+    # ── leitura ──────────────────────────────────────────────────────────
+    def load(self) -> str | None:
+        """Load this run's checkpoints (local file first, then Supabase); returns the source used."""
+        local = self._read_local()
+        if local is not None:
+            self.tables = local
+            return "local"
+        remote = self._read_pg()
+        if remote:
+            self.tables = remote
+            self._write_local()
+            return "supabase"
+        self.tables = {}
+        return None
+
+    def _read_local(self) -> dict[str, TableCheckpoint] | None:
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(payload, dict) or payload.get("run_id") != self.run_id:
+            return None
+        return {
+            table: TableCheckpoint.from_dict(table, data)
+            for table, data in (payload.get("tables") or {}).items()
+            if isinstance(data, dict)
+        }
+
+    def _read_pg(self) -> dict[str, TableCheckpoint]:
+        if self.connect is None:
+            return {}
+        try:
+            conn = self._connection()
+            with conn:  # commit/rollback; a conexão continua aberta
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"""
+                        SELECT table_name, status, block, last_id, rows_ok, rows_err, updated_at
+                        FROM public.{CHECKPOINT_TABLE}
+                        WHERE run_id = %s
+                        """,
+                        (self.run_id,),
+                    )
+                    rows = cur.fetchall()
+        except Exception as exc:
+            self._drop_connection()
+            self.warn(f"[CHECKPOINT] leitura no Supabase falhou: {exc}")
+            return {}
+        return {
+            row[0]: TableCheckpoint.from_dict(
+                row[0],
+                {
+                    "status": row[1],
+                    "block": row[2],
+                    "last_id": row[3],
+                    "rows_ok": row[4],
+                    "rows_err": row[5],
+                    "updated_at": row[6].isoformat() if hasattr(row[6], "isoformat") else row[6],
+                },
+            )
+            for row in rows
+        }
+
+    def get(self, table: str) -> TableCheckpoint | None:
+        return self.tables.get(table)
+
+    def done_tables(self) -> set[str]:
+        return {name for name, item in self.tables.items() if item.done}
+
+    # ── escrita ──────────────────────────────────────────────────────────
+    def reset(self) -> None:
+        """Start a fresh run: forget previous checkpoints and write an empty state."""
+        self.tables = {}
+        self._write_local()
+
+    def start_table(self, table: str, block: int | None = None) -> TableCheckpoint:
+        item = self.tables.get(table)
+        if item is None:
+            item = self.tables[table] = TableCheckpoint(table=table, block=block)
+        else:
+            item.status = "running"
+            item.block = block if block is not None else item.block
+        item.updated_at = _utc_now()
+        self._persist(item, force_pg=True)
+        return item
+
+    def advance(self, table: str, last_id: Any, rows_ok: int, rows_err: int) -> None:
+        """Record that every source row up to ``last_id`` has been committed."""
+        item = self.tables.get(table) or self.start_table(table)
+        try:
+            item.last_id = int(last_id) if last_id is not None else item.last_id
+        except (TypeError, ValueError):
+            return
+        item.rows_ok = rows_ok
+        item.rows_err = rows_err
+        item.updated_at = _utc_now()
+        self._persist(item)
+
+    def finish_table(self, table: str, rows_ok: int, rows_err: int) -> None:
+        item = self.tables.get(table) or self.start_table(table)
+        item.status = "done"
+        item.rows_ok = rows_ok
+        item.rows_err = rows_err
+        item.updated_at = _utc_now()
+        self._persist(item, force_pg=True)
+
+    def _persist(self, item: TableCheckpoint, force_pg: bool = False) -> None:
+        self._write_local()
+        last = self._pg_synced_at.get(item.table)
+        now = time.monotonic()
+        if force_pg or last is None or now - last >= self.pg_interval_s:
+            if self._write_pg(item):
+                self._pg_synced_at[item.table] = now
+
+    def _write_local(self) -> None:
+        payload = {
+            "run_id": self.run_id,
+            "updated_at": _utc_now(),
+            "tables": {name: item.as_dict() for name, item in self.tables.items()},
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            self.warn(f"[CHECKPOINT] arquivo local não gravado: {exc}")
+
+    def _write_pg(self, item: TableCheckpoint) -> bool:
+        if self.connect is None or self._pg_disabled:
+            return False
+        try:
+            conn = self._connection()
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"""
+                        INSERT INTO public.{CHECKPOINT_TABLE}
+                          (run_id, table_name, block, status, last_id, rows_ok, rows_err, updated_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, now())
+                        ON CONFLICT (run_id, table_name) DO UPDATE SET
+                          block = EXCLUDED.block,
+                          status = EXCLUDED.status,
+                          last_id = EXCLUDED.last_id,
+                          rows_ok = EXCLUDED.rows_ok,
+                          rows_err = EXCLUDED.rows_err,
+                          updated_at = now()
+                        """,
+                        (self.run_id, item.table, item.block, item.status, item.last_id, item.rows_ok, item.rows_err),
+                    )
+            return True
+        except Exception as exc:
+            # Sem Supabase o checkpoint local continua valendo; não insiste a cada batch.
+            self._pg_disabled = True
+            self._drop_connection()
+            self.warn(f"[CHECKPOINT] Supabase indisponível, seguindo só com {self.path}: {exc}")
+            return False
+
+    # ── conexão ──────────────────────────────────────────────────────────
+    def _connection(self):
+        """The store's single Supabase connection; the DDL runs once, on first use."""
+        if self._conn is None or getattr(self._conn, "closed", 0):
+            self._conn = self.connect()
+            self._table_checked = False
+        if not self._table_checked:
+            with self._conn:
+                with self._conn.cursor() as cur:
+                    _ensure_table(cur)
+            self._table_checked = True
+        return self._conn
+
+    def _drop_connection(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """Release the Supabase connection (the local file needs no closing)."""
+        self._drop_connection()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Aggregation of ETL row errors into deduplicated groups.
+
+A bad night can reject tens of thousands of rows with a handful of distinct
+causes. Instead of one telemetry event per row, errors are grouped by
+``(table, stage, probable_constraint, message template)``. The template is the
+message with ids, numbers, uuids and literal values masked. Each group keeps a
+count, the first/last legacy ids and a bounded sample of raw messages.
+
+The full per-row list goes to a gzip-compressed JSONL artifact
+(``logs/etl_errors.jsonl.gz``); the groups go to ``public.etl_error_groups``
+via COPY (see ``error_log_sink.persist_error_groups``).
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable
+
+MAX_TEMPLATE_LEN = 240
+
+_TEMPLATE_RULES: tuple[tuple[re.Pattern[str], str], ...] = (
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE), "<uuid>"),
+    (re.compile(r"\)=\((?:[^()]|\([^()]*\))*\)"), ")=(?)"),  # DETAIL: Key (col)=(valor)
+    (re.compile(r"'(?:[^'\\]|\\.)*'"), "'?'"),
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])"), "<n>"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def message_template(message: str | None) -> str:
+    """Mask the variable parts of an error message so equal causes share one template."""
+    text = (message or "").strip()
+    for pattern, replacement in _TEMPLATE_RULES:
+        text = pattern.sub(replacement, text)
+    return text[:MAX_TEMPLATE_LEN]
+
+
+@dataclass
+class ErrorGroup:
+    table: str | None
+    stage: str | None
+    probable_constraint: str | None
+    template: str
+    count: int = 0
+    first_legacy_id: str | None = None
+    last_legacy_id: str | None = None
+    samples: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def key(self) -> tuple[str | None, str | None, str | None, str]:
+        return (self.table, self.stage, self.probable_constraint, self.template)
+
+    def as_dict(self, with_samples: bool = True) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "table": self.table,
+            "stage": self.stage,
+            "probable_constraint": self.probable_constraint,
+            "template": self.template,
+            "count": self.count,
+            "first_legacy_id": self.first_legacy_id,
+            "last_legacy_id": self.last_legacy_id,
+        }
+        if with_samples:
+            payload["samples"] = self.samples
+        return payload
+
+
+class ErrorAggregator:
+    """Thread-safe running aggregation; counts every error, with no cap."""
+
+    def __init__(self, sample_size: int = 5):
+        self.sample_size = sample_size
+        self._groups: dict[tuple[str | None, str | None, str | None, str], ErrorGroup] = {}
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def add(self, item: dict[str, Any]) -> ErrorGroup:
+        """Fold a row error (the dict built by ``record_etl_error``) into its group."""
+        template = message_template(item.get("message"))
+        key = (item.get("table"), item.get("stage"), item.get("probable_constraint"), template)
+        legacy_id = item.get("legacy_id")
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = ErrorGroup(*key)
+            group.count += 1
+            self.total += 1
+            if legacy_id is not None:
+                if group.first_legacy_id is None:
+                    group.first_legacy_id = legacy_id
+                group.last_legacy_id = legacy_id
+            if len(group.samples) < self.sample_size:
+                group.samples.append({"legacy_id": legacy_id, "message": item.get("message")})
+        return group
+
+    def groups(self) -> list[ErrorGroup]:
+        """Groups ordered by count (largest first)."""
+        with self._lock:
+            return sorted(self._groups.values(), key=lambda g: (-g.count, g.table or "", g.template))
+
+    def summary(self, limit: int = 10) -> list[dict[str, Any]]:
+        """Top groups without samples, small enough to embed in an event."""
+        return [group.as_dict(with_samples=False) for group in self.groups()[:limit]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._groups.clear()
+            self.total = 0
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+
+def write_errors_jsonl(path: Path, rows: Iterable[dict[str, Any]]) -> int:
+    """Write one JSON object per line, gzip-compressed; returns the number of rows."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row, ensure_ascii=False, default=str))
+            fh.write("\n")
+            written += 1
+    tmp.replace(path)
+    return written
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""Per-table stage metrics for etl/run.py.
+
+The ETL records, for each table, the seconds spent in extract (MySQL fetch),
+transform (Python), load (Postgres insert, including retry splits) and
+self-ref (second-phase UPDATEs), together with rows/s, bytes sent, batches,
+retry-split count and memory (RSS at table start/end and the process
+high-water mark). Tables are also rolled up per topological block. With
+``ETL_TRACEMALLOC=<frames>`` each table additionally gets its top allocation
+sites (tracemalloc snapshot diff). The result is written to
+``logs/etl_profile.json`` and to a Prometheus textfile
+(``logs/etl_profile.prom``) that node_exporter's textfile collector can pick up.
+
+Compare two nights:
+    python scripts/etl_metrics.py compare old/etl_profile.json new/etl_profile.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+try:
+    import resource
+
+    HAS_RESOURCE = True
+except ImportError:  # Windows
+    HAS_RESOURCE = False
+
+LOGS_DIR = Path(os.getenv("LOGS_DIR", "./logs"))
+PROFILE_JSON_PATH = Path(os.getenv("ETL_PROFILE_JSON_PATH", str(LOGS_DIR / "etl_profile.json")))
+PROFILE_PROM_PATH = Path(os.getenv("ETL_PROFILE_PROM_PATH", str(LOGS_DIR / "etl_profile.prom")))
+# 0 = desligado; N = profundidade de frames guardada pelo tracemalloc (custa ~2x de RAM/CPU)
+TRACEMALLOC_FRAMES = int(os.getenv("ETL_TRACEMALLOC", "0") or 0)
+TRACEMALLOC_TOP = int(os.getenv("ETL_TRACEMALLOC_TOP", "10"))
+
+STAGES = ("extract", "transform", "load", "self_ref")
+# Métricas comparadas entre duas noites: (chave, maior_é_pior)
+COMPARED_METRICS: tuple[tuple[str, bool], ...] = (
+    ("wall_seconds", True),
+    ("extract_seconds", True),
+    ("transform_seconds", True),
+    ("load_seconds", True),
+    ("self_ref_seconds", True),
+    ("rows_per_second", False),
+    ("retry_splits", True),
+    ("peak_rss_mb", True),
+)
+
+
+def peak_rss_mb() -> float | None:
+    """Process RSS high-water mark in MiB (None when unavailable)."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return round(peak / 1_048_576, 1)
+    return round(peak / 1024, 1)
+
+
+def current_rss_mb() -> float | None:
+    """Current process RSS in MiB (Linux ``/proc``; falls back to the high-water mark)."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            resident_pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1_048_576, 1)
+
+
+def _format_site(stat: tracemalloc.Statistic | tracemalloc.StatisticDiff) -> str:
+    frame = stat.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def top_allocation_sites(limit: int = TRACEMALLOC_TOP) -> list[dict[str, Any]]:
+    """Live allocations grouped by source line (empty when tracemalloc is off)."""
+    if not tracemalloc.is_tracing():
+        return []
+    stats = tracemalloc.take_snapshot().statistics("lineno")
+    return [
+        {"site": _format_site(stat), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in stats[:limit]
+    ]
+
+
+def allocation_growth(before: tracemalloc.Snapshot, limit: int = TRACEMALLOC_TOP) -> list[dict[str, Any]]:
+    """Source lines whose live allocations grew the most since ``before``."""
+    diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+    return [
+        {
+            "site": _format_site(stat),
+            "size_kb": round(stat.size / 1024, 1),
+            "growth_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in diff[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+@dataclass
+class TableMetrics:
+    table: str
+    block: int | None = None
+    wall_seconds: float = 0.0
+    extract_seconds: float = 0.0
+    load_seconds: float = 0.0
+    self_ref_seconds: float = 0.0
+    rows_read: int = 0
+    rows_ok: int = 0
+    rows_err: int = 0
+    bytes_sent: int = 0
+    batches: int = 0
+    retry_splits: int = 0
+    peak_rss_mb: float | None = None
+    rss_start_mb: float | None = None
+    rss_end_mb: float | None = None
+    top_alloc_sites: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def rss_growth_mb(self) -> float | None:
+        if self.rss_start_mb is None or self.rss_end_mb is None:
+            return None
+        return round(self.rss_end_mb - self.rss_start_mb, 1)
+
+    @property
+    def transform_seconds(self) -> float:
+        return max(0.0, self.wall_seconds - self.extract_seconds - self.load_seconds - self.self_ref_seconds)
+
+    @property
+    def rows_per_second(self) -> float:
+        rows = self.rows_ok + self.rows_err
+        return rows / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "block": self.block,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "extract_seconds": round(self.extract_seconds, 3),
+            "transform_seconds": round(self.transform_seconds, 3),
+            "load_seconds": round(self.load_seconds, 3),
+            "self_ref_seconds": round(self.self_ref_seconds, 3),
+            "rows_read": self.rows_read,
+            "rows_ok": self.rows_ok,
+            "rows_err": self.rows_err,
+            "rows_per_second": round(self.rows_per_second, 1),
+            "bytes_sent": self.bytes_sent,
+            "batches": self.batches,
+            "retry_splits": self.retry_splits,
+            "peak_rss_mb": self.peak_rss_mb,
+            "rss_start_mb": self.rss_start_mb,
+            "rss_end_mb": self.rss_end_mb,
+            "rss_growth_mb": self.rss_growth_mb,
+            "top_alloc_sites": self.top_alloc_sites,
+        }
+
+
+@dataclass
+class RunMetrics:
+    run_id: str
+    tables: dict[str, TableMetrics] = field(default_factory=dict)
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat(timespec="seconds"))
+    current_table: str | None = None
+    memory_events: list[dict[str, Any]] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def start_tracemalloc(self, frames: int = TRACEMALLOC_FRAMES) -> bool:
+        """Start tracemalloc when ``ETL_TRACEMALLOC`` asks for it; returns whether it is tracing."""
+        if frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return tracemalloc.is_tracing()
+
+    def table(self, name: str) -> TableMetrics:
+        with self._lock:
+            item = self.tables.get(name)
+            if item is None:
+                item = self.tables[name] = TableMetrics(table=name)
+            return item
+
+    @contextmanager
+    def track_table(self, name: str, block: int | None = None) -> Iterator[TableMetrics]:
+        item = self.table(name)
+        item.block = block
+        previous = self.current_table
+        self.current_table = name
+        if item.rss_start_mb is None:
+            item.rss_start_mb = current_rss_mb()
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        started = time.monotonic()
+        try:
+            yield item
+        finally:
+            item.wall_seconds += time.monotonic() - started
+            item.peak_rss_mb = peak_rss_mb()
+            item.rss_end_mb = current_rss_mb()
+            if snapshot is not None and tracemalloc.is_tracing():
+                item.top_alloc_sites = allocation_growth(snapshot)
+            self.current_table = previous
+
+    def _target(self, table: str | None) -> TableMetrics | None:
+        name = table or self.current_table
+        return self.table(name) if name else None
+
+    def add_extract(self, seconds: float, rows: int, table: str | None = None) -> None:
+        item = self._target(table)
+        if item is not None:
+            item.extract_seconds += seconds
+            item.rows_read += rows
+
+    def add_load(self, table: str, seconds: float, nbytes: int = 0, batches: int = 1, retry_splits: int = 0) -> None:
+        item = self.table(table)
+        item.load_seconds += seconds
+        item.bytes_sent += nbytes
+        item.batches += batches
+        item.retry_splits += retry_splits
+
+    def add_self_ref(self, table: str, seconds: float, nbytes: int = 0) -> None:
+        item = self.table(table)
+        item.self_ref_seconds += seconds
+        item.bytes_sent += nbytes
+
+    def set_result(self, table: str, ok: int, err: int) -> None:
+        item = self.table(table)
+        item.rows_ok = ok
+        item.rows_err = err
+
+    def record_memory_event(self, kind: str, **details: Any) -> dict[str, Any]:
+        event = {
+            "kind": kind,
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "table": self.current_table,
+            "rss_mb": current_rss_mb(),
+            **details,
+        }
+        with self._lock:
+            self.memory_events.append(event)
+        return event
+
+    def block_summary(self) -> dict[str, dict[str, Any]]:
+        """Roll tables up per block: RSS on entry/exit, high-water mark and the table that grew the most."""
+        blocks: dict[str, dict[str, Any]] = {}
+        for name, item in self.tables.items():
+            if item.block is None:
+                continue
+            entry = blocks.setdefault(str(item.block), {
+                "tables": [],
+                "wall_seconds": 0.0,
+                "rss_start_mb": item.rss_start_mb,
+                "rss_end_mb": None,
+                "peak_rss_mb": None,
+                "top_growth_table": None,
+            })
+            entry["tables"].append(name)
+            entry["wall_seconds"] = round(entry["wall_seconds"] + item.wall_seconds, 3)
+            if item.rss_end_mb is not None:
+                entry["rss_end_mb"] = item.rss_end_mb
+            if item.peak_rss_mb is not None:
+                entry["peak_rss_mb"] = max(entry["peak_rss_mb"] or 0.0, item.peak_rss_mb)
+            growth = item.rss_growth_mb
+            best = entry["top_growth_table"]
+            if growth is not None and (best is None or growth > self.tables[best].rss_growth_mb):
+                entry["top_growth_table"] = name
+        for entry in blocks.values():
+            start, end = entry["rss_start_mb"], entry["rss_end_mb"]
+            entry["rss_growth_mb"] = round(end - start, 1) if start is not None and end is not None else None
+        return blocks
+
+    def to_dict(self, total_seconds: float | None = None, status: str | None = None) -> dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "status": status,
+            "total_seconds": round(total_seconds, 3) if total_seconds is not None else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "tables": {name: item.as_dict() for name, item in self.tables.items()},
+            "blocks": self.block_summary(),
+            "memory_events": self.memory_events,
+        }
+
+    def write(
+        self,
+        total_seconds: float | None = None,
+        status: str | None = None,
+        json_path: Path | None = None,
+        prom_path: Path | None = None,
+    ) -> dict[str, Any]:
+        payload = self.to_dict(total_seconds=total_seconds, status=status)
+        target_json = json_path or PROFILE_JSON_PATH
+        target_prom = prom_path or PROFILE_PROM_PATH
+        target_json.parent.mkdir(parents=True, exist_ok=True)
+        target_json.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        target_prom.parent.mkdir(parents=True, exist_ok=True)
+        target_prom.write_text(render_prometheus(payload), encoding="utf-8")
+        return payload
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def render_prometheus(profile: dict[str, Any]) -> str:
+    """Render a profile as Prometheus text exposition format (gauges)."""
+    run_id = _label(profile.get("run_id") or "")
+    lines: list[str] = []
+
+    def _metric(name: str, help_text: str, samples: list[tuple[dict[str, Any], Any]]) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            if value is None:
+                continue
+            rendered = ",".join(f'{k}="{_label(v)}"' for k, v in {"run_id": run_id, **labels}.items())
+            lines.append(f"{name}{{{rendered}}} {value}")
+
+    tables = profile.get("tables") or {}
+    _metric(
+        "etl_table_stage_seconds",
+        "Seconds spent per ETL stage and table.",
+        [
+            ({"table": t, "stage": stage}, m.get(f"{stage}_seconds"))
+            for t, m in tables.items()
+            for stage in STAGES
+        ],
+    )
+    _metric(
+        "etl_table_rows",
+        "Rows processed per table and outcome.",
+        [({"table": t, "outcome": "ok"}, m.get("rows_ok")) for t, m in tables.items()]
+        + [({"table": t, "outcome": "err"}, m.get("rows_err")) for t, m in tables.items()],
+    )
+    for key, help_text in (
+        ("rows_per_second", "Rows per second over the table wall time."),
+        ("bytes_sent", "Bytes of SQL sent to Postgres."),
+        ("batches", "Insert round-trips sent to Postgres."),
+        ("retry_splits", "Batches split after a rejection."),
+        ("peak_rss_mb", "Process RSS high-water mark after the table (MiB)."),
+        ("rss_growth_mb", "RSS growth between table start and end (MiB)."),
+    ):
+        _metric(f"etl_table_{key}", help_text, [({"table": t}, m.get(key)) for t, m in tables.items()])
+    blocks = profile.get("blocks") or {}
+    _metric(
+        "etl_block_peak_rss_mb",
+        "Process RSS high-water mark at the end of the block (MiB).",
+        [({"block": b}, m.get("peak_rss_mb")) for b, m in blocks.items()],
+    )
+    _metric("etl_run_seconds", "Total ETL wall time.", [({}, profile.get("total_seconds"))])
+    _metric("etl_run_peak_rss_mb", "Process RSS high-water mark (MiB).", [({}, profile.get("peak_rss_mb"))])
+    return "\n".join(lines) + "\n"
+
+
+def load_profile(path: str | Path) -> dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare_profiles(
+    old: dict[str, Any],
+    new: dict[str, Any],
+    threshold_pct: float = 20.0,
+    min_seconds: float = 1.0,
+) -> list[dict[str, Any]]:
+    """Diff two profiles table by table.
+
+    A metric is flagged as a regression when it gets worse by more than
+    ``threshold_pct`` percent. Second-based metrics below ``min_seconds`` in both
+    runs are ignored to keep noise out of the report.
+    """
+    rows: list[dict[str, Any]] = []
+    old_tables = old.get("tables") or {}
+    new_tables = new.get("tables") or {}
+    for table in sorted(set(old_tables) | set(new_tables)):
+        before = old_tables.get(table)
+        after = new_tables.get(table)
+        if before is None or after is None:
+            rows.append({"table": table, "metric": "presence", "old": before is not None, "new": after is not None,
+                         "delta_pct": None, "regression": False})
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS:
+            a, b = before.get(metric), after.get(metric)
+            if a is None or b is None:
+                continue
+            if metric.endswith("_seconds") and max(a, b) < min_seconds:
+                continue
+            delta_pct = ((b - a) / a * 100.0) if a else (0.0 if b == a else float("inf"))
+            worse = delta_pct > threshold_pct if higher_is_worse else delta_pct < -threshold_pct
+            rows.append({
+                "table": table,
+                "metric": metric,
+                "old": a,
+                "new": b,
+                "delta_pct": round(delta_pct, 1) if delta_pct != float("inf") else None,
+                "regression": bool(worse),
+            })
+    return rows
+
+
+def _format_comparison(rows: list[dict[str, Any]], only_changes: bool) -> str:
+    lines = [f"{'table':<36} {'metric':<18} {'old':>12} {'new':>12} {'delta':>8}"]
+    for row in rows:
+        if only_changes and not row["regression"] and (row["delta_pct"] in (None, 0.0)):
+            continue
+        delta = "n/a" if row["delta_pct"] is None else f"{row['delta_pct']:+.1f}%"
+        flag = "  << REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['table']:<36} {row['metric']:<18} {row['old']!s:>12} {row['new']!s:>12} {delta:>8}{flag}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ETL run profile tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmp_parser = sub.add_parser("compare", help="Diff two etl_profile.json files")
+    cmp_parser.add_argument("old", help="Baseline profile (e.g. last night)")
+    cmp_parser.add_argument("new", help="Profile to check")
+    cmp_parser.add_argument("--threshold", type=float, default=20.0, help="Regression threshold in percent")
+    cmp_parser.add_argument("--min-seconds", type=float, default=1.0, help="Ignore stages shorter than this")
+    cmp_parser.add_argument("--all", action="store_true", help="Show unchanged metrics too")
+    cmp_parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 when a regression is found")
+    args = parser.parse_args()
+
+    rows = compare_profiles(
+        load_profile(args.old),
+        load_profile(args.new),
+        threshold_pct=args.threshold,
+        min_seconds=args.min_seconds,
+    )
+    print(_format_comparison(rows, only_changes=not args.all))
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(regressions)} regression(s) above {args.threshold:.0f}%")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Opt-in per-table profiler for etl/run.py.
+
+Set ``ETL_PROFILE`` to turn it on:
+
+- ``sample`` (or ``1``): a background thread samples the ETL thread's stack
+  every ``ETL_PROFILE_INTERVAL_MS`` (default 10 ms). Overhead stays in the
+  low single-digit percent, so it can run on a production night.
+- ``cprofile``: same sampler plus cProfile (deterministic, 1.5-2x slower on
+  the transform loop). Use it for a focused investigation, not weekly.
+
+For each table the profiler writes into ``logs/profile/``:
+
+- ``<table>.collapsed``: collapsed stacks (``a;b;c count``), ready for
+  flamegraph.pl or speedscope;
+- ``<table>.top.txt``: the top-N hot functions (self and inclusive samples);
+- ``<table>.pstats``: cProfile stats (``cprofile`` mode only), readable with
+  ``python -m pstats``.
+
+``summary.json`` indexes every table with its hottest functions.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from types import FrameType
+from typing import Any, Iterator
+
+LOGS_DIR = Path(os.getenv("LOGS_DIR", "./logs"))
+PROFILE_DIR = Path(os.getenv("ETL_PROFILE_DIR", str(LOGS_DIR / "profile")))
+SAMPLE_INTERVAL_MS = float(os.getenv("ETL_PROFILE_INTERVAL_MS", "10"))
+TOP_N = int(os.getenv("ETL_PROFILE_TOP", "30"))
+MAX_STACK_DEPTH = 128
+
+MODES = ("off", "sample", "cprofile")
+_MODE_ALIASES = {"": "off", "0": "off", "false": "off", "no": "off", "1": "sample", "true": "sample", "yes": "sample"}
+
+
+def resolve_mode(raw: str | None) -> str:
+    """Normalize ``ETL_PROFILE`` to one of ``MODES`` (unknown values disable it)."""
+    value = (raw or "").strip().lower()
+    value = _MODE_ALIASES.get(value, value)
+    return value if value in MODES else "off"
+
+
+def frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def stack_of(frame: FrameType | None, stop_at: FrameType | None = None) -> tuple[str, ...]:
+    """Stack root→leaf, cut at ``stop_at`` so every sample starts at the table processor."""
+    labels: list[str] = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(frame_label(frame))
+        if frame is stop_at:
+            break
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a daemon thread via ``sys._current_frames``."""
+
+    def __init__(self, thread_id: int, interval_s: float, stop_at: FrameType | None = None):
+        self.thread_id = thread_id
+        self.interval_s = max(0.001, interval_s)
+        self.stop_at = stop_at
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[stack_of(frame, self.stop_at)] += 1
+            self.samples += 1
+            del frame
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="etl-profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def render_collapsed(stacks: Counter[tuple[str, ...]]) -> str:
+    lines = [f"{';'.join(stack)} {count}" for stack, count in stacks.most_common() if stack]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def hot_functions(stacks: Counter[tuple[str, ...]], top_n: int = TOP_N) -> list[dict[str, Any]]:
+    """Top functions by self samples (leaf), with inclusive samples (anywhere in the stack)."""
+    total = sum(stacks.values())
+    self_counts: Counter[str] = Counter()
+    incl_counts: Counter[str] = Counter()
+    for stack, count in stacks.items():
+        if not stack:
+            continue
+        self_counts[stack[-1]] += count
+        for label in set(stack):
+            incl_counts[label] += count
+    result = []
+    for label, count in self_counts.most_common(top_n):
+        result.append(
+            {
+                "function": label,
+                "self_samples": count,
+                "self_pct": round(100.0 * count / total, 1) if total else 0.0,
+                "inclusive_samples": incl_counts[label],
+                "inclusive_pct": round(100.0 * incl_counts[label] / total, 1) if total else 0.0,
+            }
+        )
+    return result
+
+
+def _format_top(table: str, wall_seconds: float, samples: int, hot: list[dict[str, Any]], pstats_text: str) -> str:
+    out = [f"# {table}: {wall_seconds:.1f}s, {samples:,} amostras"]
+    out.append(f"{'self%':>6} {'incl%':>6} {'self':>7}  função")
+    for item in hot:
+        out.append(
+            f"{item['self_pct']:>6.1f} {item['inclusive_pct']:>6.1f} {item['self_samples']:>7}  {item['function']}"
+        )
+    if pstats_text:
+        out.append("")
+        out.append("# cProfile (tottime)")
+        out.append(pstats_text.rstrip())
+    return "\n".join(out) + "\n"
+
+
+def _safe_name(table: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", table) or "table"
+
+
+@dataclass
+class TableProfile:
+    table: str
+    wall_seconds: float
+    samples: int
+    files: dict[str, str]
+    hot: list[dict[str, Any]]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "wall_seconds": round(self.wall_seconds, 3),
+            "samples": self.samples,
+            "files": self.files,
+            "hot": self.hot[:10],
+        }
+
+
+@dataclass
+class EtlProfiler:
+    mode: str = "off"
+    out_dir: Path = PROFILE_DIR
+    interval_ms: float = SAMPLE_INTERVAL_MS
+    top_n: int = TOP_N
+    run_id: str = ""
+    tables: dict[str, TableProfile] = field(default_factory=dict)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @contextmanager
+    def profile_table(self, table: str) -> Iterator[None]:
+        """Profile one table processor; no-op when the profiler is off."""
+        if not self.enabled:
+            yield
+            return
+
+        caller = sys._getframe(2)  # frame do run_etl (acima do contextmanager)
+        sampler = StackSampler(threading.get_ident(), self.interval_ms / 1000.0, stop_at=caller)
+        profiler = cProfile.Profile() if self.mode == "cprofile" else None
+        started = time.monotonic()
+        sampler.start()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            sampler.stop()
+            self._write_table(table, time.monotonic() - started, sampler, profiler)
+
+    def _write_table(
+        self,
+        table: str,
+        wall_seconds: float,
+        sampler: StackSampler,
+        profiler: cProfile.Profile | None,
+    ) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        base = _safe_name(table)
+        files: dict[str, str] = {}
+
+        collapsed_path = self.out_dir / f"{base}.collapsed"
+        collapsed_path.write_text(render_collapsed(sampler.stacks), encoding="utf-8")
+        files["collapsed"] = collapsed_path.name
+
+        pstats_text = ""
+        if profiler is not None:
+            pstats_path = self.out_dir / f"{base}.pstats"
+            profiler.dump_stats(str(pstats_path))
+            files["pstats"] = pstats_path.name
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).strip_dirs().sort_stats("tottime").print_stats(self.top_n)
+            pstats_text = buf.getvalue()
+
+        hot = hot_functions(sampler.stacks, self.top_n)
+        top_path = self.out_dir / f"{base}.top.txt"
+        top_path.write_text(_format_top(table, wall_seconds, sampler.samples, hot, pstats_text), encoding="utf-8")
+        files["top"] = top_path.name
+
+        previous = self.tables.get(table)
+        if previous is not None:
+            wall_seconds += previous.wall_seconds
+        self.tables[table] = TableProfile(table, wall_seconds, sampler.samples, files, hot)
+
+    def write_summary(self) -> Path | None:
+        if not self.enabled or not self.tables:
+            return None
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "run_id": self.run_id,
+            "mode": self.mode,
+            "interval_ms": self.interval_ms,
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "tables": {name: item.as_dict() for name, item in self.tables.items()},
+        }
+        path = self.out_dir / "summary.json"
+        path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+
+def profiler_from_env(run_id: str = "") -> EtlProfiler:
+    return EtlProfiler(mode=resolve_mode(os.getenv("ETL_PROFILE")), run_id=run_id)
@@ -1,22 +1,57 @@
 #!/usr/bin/env python3
-"""Probe and download backup files from the configured remote source."""
+"""Probe and download backup files from the configured remote source.
+
+Large files are downloaded in ``BACKUP_DOWNLOAD_SEGMENTS`` byte ranges over
+parallel connections (FTP/FTPS: ``REST`` + ``RETR`` aborted at the end of the
+range; SFTP: one SSH session per range with paramiko prefetch), written with
+positional writes into a preallocated ``<file>.part``. Per-segment progress is
+kept in ``<file>.segments.json``, so a failed download resumes each range where
+it stopped.
+
+Everything for one run goes through a ``BackupSession``: a single
+authenticated connection reused for listing, SIZE/stat and the sequential
+download, with keepalive and backoff reconnects (only the parallel ranges
+open their own connections).
+
+``stream_backup`` is the streaming alternative: one sequential connection
+whose bytes go through a ``DumpTee`` (local copy + SHA-256 on the fly)
+straight into the consumer, e.g. ``import_dump.import_dump_stream``.
+
+The local retention cache is kept compressed (``BACKUP_CACHE_CODEC``, zstd by
+default, gzip without ``zstandard``): a plain ``.sql`` becomes ``.sql.zst``
+with a ``.sha256`` sidecar holding the hash of the uncompressed content.
+Dumps that arrive compressed (``.gz``/``.zst``/``.xz``) are cached as-is.
+"""
 
 from __future__ import annotations
 
 import argparse
 import base64
 import ftplib
+import hashlib
+import itertools
+import json
 import logging
 import os
 import re
 import sys
 import tempfile
-from dataclasses import dataclass
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
 
 from dotenv import load_dotenv
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts import dump_codec  # noqa: E402
+
 try:
     import paramiko
 
@@ -27,6 +62,7 @@ except ImportError:
 load_dotenv()
 
 ALLOWED_PROTOCOLS = {"ftp", "ftps", "sftp"}
+SEGMENT_STATE_SAVE_BYTES = 8 * 1024 * 1024
 
 logging.basicConfig(
     level=logging.INFO,
@@ -82,6 +118,12 @@ class BackupConfig:
     ftp_timeout: int
     ftp_retries: int
     ftp_blocksize: int
+    download_segments: int = 4
+    min_segment_bytes: int = 32 * 1024 * 1024
+    sftp_prefetch_requests: int = 64
+    cache_codec: str = "zstd"
+    keepalive_s: int = 60
+    reconnect_backoff_s: int = 2
 
     @property
     def date_pattern(self) -> re.Pattern[str]:
@@ -148,6 +190,12 @@ def load_backup_config() -> BackupConfig:
         ftp_timeout=_parse_timeout("BACKUP_FTP_TIMEOUT", default_timeout),
         ftp_retries=_parse_timeout("BACKUP_FTP_RETRIES", 6),
         ftp_blocksize=_parse_timeout("BACKUP_FTP_BLOCKSIZE", 1024 * 1024),
+        download_segments=_parse_timeout("BACKUP_DOWNLOAD_SEGMENTS", 4),
+        min_segment_bytes=_parse_timeout("BACKUP_MIN_SEGMENT_MB", 32) * 1024 * 1024,
+        sftp_prefetch_requests=_parse_timeout("BACKUP_SFTP_PREFETCH_REQUESTS", 64),
+        cache_codec=_clean_env(os.getenv("BACKUP_CACHE_CODEC", "zstd")) or "zstd",
+        keepalive_s=_parse_timeout("BACKUP_KEEPALIVE_S", 60),
+        reconnect_backoff_s=_parse_timeout("BACKUP_RECONNECT_BACKOFF_S", 2),
     )
 
 
@@ -159,6 +207,9 @@ LOCAL_DIR = DEFAULT_CONFIG.local_dir
 BACKUP_RETENTION_DAYS = DEFAULT_CONFIG.retention_days
 DATE_PATTERN = DEFAULT_CONFIG.date_pattern
 
+# Sobras de um download interrompido (ver _SegmentedDownload / DumpTee)
+PARTIAL_SUFFIXES = (".part", ".segments.json")
+
 
 def _normalize_protocol(raw: str) -> str:
     protocol = (raw or "").strip().lower()
@@ -170,11 +221,6 @@ def _normalize_protocol(raw: str) -> str:
     return protocol
 
 
-def _gz_magic_ok(path: Path) -> bool:
-    with open(path, "rb") as handle:
-        return handle.read(2) == b"\x1f\x8b"
-
-
 def _validate_local(path: Path) -> None:
     if not path.exists():
         raise BackupSourceError("invalid_file", f"Downloaded file not found: {path}")
@@ -183,10 +229,76 @@ def _validate_local(path: Path) -> None:
         raise BackupSourceError("invalid_file", f"Downloaded file is empty: {path}")
     log.info("Downloaded size: %d bytes (%.1f MB)", size, size / 1_048_576)
 
-    if path.suffix == ".gz":
-        if not _gz_magic_ok(path):
-            raise BackupSourceError("invalid_file", f"Invalid gzip magic bytes: {path}")
-        log.info("Gzip magic bytes OK.")
+    detected = dump_codec.file_codec(path)
+    expected = dump_codec.codec_for_name(path.name)
+    if expected is not None and detected != expected:
+        raise BackupSourceError("invalid_file", f"Invalid {expected} magic bytes (found {detected}): {path}")
+    if detected != dump_codec.PLAIN:
+        log.info("Compressed dump detected: %s", detected)
+
+
+def _cache_codec(config: BackupConfig) -> str:
+    try:
+        codec = dump_codec.resolve_codec(config.cache_codec)
+    except ValueError as exc:
+        log.warning("BACKUP_CACHE_CODEC inválido (%s). Cache sem compressão.", exc)
+        return dump_codec.PLAIN
+    if codec == "gzip" and (config.cache_codec or "").strip().lower() in ("zstd", "zst"):
+        log.info("zstandard não instalado: cache local em gzip.")
+    return codec
+
+
+def _cache_local(path: Path, config: BackupConfig) -> Path:
+    """Compress a plain download into the retention cache; returns the cached path."""
+    codec = _cache_codec(config)
+    if dump_codec.file_codec(path) != dump_codec.PLAIN or codec == dump_codec.PLAIN:
+        dump_codec.write_sha256_sidecar(path, dump_codec.content_sha256(path))
+        return path
+
+    cached = path.with_name(path.name + dump_codec.SUFFIXES[codec])
+    started = time.monotonic()
+    sha256 = dump_codec.compress_file(path, cached, codec)
+    dump_codec.write_sha256_sidecar(cached, sha256)
+    plain_size = path.stat().st_size
+    path.unlink()
+    log.info(
+        "Local cache: %s (%s, %.1f MB -> %.1f MB in %.1fs)",
+        cached.name,
+        codec,
+        plain_size / 1_048_576,
+        cached.stat().st_size / 1_048_576,
+        time.monotonic() - started,
+    )
+    return cached
+
+
+def _cached_copy(path: Path) -> Path | None:
+    """Finished retention-cache copy of a plain download (any codec), or None.
+
+    _cache_local deletes the plain file after compressing it, so its size can't
+    tell that the dump is already here; the sidecar is written only once the
+    compressed copy is complete and is newer than it.
+    """
+    if dump_codec.codec_for_name(path.name) is not None:
+        return None
+    for suffix in dump_codec.SUFFIXES.values():
+        cached = path.with_name(path.name + suffix)
+        if cached.is_file() and dump_codec.read_sha256_sidecar(cached):
+            return cached
+    return None
+
+
+def dump_sha256(path: Path) -> str:
+    """SHA-256 of the uncompressed dump content (sidecar when fresh, otherwise computed and stored)."""
+    cached = dump_codec.read_sha256_sidecar(path)
+    if cached:
+        return cached
+    value = dump_codec.content_sha256(path)
+    try:
+        dump_codec.write_sha256_sidecar(path, value)
+    except OSError:
+        pass
+    return value
 
 
 def _select_best(
@@ -354,148 +466,738 @@ def _connect_ftp(config: BackupConfig, *, use_tls: bool) -> ftplib.FTP:
     return ftp
 
 
-def _list_sftp_entries(config: BackupConfig) -> list[BackupEntry]:
-    ssh, sftp = _connect_sftp(config)
-    remote_dir = config.remote_dir_for("sftp")
+def _list_sftp_entries(sftp: "paramiko.SFTPClient", remote_dir: str) -> list[BackupEntry]:
     try:
         attrs = sftp.listdir_attr(remote_dir)
-        return [
-            BackupEntry(
-                name=attr.filename,
-                modified_at=datetime.fromtimestamp(attr.st_mtime) if attr.st_mtime else None,
-                size_bytes=int(attr.st_size) if attr.st_size is not None else None,
-            )
-            for attr in attrs
-        ]
     except FileNotFoundError as exc:
         raise BackupSourceError("remote_dir", f"SFTP remote dir not found: {remote_dir}") from exc
-    except OSError as exc:
+    except PermissionError as exc:
         raise BackupSourceError("remote_dir", f"SFTP could not list '{remote_dir}': {exc}") from exc
-    finally:
-        try:
-            sftp.close()
-        finally:
-            ssh.close()
+    return [
+        BackupEntry(
+            name=attr.filename,
+            modified_at=datetime.fromtimestamp(attr.st_mtime) if attr.st_mtime else None,
+            size_bytes=int(attr.st_size) if attr.st_size is not None else None,
+        )
+        for attr in attrs
+    ]
 
 
-def _list_ftp_entries(config: BackupConfig, *, use_tls: bool) -> list[BackupEntry]:
-    ftp = _connect_ftp(config, use_tls=use_tls)
+def _list_ftp_entries(ftp: ftplib.FTP) -> list[BackupEntry]:
+    entries: list[BackupEntry] = []
     try:
-        entries: list[BackupEntry] = []
-        try:
-            for name, facts in ftp.mlsd():
-                modified_at = None
-                if "modify" in facts:
+        for name, facts in ftp.mlsd():
+            modified_at = None
+            if "modify" in facts:
+                try:
+                    modified_at = datetime.strptime(facts["modify"], "%Y%m%d%H%M%S")
+                except ValueError:
+                    modified_at = None
+            size_bytes = None
+            if "size" in facts:
+                try:
+                    size_bytes = int(facts["size"])
+                except (TypeError, ValueError):
+                    size_bytes = None
+            entries.append(BackupEntry(name=name, modified_at=modified_at, size_bytes=size_bytes))
+    except ftplib.error_perm:
+        for name in ftp.nlst():
+            entries.append(BackupEntry(name=name))
+    return entries
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Connection-level failure worth a reconnect (not auth, missing dir/file or a 5xx reply)."""
+    if isinstance(exc, BackupSourceError):
+        return exc.category == "connectivity"
+    if isinstance(exc, (ftplib.error_perm, FileNotFoundError, PermissionError)):
+        return False
+    if HAS_PARAMIKO and isinstance(exc, paramiko.SSHException):
+        return True
+    return isinstance(exc, (OSError, EOFError, ftplib.Error))
+
+
+def _backoff(
+    label: str,
+    config: BackupConfig,
+    attempt: int,
+    phase: str,
+    exc: BaseException,
+    wait: Callable[[float], object] | None = None,
+) -> None:
+    """Log the failure and wait ``reconnect_backoff_s * 2**(attempt-1)`` seconds, capped at 30."""
+    delay = min(config.reconnect_backoff_s * 2 ** (attempt - 1), 30)
+    log.warning(
+        "%s: %s failed (%d/%d): %s - reconnecting in %ds",
+        label,
+        phase,
+        attempt,
+        config.ftp_retries,
+        exc,
+        delay,
+    )
+    if delay:
+        (wait or time.sleep)(delay)
+
+
+class BackupSession:
+    """One authenticated connection to the backup source, reused for listing, SIZE/stat and download.
+
+    The connection is opened lazily and kept until ``close()`` (or the end of
+    the ``with`` block). Only connection-level failures reconnect, with
+    exponential backoff from ``reconnect_backoff_s``; auth, missing dir/file
+    and 5xx replies fail immediately. While the FTP control connection is
+    idle (e.g. during a segmented download, whose ranges use their own
+    connections) a background thread sends ``NOOP`` every ``keepalive_s``;
+    SFTP uses the SSH transport keepalive. Time spent per phase (connect,
+    list, size, download/stream) is kept in ``timings`` and logged on close.
+    """
+
+    def __init__(self, config: BackupConfig | None = None):
+        self.config = config or load_backup_config()
+        self.protocol = _normalize_protocol(self.config.protocol)
+        self.label = self.protocol.upper()
+        self.remote_dir = self.config.remote_dir_for(self.protocol)
+        self.timings: dict[str, float] = {}
+        self.logins = 0
+        self._ftp: ftplib.FTP | None = None
+        self._ssh = None
+        self._sftp = None
+        self._lock = threading.RLock()
+        self._idle_since = time.monotonic()
+        self._stop = threading.Event()
+        self._keepalive: threading.Thread | None = None
+
+    def __enter__(self) -> "BackupSession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def reconnects(self) -> int:
+        return max(self.logins - 1, 0)
+
+    def report(self) -> dict:
+        return {
+            "protocol": self.protocol,
+            "logins": self.logins,
+            "reconnects": self.reconnects,
+            "timings_s": {phase: round(seconds, 3) for phase, seconds in self.timings.items()},
+        }
+
+    def _add_timing(self, phase: str, seconds: float) -> None:
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def remote_path(self, filename: str) -> str:
+        return f"{self.remote_dir.rstrip('/')}/{filename}"
+
+    # -- conexão -----------------------------------------------------------------
+
+    def _connection(self):
+        if self.protocol == "sftp":
+            if self._sftp is None:
+                started = time.monotonic()
+                self._ssh, self._sftp = _connect_sftp(self.config)
+                transport = self._ssh.get_transport()
+                if transport is not None:
+                    transport.set_keepalive(self.config.keepalive_s)
+                self.logins += 1
+                self._add_timing("connect", time.monotonic() - started)
+            return self._sftp
+
+        if self._ftp is None:
+            started = time.monotonic()
+            self._ftp = _connect_ftp(self.config, use_tls=self.protocol == "ftps")
+            self.logins += 1
+            self._add_timing("connect", time.monotonic() - started)
+            self._idle_since = time.monotonic()
+            if self._keepalive is None:
+                self._keepalive = threading.Thread(target=self._keepalive_loop, name="ftp-keepalive", daemon=True)
+                self._keepalive.start()
+        return self._ftp
+
+    def _drop(self) -> None:
+        """Discard the current connection without a graceful QUIT (it may be mid-transfer or dead)."""
+        with self._lock:
+            ftp, self._ftp = self._ftp, None
+            sftp, ssh = self._sftp, self._ssh
+            self._sftp = self._ssh = None
+        for handle in (ftp, sftp, ssh):
+            if handle is None:
+                continue
+            try:
+                handle.close()
+            except Exception:
+                pass
+
+    def _keepalive_loop(self) -> None:
+        interval = self.config.keepalive_s
+        while not self._stop.wait(interval):
+            if not self._lock.acquire(blocking=False):
+                continue  # conexão em uso (transferência no próprio controle)
+            try:
+                if self._ftp is not None and time.monotonic() - self._idle_since >= interval:
+                    self._ftp.voidcmd("NOOP")
+                    self._idle_since = time.monotonic()
+            except Exception as exc:
+                log.info("%s: keepalive failed (%s); reconnecting on next use", self.label, exc)
+                self._drop()
+            finally:
+                self._lock.release()
+
+    def _backoff(self, attempt: int, phase: str, exc: BaseException) -> None:
+        _backoff(self.label, self.config, attempt, phase, exc)
+
+    def _call(self, phase: str, op: Callable[[object], object]):
+        """Run ``op(connection)``, reconnecting with backoff on connection-level failures."""
+        for attempt in range(1, self.config.ftp_retries + 1):
+            with self._lock:
+                try:
+                    connection = self._connection()
+                    started = time.monotonic()
                     try:
-                        modified_at = datetime.strptime(facts["modify"], "%Y%m%d%H%M%S")
-                    except ValueError:
-                        modified_at = None
-                size_bytes = None
-                if "size" in facts:
+                        return op(connection)
+                    finally:
+                        self._add_timing(phase, time.monotonic() - started)
+                        self._idle_since = time.monotonic()
+                except Exception as exc:
+                    if not _is_transient(exc):
+                        raise
+                    self._drop()
+                    if attempt >= self.config.ftp_retries:
+                        raise BackupSourceError("connectivity", f"{self.label} {phase} failed: {exc}") from exc
+                    error = exc
+            self._backoff(attempt, phase, error)
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        with self._lock:
+            ftp, self._ftp = self._ftp, None
+        if ftp is not None:
+            try:
+                ftp.quit()
+            except Exception:
+                try:
+                    ftp.close()
+                except Exception:
+                    pass
+        self._drop()
+        if self.logins:
+            log.info(
+                "%s session: logins=%d reconnects=%d %s",
+                self.label,
+                self.logins,
+                self.reconnects,
+                " ".join(f"{phase}={seconds:.1f}s" for phase, seconds in self.timings.items()),
+            )
+
+    # -- operações ---------------------------------------------------------------
+
+    def list_entries(self) -> list[BackupEntry]:
+        if self.protocol == "sftp":
+            return self._call("list", lambda sftp: _list_sftp_entries(sftp, self.remote_dir))
+        return self._call("list", _list_ftp_entries)
+
+    def size(self, filename: str) -> int | None:
+        """Remote size in bytes (None when the FTP server has no SIZE)."""
+        if self.protocol == "sftp":
+            def _stat(sftp) -> int:
+                try:
+                    return int(sftp.stat(self.remote_path(filename)).st_size or 0)
+                except FileNotFoundError as exc:
+                    raise BackupSourceError("invalid_file", f"SFTP file not found: {self.remote_path(filename)}") from exc
+
+            return self._call("size", _stat)
+
+        def _size(ftp: ftplib.FTP) -> int | None:
+            try:
+                ftp.voidcmd("TYPE I")
+                value = ftp.size(filename)
+            except ftplib.error_perm:
+                return None
+            return int(value) if value is not None else None
+
+        return self._call("size", _size)
+
+    def _read_ftp(self, ftp: ftplib.FTP, filename: str, offset: int, size: int | None) -> Iterator[bytes]:
+        ftp.voidcmd("TYPE I")
+        conn = ftp.transfercmd(f"RETR {filename}", rest=offset or None)
+        received = offset
+        try:
+            while True:
+                data = conn.recv(self.config.ftp_blocksize)
+                if not data:
+                    break
+                received += len(data)
+                yield data
+        finally:
+            conn.close()
+        try:
+            ftp.voidresp()  # 226: transferência completa, não só socket fechado
+        except (OSError, EOFError, ftplib.error_temp, ftplib.error_reply) as exc:
+            if size is None or received != size:
+                raise
+            # Servidores que derrubam o controle ocioso durante RETR longo: os bytes estão todos aqui.
+            log.warning("%s: control connection lost after a complete transfer (%s)", self.label, exc)
+            self._drop()
+
+    def _read_sftp(self, sftp, filename: str, offset: int) -> Iterator[bytes]:
+        with sftp.open(self.remote_path(filename), "rb") as handle:
+            handle.seek(offset)
+            handle.prefetch(None, self.config.sftp_prefetch_requests)
+            while True:
+                data = handle.read(self.config.ftp_blocksize)
+                if not data:
+                    break
+                yield data
+
+    def iter_file(self, filename: str, *, offset: int = 0, size: int | None = None, phase: str = "stream") -> Iterator[bytes]:
+        """Sequential bytes of the remote file from ``offset``; reconnects and continues where it stopped."""
+        for attempt in range(1, self.config.ftp_retries + 1):
+            done = False
+            started = time.monotonic()
+            try:
+                with self._lock:
+                    connection = self._connection()
+                    if self.protocol == "sftp":
+                        reader = self._read_sftp(connection, filename, offset)
+                    else:
+                        reader = self._read_ftp(connection, filename, offset, size)
                     try:
-                        size_bytes = int(facts["size"])
-                    except (TypeError, ValueError):
-                        size_bytes = None
-                entries.append(BackupEntry(name=name, modified_at=modified_at, size_bytes=size_bytes))
-        except ftplib.error_perm:
-            for name in ftp.nlst():
-                entries.append(BackupEntry(name=name))
-        return entries
-    finally:
+                        for chunk in reader:
+                            offset += len(chunk)
+                            yield chunk
+                        done = True
+                    finally:
+                        reader.close()
+                        self._add_timing(phase, time.monotonic() - started)
+                        self._idle_since = time.monotonic()
+                        if not done:
+                            self._drop()  # transferência pela metade: o controle não é mais reaproveitável
+                return
+            except (ftplib.error_perm, FileNotFoundError) as exc:
+                raise BackupSourceError("invalid_file", f"{self.label} could not read {filename}: {exc}") from exc
+            except Exception as exc:
+                if not _is_transient(exc):
+                    raise
+                if attempt >= self.config.ftp_retries:
+                    raise BackupSourceError("connectivity", f"{self.label} {phase} failed at {offset} bytes: {exc}") from exc
+                self._backoff(attempt, f"{phase} at {offset} bytes", exc)
+
+    def retrieve(self, filename: str, local_path: Path, size: int | None) -> Path:
+        """Download to ``local_path`` over the session connection, resuming a partial local file."""
         try:
-            ftp.quit()
-        except Exception:
-            ftp.close()
+            offset = local_path.stat().st_size
+        except FileNotFoundError:
+            offset = 0
+        if size is not None and offset > size:
+            log.warning("Local file is larger than remote. Restarting download: %s", local_path)
+            local_path.unlink(missing_ok=True)
+            offset = 0
+        if size is not None and offset == size:
+            log.info("%s: %s already downloaded (%d bytes)", self.label, local_path, size)
+            return local_path
+
+        if offset:
+            log.info("%s: resuming %s at %d bytes", self.label, filename, offset)
+        else:
+            log.info("%s: downloading %s -> %s", self.label, self.remote_path(filename), local_path)
+        with open(local_path, "ab" if offset else "wb") as handle:
+            for chunk in self.iter_file(filename, offset=offset, size=size, phase="download"):
+                handle.write(chunk)
+        return local_path
 
 
-def _fetch_sftp_file(config: BackupConfig, filename: str, dest_dir: Path) -> Path:
-    ssh, sftp = _connect_sftp(config)
-    remote_dir = config.remote_dir_for("sftp")
-    local_path = dest_dir / filename
-    remote_path = f"{remote_dir.rstrip('/')}/{filename}"
+@dataclass
+class _Segment:
+    index: int
+    start: int
+    end: int  # exclusivo
+    done: int = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.end - self.start - self.done
+
+    @property
+    def position(self) -> int:
+        return self.start + self.done
+
+
+def _plan_segments(size: int, config: BackupConfig) -> list[_Segment]:
+    """Split ``size`` bytes into up to ``download_segments`` ranges; [] means single stream."""
+    count = min(config.download_segments, size // max(config.min_segment_bytes, 1))
+    if count <= 1:
+        return []
+    step = -(-size // count)
+    return [_Segment(index, start, min(start + step, size)) for index, start in enumerate(range(0, size, step))]
+
+
+def _load_segment_state(state_path: Path, filename: str, size: int) -> list[_Segment]:
     try:
-        log.info("SFTP: downloading %s -> %s", remote_path, local_path)
-        sftp.get(remote_path, str(local_path))
-        return local_path
-    except FileNotFoundError as exc:
-        raise BackupSourceError("invalid_file", f"SFTP file not found: {remote_path}") from exc
-    except OSError as exc:
-        raise BackupSourceError("connectivity", f"SFTP download failed: {exc}") from exc
-    finally:
+        payload = json.loads(state_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    if not isinstance(payload, dict) or payload.get("filename") != filename or payload.get("size") != size:
+        return []
+    try:
+        segments = [
+            _Segment(int(item["index"]), int(item["start"]), int(item["end"]), int(item["done"]))
+            for item in payload.get("segments") or []
+        ]
+    except (KeyError, TypeError, ValueError):
+        return []
+    covered = sum(segment.end - segment.start for segment in segments)
+    if covered != size or any(segment.remaining < 0 for segment in segments):
+        return []
+    return segments
+
+
+def _preallocate(fd: int, size: int) -> None:
+    if os.fstat(fd).st_size == size:
+        return
+    os.ftruncate(fd, size)
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass  # filesystem sem suporte: o ftruncate já basta
+
+
+@dataclass
+class _SegmentedDownload:
+    """Shared state of a ranged download: the .part descriptor and per-segment progress."""
+
+    filename: str
+    local_path: Path
+    size: int
+    segments: list[_Segment]
+    label: str
+    config: BackupConfig
+    _fd: int = field(default=-1, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _unsaved: int = field(default=0, repr=False)
+    _failed: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def part_path(self) -> Path:
+        return self.local_path.with_name(self.local_path.name + ".part")
+
+    @property
+    def state_path(self) -> Path:
+        return self.local_path.with_name(self.local_path.name + ".segments.json")
+
+    def write(self, segment: _Segment, data: bytes) -> None:
+        if self._failed.is_set():
+            raise BackupSourceError("connectivity", f"{self.label}: another segment failed")
+        if hasattr(os, "pwrite"):
+            os.pwrite(self._fd, data, segment.position)
+        else:
+            with self._lock:
+                os.lseek(self._fd, segment.position, os.SEEK_SET)
+                os.write(self._fd, data)
+        with self._lock:
+            segment.done += len(data)
+            self._unsaved += len(data)
+            if self._unsaved >= SEGMENT_STATE_SAVE_BYTES:
+                self._save_state()
+
+    def _save_state(self) -> None:
+        payload = {
+            "filename": self.filename,
+            "size": self.size,
+            "segments": [
+                {"index": s.index, "start": s.start, "end": s.end, "done": s.done} for s in self.segments
+            ],
+        }
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp.write_text(json.dumps(payload) + "\n", encoding="utf-8")
+        os.replace(tmp, self.state_path)
+        self._unsaved = 0
+
+    def _run_segment(self, segment: _Segment, read_range: Callable[[_Segment, "_SegmentedDownload"], None]) -> None:
+        retries = self.config.ftp_retries
+        for attempt in range(1, retries + 1):
+            if segment.remaining <= 0 or self._failed.is_set():
+                return
+            try:
+                read_range(segment, self)
+                if segment.remaining > 0:
+                    raise ConnectionError(f"stream ended {segment.remaining} bytes before the end of the segment")
+                return
+            except Exception as exc:
+                if self._failed.is_set():
+                    return
+                if attempt >= retries:
+                    self._failed.set()
+                    raise BackupSourceError(
+                        "connectivity", f"{self.label} download failed on segment {segment.index}: {exc}"
+                    ) from exc
+                # Mesmo backoff da sessão; acorda antes se outro segmento já desistiu.
+                phase = f"segment {segment.index} at {segment.position}"
+                _backoff(self.label, self.config, attempt, phase, exc, wait=self._failed.wait)
+
+    def run(self, read_range: Callable[[_Segment, "_SegmentedDownload"], None]) -> Path:
+        resumed = sum(segment.done for segment in self.segments)
+        log.info(
+            "%s: downloading %s in %d segments (%.1f MB%s)",
+            self.label,
+            self.filename,
+            len(self.segments),
+            self.size / 1_048_576,
+            f", resuming {resumed / 1_048_576:.1f} MB already on disk" if resumed else "",
+        )
+        started = time.monotonic()
+        self._fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
         try:
-            sftp.close()
+            _preallocate(self._fd, self.size)
+            with self._lock:
+                self._save_state()
+            pending = [segment for segment in self.segments if segment.remaining > 0]
+            with ThreadPoolExecutor(max_workers=max(len(pending), 1), thread_name_prefix="segment") as pool:
+                futures = [pool.submit(self._run_segment, segment, read_range) for segment in pending]
+            errors = [future.exception() for future in futures if future.exception() is not None]
+            with self._lock:
+                self._save_state()
+            if errors:
+                raise errors[0]
+            os.fsync(self._fd)
         finally:
-            ssh.close()
+            os.close(self._fd)
+            self._fd = -1
+
+        os.replace(self.part_path, self.local_path)
+        self.state_path.unlink(missing_ok=True)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        log.info(
+            "%s: %s complete in %.1fs (%.1f MB/s)",
+            self.label,
+            self.filename,
+            elapsed,
+            (self.size - resumed) / 1_048_576 / elapsed,
+        )
+        return self.local_path
 
 
-def _fetch_ftp_file(config: BackupConfig, filename: str, dest_dir: Path, *, use_tls: bool) -> Path:
-    proto = "FTPS" if use_tls else "FTP"
-    local_path = dest_dir / filename
-    ftp = _connect_ftp(config, use_tls=use_tls)
+def _segmented_download(
+    config: BackupConfig,
+    filename: str,
+    local_path: Path,
+    size: int,
+    *,
+    label: str,
+    read_range: Callable[[_Segment, _SegmentedDownload], None],
+) -> Path:
+    """Ranged download into ``local_path``, resuming from ``<file>.segments.json`` when it matches."""
+    plan = _plan_segments(size, config)
+    download = _SegmentedDownload(
+        filename=filename,
+        local_path=local_path,
+        size=size,
+        segments=plan,
+        label=label,
+        config=config,
+    )
+    if download.part_path.exists() and download.part_path.stat().st_size == size:
+        download.segments = _load_segment_state(download.state_path, filename, size) or plan
+    elif local_path.exists() and local_path.stat().st_size == size and not download.state_path.exists():
+        log.info("%s: %s already downloaded (%d bytes)", label, local_path, size)
+        return local_path
+    return download.run(read_range)
+
 
-    remote_size = None
+def _abandon_ftp(ftp: ftplib.FTP) -> None:
     try:
-        remote_size = ftp.size(filename)
+        ftp.abort()
     except Exception:
-        remote_size = None
-
+        pass
     try:
-        offset = local_path.stat().st_size
-    except FileNotFoundError:
-        offset = 0
+        ftp.close()
+    except Exception:
+        pass
 
-    if remote_size is not None and offset and offset > int(remote_size):
-        log.warning("Local file is larger than remote. Restarting download: %s", local_path)
-        local_path.unlink(missing_ok=True)
-        offset = 0
 
-    for attempt in range(1, config.ftp_retries + 1):
+def _ftp_range_reader(
+    config: BackupConfig, filename: str, *, use_tls: bool
+) -> Callable[[_Segment, _SegmentedDownload], None]:
+    def read_range(segment: _Segment, download: _SegmentedDownload) -> None:
+        ftp = _connect_ftp(config, use_tls=use_tls)
         try:
-            if offset:
-                log.info("%s: resuming at %d bytes (%d/%d)", proto, offset, attempt, config.ftp_retries)
-            mode = "ab" if offset else "wb"
-            with open(local_path, mode) as handle:
-                ftp.retrbinary(
-                    f"RETR {filename}",
-                    handle.write,
-                    blocksize=config.ftp_blocksize,
-                    rest=offset or None,
-                )
-            break
-        except Exception as exc:
-            log.warning("%s: download attempt %d/%d failed (%s)", proto, attempt, config.ftp_retries, exc)
+            ftp.voidcmd("TYPE I")
+            conn = ftp.transfercmd(f"RETR {filename}", rest=segment.position)
             try:
-                ftp.close()
-            except Exception:
-                pass
-            if attempt >= config.ftp_retries:
-                raise BackupSourceError("connectivity", f"{proto} download failed: {exc}") from exc
-            ftp = _connect_ftp(config, use_tls=use_tls)
+                while segment.remaining > 0:
+                    data = conn.recv(min(config.ftp_blocksize, segment.remaining))
+                    if not data:
+                        break
+                    download.write(segment, data)
+            finally:
+                conn.close()
+        finally:
+            # Segmento lido até o fim do range: ABOR no resto da transferência.
+            _abandon_ftp(ftp)
+
+    return read_range
+
+
+def _sftp_range_reader(config: BackupConfig, remote_path: str) -> Callable[[_Segment, _SegmentedDownload], None]:
+    def read_range(segment: _Segment, download: _SegmentedDownload) -> None:
+        ssh, sftp = _connect_sftp(config)
+        try:
+            with sftp.open(remote_path, "rb") as handle:
+                handle.seek(segment.position)
+                handle.prefetch(segment.end, config.sftp_prefetch_requests)
+                while segment.remaining > 0:
+                    data = handle.read(min(config.ftp_blocksize, segment.remaining))
+                    if not data:
+                        break
+                    download.write(segment, data)
+        finally:
             try:
-                offset = local_path.stat().st_size
-            except FileNotFoundError:
-                offset = 0
+                sftp.close()
+            finally:
+                ssh.close()
+
+    return read_range
+
+
+def _fetch_remote_file(session: BackupSession, filename: str, dest_dir: Path) -> Path:
+    """Download ``filename``: parallel ranges when large enough, else over the session connection."""
+    config = session.config
+    local_path = dest_dir / filename
+    size = session.size(filename)
 
+    if size and _plan_segments(size, config):
+        if session.protocol == "sftp":
+            read_range = _sftp_range_reader(config, session.remote_path(filename))
+        else:
+            read_range = _ftp_range_reader(config, filename, use_tls=session.protocol == "ftps")
+        # Os ranges usam conexões próprias; a da sessão fica ociosa (keepalive) para o que vier depois.
+        started = time.monotonic()
+        try:
+            return _segmented_download(config, filename, local_path, size, label=session.label, read_range=read_range)
+        finally:
+            session._add_timing("download", time.monotonic() - started)
+
+    return session.retrieve(filename, local_path, size)
+
+
+class DumpTee:
+    """Iterate the dump bytes once, writing the local copy and its SHA-256 as they pass.
+
+    Consumers receive the bytes exactly as they arrive. A plain dump is cached
+    compressed with ``cache_codec`` while it passes through. The SHA-256 is
+    always computed on the uncompressed content, as in ``dump_sha256``. The
+    copy goes to ``<file>.part`` and is renamed (and ``finalize`` called on it)
+    only after the last chunk, so an interrupted stream never leaves a file
+    that looks complete.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        local_path: Path,
+        finalize: Callable[[Path], None] | None = None,
+        cache_codec: str = dump_codec.PLAIN,
+    ):
+        self.chunks = chunks
+        self.local_path = local_path
+        self.name = local_path.name
+        self.finalize = finalize
+        self.cache_codec = cache_codec
+        self.size = 0
+        self.sha256: str | None = None
+        self.complete = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        head, rest = dump_codec.peek(self.chunks)
+        wire_codec = dump_codec.detect_codec(head)
+        compressor = None
+        content = None
+        if wire_codec == dump_codec.PLAIN and self.cache_codec != dump_codec.PLAIN:
+            compressor = dump_codec.Compressor(self.cache_codec)
+            self.local_path = self.local_path.with_name(self.name + dump_codec.SUFFIXES[self.cache_codec])
+        elif wire_codec != dump_codec.PLAIN:
+            content = dump_codec.Decompressor(wire_codec)  # só para o SHA-256 do conteúdo
+
+        part = self.local_path.with_name(self.local_path.name + ".part")
+        digest = hashlib.sha256()
+        self.size = 0
+        with open(part, "wb") as handle:
+            for chunk in itertools.chain([head], rest):
+                if not chunk:
+                    continue
+                handle.write(compressor.compress(chunk) if compressor else chunk)
+                digest.update(content.decompress(chunk) if content else chunk)
+                self.size += len(chunk)
+                yield chunk
+            if compressor is not None:
+                handle.write(compressor.flush())
+        if content is not None:
+            digest.update(content.finish())
+        os.replace(part, self.local_path)
+        self.sha256 = digest.hexdigest()
+        dump_codec.write_sha256_sidecar(self.local_path, self.sha256)
+        self.complete = True
+        if self.finalize is not None:
+            self.finalize(self.local_path)
+
+
+def _close_after(chunks: Iterator[bytes], session: BackupSession) -> Iterator[bytes]:
     try:
-        ftp.quit()
-    except Exception:
-        ftp.close()
-    return local_path
+        yield from chunks
+    finally:
+        session.close()
+
+
+def stream_backup_file(
+    filename: str,
+    *,
+    config: BackupConfig | None = None,
+    session: BackupSession | None = None,
+) -> DumpTee:
+    """Streaming counterpart of ``download_backup_file``: nothing is read until the tee is iterated."""
+    owned = session is None
+    session = session or BackupSession(config)
+    config = session.config
+    config.local_dir.mkdir(parents=True, exist_ok=True)
+    local_path = config.local_dir / filename
+
+    def _finalize(path: Path) -> None:
+        _validate_local(path)
+        _purge_old_backups(
+            config.retention_days,
+            local_dir=config.local_dir,
+            pattern=config.date_pattern,
+            prefix=config.prefix,
+            extension=config.extension,
+            keep_paths=(path,),
+        )
+
+    chunks = session.iter_file(filename, phase="stream")
+    if owned:
+        chunks = _close_after(chunks, session)
+    log.info("%s: streaming %s (tee -> %s)", session.label, filename, local_path)
+    return DumpTee(chunks, local_path, finalize=_finalize, cache_codec=_cache_codec(config))
 
 
 def probe_backup_source(
     target_date: date | None = None,
     config: BackupConfig | None = None,
+    *,
+    session: BackupSession | None = None,
 ) -> BackupProbeResult:
-    config = config or load_backup_config()
-    protocol = _normalize_protocol(config.protocol)
+    if session is None:
+        with BackupSession(config) as owned:
+            return probe_backup_source(target_date, session=owned)
+    config = session.config
+    protocol = session.protocol
 
-    if protocol == "ftp":
-        entries = _list_ftp_entries(config, use_tls=False)
-    elif protocol == "ftps":
-        entries = _list_ftp_entries(config, use_tls=True)
-    else:
-        entries = _list_sftp_entries(config)
+    entries = session.list_entries()
 
     selected_entry, matched_files = _select_entry(entries, target_date, config)
     if selected_entry.size_bytes is not None and selected_entry.size_bytes <= 0:
@@ -523,6 +1225,17 @@ def probe_backup_source(
     return result
 
 
+def same_remote_file(probe: BackupProbeResult, last_loaded: dict | None) -> bool:
+    """Cheap change check without downloading: same name, size and mtime as the last loaded dump."""
+    if not last_loaded or probe.size_bytes is None or probe.modified_at is None:
+        return False
+    return (
+        probe.selected_file == last_loaded.get("name")
+        and probe.size_bytes == last_loaded.get("remote_size_bytes")
+        and probe.modified_at.isoformat() == last_loaded.get("remote_modified_at")
+    )
+
+
 def _purge_old_backups(
     keep_days: int,
     *,
@@ -532,27 +1245,55 @@ def _purge_old_backups(
     extension: str = EXT,
     keep_paths: tuple[Path, ...] = (),
 ) -> None:
-    """Remove backups locais com data anterior a keep_days dias."""
+    """Remove backups locais com data anterior a keep_days dias.
+
+    Downloads parciais (``.part`` / ``.segments.json``) também saem quando
+    vencidos ou órfãos: o arquivo final já existe, ou um dump mais novo
+    (``keep_paths``) já foi baixado e o parcial nunca mais será retomado.
+    """
     if keep_days <= 0:
         return
     cutoff = date.today()
     removed = 0
     protected = {path.resolve() for path in keep_paths}
-    for path in local_dir.glob(f"{prefix}*{extension}"):
+    protected |= {dump_codec.sidecar_path(path).resolve() for path in keep_paths}
+    kept_dates = [
+        date.fromisoformat(match.group(1))
+        for match in (pattern.match(dump_codec.strip_codec_suffix(path.name)) for path in keep_paths)
+        if match
+    ]
+    newest_kept = max(kept_dates, default=None)
+    for path in local_dir.glob(f"{prefix}*{extension}*"):
         if path.resolve() in protected:
             continue
-        match = pattern.match(path.name)
+        name = path.name
+        partial = name.endswith(PARTIAL_SUFFIXES)
+        for suffix in (dump_codec.SHA256_SIDECAR_SUFFIX, *PARTIAL_SUFFIXES):
+            if name.endswith(suffix):
+                name = name[: -len(suffix)]
+                break
+        match = pattern.match(dump_codec.strip_codec_suffix(name))
         if not match:
             continue
         file_date = date.fromisoformat(match.group(1))
         age = (cutoff - file_date).days
         if age > keep_days:
-            try:
-                path.unlink()
-                log.info("Backup antigo removido (age=%dd): %s", age, path.name)
-                removed += 1
-            except OSError as exc:
-                log.warning("Não foi possível remover %s: %s", path.name, exc)
+            reason = f"age={age}d"
+        elif partial and any(
+            path.with_name(dump_codec.strip_codec_suffix(name) + suffix).exists()
+            for suffix in ("", *dump_codec.SUFFIXES.values())
+        ):
+            reason = "download já concluído"
+        elif partial and newest_kept is not None and file_date < newest_kept:
+            reason = f"órfão, dump de {newest_kept.isoformat()} já baixado"
+        else:
+            continue
+        try:
+            path.unlink()
+            log.info("%s removido (%s): %s", "Download parcial" if partial else "Backup antigo", reason, path.name)
+            removed += 1
+        except OSError as exc:
+            log.warning("Não foi possível remover %s: %s", path.name, exc)
     if removed:
         log.info("Retenção: %d arquivo(s) antigo(s) removido(s) (política: %dd).", removed, keep_days)
 
@@ -561,19 +1302,21 @@ def download_backup_file(
     filename: str,
     *,
     config: BackupConfig | None = None,
+    session: BackupSession | None = None,
 ) -> Path:
-    config = config or load_backup_config()
-    protocol = _normalize_protocol(config.protocol)
+    if session is None:
+        with BackupSession(config) as owned:
+            return download_backup_file(filename, session=owned)
+    config = session.config
     config.local_dir.mkdir(parents=True, exist_ok=True)
 
-    if protocol == "ftp":
-        path = _fetch_ftp_file(config, filename, config.local_dir, use_tls=False)
-    elif protocol == "ftps":
-        path = _fetch_ftp_file(config, filename, config.local_dir, use_tls=True)
+    path = _cached_copy(config.local_dir / filename)
+    if path is not None:
+        log.info("%s: %s already downloaded (cached as %s)", session.label, filename, path.name)
     else:
-        path = _fetch_sftp_file(config, filename, config.local_dir)
-
-    _validate_local(path)
+        path = _fetch_remote_file(session, filename, config.local_dir)
+        _validate_local(path)
+        path = _cache_local(path, config)
     _purge_old_backups(
         config.retention_days,
         local_dir=config.local_dir,
@@ -586,9 +1329,21 @@ def download_backup_file(
 
 
 def fetch_backup(target_date: date | None = None, config: BackupConfig | None = None) -> Path:
-    config = config or load_backup_config()
-    probe = probe_backup_source(target_date=target_date, config=config)
-    return download_backup_file(probe.selected_file, config=config)
+    with BackupSession(config) as session:
+        probe = probe_backup_source(target_date=target_date, session=session)
+        return download_backup_file(probe.selected_file, session=session)
+
+
+def stream_backup(target_date: date | None = None, config: BackupConfig | None = None) -> DumpTee:
+    session = BackupSession(config)
+    try:
+        probe = probe_backup_source(target_date=target_date, session=session)
+    except BaseException:
+        session.close()
+        raise
+    tee = stream_backup_file(probe.selected_file, session=session)
+    tee.chunks = _close_after(tee.chunks, session)
+    return tee
 
 
 def _resolve_target_date(args: argparse.Namespace) -> date | None:
@@ -0,0 +1,656 @@
+#!/usr/bin/env python3
+"""
+generate_synthetic_dump.py — Gera um dump MySQL sintético no formato do legado.
+
+As tabelas e colunas saem do próprio ETL (EXEC_ORDER + COLUMN_MAPPING +
+colunas extras lidas pelos processadores especializados), então o dump
+acompanha o mapping sem manutenção manual. Os volumes de 1× seguem a ordem de
+grandeza do dump de produção (~438 MB) e escalam com --scale (10×, 50×...).
+
+Sujeira injetada em proporções ajustáveis (--dirty chave=proporção):
+  mojibake        texto UTF-8 duplamente codificado ("JoÃ£o")
+  zero_dates      '0000-00-00 00:00:00' em colunas de data
+  orphan_fks      FK apontando para id inexistente
+  duplicate_emails email_log repetido (com variação de caixa)
+  duplicate_slugs chave/slug de categoria repetidos
+  invalid_status  status_id fora de is_extras_status (ou 0)
+  invalid_json    payload JSON truncado
+  nulls           NULL em colunas opcionais
+
+Saída: arquivo .sql (ou .sql.gz) estilo mysqldump + <saída>.json com as
+contagens por tabela e a quantidade de cada sujeira injetada.
+
+Uso:
+  python scripts/generate_synthetic_dump.py --scale 1 --output ./backups/synthetic/nblgrafica_app-synthetic-1x.sql
+  python scripts/generate_synthetic_dump.py --scale 10 --gzip --dirty mojibake=0.05 --dirty orphan_fks=0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import random
+import sys
+import time
+import zlib
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterator, TextIO
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from etl import run as etl_run  # noqa: E402
+
+# ─────────────────────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────────────────────
+SYNTHETIC_DIR = Path(os.getenv("SYNTHETIC_DUMP_DIR", "./backups/synthetic"))
+MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "nblgrafica_app")
+ROWS_PER_INSERT = 500  # mysqldump --extended-insert gera linhas de ~1 MB; 500 fica próximo disso
+
+# Volumes aproximados do dump de produção (1×). PF/PJ e lançamentos batem com
+# VERIFY_MIN_ROWS_BY_TABLE; o resto é ordem de grandeza.
+BASE_ROWS: dict[str, int] = {
+    "is_clientes": 7_610,
+    "is_entregas_balcoes": 12,
+    "is_entregas_fretes": 40,
+    "is_extras_status": 30,
+    "is_financeiro_funcionarios": 60,
+    "is_mkt_regras": 20,
+    "is_producao_setores": 12,
+    "is_produtos": 1_800,
+    "is_produtos_vars_nomes": 150,
+    "is_produtos_categorias": 400,
+    "is_clientes_enderecos": 9_000,
+    "is_mkt_cupons": 600,
+    "is_entregas_fretes_locais": 1_500,
+    "is_produtos_categorias_extras": 2_500,
+    "is_produtos_vars": 9_000,
+    "is_usuarios": 80,
+    "is_usuarios_historico": 60_000,
+    "is_financeiro_lancamentos": 97_985,
+    "is_pedidos": 70_000,
+    "is_pedidos_fretes_detalhes": 30_000,
+    "is_pedidos_fretes_envios": 30_000,
+    "is_pedidos_itens": 140_000,
+    "is_pedidos_pagamentos": 80_000,
+    "is_clientes_extratos": 40_000,
+    "is_pedidos_historico": 300_000,
+    "is_pedidos_itens_reprovados": 3_000,
+    "is_pedidos_pag_reprovados": 2_500,
+}
+
+# Colunas lidas pelos processadores especializados que não estão no mapping.
+EXTRA_SOURCE_COLUMNS: dict[str, list[str]] = {
+    "is_clientes": [
+        "nome", "sobrenome", "nascimento", "cpf", "sexo",
+        "razao_social", "fantasia", "ie", "cnpj",
+        "cep", "logradouro", "numero", "bairro", "complemento", "cidade", "estado",
+    ],
+    "is_mkt_cupons": ["produtos"],
+    "is_pedidos_fretes_envios": ["tipo", "detalhes"],
+}
+
+# Tipos das colunas extras (mesmas regras do mapping quando o nome bate).
+EXTRA_COLUMN_KINDS: dict[str, str] = {
+    "nascimento": "datetime",
+    "produtos": "csv_produtos",
+    "detalhes": "json_frete",
+}
+
+HUMAN_TEXT = {
+    "nome", "sobrenome", "razao_social", "fantasia", "titulo", "descricao", "obs",
+    "obs_interna", "logradouro", "bairro", "cidade", "complemento", "motivo", "acao",
+    "cargo", "descricao_curta", "texto_exibicao", "opcao", "arte_nome",
+}
+LONG_TEXT = {"descricao_html", "obs", "obs_interna", "descricao", "json", "produto_detalhes",
+             "formato_detalhes", "vars_detalhes", "detalhes", "endereco", "conteudo", "meta_description"}
+
+FIRST_NAMES = ["João", "Maria", "José", "Ana", "Antônio", "Francisca", "Luís", "Conceição", "Inês", "Sebastião",
+               "Cícero", "Raimunda", "Fábio", "Lúcia", "Márcio", "Débora", "Vitória", "Ângela"]
+LAST_NAMES = ["Araújo", "Gonçalves", "Conceição", "Simões", "Magalhães", "Ribeiro", "Brandão", "Leitão",
+              "Sá", "Guimarães", "Falcão", "Assunção"]
+CITIES = [("Fortaleza", "CE"), ("Maracanaú", "CE"), ("Caucaia", "CE"), ("Juazeiro do Norte", "CE"),
+          ("São Paulo", "SP"), ("Teresina", "PI"), ("João Pessoa", "PB"), ("Maceió", "AL"), ("Belém", "PA")]
+WORDS = ["cartão", "visita", "adesivo", "lona", "impressão", "acabamento", "laminação", "couché", "promoção",
+         "gráfica", "convite", "panfleto", "etiqueta", "verniz", "cortesia", "entrega", "balcão", "coleção"]
+SLUG_WORDS = ["promocional", "cartoes", "adesivos", "banners", "papelaria", "brindes", "embalagens", "convites"]
+
+# ─────────────────────────────────────────────────────────────
+# LOGGING
+# ─────────────────────────────────────────────────────────────
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s  %(levelname)-7s  %(message)s",
+    datefmt="%H:%M:%S",
+)
+log = logging.getLogger("generate_synthetic_dump")
+
+
+# ─────────────────────────────────────────────────────────────
+# PARÂMETROS
+# ─────────────────────────────────────────────────────────────
+@dataclass
+class DirtyRatios:
+    mojibake: float = 0.02
+    zero_dates: float = 0.01
+    orphan_fks: float = 0.01
+    duplicate_emails: float = 0.005
+    duplicate_slugs: float = 0.01
+    invalid_status: float = 0.005
+    invalid_json: float = 0.002
+    nulls: float = 0.05
+
+    def override(self, items: list[str]) -> DirtyRatios:
+        """Aplica pares ``chave=proporção`` vindos da CLI."""
+        for item in items:
+            key, _, raw = item.partition("=")
+            key = key.strip()
+            if not hasattr(self, key):
+                raise ValueError(f"sujeira desconhecida: {key!r} (válidas: {', '.join(asdict(self))})")
+            value = float(raw)
+            if not 0.0 <= value <= 1.0:
+                raise ValueError(f"proporção fora de [0, 1] para {key}: {value}")
+            setattr(self, key, value)
+        return self
+
+
+@dataclass
+class ColumnSpec:
+    name: str
+    kind: str
+    sql_type: str
+    ref: str | None = None
+
+
+@dataclass
+class DumpStats:
+    scale: float
+    seed: int
+    dirty: dict[str, float]
+    rows: dict[str, int] = field(default_factory=dict)
+    injected: dict[str, int] = field(default_factory=dict)
+    bytes_written: int = 0
+    seconds: float = 0.0
+
+
+SQL_TYPES = {
+    "pk": "int(11) NOT NULL AUTO_INCREMENT",
+    "fk": "int(11) DEFAULT NULL",
+    "orphan_fk": "int(11) DEFAULT NULL",
+    "status_fk": "int(11) DEFAULT NULL",
+    "self_ref": "int(11) DEFAULT NULL",
+    "bool": "tinyint(1) DEFAULT '0'",
+    "datetime": "datetime DEFAULT NULL",
+    "money": "decimal(10,2) DEFAULT '0.00'",
+    "decimal": "decimal(12,2) DEFAULT NULL",
+    "int": "int(11) DEFAULT NULL",
+    "email": "varchar(150) DEFAULT NULL",
+    "cliente_tipo": "varchar(10) DEFAULT NULL",
+    "cupom_tipo": "char(1) DEFAULT NULL",
+    "finance_tipo": "tinyint(1) DEFAULT NULL",
+    "cupom_codigo": "varchar(40) DEFAULT NULL",
+    "cupom_ref": "varchar(40) DEFAULT NULL",
+    "chave": "varchar(120) DEFAULT NULL",
+    "pai": "varchar(120) DEFAULT NULL",
+    "parcelas": "varchar(20) DEFAULT NULL",
+    "csv_produtos": "text",
+    "json": "text",
+    "json_frete": "text",
+    "long_text": "text",
+    "text": "varchar(255) DEFAULT NULL",
+}
+
+
+# TABLE_TYPE_OVERRIDES do ETL → tipo gerado
+OVERRIDE_KINDS = {
+    "int": "int", "int_pk": "int", "bool": "bool", "money": "money", "decimal": "decimal",
+    "ts": "datetime", "str": "text", "finance_tipo": "finance_tipo", "cupom_tipo": "cupom_tipo",
+}
+
+
+# ─────────────────────────────────────────────────────────────
+# ESQUEMA (derivado do ETL)
+# ─────────────────────────────────────────────────────────────
+def source_tables() -> list[str]:
+    """Tabelas MySQL lidas pelo ETL, na ordem de EXEC_ORDER (pais antes dos filhos)."""
+    seen: list[str] = []
+    for table in etl_run.EXEC_ORDER:
+        if table in etl_run.SOURCE_TABLE_OVERRIDES:
+            continue
+        mysql_table = etl_run.MYSQL_TABLE_NAME_MAP.get(table, table)
+        if mysql_table not in seen:
+            seen.append(mysql_table)
+    return seen
+
+
+def _target_table(mysql_table: str) -> str:
+    for table, source in etl_run.MYSQL_TABLE_NAME_MAP.items():
+        if source == mysql_table:
+            return table
+    return mysql_table
+
+
+def column_kind(table: str, pg_col: str, mysql_col: str) -> tuple[str, str | None]:
+    """Classifica uma coluna de origem com as mesmas regras de tipo do transform."""
+    special = {
+        ("is_clientes", "tipo"): "cliente_tipo",
+        ("is_mkt_cupons", "tipo"): "cupom_tipo",
+        ("is_mkt_cupons", "codigo"): "cupom_codigo",
+        ("is_pedidos", "cupom"): "cupom_ref",
+        ("is_financeiro_lancamentos", "tipo"): "finance_tipo",
+        ("is_produtos_categorias", "chave"): "chave",
+        ("is_produtos_categorias", "slug"): "chave",
+        ("is_produtos_categorias", "parent_id"): "pai",
+        ("is_pedidos_pagamentos", "parcelas_raw"): "parcelas",
+        ("is_pedidos_pagamentos", "parcelas_qtd"): "parcelas",
+        ("is_pedidos_historico", "status_id"): "status_fk",
+    }
+    if mysql_col == "id":
+        return "pk", None
+    if (table, pg_col) in special:
+        return special[(table, pg_col)], None
+    override = etl_run.TABLE_TYPE_OVERRIDES.get(table, {}).get(pg_col)
+    if override in OVERRIDE_KINDS:
+        return OVERRIDE_KINDS[override], None
+    if pg_col.endswith("_id") and pg_col in etl_run.FK_MAP:
+        ref = etl_run.FK_MAP[pg_col]
+        if ref is None:
+            return "self_ref", table
+        if ref == "_orphan":
+            return "orphan_fk", None
+        if ref == "_int":
+            return "status_fk", None
+        if ref == table:
+            return "self_ref", table
+        return "fk", etl_run.MYSQL_TABLE_NAME_MAP.get(ref, ref)
+    if pg_col == "email_log":
+        return "email", None
+    if pg_col in etl_run.BOOL_COLS:
+        return "bool", None
+    if pg_col in etl_run.TS_COLS:
+        return "datetime", None
+    if pg_col in etl_run.MONEY_COLS:
+        return "money", None
+    if pg_col in etl_run.INT_COLS or pg_col == "status":
+        return "int", None
+    if any(x in pg_col for x in ("valor", "saldo", "custo", "qtde", "taxa", "desconto")):
+        return "decimal", None
+    if pg_col.endswith("_json") or mysql_col == "json":
+        return "json", None
+    if mysql_col in LONG_TEXT:
+        return "long_text", None
+    return "text", None
+
+
+def table_columns(mysql_table: str) -> list[ColumnSpec]:
+    table = _target_table(mysql_table)
+    mapping = etl_run.COLUMN_MAPPING.get(table, {})
+    specs: dict[str, ColumnSpec] = {}
+    for pg_col, mysql_col in mapping.items():
+        if mysql_col in specs:
+            continue
+        kind, ref = column_kind(table, pg_col, mysql_col)
+        specs[mysql_col] = ColumnSpec(mysql_col, kind, SQL_TYPES[kind], ref)
+    for mysql_col in EXTRA_SOURCE_COLUMNS.get(mysql_table, []):
+        if mysql_col in specs:
+            continue
+        kind = EXTRA_COLUMN_KINDS.get(mysql_col)
+        if kind is None:
+            kind, _ = column_kind(table, mysql_col, mysql_col)
+        specs[mysql_col] = ColumnSpec(mysql_col, kind, SQL_TYPES[kind])
+    ordered = sorted(specs.values(), key=lambda s: (s.kind != "pk",))
+    return ordered
+
+
+def rows_for(mysql_table: str, scale: float) -> int:
+    return max(1, round(BASE_ROWS.get(mysql_table, 100) * scale))
+
+
+# ─────────────────────────────────────────────────────────────
+# VALORES
+# ─────────────────────────────────────────────────────────────
+def mojibake(text: str) -> str:
+    """UTF-8 lido como latin1 e regravado como UTF-8 — o defeito clássico do legado."""
+    return text.encode("utf-8").decode("latin1")
+
+
+def chave_for(categoria_id: int) -> str:
+    return f"{SLUG_WORDS[categoria_id % len(SLUG_WORDS)]}-{categoria_id}"
+
+
+class RowFactory:
+    """Gera linhas de uma tabela de forma determinística (seed + nome da tabela)."""
+
+    def __init__(self, mysql_table: str, columns: list[ColumnSpec], counts: dict[str, int],
+                 dirty: DirtyRatios, seed: int, anchor: date, injected: Counter[str]):
+        self.table = mysql_table
+        self.columns = columns
+        self.counts = counts
+        self.dirty = dirty
+        self.rng = random.Random(seed ^ zlib.crc32(mysql_table.encode()))
+        self.anchor = datetime.combine(anchor, datetime.min.time())
+        self.injected = injected
+        self.status_count = counts.get("is_extras_status", 1)
+        self._generators: dict[str, Callable[[ColumnSpec, int], Any]] = {
+            "pk": lambda spec, row_id: row_id,
+            "fk": self._fk,
+            "orphan_fk": lambda spec, row_id: self.rng.randint(1, 500),
+            "status_fk": self._status,
+            "self_ref": self._self_ref,
+            "bool": lambda spec, row_id: int(self.rng.random() < 0.3),
+            "datetime": self._datetime,
+            "money": lambda spec, row_id: round(self.rng.uniform(0, 2_500), 2),
+            "decimal": lambda spec, row_id: round(self.rng.uniform(-50, 5_000), 2),
+            "int": lambda spec, row_id: self.rng.randint(0, 9),
+            "email": self._email,
+            "cliente_tipo": lambda spec, row_id: "fisica" if self.rng.random() < 0.6 else "juridica",
+            "cupom_tipo": lambda spec, row_id: self.rng.choice("$%f"),
+            "finance_tipo": lambda spec, row_id: self.rng.choice((0, 1)),
+            "cupom_codigo": lambda spec, row_id: f"CUPOM{row_id:05d}",
+            "cupom_ref": self._cupom_ref,
+            "chave": self._chave,
+            "pai": self._pai,
+            "parcelas": lambda spec, row_id: f"{self.rng.randint(1, 12)}x",
+            "csv_produtos": self._csv_produtos,
+            "json": self._json,
+            "json_frete": self._json_frete,
+            "long_text": self._long_text,
+            "text": self._text,
+        }
+
+    # ── sujeira ─────────────────────────────────────────────
+    def _hit(self, key: str) -> bool:
+        ratio = getattr(self.dirty, key)
+        if ratio and self.rng.random() < ratio:
+            self.injected[key] += 1
+            return True
+        return False
+
+    def _human(self, text: str) -> str:
+        return mojibake(text) if self._hit("mojibake") else text
+
+    # ── geradores por tipo ──────────────────────────────────
+    def _fk(self, spec: ColumnSpec, row_id: int) -> int | None:
+        parent_rows = self.counts.get(spec.ref or "", 0)
+        if parent_rows == 0:
+            return None
+        if self._hit("orphan_fks"):
+            return parent_rows + self.rng.randint(1, 10_000)
+        return self.rng.randint(1, parent_rows)
+
+    def _status(self, spec: ColumnSpec, row_id: int) -> int:
+        if self._hit("invalid_status"):
+            return self.rng.choice((0, self.status_count + self.rng.randint(1, 900)))
+        return self.rng.randint(1, self.status_count)
+
+    def _self_ref(self, spec: ColumnSpec, row_id: int) -> int | None:
+        if row_id > 1 and self.rng.random() < 0.05:
+            return self.rng.randint(1, row_id - 1)
+        return None
+
+    def _datetime(self, spec: ColumnSpec, row_id: int) -> str:
+        if self._hit("zero_dates"):
+            return "0000-00-00 00:00:00"
+        # Linhas mais novas ficam mais perto da data âncora (recência do verify).
+        total = max(1, self.counts.get(self.table, 1))
+        days_back = int((1 - row_id / total) * 5 * 365) + self.rng.randint(0, 3)
+        moment = self.anchor - timedelta(days=days_back, seconds=self.rng.randint(0, 86_399))
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _email(self, spec: ColumnSpec, row_id: int) -> str:
+        if row_id > 1 and self._hit("duplicate_emails"):
+            other = self.rng.randint(1, row_id - 1)
+            return f"Cliente{other}@Exemplo.com.br"
+        return f"cliente{row_id}@exemplo.com.br"
+
+    def _cupom_ref(self, spec: ColumnSpec, row_id: int) -> str | None:
+        if self.rng.random() > 0.08:
+            return None
+        cupons = self.counts.get("is_mkt_cupons", 0)
+        if cupons == 0 or self._hit("orphan_fks"):
+            return "CUPOMINEXISTENTE"
+        return f"CUPOM{self.rng.randint(1, cupons):05d}"
+
+    def _chave(self, spec: ColumnSpec, row_id: int) -> str:
+        if row_id > 1 and self._hit("duplicate_slugs"):
+            return chave_for(self.rng.randint(1, row_id - 1))
+        return chave_for(row_id)
+
+    def _pai(self, spec: ColumnSpec, row_id: int) -> str:
+        if row_id > 1 and self.rng.random() < 0.6:
+            return chave_for(self.rng.randint(1, row_id - 1))
+        return "0"
+
+    def _csv_produtos(self, spec: ColumnSpec, row_id: int) -> str:
+        produtos = self.counts.get("is_produtos", 0)
+        if produtos == 0 or self.rng.random() < 0.5:
+            return ""
+        return ",".join(str(self.rng.randint(1, produtos)) for _ in range(self.rng.randint(1, 6)))
+
+    def _json(self, spec: ColumnSpec, row_id: int) -> str:
+        payload = json.dumps(
+            {"id": row_id, "obs": self._human(self._words(4)), "itens": [self.rng.randint(1, 99) for _ in range(3)]},
+            ensure_ascii=False,
+        )
+        if self._hit("invalid_json"):
+            return payload[: len(payload) // 2]
+        return payload
+
+    def _json_frete(self, spec: ColumnSpec, row_id: int) -> str:
+        payload = json.dumps(
+            {
+                "titulo": self._human(self.rng.choice(["Retirada no balcão", "Entrega expressa", "Correios PAC"])),
+                "modulo": self.rng.choice(["correios", "motoboy", "balcao"]),
+                "prazo": self.rng.randint(0, 15),
+                "custo": round(self.rng.uniform(0, 80), 2),
+                "sucesso": self.rng.random() < 0.9,
+                "hash": f"{self.rng.getrandbits(64):016x}",
+                "data": self._datetime(spec, row_id),
+            },
+            ensure_ascii=False,
+        )
+        if self._hit("invalid_json"):
+            return payload[: len(payload) // 2]
+        return payload
+
+    def _words(self, n: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(n))
+
+    def _long_text(self, spec: ColumnSpec, row_id: int) -> str:
+        return self._human(" ".join(self._words(8).capitalize() + "." for _ in range(self.rng.randint(1, 6))))
+
+    def _text(self, spec: ColumnSpec, row_id: int) -> str:
+        name = spec.name
+        if name in ("nome", "razao_social", "fantasia"):
+            return self._human(f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}")
+        if name == "sobrenome":
+            return self._human(self.rng.choice(LAST_NAMES))
+        if name == "cidade":
+            return self._human(self.rng.choice(CITIES)[0])
+        if name == "estado":
+            return self.rng.choice(CITIES)[1]
+        if name.startswith("cep"):
+            return f"{self.rng.randint(60_000_000, 63_999_999)}"
+        if name in ("telefone", "celular"):
+            return f"(85) 9{self.rng.randint(8000, 9999)}-{self.rng.randint(0, 9999):04d}"
+        if name == "cpf":
+            return f"{self.rng.randint(0, 999_999_999_99):011d}"
+        if name == "cnpj":
+            return f"{self.rng.randint(0, 99_999_999_999_999):014d}"
+        if name == "sexo":
+            return self.rng.choice("MF")
+        if name == "ip":
+            return ".".join(str(self.rng.randint(1, 254)) for _ in range(4))
+        if name in HUMAN_TEXT:
+            return self._human(self._words(self.rng.randint(2, 5)).capitalize())
+        return f"{name}-{row_id}"
+
+    def row(self, row_id: int) -> list[Any]:
+        values: list[Any] = []
+        for spec in self.columns:
+            if spec.kind not in ("pk", "cliente_tipo", "chave", "cupom_codigo") and self.rng.random() < self.dirty.nulls:
+                values.append(None)
+                continue
+            values.append(self._generators[spec.kind](spec, row_id))
+        return values
+
+
+# ─────────────────────────────────────────────────────────────
+# ESCRITA (estilo mysqldump)
+# ─────────────────────────────────────────────────────────────
+_ESCAPES = {"\\": "\\\\", "'": "\\'", "\n": "\\n", "\r": "\\r", "\x00": "\\0", "\x1a": "\\Z"}
+_ESCAPE_TABLE = str.maketrans(_ESCAPES)
+
+
+def sql_literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).translate(_ESCAPE_TABLE) + "'"
+
+
+def create_table_sql(mysql_table: str, columns: list[ColumnSpec]) -> str:
+    lines = [f"  `{spec.name}` {spec.sql_type}" for spec in columns]
+    lines.append("  PRIMARY KEY (`id`)")
+    body = ",\n".join(lines)
+    return f"CREATE TABLE `{mysql_table}` (\n{body}\n) ENGINE=InnoDB DEFAULT CHARSET=latin1;\n"
+
+
+def _insert_chunks(mysql_table: str, factory: RowFactory, total: int) -> Iterator[str]:
+    for start in range(1, total + 1, ROWS_PER_INSERT):
+        end = min(total, start + ROWS_PER_INSERT - 1)
+        tuples = ",".join(
+            "(" + ",".join(sql_literal(v) for v in factory.row(row_id)) + ")" for row_id in range(start, end + 1)
+        )
+        yield f"INSERT INTO `{mysql_table}` VALUES {tuples};\n"
+
+
+def write_dump(
+    out: TextIO,
+    scale: float,
+    dirty: DirtyRatios,
+    seed: int = 42,
+    anchor: date | None = None,
+    tables: list[str] | None = None,
+) -> DumpStats:
+    """Escreve o dump completo em ``out`` e devolve as contagens por tabela."""
+    anchor = anchor or date.today()
+    selected = [t for t in source_tables() if not tables or t in tables]
+    counts = {t: rows_for(t, scale) for t in source_tables()}
+    stats = DumpStats(scale=scale, seed=seed, dirty=asdict(dirty))
+    injected: Counter[str] = Counter()
+
+    out.write(
+        f"-- MySQL dump 10.13  Distrib 5.7 (synthetic)\n--\n-- Host: synthetic    Database: {MYSQL_DATABASE}\n"
+        f"-- Scale: {scale:g}x    Seed: {seed}    Anchor: {anchor.isoformat()}\n"
+        "-- ------------------------------------------------------\n\n"
+        "/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;\n"
+        "/*!40101 SET NAMES utf8 */;\n"
+        "/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n"
+        "/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n"
+        "/*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;\n\n"
+    )
+    for mysql_table in selected:
+        columns = table_columns(mysql_table)
+        total = counts[mysql_table]
+        factory = RowFactory(mysql_table, columns, counts, dirty, seed, anchor, injected)
+        out.write(
+            f"--\n-- Table structure for table `{mysql_table}`\n--\n\n"
+            f"DROP TABLE IF EXISTS `{mysql_table}`;\n{create_table_sql(mysql_table, columns)}\n"
+            f"LOCK TABLES `{mysql_table}` WRITE;\n/*!40000 ALTER TABLE `{mysql_table}` DISABLE KEYS */;\n"
+        )
+        for statement in _insert_chunks(mysql_table, factory, total):
+            out.write(statement)
+        out.write(f"/*!40000 ALTER TABLE `{mysql_table}` ENABLE KEYS */;\nUNLOCK TABLES;\n\n")
+        stats.rows[mysql_table] = total
+    out.write(
+        "/*!40101 SET SQL_MODE=@OLD_SQL_MODE */;\n"
+        "/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n"
+        "/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;\n"
+        "/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;\n\n"
+        "-- Dump completed\n"
+    )
+    stats.injected = dict(sorted(injected.items()))
+    return stats
+
+
+def generate_dump(
+    output: Path,
+    scale: float = 1.0,
+    dirty: DirtyRatios | None = None,
+    seed: int = 42,
+    anchor: date | None = None,
+    tables: list[str] | None = None,
+) -> DumpStats:
+    """Gera ``output`` (.sql ou .sql.gz) e o sidecar ``<output>.json``."""
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    dirty = dirty or DirtyRatios()
+    started = time.monotonic()
+    opener = gzip.open if output.suffix == ".gz" else open
+    with opener(output, "wt", encoding="utf-8", newline="\n") as fh:  # type: ignore[operator]
+        stats = write_dump(fh, scale, dirty, seed=seed, anchor=anchor, tables=tables)
+    stats.seconds = round(time.monotonic() - started, 3)
+    stats.bytes_written = output.stat().st_size
+    sidecar = output.with_name(output.name + ".json")
+    sidecar.write_text(json.dumps(asdict(stats), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return stats
+
+
+def default_output(scale: float, gz: bool = False) -> Path:
+    suffix = ".sql.gz" if gz else ".sql"
+    return SYNTHETIC_DIR / f"{MYSQL_DATABASE}-synthetic-{scale:g}x{suffix}"
+
+
+# ─────────────────────────────────────────────────────────────
+# PONTO DE ENTRADA
+# ─────────────────────────────────────────────────────────────
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera dump MySQL sintético no formato do legado.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplicador do volume de produção (1, 10, 50...).")
+    parser.add_argument("--output", metavar="PATH", help="Arquivo de saída (.sql ou .sql.gz).")
+    parser.add_argument("--gzip", action="store_true", help="Comprime a saída (quando --output não é informado).")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador (mesma semente → mesmo dump).")
+    parser.add_argument("--anchor-date", metavar="YYYY-MM-DD", help="Data mais recente dos registros (padrão: hoje).")
+    parser.add_argument("--tables", help="Lista de tabelas MySQL separadas por vírgula (padrão: todas).")
+    parser.add_argument(
+        "--dirty",
+        action="append",
+        default=[],
+        metavar="CHAVE=PROPORÇÃO",
+        help="Ajusta a proporção de uma sujeira (ex.: mojibake=0.05). Pode repetir.",
+    )
+    args = parser.parse_args()
+
+    try:
+        dirty = DirtyRatios().override(args.dirty)
+        anchor = date.fromisoformat(args.anchor_date) if args.anchor_date else None
+        tables = [t.strip() for t in args.tables.split(",") if t.strip()] if args.tables else None
+        output = Path(args.output) if args.output else default_output(args.scale, gz=args.gzip)
+        log.info("Gerando dump sintético %gx → %s", args.scale, output)
+        stats = generate_dump(output, scale=args.scale, dirty=dirty, seed=args.seed, anchor=anchor, tables=tables)
+    except Exception as exc:
+        log.error("Falha fatal: %s", exc)
+        sys.exit(1)
+
+    log.info(
+        "Dump gerado: %s linhas em %d tabelas, %.1f MB em %.1fs",
+        f"{sum(stats.rows.values()):,}", len(stats.rows), stats.bytes_written / 1_048_576, stats.seconds,
+    )
+    for key, count in stats.injected.items():
+        log.info("  sujeira %-16s %s", key, f"{count:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 """
-import_dump.py — Importa dump MySQL (.sql ou .sql.gz) no container Docker.
+import_dump.py — Importa dump MySQL (.sql, .sql.gz, .sql.zst ou .sql.xz) no container Docker.
 
 Fluxo:
-1. Copia o arquivo para sql_input/ (volume montado no container mysql)
-2. Sobe o container MySQL via docker compose (se não estiver rodando)
-3. Aguarda healthcheck
-4. Importa o dump (descomprimindo .gz via pipe se necessário)
-5. Verifica que a importação gerou dados (SELECT COUNT(*) FROM is_pedidos)
+1. Sobe o container MySQL via docker compose (se não estiver rodando)
+2. Aguarda healthcheck
+3. Importa o dump via stdin do `mysql`; dumps comprimidos (detectados pelos
+   magic bytes, ver scripts/dump_codec.py) são descomprimidos em streaming no
+   próprio processo
+4. Verifica que a importação gerou dados (SELECT COUNT(*) FROM is_pedidos)
+
+Com MYSQL_IMPORT_MODE=diff (runner self-hosted, volume `mysql_data` mantido
+entre noites) o banco da noite anterior é reaproveitado: calcula o checksum
+de cada tabela do dump novo (scripts/dump_diff.py), compara com os checksums
+gravados em `<MYSQL_WARM_STATE_DB>.table_checksums` na última importação e
+reimporta (DROP + reload, via o próprio dump) só as tabelas que mudaram.
+Tabelas que sumiram do dump são removidas. Sem estado (volume novo) tudo é
+recarregado, como no modo full.
+
+`import_dump_stream` faz o mesmo a partir de um iterável de bytes (o download
+em andamento, ver `fetch_backup.stream_backup`), sobrepondo download e import.
 
 Uso standalone:
   python scripts/import_dump.py --file ./backups/nblgrafica_app-2025-01-15.sql.gz
@@ -17,15 +29,23 @@ Uso standalone:
 import argparse
 import logging
 import os
-import shutil
 import subprocess
 import sys
+import tempfile
 import time
 from pathlib import Path
+from typing import Iterable
 
 import mysql.connector
 from dotenv import load_dotenv
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.dump_codec import PLAIN, decompress_stream, file_codec, iter_file  # noqa: E402
+from scripts.dump_diff import filter_tables, section_object, table_checksums  # noqa: E402
+
 load_dotenv()
 
 # ─────────────────────────────────────────────────────────────
@@ -38,7 +58,10 @@ MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "root")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "nblgrafica_app")
 
 COMPOSE_FILE   = os.getenv("DOCKER_COMPOSE_FILE", "docker-compose.yml")
-SQL_INPUT_DIR  = Path(os.getenv("SQL_INPUT_DIR", "./sql_input"))
+
+# full = dump inteiro toda noite; diff = só as tabelas cujo checksum mudou
+IMPORT_MODE    = os.getenv("MYSQL_IMPORT_MODE", "full").strip().lower()
+WARM_STATE_DB  = os.getenv("MYSQL_WARM_STATE_DB", "etl_import_state")
 
 HEALTHCHECK_RETRIES = int(os.getenv("MYSQL_HEALTHCHECK_RETRIES", "30"))
 HEALTHCHECK_SLEEP   = float(os.getenv("MYSQL_HEALTHCHECK_SLEEP", "2"))
@@ -108,12 +131,8 @@ def _compose_up_mysql() -> None:
     _run(["docker", "compose", "-f", COMPOSE_FILE, "up", "-d", "mysql"])
 
 
-def _import_dump(dump_path: Path) -> None:
-    """Importa o dump no MySQL. Suporta .sql e .sql.gz."""
-    is_gz = dump_path.suffix == ".gz"
-    log.info("Importando dump: %s (%s)", dump_path.name, "gzip" if is_gz else "plain sql")
-
-    mysql_cmd = [
+def _mysql_cmd() -> list[str]:
+    return [
         "docker", "compose", "-f", COMPOSE_FILE,
         "exec", "-T", "mysql",
         "mysql",
@@ -122,58 +141,275 @@ def _import_dump(dump_path: Path) -> None:
         MYSQL_DATABASE,
     ]
 
-    if is_gz:
-        # zcat dump.sql.gz | docker exec -i mysql mysql ...
-        zcat_proc = subprocess.Popen(
-            ["zcat", str(dump_path)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        mysql_proc = subprocess.Popen(
-            mysql_cmd,
-            stdin=zcat_proc.stdout,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+
+def _import_dump(dump_path: Path) -> None:
+    """Importa o dump no MySQL. Plain vai direto como stdin; comprimido passa por _import_stream."""
+    codec = file_codec(dump_path)
+    if codec != PLAIN:
+        _import_stream(iter_file(dump_path), dump_path.name)
+        return
+
+    log.info("Importando dump: %s (plain sql)", dump_path.name)
+    with open(dump_path, "rb") as f:
+        proc = subprocess.run(
+            _mysql_cmd(),
+            stdin=f,
+            capture_output=True,
             text=True,
         )
-        zcat_proc.stdout.close()
-        mysql_stdout, mysql_stderr = mysql_proc.communicate()
-        zcat_rc = zcat_proc.wait()
-
-        if zcat_rc != 0:
-            _, zcat_err = zcat_proc.communicate()
-            raise subprocess.CalledProcessError(
-                zcat_rc, "zcat", stderr=zcat_err.decode(errors="replace") if isinstance(zcat_err, bytes) else zcat_err
-            )
-        if mysql_proc.returncode != 0:
-            raise subprocess.CalledProcessError(
-                mysql_proc.returncode, "mysql", stderr=mysql_stderr
-            )
-    else:
-        with open(dump_path, "rb") as f:
-            proc = subprocess.run(
-                mysql_cmd,
-                stdin=f,
-                capture_output=True,
-                text=True,
-            )
-        if proc.returncode != 0:
-            raise subprocess.CalledProcessError(
-                proc.returncode, "mysql", stderr=proc.stderr
-            )
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            proc.returncode, "mysql", stderr=proc.stderr
+        )
 
     log.info("Dump importado com sucesso.")
 
 
-def _verify_import() -> None:
-    """Verifica que is_pedidos tem dados após importação."""
-    conn = mysql.connector.connect(
+def _read_stderr(handle) -> str:
+    handle.seek(0)
+    return handle.read().decode(errors="replace")
+
+
+def _import_stream(chunks: Iterable[bytes], name: str) -> int:
+    """
+    Importa o dump a partir de um iterável de bytes; retorna os bytes consumidos.
+
+    O codec (plain/gzip/zstd/xz) é detectado pelo conteúdo e a descompressão
+    roda aqui, em streaming, enquanto o `mysql` consome o stdin em paralelo.
+    Se o iterável (ou a descompressão) falhar no meio, o `mysql` é morto antes
+    de ver EOF — um dump truncado nunca é "importado com sucesso".
+    """
+    log.info("Importando dump em streaming: %s", name)
+
+    with tempfile.TemporaryFile() as mysql_err:
+        mysql_proc = subprocess.Popen(
+            _mysql_cmd(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=mysql_err
+        )
+        sink = mysql_proc.stdin
+
+        consumed = 0
+        written = 0
+        counted = _ByteCounter(chunks)
+        try:
+            for data in decompress_stream(counted):
+                sink.write(data)
+                written += len(data)
+        except BrokenPipeError:
+            pass  # mysql saiu antes do fim: o returncode abaixo diz o motivo
+        except BaseException:
+            mysql_proc.kill()
+            mysql_proc.wait()
+            raise
+        finally:
+            consumed = counted.total
+            try:
+                sink.close()
+            except BrokenPipeError:
+                pass
+
+        mysql_rc = mysql_proc.wait()
+        if mysql_rc != 0:
+            raise subprocess.CalledProcessError(mysql_rc, "mysql", stderr=_read_stderr(mysql_err))
+
+    log.info(
+        "Dump importado com sucesso (%.1f MB recebidos, %.1f MB de SQL).",
+        consumed / 1_048_576,
+        written / 1_048_576,
+    )
+    return consumed
+
+
+class _ByteCounter:
+    """Iterável que conta os bytes que passam (antes da descompressão)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = chunks
+        self.total = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.total += len(chunk)
+            yield chunk
+
+
+def _connect(database: str | None = MYSQL_DATABASE):
+    return mysql.connector.connect(
         host=MYSQL_HOST,
         port=MYSQL_PORT,
         user=MYSQL_USER,
         password=MYSQL_PASSWORD,
-        database=MYSQL_DATABASE,
+        database=database,
     )
+
+
+# ─────────────────────────────────────────────────────────────
+# IMPORT DIFERENCIAL (banco quente)
+# ─────────────────────────────────────────────────────────────
+def _load_warm_state() -> dict[str, dict]:
+    """Checksums por tabela da última importação neste volume ({} se não houver)."""
+    conn = _connect(None)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{WARM_STATE_DB}`")
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS `{WARM_STATE_DB}`.table_checksums (
+                table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+                sha256 CHAR(64) NOT NULL,
+                dump_name VARCHAR(255) NOT NULL,
+                loaded_at DATETIME NOT NULL
+            )
+            """
+        )
+        cur.execute(f"SELECT table_name, sha256, dump_name FROM `{WARM_STATE_DB}`.table_checksums")
+        state = {name: {"sha256": sha, "dump_name": dump} for name, sha, dump in cur.fetchall()}
+        cur.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = %s",
+            (MYSQL_DATABASE,),
+        )
+        existing = {row[0] for row in cur.fetchall()}
+    finally:
+        conn.close()
+    # Checksum de uma tabela (view, triggers dela) que não existe mais no banco não vale nada.
+    return {
+        name: entry
+        for name, entry in state.items()
+        if section_object(name)[0] in ("routines", "events") or section_object(name)[1] in existing
+    }
+
+
+def _forget_warm_state(tables: Iterable[str] | None = None) -> None:
+    """Apaga o checksum de `tables` (todas se None) antes de mexer nelas: falha no meio = recarga."""
+    tables = None if tables is None else list(tables)
+    if tables == []:
+        return
+    try:
+        conn = _connect(None)
+    except mysql.connector.Error:
+        return
+    try:
+        cur = conn.cursor()
+        if tables is None:
+            cur.execute(f"DELETE FROM `{WARM_STATE_DB}`.table_checksums")
+        else:
+            cur.executemany(
+                f"DELETE FROM `{WARM_STATE_DB}`.table_checksums WHERE table_name = %s",
+                [(name,) for name in tables],
+            )
+        conn.commit()
+    except mysql.connector.Error as exc:
+        if exc.errno not in (1049, 1146):  # banco/tabela de estado ainda não existe
+            raise
+    finally:
+        conn.close()
+
+
+def _save_warm_state(dump_name: str, checksums: dict[str, str]) -> None:
+    if not checksums:
+        return
+    conn = _connect(None)
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            f"""
+            REPLACE INTO `{WARM_STATE_DB}`.table_checksums (table_name, sha256, dump_name, loaded_at)
+            VALUES (%s, %s, %s, UTC_TIMESTAMP())
+            """,
+            [(name, sha, dump_name) for name, sha in checksums.items()],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _drop_sections(sections: list[str]) -> None:
+    """Remove os objetos de cada seção: tabela, view, triggers de uma tabela, routines/events do banco."""
+    conn = _connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for section in sections:
+            kind, name = section_object(section)
+            if kind == "table":
+                cur.execute(f"DROP TABLE IF EXISTS `{name}`")
+            elif kind == "view":
+                cur.execute(f"DROP VIEW IF EXISTS `{name}`")
+            elif kind == "triggers":
+                cur.execute(
+                    "SELECT trigger_name FROM information_schema.triggers "
+                    "WHERE trigger_schema = %s AND event_object_table = %s",
+                    (MYSQL_DATABASE, name),
+                )
+                for (trigger,) in cur.fetchall():
+                    cur.execute(f"DROP TRIGGER IF EXISTS `{trigger}`")
+            elif kind == "routines":
+                cur.execute(
+                    "SELECT routine_type, routine_name FROM information_schema.routines WHERE routine_schema = %s",
+                    (MYSQL_DATABASE,),
+                )
+                for routine_type, routine in cur.fetchall():
+                    cur.execute(f"DROP {routine_type} IF EXISTS `{routine}`")
+            else:
+                cur.execute(
+                    "SELECT event_name FROM information_schema.events WHERE event_schema = %s",
+                    (MYSQL_DATABASE,),
+                )
+                for (event,) in cur.fetchall():
+                    cur.execute(f"DROP EVENT IF EXISTS `{event}`")
+    finally:
+        conn.close()
+
+
+def _import_diff(dump_path: Path) -> dict:
+    """Reimporta só as tabelas cujo checksum mudou desde a última importação; devolve o relatório."""
+    started = time.monotonic()
+    checksums = table_checksums(iter_file(dump_path))
+    previous = _load_warm_state()
+    hashed_in = time.monotonic() - started
+
+    reused = [name for name, sha in checksums.items() if previous.get(name, {}).get("sha256") == sha]
+    # DROP TABLE leva junto os triggers: tabela recarregada → triggers dela também
+    changed = {name for name in checksums if name not in reused and section_object(name)[0] == "table"}
+    reused = [name for name in reused if not (name.startswith("triggers:") and section_object(name)[1] in changed)]
+    reloaded = [name for name in checksums if name not in reused]
+    dropped = sorted(set(previous) - set(checksums))
+    snapshot = sorted({entry["dump_name"] for entry in previous.values()})
+
+    log.info(
+        "Import diferencial (%s vs snapshot %s): %d tabela(s) reaproveitada(s), %d a recarregar, %d a remover "
+        "(checksums em %.1fs)",
+        dump_path.name,
+        ", ".join(snapshot) or "-",
+        len(reused),
+        len(reloaded),
+        len(dropped),
+        hashed_in,
+    )
+
+    _forget_warm_state(reloaded + dropped)
+    # o dump não traz DROP de trigger/routine/event: os antigos saem antes da recarga
+    recreated = [name for name in reloaded if section_object(name)[0] in ("triggers", "routines", "events")]
+    if dropped or recreated:
+        _drop_sections(dropped + recreated)
+    applied = 0
+    if reloaded:
+        applied = _import_stream(filter_tables(iter_file(dump_path), set(reloaded)), f"{dump_path.name} (diff)")
+    _save_warm_state(dump_path.name, {name: checksums[name] for name in reloaded})
+
+    return {
+        "mode": "diff",
+        "snapshot": snapshot,
+        "tables_reused": reused,
+        "tables_reloaded": reloaded,
+        "tables_dropped": dropped,
+        "sql_bytes_applied": applied,
+        "checksum_seconds": round(hashed_in, 2),
+    }
+
+
+def _verify_import() -> None:
+    """Verifica que is_pedidos tem dados após importação."""
+    conn = _connect()
     try:
         cur = conn.cursor()
         cur.execute("SELECT COUNT(*) FROM is_pedidos")
@@ -188,31 +424,57 @@ def _verify_import() -> None:
 # ─────────────────────────────────────────────────────────────
 # PONTO DE ENTRADA
 # ─────────────────────────────────────────────────────────────
-def import_dump(dump_path: Path, skip_compose: bool = False) -> None:
+def import_dump(dump_path: Path, skip_compose: bool = False, mode: str | None = None) -> dict:
     """
     Importa dump no MySQL Docker.
 
     Args:
-        dump_path: Caminho para o arquivo .sql ou .sql.gz
+        dump_path: Caminho para o arquivo .sql (ou comprimido: .gz, .zst, .xz)
         skip_compose: Se True, não executa docker compose up (MySQL já está rodando)
+        mode: "full" ou "diff" (default: MYSQL_IMPORT_MODE)
+
+    Returns:
+        Relatório da importação ({"mode": ...}; no modo diff, as tabelas
+        reaproveitadas/recarregadas/removidas)
     """
+    mode = (mode or IMPORT_MODE).strip().lower()
+    if mode not in ("full", "diff"):
+        raise ValueError(f"MYSQL_IMPORT_MODE inválido: {mode!r} (use full ou diff)")
     dump_path = Path(dump_path).resolve()
     if not dump_path.exists():
         raise FileNotFoundError(f"Dump não encontrado: {dump_path}")
 
-    # Copiar para sql_input/ (volume do container)
-    SQL_INPUT_DIR.mkdir(parents=True, exist_ok=True)
-    dest = SQL_INPUT_DIR / dump_path.name
-    if dest != dump_path:
-        log.info("Copiando dump para sql_input/: %s", dest)
-        shutil.copy2(dump_path, dest)
+    if not skip_compose:
+        _compose_up_mysql()
+
+    _wait_for_mysql()
+    if mode == "diff":
+        report = _import_diff(dump_path)
+    else:
+        _forget_warm_state()  # o banco passa a ser o dump inteiro; checksums antigos não valem
+        _import_dump(dump_path)
+        report = {"mode": "full"}
+    _verify_import()
+    return report
+
+
+def import_dump_stream(chunks: Iterable[bytes], name: str, skip_compose: bool = False) -> int:
+    """
+    Importa dump no MySQL Docker enquanto ele ainda está chegando.
 
+    Args:
+        chunks: bytes do dump na ordem (ex.: `fetch_backup.DumpTee`)
+        name: nome do arquivo (só para log; o codec vem dos magic bytes)
+        skip_compose: Se True, não executa docker compose up (MySQL já está rodando)
+    """
     if not skip_compose:
         _compose_up_mysql()
 
     _wait_for_mysql()
-    _import_dump(dump_path)
+    _forget_warm_state()
+    consumed = _import_stream(chunks, name)
     _verify_import()
+    return consumed
 
 
 def main() -> None:
@@ -221,17 +483,22 @@ def main() -> None:
         "--file",
         required=True,
         metavar="PATH",
-        help="Caminho do arquivo dump (.sql ou .sql.gz).",
+        help="Caminho do arquivo dump (.sql, .sql.gz, .sql.zst ou .sql.xz).",
     )
     parser.add_argument(
         "--skip-compose",
         action="store_true",
         help="Não sobe o container MySQL (já está rodando).",
     )
+    parser.add_argument(
+        "--mode",
+        choices=("full", "diff"),
+        help="full = dump inteiro; diff = só tabelas alteradas (default: MYSQL_IMPORT_MODE).",
+    )
     args = parser.parse_args()
 
     try:
-        import_dump(Path(args.file), skip_compose=args.skip_compose)
+        import_dump(Path(args.file), skip_compose=args.skip_compose, mode=args.mode)
     except Exception as exc:
         log.error("Falha fatal: %s", exc)
         sys.exit(1)
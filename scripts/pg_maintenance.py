@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+pg_maintenance.py — ANALYZE / VACUUM (ANALYZE) pós-carga nas tabelas carregadas.
+
+Depois do TRUNCATE ... RESTART IDENTITY CASCADE e do reload em massa, as
+estatísticas do planner ficam vazias até o autovacuum passar. As primeiras
+consultas das views de dashboard pegam planos ruins (e às vezes 57014
+statement timeout). Este passo roda logo após o ETL:
+
+- tabelas: as que o ETL carregou (logs/etl_profile.json), agrupadas pelo bloco
+  de EXEC_BLOCKS; sem profile, todas do EXEC_ORDER;
+- blocos em ordem de dependência; dentro do bloco, até PG_MAINTENANCE_WORKERS
+  tabelas em paralelo (uma conexão autocommit por worker);
+- depois das tabelas, as mv_dashboard_* (migration 013) que existirem;
+- ``VACUUM (ANALYZE)`` quando pg_stat_user_tables mostra pelo menos
+  PG_MAINTENANCE_VACUUM_MIN_DEAD tuplas mortas (upsert, UPDATE de auto-referência),
+  senão só ``ANALYZE``.
+
+Falha numa tabela não derruba a carga: fica registrada no relatório
+(``manifest.maintenance``) e no log.
+
+Uso standalone:
+  python scripts/pg_maintenance.py
+  python scripts/pg_maintenance.py --tables is_pedidos,is_pedidos_itens
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import psycopg2
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.error_log_sink import read_json_file  # noqa: E402
+from scripts.etl_metrics import PROFILE_JSON_PATH  # noqa: E402
+from scripts.truncate_supabase import APP_ONLY_TABLES, EXEC_ORDER  # noqa: E402
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s  %(levelname)-7s  %(message)s",
+    datefmt="%H:%M:%S",
+)
+log = logging.getLogger("pg_maintenance")
+
+# Views materializadas do dashboard (mesma lista de etl/run.py). O REFRESH do ETL
+# não atualiza estatísticas; entram como último bloco quando existem.
+DASHBOARD_MATVIEWS = ["mv_dashboard_pedidos", "mv_dashboard_financeiro"]
+
+
+# ─────────────────────────────────────────────────────────────
+# HELPERS
+# ─────────────────────────────────────────────────────────────
+def loaded_table_groups(profile: dict | None) -> list[list[str]]:
+    """
+    Tabelas carregadas agrupadas por bloco do ETL, em ordem de dependência.
+    Sem profile (ou sem tabelas com linhas), cai para o EXEC_ORDER inteiro num bloco só.
+    """
+    tables = (profile or {}).get("tables") or {}
+    blocks: dict[int, list[str]] = {}
+    for name, item in tables.items():
+        if name in APP_ONLY_TABLES or not item.get("rows_ok"):
+            continue
+        block = item.get("block")
+        blocks.setdefault(block if isinstance(block, int) else len(EXEC_ORDER), []).append(name)
+    if not blocks:
+        return [list(EXEC_ORDER)]
+    order = {name: index for index, name in enumerate(EXEC_ORDER)}
+    return [sorted(blocks[b], key=lambda t: (order.get(t, len(order)), t)) for b in sorted(blocks)]
+
+
+def _dead_tuples(conn, tables: list[str]) -> dict[str, int]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT relname, n_dead_tup FROM pg_stat_user_tables WHERE schemaname = 'public' AND relname = ANY(%s)",
+            (tables,),
+        )
+        return {name: int(dead or 0) for name, dead in cur.fetchall()}
+
+
+def _maintenance_sql(table: str, vacuum: bool) -> str:
+    return f'VACUUM (ANALYZE) public."{table}"' if vacuum else f'ANALYZE public."{table}"'
+
+
+# ─────────────────────────────────────────────────────────────
+# PONTO DE ENTRADA
+# ─────────────────────────────────────────────────────────────
+def run_maintenance(
+    groups: list[list[str]] | None = None,
+    workers: int | None = None,
+    vacuum_min_dead: int | None = None,
+) -> dict:
+    """
+    Roda ANALYZE / VACUUM (ANALYZE) bloco a bloco e devolve o relatório por tabela.
+
+    Raises:
+        ValueError: Se SUPABASE_DB_URL não configurado.
+    """
+    db_url = os.getenv("SUPABASE_DB_URL", "")
+    if not db_url:
+        raise ValueError("SUPABASE_DB_URL não configurado.")
+    include_matviews = groups is None
+    if groups is None:
+        groups = loaded_table_groups(read_json_file(PROFILE_JSON_PATH))
+    workers = max(1, workers if workers is not None else int(os.getenv("PG_MAINTENANCE_WORKERS", "3")))
+    if vacuum_min_dead is None:
+        vacuum_min_dead = int(os.getenv("PG_MAINTENANCE_VACUUM_MIN_DEAD", "1000"))
+
+    started = time.monotonic()
+    report: dict = {"workers": workers, "vacuum_min_dead": vacuum_min_dead, "tables": {}}
+    local = threading.local()
+    opened: list = []
+    lock = threading.Lock()
+
+    def _connection():
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = psycopg2.connect(db_url)
+            conn.autocommit = True  # VACUUM não roda dentro de transação
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = 0")
+            local.conn = conn
+            with lock:
+                opened.append(conn)
+        return conn
+
+    def _maintain(table: str, dead: int) -> dict:
+        vacuum = dead >= vacuum_min_dead
+        item = {"action": "vacuum_analyze" if vacuum else "analyze", "dead_tuples": dead}
+        table_started = time.monotonic()
+        try:
+            with _connection().cursor() as cur:
+                cur.execute(_maintenance_sql(table, vacuum))
+            item["status"] = "ok"
+        except Exception as exc:
+            item.update(status="failed", error=str(exc))
+            log.warning("[MAINT] %s falhou: %s", table, exc)
+        item["seconds"] = round(time.monotonic() - table_started, 3)
+        return item
+
+    try:
+        tables = [t for group in groups for t in group]
+        dead_by_table = _dead_tuples(_connection(), tables + (DASHBOARD_MATVIEWS if include_matviews else []))
+        matviews = [v for v in DASHBOARD_MATVIEWS if include_matviews and v in dead_by_table]
+        if matviews:
+            groups = [*groups, matviews]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="maint") as pool:
+            for group in groups:
+                futures = {t: pool.submit(_maintain, t, dead_by_table.get(t, 0)) for t in group}
+                for table, future in futures.items():  # bloco termina antes do próximo começar
+                    item = report["tables"][table] = future.result()
+                    log.info("[MAINT] %-32s %-15s %6.2fs dead=%d", table, item["action"], item["seconds"], item["dead_tuples"])
+    finally:
+        for conn in opened:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    report["failed"] = sorted(t for t, item in report["tables"].items() if item["status"] != "ok")
+    report["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ANALYZE / VACUUM (ANALYZE) pós-carga no Supabase.")
+    parser.add_argument("--tables", metavar="T1,T2,...", help="Lista CSV de tabelas (substitui o etl_profile.json).")
+    args = parser.parse_args()
+
+    groups = [[t.strip() for t in args.tables.split(",") if t.strip()]] if args.tables else None
+    try:
+        report = run_maintenance(groups)
+    except Exception as exc:
+        log.error("Falha fatal: %s", exc)
+        sys.exit(1)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
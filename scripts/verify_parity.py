@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""Source-vs-target parity check with chunked, order-independent hash aggregates.
+
+For each ``PARITY_TABLES`` entry the legacy id space is cut into ranges of
+``PARITY_RANGE_SIZE`` ids, compared concurrently on up to ``PARITY_WORKERS``
+worker threads. Each worker has its own MySQL and Supabase connections.
+
+- MySQL side: the rows of the range go through the same transform as the ETL
+  (``transform_row`` / ``transform_pagamento``, NOT NULL fallbacks, mutators,
+  validators). Rows the ETL would skip are not expected in the target.
+- Supabase side: the loaded rows with the same ids.
+
+Each row becomes one text per column, rendered the way the target column type
+prints it (``digest_text`` in Python, ``DIGEST_SQL`` in Postgres), and a 64-bit
+hash (the first 8 bytes of its md5). A range digest is ``(count, sum of hashes
+mod 2**64)``, so row order does not matter. The target digest is computed by
+Postgres in a single aggregate query; only the two numbers cross the wire.
+Only ranges whose digests differ are split in halves and compared again, down
+to ``PARITY_LEAF_SIZE`` ids. Only there are the loaded rows fetched, put in the
+canonical form (``canonical_value``) and diffed id by id, reporting the first
+diverging columns. A value the two renderings disagree on only costs an extra
+leaf fetch: the leaf diff has the last word.
+
+The report goes to ``PARITY_REPORT_PATH`` (``./logs/parity_report.json``).
+Any mismatch makes the script exit 1.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from etl import run as etl_run  # noqa: E402
+from scripts.error_log_sink import capture_traceback, ensure_run_id, persist_error_event, read_json_file  # noqa: E402
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s  %(levelname)-7s  %(message)s",
+    datefmt="%H:%M:%S",
+)
+log = logging.getLogger("verify_parity")
+
+DEFAULT_TABLES = "is_produtos,is_financeiro_lancamentos,is_pedidos_itens,is_pedidos_pagamentos,is_pedidos_historico"
+HASH_MOD = 2**64
+NULL = "\x00"  # distinto de "" e de "None"
+MAX_VALUE_CHARS = 200
+
+# Tabelas carregadas por processadores especiais cujo transform depende de estado do run
+# (e-mails vistos, slugs, cupons, linhas derivadas) — fora do escopo da paridade.
+UNSUPPORTED_TABLES = {
+    "is_clientes",
+    "is_clientes_enderecos",
+    "is_mkt_cupons",
+    "is_produtos_categorias",
+    "is_pedidos",
+    "is_pedidos_fretes_entregas",
+} | etl_run.DERIVED_TABLES | etl_run.TABLES_WITHOUT_ID
+
+SPECIAL_TRANSFORMS: dict[str, Callable[[dict], Optional[dict]]] = {
+    "is_pedidos_pagamentos": etl_run.transform_pagamento,
+}
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    table: str
+    mysql_table: str
+    mapping: dict[str, str]
+    columns: tuple[str, ...]  # colunas do Supabase comparadas (inclui id)
+    int_pk: bool
+
+    @classmethod
+    def for_table(cls, table: str) -> "TableSpec":
+        if table in UNSUPPORTED_TABLES:
+            raise ValueError(f"PARITY_TABLES: '{table}' is loaded by a special processor and cannot be compared")
+        mapping = etl_run.COLUMN_MAPPING.get(table)
+        if not mapping:
+            raise ValueError(f"PARITY_TABLES: '{table}' has no column mapping")
+        int_pk = etl_run.TABLE_TYPE_OVERRIDES.get(table, {}).get("id") == "int_pk"
+        columns = tuple(["id"] + sorted(c for c in mapping if c != "id"))
+        return cls(table, etl_run.resolve_source_table(table), dict(mapping), columns, int_pk)
+
+    def source_columns(self) -> list[str]:
+        return sorted(set(self.mapping.values()) | {"id"})
+
+
+def canonical_value(value: Any, column: str = "") -> str:
+    """Stable text form of a value, equal for the transformed MySQL value and the one psycopg2 returns."""
+    if value is None:
+        return NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, (float, Decimal)):
+        number = Decimal(str(value)).normalize()
+        return format(number, "f") if number != 0 else "0"
+    if isinstance(value, dt.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    if isinstance(value, (dt.date, dt.time)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    text = str(value)
+    if column.endswith("_json"):
+        try:
+            return canonical_value(json.loads(text))
+        except ValueError:
+            return text
+    if len(text) >= 19 and text[4] == "-" and text[10] in "T ":
+        # to_ts() devolve ISO sem fuso; timestamptz volta como datetime
+        try:
+            return canonical_value(dt.datetime.fromisoformat(text))
+        except ValueError:
+            return text
+    return text
+
+
+def canonical_row(row: dict, columns: Iterable[str]) -> dict[str, str]:
+    return {column: canonical_value(row.get(column), column) for column in columns}
+
+
+# information_schema.columns.data_type → como o valor é renderizado no digest
+DIGEST_KINDS = {
+    "boolean": "bool",
+    "smallint": "int",
+    "integer": "int",
+    "bigint": "int",
+    "numeric": "number",
+    "real": "number",
+    "double precision": "number",
+    "timestamp with time zone": "timestamptz",
+    "timestamp without time zone": "timestamp",
+    "date": "date",
+    "time without time zone": "time",
+    "json": "json",
+    "jsonb": "json",
+    "ARRAY": "json",
+    "bytea": "bytes",
+}
+
+_FRACTION = "CASE WHEN date_trunc('second', {x}) = {x} THEN '' ELSE to_char({x}, '.US') END"
+_ISO_SECONDS = "to_char({x}, 'YYYY-MM-DD\"T\"HH24:MI:SS') || " + _FRACTION
+
+# Expressão SQL de cada tipo; precisa produzir o mesmo texto que digest_text()
+DIGEST_SQL = {
+    "bool": "CASE WHEN {c} THEN 't' WHEN NOT {c} THEN 'f' END",
+    "int": "{c}::text",
+    "number": "trim_scale({c}::text::numeric)::text",
+    "timestamptz": _ISO_SECONDS.format(x="({c} AT TIME ZONE 'UTC')"),
+    "timestamp": _ISO_SECONDS.format(x="{c}"),
+    "date": "to_char({c}, 'YYYY-MM-DD')",
+    "time": "{c}::text",
+    "json": "to_jsonb({c})::text",
+    "bytes": "encode({c}, 'hex')",
+    "text": "{c}::text",
+}
+
+
+def _parse_datetime(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return dt.datetime.fromisoformat(value.strip())
+        except ValueError:
+            return value
+    return value
+
+
+def _jsonb_text(value: Any) -> str:
+    """``value`` as Postgres prints a jsonb: keys by (length, bytes), ", " and ": " separators, numerics verbatim."""
+    if isinstance(value, dict):
+        keys = sorted((str(k) for k in value), key=lambda k: (len(k.encode("utf-8")), k.encode("utf-8")))
+        items = {str(k): v for k, v in value.items()}
+        return "{" + ", ".join(f"{_jsonb_text(k)}: {_jsonb_text(items[k])}" for k in keys) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_jsonb_text(v) for v in value) + "]"
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return format(Decimal(repr(value)), "f")
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def digest_text(value: Any, kind: str) -> Optional[str]:
+    """Text of a transformed source value as ``DIGEST_SQL[kind]`` renders the loaded one (None for NULL)."""
+    if value is None:
+        return None
+    if kind == "number" and not isinstance(value, bool):
+        try:
+            return canonical_value(Decimal(str(value).strip()))
+        except ArithmeticError:
+            return str(value)
+    if kind in ("timestamptz", "timestamp"):
+        value = _parse_datetime(value)
+        if isinstance(value, dt.date) and not isinstance(value, dt.datetime):
+            value = dt.datetime.combine(value, dt.time())
+        return canonical_value(value)
+    if kind == "date":
+        value = _parse_datetime(value)
+        return value.date().isoformat() if isinstance(value, dt.datetime) else canonical_value(value)
+    if kind == "time" and isinstance(value, dt.time):
+        text = value.isoformat()
+        return text.rstrip("0") if "." in text else text
+    if kind == "json":
+        if isinstance(value, (str, bytes, bytearray)):
+            try:
+                value = json.loads(value, parse_float=Decimal)
+            except ValueError:
+                return str(value)
+        return _jsonb_text(value)
+    if kind == "text" and isinstance(value, str):
+        return value
+    return canonical_value(value)
+
+
+def digest_row_text(row: dict, columns: Iterable[str], kinds: dict[str, str]) -> str:
+    parts = []
+    for column in columns:
+        text = digest_text(row.get(column), kinds.get(column, "text"))
+        parts.append(f"{column}!" if text is None else f"{column}={text}")
+    return "\x1f".join(parts)
+
+
+def digest_sql(spec: TableSpec, kinds: dict[str, str], where: str) -> str:
+    """Aggregate query returning ``(count, sum of row hashes)`` for the rows matching ``where``."""
+    parts = []
+    for column in spec.columns:
+        expr = DIGEST_SQL[kinds.get(column, "text")].format(c=f'"{column}"')
+        parts.append(f"'{column}' || COALESCE('=' || {expr}, '!')")
+    row_text = " || chr(31) || ".join(parts)
+    return (
+        f"SELECT COUNT(*), COALESCE(SUM(('x' || left(md5({row_text}), 16))::bit(64)::bigint::numeric), 0) "
+        f'FROM public."{spec.table}" WHERE {where}'
+    )
+
+
+def row_hash(text: str) -> int:
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big")
+
+
+@dataclass
+class RangeDigest:
+    count: int = 0
+    total: int = 0
+
+    def add(self, text: str) -> None:
+        self.count += 1
+        self.total = (self.total + row_hash(text)) % HASH_MOD
+
+
+def expected_row(spec: TableSpec, source_row: dict) -> Optional[dict]:
+    """The row the ETL would load for ``source_row`` (None when the ETL skips it)."""
+    transform = SPECIAL_TRANSFORMS.get(spec.table)
+    row = transform(source_row) if transform else etl_run.transform_row(source_row, spec.table, spec.mapping)
+    if not row or row.get("id") is None:
+        return None
+    if any(row.get(c) is None for c in etl_run.REQUIRED_NONNULL_COLS.get(spec.table, ())):
+        return None
+    for column, default in etl_run.NONNULL_FALLBACKS.get(spec.table, {}).items():
+        if row.get(column) is None:
+            row[column] = default
+    mutator = etl_run.POST_TRANSFORM_MUTATORS.get(spec.table)
+    if mutator:
+        row = mutator(row)
+    validator = etl_run.POST_TRANSFORM_VALIDATORS.get(spec.table)
+    if validator and not validator(row):
+        return None
+    return row
+
+
+class MySQLSide:
+    """Transformed source rows by legacy id range."""
+
+    def __init__(self, conn) -> None:
+        self.conn = conn
+
+    def bounds(self, spec: TableSpec) -> tuple[Optional[int], Optional[int]]:
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"SELECT MIN(`id`), MAX(`id`) FROM `{spec.mysql_table}`")
+            low, high = cur.fetchone()
+        finally:
+            cur.close()
+        return (int(low), int(high)) if low is not None else (None, None)
+
+    def rows(self, spec: TableSpec, low: int, high: int) -> Iterator[tuple[str, dict]]:
+        sql = etl_run.source_select_sql(spec.mysql_table, spec.source_columns())
+        cur = self.conn.cursor(dictionary=True)
+        try:
+            cur.execute(f"{sql} WHERE `id` >= %s AND `id` < %s", (low, high))
+            while True:
+                batch = cur.fetchmany(etl_run.BATCH_SIZE)
+                if not batch:
+                    return
+                for source_row in etl_run.decode_source_rows(spec.mysql_table, batch):
+                    try:
+                        row = expected_row(spec, source_row)
+                    except Exception as exc:  # o ETL registra e pula a linha
+                        log.debug("transform failed for %s id=%s: %s", spec.table, source_row.get("id"), exc)
+                        continue
+                    if row is not None:
+                        yield str(row["id"]), row
+        finally:
+            cur.close()
+
+
+class SupabaseSide:
+    """Loaded rows: by id range for integer keys, by the expected ids for UUID keys.
+
+    Range digests are aggregated by Postgres; rows are only fetched for leaf ranges.
+    """
+
+    def __init__(self, conn) -> None:
+        self.conn = conn
+        self._kinds: dict[str, dict[str, str]] = {}
+
+    def count(self, spec: TableSpec) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute(f'SELECT COUNT(*) FROM public."{spec.table}"')
+            return int(cur.fetchone()[0])
+
+    def column_kinds(self, spec: TableSpec) -> dict[str, str]:
+        kinds = self._kinds.get(spec.table)
+        if kinds is None:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    "SELECT column_name, data_type FROM information_schema.columns "
+                    "WHERE table_schema = 'public' AND table_name = %s",
+                    (spec.table,),
+                )
+                kinds = {name: DIGEST_KINDS.get(data_type, "text") for name, data_type in cur.fetchall()}
+            self._kinds[spec.table] = kinds
+        return kinds
+
+    @staticmethod
+    def _where(spec: TableSpec, low: int, high: int, keys: list[str]) -> Optional[tuple[str, tuple]]:
+        if spec.int_pk:
+            return "id >= %s AND id < %s", (low, high)
+        if keys:
+            return "id = ANY(%s::uuid[])", (keys,)
+        return None
+
+    def digest(self, spec: TableSpec, low: int, high: int, keys: list[str]) -> RangeDigest:
+        where = self._where(spec, low, high, keys)
+        if where is None:
+            return RangeDigest()
+        with self.conn.cursor() as cur:
+            cur.execute(digest_sql(spec, self.column_kinds(spec), where[0]), where[1])
+            count, total = cur.fetchone()
+        return RangeDigest(int(count), int(total) % HASH_MOD)
+
+    def rows(
+        self, spec: TableSpec, low: int, high: int, keys: list[str]
+    ) -> Iterator[tuple[str, dict[str, str]]]:
+        where = self._where(spec, low, high, keys)
+        if where is None:
+            return
+        select = ", ".join(f'"{c}"' for c in spec.columns)
+        sql, params = f'SELECT {select} FROM public."{spec.table}" WHERE {where[0]}', where[1]
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params)
+            while True:
+                batch = cur.fetchmany(etl_run.BATCH_SIZE)
+                if not batch:
+                    return
+                for values in batch:
+                    row = dict(zip(spec.columns, values))
+                    yield str(row["id"]), canonical_row(row, spec.columns)
+
+
+def plan_ranges(low: Optional[int], high: Optional[int], size: int) -> list[tuple[int, int]]:
+    """Half-open ``[low, high)`` ranges covering ``low..high`` (inclusive)."""
+    if low is None or high is None:
+        return []
+    return [(start, min(start + size, high + 1)) for start in range(low, high + 1, size)]
+
+
+def _value_preview(value: Optional[str]) -> Optional[str]:
+    if value is None or value == NULL:
+        return None
+    return value if len(value) <= MAX_VALUE_CHARS else value[:MAX_VALUE_CHARS] + "…"
+
+
+def diff_rows(spec: TableSpec, expected: dict[str, dict], loaded: dict[str, dict]) -> list[dict]:
+    """Per-id differences of a leaf range, with the diverging columns in column order."""
+    diffs: list[dict] = []
+    for key in sorted(set(expected) | set(loaded)):
+        want, got = expected.get(key), loaded.get(key)
+        if got is None:
+            diffs.append({"id": key, "kind": "missing_in_target"})
+        elif want is None:
+            diffs.append({"id": key, "kind": "unexpected_in_target"})
+        else:
+            columns = [c for c in spec.columns if want.get(c) != got.get(c)]
+            if columns:
+                diffs.append({
+                    "id": key,
+                    "kind": "value_mismatch",
+                    "columns": columns,
+                    "expected": {c: _value_preview(want.get(c)) for c in columns[:5]},
+                    "actual": {c: _value_preview(got.get(c)) for c in columns[:5]},
+                })
+    return diffs
+
+
+@dataclass
+class RangeResult:
+    low: int
+    high: int
+    source_rows: int = 0
+    target_rows: int = 0
+    ranges_compared: int = 0
+    mismatched_leaves: list[tuple[int, int]] = field(default_factory=list)
+    diffs: list[dict] = field(default_factory=list)
+
+
+def compare_range(source, target, spec: TableSpec, low: int, high: int, leaf_size: int) -> RangeResult:
+    """Compare the digests of ``[low, high)``; bisect only while they differ, fetch target rows only at leaves."""
+    result = RangeResult(low, high)
+    kinds = target.column_kinds(spec)
+    pending = [(low, high, True)]
+    while pending:
+        start, end, top = pending.pop()
+        result.ranges_compared += 1
+        if end - start <= leaf_size:
+            expected = {key: canonical_row(row, spec.columns) for key, row in source.rows(spec, start, end)}
+            loaded = dict(target.rows(spec, start, end, list(expected)))
+            if top:
+                result.source_rows, result.target_rows = len(expected), len(loaded)
+            diffs = diff_rows(spec, expected, loaded)
+            if diffs:
+                result.mismatched_leaves.append((start, end))
+                result.diffs.extend(diffs)
+            continue
+
+        wanted, keys = RangeDigest(), []
+        for key, row in source.rows(spec, start, end):
+            wanted.add(digest_row_text(row, spec.columns, kinds))
+            keys.append(key)
+        found = target.digest(spec, start, end, keys)
+        if top:
+            result.source_rows, result.target_rows = wanted.count, found.count
+        if (wanted.count, wanted.total) != (found.count, found.total):
+            middle = (start + end) // 2
+            pending.extend([(middle, end, False), (start, middle, False)])
+    return result
+
+
+def compare_table(
+    spec: TableSpec,
+    open_sides: Callable[[], tuple[Any, Any]],
+    *,
+    workers: int,
+    range_size: int,
+    leaf_size: int,
+    max_samples: int,
+) -> dict:
+    """Parity of one table; ``open_sides()`` gives a (source, target) pair per worker thread."""
+    started = time.monotonic()
+    local = threading.local()
+    opened: list[tuple[Any, Any]] = []
+    lock = threading.Lock()
+
+    def _sides():
+        sides = getattr(local, "sides", None)
+        if sides is None:
+            sides = local.sides = open_sides()
+            with lock:
+                opened.append(sides)
+        return sides
+
+    def _compare(bounds: tuple[int, int]) -> RangeResult:
+        source, target = _sides()
+        return compare_range(source, target, spec, bounds[0], bounds[1], leaf_size)
+
+    source, target = _sides()
+    ranges = plan_ranges(*source.bounds(spec), range_size)
+    target_total = target.count(spec)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges) or 1)), thread_name_prefix="parity") as pool:
+        results = list(pool.map(_compare, ranges))
+    for sides in opened:
+        for side in sides:
+            _close(side)
+
+    diffs = [d for r in results for d in r.diffs]
+    expected_total = sum(r.source_rows for r in results)
+    diverging = Counter(c for d in diffs for c in d.get("columns", ()))
+    kinds = Counter(d["kind"] for d in diffs)
+    outside = target_total - sum(r.target_rows for r in results)  # linhas fora das faixas do legado
+    return {
+        "table": spec.table,
+        "status": "ok" if not diffs and outside == 0 else "mismatch",
+        "ranges": len(ranges),
+        "ranges_mismatched": sum(1 for r in results if r.mismatched_leaves),
+        "ranges_compared": sum(r.ranges_compared for r in results),
+        "source_rows": expected_total,
+        "target_rows": target_total,
+        "target_rows_outside_ranges": outside,
+        "mismatches": dict(kinds),
+        "diverging_columns": [c for c in spec.columns if c in diverging],
+        "diverging_column_counts": {c: diverging[c] for c in spec.columns if c in diverging},
+        "samples": diffs[:max_samples],
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def _close(side) -> None:
+    try:
+        side.conn.close()
+    except Exception:
+        pass
+
+
+def _parse_tables(raw: str) -> list[str]:
+    tables = [t.strip() for t in raw.split(",") if t.strip()]
+    if not tables:
+        raise ValueError("PARITY_TABLES: at least one table is required")
+    return tables
+
+
+def _open_sides() -> tuple[MySQLSide, SupabaseSide]:
+    pg = etl_run.get_pg()
+    pg.set_session(readonly=True, autocommit=True)
+    return MySQLSide(etl_run.get_mysql()), SupabaseSide(pg)
+
+
+def verify_parity() -> dict:
+    tables = _parse_tables(os.getenv("PARITY_TABLES", DEFAULT_TABLES))
+    specs = [TableSpec.for_table(table) for table in tables]
+    workers = max(1, int(os.getenv("PARITY_WORKERS", "4")))
+    range_size = max(1, int(os.getenv("PARITY_RANGE_SIZE", "50000")))
+    leaf_size = max(1, int(os.getenv("PARITY_LEAF_SIZE", "200")))
+    max_samples = int(os.getenv("PARITY_MAX_SAMPLES", "50"))
+    report_path = Path(os.getenv("PARITY_REPORT_PATH", "./logs/parity_report.json"))
+
+    report: dict = {
+        "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "status": "running",
+        "workers": workers,
+        "range_size": range_size,
+        "leaf_size": leaf_size,
+        "tables": {},
+    }
+    started = time.monotonic()
+    try:
+        # Mesmo estado que o ETL usa no transform: cache de FKs válidas e plano de charset.
+        mysql = etl_run.get_mysql()
+        try:
+            cursor = mysql.cursor(dictionary=True)
+            etl_run.VALID_FK_IDS = etl_run.build_valid_fk_ids(cursor)
+            etl_run.prepare_charset_plan(cursor)
+            cursor.close()
+        finally:
+            mysql.close()
+
+        for spec in specs:
+            result = compare_table(
+                spec, _open_sides, workers=workers, range_size=range_size, leaf_size=leaf_size, max_samples=max_samples
+            )
+            report["tables"][spec.table] = result
+            log.info(
+                "[PARITY %s] %s source=%d target=%d ranges=%d mismatched=%d columns=%s (%.1fs)",
+                result["status"].upper(),
+                spec.table,
+                result["source_rows"],
+                result["target_rows"],
+                result["ranges"],
+                result["ranges_mismatched"],
+                ",".join(result["diverging_columns"]) or "-",
+                result["elapsed_seconds"],
+            )
+
+        failed = [t for t, r in report["tables"].items() if r["status"] != "ok"]
+        report["status"] = "failed" if failed else "success"
+        if failed:
+            raise RuntimeError(f"parity check failed for: {', '.join(failed)}")
+        log.info("Parity check completed successfully.")
+    except Exception as exc:
+        report["status"] = "failed"
+        report["error"] = str(exc)
+        raise
+    finally:
+        report["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    return report
+
+
+def main() -> None:
+    try:
+        verify_parity()
+    except Exception as exc:
+        report_path = Path(os.getenv("PARITY_REPORT_PATH", "./logs/parity_report.json"))
+        persist_error_event(
+            script_name="scripts/verify_parity.py",
+            step_name="verify_parity",
+            phase="verification",
+            event_type="parity_failure",
+            message=str(exc),
+            error_class=type(exc).__name__,
+            traceback_text=capture_traceback(exc),
+            run_id=ensure_run_id(),
+            details={
+                "report_path": str(report_path.resolve()),
+                "report": read_json_file(report_path),
+            },
+        )
+        log.error("Parity check failed: %s", exc)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
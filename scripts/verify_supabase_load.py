@@ -1,5 +1,16 @@
 ﻿#!/usr/bin/env python3
-"""Post-load verification for Supabase data."""
+"""Post-load verification for Supabase data.
+
+Column metadata (and, in estimate mode, ``pg_class.reltuples``) for every
+``VERIFY_TABLES`` entry comes from one catalog query. The per-table checks
+(row counts, recency, min-date) then run concurrently on up to
+``VERIFY_WORKERS`` connections, one per worker thread.
+
+``VERIFY_COUNT_MODE=estimate`` runs ``ANALYZE`` and accepts the planner
+estimate when it clears the minimum by more than ``VERIFY_ESTIMATE_MARGIN``.
+Only tables near their threshold, or whose count feeds the baseline
+comparison, pay for an exact ``COUNT(*)``.
+"""
 
 from __future__ import annotations
 
@@ -8,8 +19,12 @@ import logging
 import os
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Callable
 
 import psycopg2
 from dotenv import load_dotenv
@@ -87,28 +102,71 @@ def _count_rows(cur, table: str) -> int:
     return int(row[0])
 
 
-def _has_column(cur, table: str, column: str) -> bool:
+def _fetch_catalog(cur, tables: list[str]) -> dict[str, dict]:
+    """Columns and reltuples of all tables in one round trip: {table: {"columns": set, "reltuples": float}}."""
     cur.execute(
         """
-        SELECT 1
-        FROM information_schema.columns
-        WHERE table_schema = 'public'
-          AND table_name = %s
-          AND column_name = %s
-        LIMIT 1
+        SELECT c.relname, c.reltuples, a.attname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = 'public'
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE c.relname = ANY(%s)
+          AND c.relkind IN ('r', 'p')
         """,
-        (table, column),
+        (list(tables),),
     )
-    return cur.fetchone() is not None
+    catalog: dict[str, dict] = {}
+    for relname, reltuples, column in cur.fetchall():
+        entry = catalog.setdefault(relname, {"columns": set(), "reltuples": float(reltuples)})
+        entry["columns"].add(column)
+    return catalog
 
 
-def _find_recency_column(cur, table: str, candidates: list[str]) -> str | None:
+def _find_recency_column(columns: set[str], candidates: list[str]) -> str | None:
     for column in candidates:
-        if _has_column(cur, table, column):
+        if column in columns:
             return column
     return None
 
 
+def _estimate_is_decisive(reltuples: float, required: int, margin: float) -> bool:
+    """The estimate alone settles the threshold (reltuples < 0 = never analyzed)."""
+    if required <= 0:
+        return True
+    return reltuples >= 0 and reltuples >= required * (1 + margin)
+
+
+def _run_concurrently(db_url: str, jobs: dict[str, Callable], workers: int) -> dict[str, object]:
+    """Run ``job(cursor)`` for each job on a small pool (one connection per worker thread)."""
+    if not jobs:
+        return {}
+    local = threading.local()
+    opened: list = []
+    lock = threading.Lock()
+
+    def _call(job: Callable):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = psycopg2.connect(db_url)
+            conn.autocommit = True
+            local.conn = conn
+            with lock:
+                opened.append(conn)
+        with conn.cursor() as cur:
+            return job(cur)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs))), thread_name_prefix="verify") as pool:
+            futures = {name: pool.submit(_call, job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        for conn in opened:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
 def _max_age_hours(cur, table: str, column: str) -> float | None:
     cur.execute(
         f'SELECT EXTRACT(EPOCH FROM (NOW() - MAX("{column}"))) / 3600.0 FROM "{table}" WHERE "{column}" IS NOT NULL'
@@ -194,11 +252,16 @@ def verify_supabase_load() -> None:
     min_date_min_rows = int(os.getenv("VERIFY_MIN_DATE_MIN_ROWS", "1"))
     baseline_path = Path(os.getenv("VERIFY_BASELINE_PATH", "./backups/verify_baseline.json"))
     diagnostics_path = Path(os.getenv("VERIFY_DIAGNOSTICS_PATH", "./logs/verify_diagnostics.json"))
+    workers = max(1, int(os.getenv("VERIFY_WORKERS", "4")))
+    count_mode = (os.getenv("VERIFY_COUNT_MODE", "exact") or "exact").strip().lower()
+    estimate_margin = float(os.getenv("VERIFY_ESTIMATE_MARGIN", "0.2"))
 
     if recency_table not in tables:
         raise ValueError("VERIFY_RECENCY_TABLE must be present in VERIFY_TABLES")
     if min_date_raw and min_date_table not in tables:
         raise ValueError("VERIFY_MIN_DATE_TABLE must be present in VERIFY_TABLES")
+    if count_mode not in ("exact", "estimate"):
+        raise ValueError("VERIFY_COUNT_MODE must be 'exact' or 'estimate'")
 
     log.info("Verifying row counts in %s", ", ".join(tables))
 
@@ -208,7 +271,11 @@ def verify_supabase_load() -> None:
         "status": "running",
         "tables": tables,
         "min_rows_by_table": min_rows_by_table,
+        "count_mode": count_mode,
+        "workers": workers,
         "counts": counts,
+        "count_source": {},
+        "estimates": {},
         "recency": {
             "table": recency_table,
             "candidates": recency_candidates,
@@ -229,79 +296,123 @@ def verify_supabase_load() -> None:
         "baseline_path": str(baseline_path),
     }
 
+    started = time.monotonic()
     try:
-        with psycopg2.connect(db_url) as conn:
+        min_dt = _parse_iso_datetime(min_date_raw) if min_date_raw else None
+
+        conn = psycopg2.connect(db_url)
+        try:
+            conn.autocommit = True
             with conn.cursor() as cur:
-                for table in tables:
-                    count = _count_rows(cur, table)
-                    counts[table] = count
-                    required = min_rows_by_table[table]
-                    if count < required:
-                        raise RuntimeError(
-                            f"verification failed: table '{table}' has {count} rows (< {required})"
-                        )
-                    log.info("[VERIFY OK] table=%s count=%d min_required=%d", table, count, required)
-
-                recency_column = _find_recency_column(cur, recency_table, recency_candidates)
-                diagnostics["recency"]["selected_column"] = recency_column
-                if recency_column:
-                    age_hours = _max_age_hours(cur, recency_table, recency_column)
-                    diagnostics["recency"]["age_hours"] = age_hours
-                    if age_hours is None:
-                        raise RuntimeError(
-                            f"verification failed: '{recency_table}.{recency_column}' has no non-null values"
-                        )
-                    if age_hours > max_age_hours:
-                        raise RuntimeError(
-                            f"verification failed: data too old in '{recency_table}.{recency_column}' "
-                            f"({age_hours:.2f}h > {max_age_hours:.2f}h)"
-                        )
-                    log.info(
-                        "[VERIFY OK] recency table=%s column=%s age_hours=%.2f",
-                        recency_table,
-                        recency_column,
-                        age_hours,
-                    )
-                else:
-                    baseline = _load_baseline(baseline_path)
-                    previous = baseline.get("counts", {}).get(recency_table)
-                    current = counts[recency_table]
-                    diagnostics["recency"]["baseline_previous_count"] = previous
-                    if previous is not None and current == previous:
-                        raise RuntimeError(
-                            "verification failed: no recency column and rowcount did not change "
-                            f"for '{recency_table}' (current={current}, previous={previous})"
-                        )
-                    log.info(
-                        "[VERIFY OK] no recency column in %s; baseline comparison passed (previous=%s current=%s)",
-                        recency_table,
-                        previous,
-                        current,
-                    )
-
-                if min_date_raw:
-                    min_dt = _parse_iso_datetime(min_date_raw)
-                    min_col = _find_recency_column(cur, min_date_table, min_date_candidates)
-                    diagnostics["min_date"]["selected_column"] = min_col
-                    if not min_col:
-                        raise RuntimeError(
-                            "verification failed: no suitable date column found for VERIFY_MIN_DATE "
-                            f"in table '{min_date_table}'"
-                        )
-                    rows_after = _count_rows_after(cur, min_date_table, min_col, min_dt)
-                    diagnostics["min_date"]["rows_after"] = rows_after
-                    if rows_after < min_date_min_rows:
-                        raise RuntimeError(
-                            "verification failed: expected rows after VERIFY_MIN_DATE "
-                            f"({min_date_raw}) in '{min_date_table}.{min_col}', got {rows_after}"
-                        )
-                    log.info(
-                        "[VERIFY OK] min-date table=%s column=%s threshold=%s rows=%d",
-                        min_date_table,
-                        min_col,
-                        min_date_raw,
-                        rows_after,
-                    )
+                if count_mode == "estimate":
+                    cur.execute("ANALYZE " + ", ".join(f'"{table}"' for table in tables))
+                catalog = _fetch_catalog(cur, tables)
+        finally:
+            conn.close()
+
+        missing = [table for table in tables if table not in catalog]
+        if missing:
+            raise RuntimeError(f"verification failed: table(s) not found in public schema: {', '.join(missing)}")
+
+        recency_column = _find_recency_column(catalog[recency_table]["columns"], recency_candidates)
+        diagnostics["recency"]["selected_column"] = recency_column
+        min_col = None
+        if min_dt is not None:
+            min_col = _find_recency_column(catalog[min_date_table]["columns"], min_date_candidates)
+            diagnostics["min_date"]["selected_column"] = min_col
+            if not min_col:
+                raise RuntimeError(
+                    "verification failed: no suitable date column found for VERIFY_MIN_DATE "
+                    f"in table '{min_date_table}'"
+                )
+
+        jobs: dict[str, Callable] = {}
+        for table in tables:
+            reltuples = catalog[table]["reltuples"]
+            if count_mode == "estimate":
+                diagnostics["estimates"][table] = reltuples
+            # Sem coluna de recência a checagem compara a contagem com o baseline: precisa ser exata.
+            needs_exact = count_mode == "exact" or (table == recency_table and not recency_column)
+            if needs_exact or not _estimate_is_decisive(reltuples, min_rows_by_table[table], estimate_margin):
+                jobs[f"count:{table}"] = lambda cur, table=table: _count_rows(cur, table)
+        if recency_column:
+            jobs["recency"] = lambda cur: _max_age_hours(cur, recency_table, recency_column)
+        if min_col:
+            jobs["min_date"] = lambda cur: _count_rows_after(cur, min_date_table, min_col, min_dt)
+
+        results = _run_concurrently(db_url, jobs, workers)
+
+        for table in tables:
+            if f"count:{table}" in results:
+                count = int(results[f"count:{table}"])
+                diagnostics["count_source"][table] = "exact"
+            else:
+                count = int(catalog[table]["reltuples"])
+                diagnostics["count_source"][table] = "estimate"
+            counts[table] = count
+            required = min_rows_by_table[table]
+            if count < required:
+                raise RuntimeError(
+                    f"verification failed: table '{table}' has {count} rows (< {required})"
+                )
+            log.info(
+                "[VERIFY OK] table=%s count=%d (%s) min_required=%d",
+                table,
+                count,
+                diagnostics["count_source"][table],
+                required,
+            )
+
+        if recency_column:
+            age_hours = results["recency"]
+            diagnostics["recency"]["age_hours"] = age_hours
+            if age_hours is None:
+                raise RuntimeError(
+                    f"verification failed: '{recency_table}.{recency_column}' has no non-null values"
+                )
+            if age_hours > max_age_hours:
+                raise RuntimeError(
+                    f"verification failed: data too old in '{recency_table}.{recency_column}' "
+                    f"({age_hours:.2f}h > {max_age_hours:.2f}h)"
+                )
+            log.info(
+                "[VERIFY OK] recency table=%s column=%s age_hours=%.2f",
+                recency_table,
+                recency_column,
+                age_hours,
+            )
+        else:
+            baseline = _load_baseline(baseline_path)
+            previous = baseline.get("counts", {}).get(recency_table)
+            current = counts[recency_table]
+            diagnostics["recency"]["baseline_previous_count"] = previous
+            if previous is not None and current == previous:
+                raise RuntimeError(
+                    "verification failed: no recency column and rowcount did not change "
+                    f"for '{recency_table}' (current={current}, previous={previous})"
+                )
+            log.info(
+                "[VERIFY OK] no recency column in %s; baseline comparison passed (previous=%s current=%s)",
+                recency_table,
+                previous,
+                current,
+            )
+
+        if min_col:
+            rows_after = int(results["min_date"])
+            diagnostics["min_date"]["rows_after"] = rows_after
+            if rows_after < min_date_min_rows:
+                raise RuntimeError(
+                    "verification failed: expected rows after VERIFY_MIN_DATE "
+                    f"({min_date_raw}) in '{min_date_table}.{min_col}', got {rows_after}"
+                )
+            log.info(
+                "[VERIFY OK] min-date table=%s column=%s threshold=%s rows=%d",
+                min_date_table,
+                min_col,
+                min_date_raw,
+                rows_after,
+            )
 
         _save_baseline(baseline_path, counts)
         diagnostics["status"] = "success"
@@ -311,6 +422,7 @@ def verify_supabase_load() -> None:
         diagnostics["error"] = str(exc)
         raise
     finally:
+        diagnostics["elapsed_seconds"] = round(time.monotonic() - started, 3)
         _save_diagnostics(diagnostics_path, diagnostics)
 
 
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import dataclasses
+import gzip
+import hashlib
+import lzma
+import time
+from pathlib import Path
+
+import pytest
+
+from scripts import dump_codec, fetch_backup, import_dump
+
+DUMP = b"".join(f"INSERT INTO is_pedidos VALUES ({i}, 'x');\n".encode() for i in range(3000))
+SHA = hashlib.sha256(DUMP).hexdigest()
+
+
+def _chunks(data: bytes, size: int = 777) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize(
+    "codec, packed",
+    [
+        ("plain", DUMP),
+        ("gzip", gzip.compress(DUMP)),
+        ("gzip", gzip.compress(DUMP[:5000]) + gzip.compress(DUMP[5000:])),  # multi-member (pigz, cat a.gz b.gz)
+        ("xz", lzma.compress(DUMP)),
+    ],
+)
+def test_detects_codec_by_magic_and_round_trips(codec: str, packed: bytes) -> None:
+    assert dump_codec.detect_codec(packed[:8]) == codec
+    assert b"".join(dump_codec.decompress_stream(_chunks(packed))) == DUMP
+
+
+def test_truncated_stream_raises() -> None:
+    packed = gzip.compress(DUMP)
+
+    with pytest.raises(ValueError, match="truncated gzip"):
+        b"".join(dump_codec.decompress_stream(_chunks(packed[:-40])))
+
+
+def test_xz_multi_stream_ending_on_a_chunk_boundary() -> None:
+    first, second = lzma.compress(DUMP[:5000]), lzma.compress(DUMP[5000:])
+
+    assert b"".join(dump_codec.decompress_stream([first, second])) == DUMP
+    with pytest.raises(ValueError, match="truncated xz"):
+        b"".join(dump_codec.decompress_stream([first, second[:-30]]))
+
+
+def test_truncated_zstd_raises() -> None:
+    pytest.importorskip("zstandard")
+    compressor = dump_codec.Compressor("zstd")
+    packed = compressor.compress(DUMP) + compressor.flush()
+
+    with pytest.raises(ValueError, match="truncated zstd"):
+        b"".join(dump_codec.decompress_stream(_chunks(packed[:-10])))
+    # dois frames, o primeiro termina no fim de um chunk
+    assert b"".join(dump_codec.decompress_stream([packed, packed])) == DUMP + DUMP
+
+
+def test_zstd_round_trip() -> None:
+    pytest.importorskip("zstandard")
+    compressor = dump_codec.Compressor("zstd")
+    packed = compressor.compress(DUMP) + compressor.flush()
+
+    assert dump_codec.detect_codec(packed) == "zstd"
+    assert b"".join(dump_codec.decompress_stream(_chunks(packed))) == DUMP
+
+
+def test_resolve_codec_aliases_and_fallback() -> None:
+    assert dump_codec.resolve_codec("none") == dump_codec.PLAIN
+    assert dump_codec.resolve_codec("gz") == "gzip"
+    assert dump_codec.resolve_codec("zstd") == ("zstd" if dump_codec.HAS_ZSTD else "gzip")
+    with pytest.raises(ValueError):
+        dump_codec.resolve_codec("bzip2")
+
+
+def _config(tmp_path: Path, codec: str) -> fetch_backup.BackupConfig:
+    return dataclasses.replace(fetch_backup.load_backup_config(), local_dir=tmp_path, cache_codec=codec)
+
+
+def test_cache_local_compresses_plain_download_with_content_sidecar(tmp_path: Path) -> None:
+    plain = tmp_path / "nblgrafica_app-2026-04-05.sql"
+    plain.write_bytes(DUMP)
+
+    cached = fetch_backup._cache_local(plain, _config(tmp_path, "gzip"))
+
+    assert cached.name == "nblgrafica_app-2026-04-05.sql.gz"
+    assert not plain.exists()
+    assert gzip.decompress(cached.read_bytes()) == DUMP
+    assert dump_codec.read_sha256_sidecar(cached) == SHA
+    assert fetch_backup.dump_sha256(cached) == SHA
+
+
+def test_tee_caches_compressed_copy_and_hashes_plain_content(tmp_path: Path) -> None:
+    target = tmp_path / "nblgrafica_app-2026-04-05.sql"
+    tee = fetch_backup.DumpTee(iter(_chunks(DUMP)), target, cache_codec="gzip")
+
+    assert b"".join(tee) == DUMP  # o consumidor recebe os bytes como chegaram
+
+    cached = tmp_path / "nblgrafica_app-2026-04-05.sql.gz"
+    assert tee.local_path == cached and not target.exists()
+    assert gzip.decompress(cached.read_bytes()) == DUMP
+    assert tee.sha256 == SHA
+    assert dump_codec.read_sha256_sidecar(cached) == SHA
+
+
+def test_purge_removes_stale_compressed_dumps_and_sidecars(tmp_path: Path) -> None:
+    old = tmp_path / "nblgrafica_app-2020-01-01.sql.gz"
+    old.write_bytes(gzip.compress(b"x"))
+    dump_codec.write_sha256_sidecar(old, SHA)
+    recent = tmp_path / f"nblgrafica_app-{time.strftime('%Y-%m-%d')}.sql.zst"
+    recent.write_bytes(b"x")
+
+    fetch_backup._purge_old_backups(
+        7, local_dir=tmp_path, pattern=fetch_backup.DATE_PATTERN, prefix="nblgrafica_app-", extension=".sql"
+    )
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [recent.name]
+
+
+def test_import_dump_decompresses_cached_file_in_process(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    out = tmp_path / "mysql_stdin.sql"
+    monkeypatch.setattr(import_dump, "_mysql_cmd", lambda: ["sh", "-c", f"cat > '{out}'"])
+    cached = tmp_path / "nblgrafica_app-2026-04-05.sql"  # extensão "errada": o codec vem dos magic bytes
+    cached.write_bytes(lzma.compress(DUMP))
+
+    import_dump._import_dump(cached)
+
+    assert out.read_bytes() == DUMP
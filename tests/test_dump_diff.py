@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import gzip
+from pathlib import Path
+
+import pytest
+
+from scripts import dump_diff, import_dump
+
+PREAMBLE = (
+    "-- MySQL dump 10.13\n--\n"
+    "/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n\n"
+)
+FOOTER = "/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n\n-- Dump completed on {when}\n"
+
+
+def _table(name: str, rows: list[int]) -> str:
+    values = ",".join(f"({r})" for r in rows)
+    return (
+        f"--\n-- Table structure for table `{name}`\n--\n\n"
+        f"DROP TABLE IF EXISTS `{name}`;\nCREATE TABLE `{name}` (`id` int NOT NULL) ENGINE=InnoDB;\n"
+        f"LOCK TABLES `{name}` WRITE;\nINSERT INTO `{name}` VALUES {values};\nUNLOCK TABLES;\n\n"
+    )
+
+
+def _triggers(table: str, body: str) -> str:
+    return (
+        "/*!50003 SET @saved_cs_client      = @@character_set_client */ ;\n"
+        "/*!50003 SET @saved_sql_mode       = @@sql_mode */ ;\n"
+        "DELIMITER ;;\n"
+        f"/*!50003 CREATE*/ /*!50017 DEFINER=`root`@`%`*/ /*!50003 TRIGGER `trg_{table}` "
+        f"BEFORE INSERT ON `{table}` FOR EACH ROW {body} */;;\n"
+        "DELIMITER ;\n"
+        "/*!50003 SET sql_mode              = @saved_sql_mode */ ;\n"
+        "/*!50003 SET character_set_client  = @saved_cs_client */ ;\n\n"
+    )
+
+
+def _temporary_view(name: str) -> str:
+    return (
+        f"--\n-- Temporary view structure for view `{name}`\n--\n\n"
+        f"DROP TABLE IF EXISTS `{name}`;\n/*!50001 DROP VIEW IF EXISTS `{name}`*/;\n"
+        f"/*!50001 CREATE VIEW `{name}` AS SELECT \n 1 AS `id`*/;\n\n"
+    )
+
+
+def _final_view(name: str, select: str) -> str:
+    return (
+        f"--\n-- Final view structure for view `{name}`\n--\n\n"
+        f"/*!50001 DROP VIEW IF EXISTS `{name}`*/;\n"
+        "/*!50001 CREATE ALGORITHM=UNDEFINED */\n"
+        f"/*!50001 VIEW `{name}` AS {select} */;\n\n"
+    )
+
+
+def _routines(body: str) -> str:
+    return (
+        "--\n-- Dumping routines for database 'nblgrafica_app'\n--\n"
+        "/*!50003 DROP PROCEDURE IF EXISTS `sp_total` */;\n"
+        "DELIMITER ;;\n"
+        f"CREATE DEFINER=`root`@`%` PROCEDURE `sp_total`()\nBEGIN\n  {body}\nEND ;;\n"
+        "DELIMITER ;\n\n"
+    )
+
+
+def _dump(tables: dict[str, list[int]], when: str = "2026-04-05") -> bytes:
+    body = "".join(_table(name, rows) for name, rows in tables.items())
+    return (PREAMBLE + body + FOOTER.format(when=when)).encode()
+
+
+def _dump_with_objects(
+    rows: tuple[int, ...] = (1,), trigger: str = "SET NEW.id = NEW.id", view: str = "select `id` from `is_pedidos`"
+) -> bytes:
+    body = (
+        _table("is_pedidos", rows)
+        + _triggers("is_pedidos", trigger)
+        + _temporary_view("vw_pedidos")
+        + _table("is_usuarios", [1])
+        + _final_view("vw_pedidos", view)
+        + _routines("SELECT COUNT(*) FROM is_pedidos;")
+    )
+    return (PREAMBLE + body + FOOTER.format(when="2026-04-05")).encode()
+
+
+def _chunks(data: bytes, size: int = 13) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def test_checksums_change_only_for_changed_tables() -> None:
+    night1 = dump_diff.table_checksums(_chunks(_dump({"is_clientes": [1, 2], "is_pedidos": [1]})))
+    night2 = dump_diff.table_checksums(
+        _chunks(gzip.compress(_dump({"is_clientes": [1, 2], "is_pedidos": [1, 2]}, when="2026-04-06")))
+    )
+
+    assert list(night1) == ["is_clientes", "is_pedidos"]
+    assert night1["is_clientes"] == night2["is_clientes"]  # data do dump no comentário não conta
+    assert night1["is_pedidos"] != night2["is_pedidos"]
+
+
+def test_filter_tables_keeps_preamble_selected_sections_and_footer() -> None:
+    dump = _dump({"is_clientes": [1], "is_pedidos": [2], "is_usuarios": [3]})
+
+    partial = b"".join(dump_diff.filter_tables(_chunks(dump), {"is_pedidos"})).decode()
+
+    assert partial.startswith(PREAMBLE)
+    assert "INSERT INTO `is_pedidos` VALUES (2);" in partial
+    assert "is_clientes" not in partial and "is_usuarios" not in partial
+    assert partial.endswith(FOOTER.format(when="2026-04-05"))
+
+
+def test_views_triggers_and_routines_get_their_own_sections() -> None:
+    base = dump_diff.table_checksums(_chunks(_dump_with_objects()))
+    new_view = dump_diff.table_checksums(_chunks(_dump_with_objects(view="select `id` from `is_usuarios`")))
+    new_trigger = dump_diff.table_checksums(_chunks(_dump_with_objects(trigger="SET NEW.id = NEW.id + 1")))
+
+    assert list(base) == [
+        "is_pedidos",
+        "triggers:is_pedidos",
+        "view:vw_pedidos",
+        "is_usuarios",
+        "routines:nblgrafica_app",
+    ]
+    assert [k for k in base if base[k] != new_view[k]] == ["view:vw_pedidos"]
+    assert [k for k in base if base[k] != new_trigger[k]] == ["triggers:is_pedidos"]
+    assert dump_diff.section_object("view:vw_pedidos") == ("view", "vw_pedidos")
+    assert dump_diff.section_object("is_pedidos") == ("table", "is_pedidos")
+
+
+def test_filter_tables_keeps_both_halves_of_a_view_and_not_its_neighbours() -> None:
+    partial = b"".join(dump_diff.filter_tables(_chunks(_dump_with_objects()), {"view:vw_pedidos"})).decode()
+
+    assert "Temporary view structure for view `vw_pedidos`" in partial
+    assert "/*!50001 VIEW `vw_pedidos` AS select `id` from `is_pedidos` */;" in partial
+    assert "INSERT INTO" not in partial and "TRIGGER" not in partial and "sp_total" not in partial
+    assert "`is_usuarios`" not in partial
+    assert partial.endswith(FOOTER.format(when="2026-04-05"))
+
+
+def test_diff_import_reloads_only_changed_tables(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    dump = tmp_path / "nblgrafica_app-2026-04-06.sql"
+    dump.write_bytes(_dump({"is_clientes": [1], "is_pedidos": [1, 2], "is_novos": [7]}))
+    old = dump_diff.table_checksums([_dump({"is_clientes": [1], "is_pedidos": [1], "is_removida": [9]})])
+    state = {name: {"sha256": sha, "dump_name": "nblgrafica_app-2026-04-05.sql"} for name, sha in old.items()}
+    calls: dict[str, object] = {}
+    out = tmp_path / "mysql_stdin.sql"
+
+    monkeypatch.setattr(import_dump, "_load_warm_state", lambda: state)
+    monkeypatch.setattr(import_dump, "_forget_warm_state", lambda tables=None: calls.setdefault("forget", list(tables)))
+    monkeypatch.setattr(import_dump, "_drop_sections", lambda sections: calls.setdefault("drop", sections))
+    monkeypatch.setattr(import_dump, "_save_warm_state", lambda name, sums: calls.setdefault("save", (name, sums)))
+    monkeypatch.setattr(import_dump, "_mysql_cmd", lambda: ["sh", "-c", f"cat > '{out}'"])
+
+    report = import_dump._import_diff(dump)
+
+    assert report["tables_reused"] == ["is_clientes"]
+    assert report["tables_reloaded"] == ["is_pedidos", "is_novos"]
+    assert report["tables_dropped"] == ["is_removida"]
+    assert report["snapshot"] == ["nblgrafica_app-2026-04-05.sql"]
+    assert calls["forget"] == ["is_pedidos", "is_novos", "is_removida"]
+    assert calls["drop"] == ["is_removida"]
+    assert sorted(calls["save"][1]) == ["is_novos", "is_pedidos"]
+    applied = out.read_text()
+    assert "`is_clientes`" not in applied and "INSERT INTO `is_pedidos` VALUES (1),(2);" in applied
+
+
+def test_diff_import_reloads_triggers_with_their_table(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    dump = tmp_path / "nblgrafica_app-2026-04-06.sql"
+    dump.write_bytes(_dump_with_objects(rows=(1, 2)))
+    old = dump_diff.table_checksums([_dump_with_objects(rows=(1,))])
+    state = {name: {"sha256": sha, "dump_name": "nblgrafica_app-2026-04-05.sql"} for name, sha in old.items()}
+    calls: dict[str, object] = {}
+    out = tmp_path / "mysql_stdin.sql"
+
+    monkeypatch.setattr(import_dump, "_load_warm_state", lambda: state)
+    monkeypatch.setattr(import_dump, "_forget_warm_state", lambda tables=None: None)
+    monkeypatch.setattr(import_dump, "_drop_sections", lambda sections: calls.setdefault("drop", sections))
+    monkeypatch.setattr(import_dump, "_save_warm_state", lambda name, sums: None)
+    monkeypatch.setattr(import_dump, "_mysql_cmd", lambda: ["sh", "-c", f"cat > '{out}'"])
+
+    report = import_dump._import_diff(dump)
+
+    # o DROP TABLE do reload leva os triggers junto: o bloco deles volta mesmo sem mudar
+    assert report["tables_reloaded"] == ["is_pedidos", "triggers:is_pedidos"]
+    assert report["tables_reused"] == ["view:vw_pedidos", "is_usuarios", "routines:nblgrafica_app"]
+    assert calls["drop"] == ["triggers:is_pedidos"]
+    applied = out.read_text()
+    assert "TRIGGER `trg_is_pedidos`" in applied and "vw_pedidos" not in applied
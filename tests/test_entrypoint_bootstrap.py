@@ -5,7 +5,11 @@ ROOT = Path(__file__).resolve().parents[1]
 ENTRYPOINTS = [
     ROOT / "scripts" / "check_env.py",
     ROOT / "scripts" / "daily_job.py",
+    ROOT / "scripts" / "fetch_backup.py",
+    ROOT / "scripts" / "import_dump.py",
+    ROOT / "scripts" / "pg_maintenance.py",
     ROOT / "scripts" / "probe_backup_source.py",
+    ROOT / "scripts" / "verify_parity.py",
     ROOT / "scripts" / "verify_supabase_load.py",
     ROOT / "etl" / "run.py",
 ]
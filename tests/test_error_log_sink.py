@@ -41,3 +41,150 @@ def test_ensure_run_id_generates_and_reuses_value(monkeypatch) -> None:
 
     assert first == second
     assert first.startswith("local-")
+
+
+class SinkCursorStub:
+    def __init__(self, statements: list[str]) -> None:
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, sql: str, params=None) -> None:
+        self.statements.append(sql)
+
+
+class SinkConnStub:
+    closed = 0
+
+    def __init__(self, statements: list[str]) -> None:
+        self.statements = statements
+
+    def cursor(self) -> SinkCursorStub:
+        return SinkCursorStub(self.statements)
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+def _event(n: int) -> dict:
+    return {"run_id": "r1", "script_name": "etl/run.py", "event_type": "etl_failure", "message": f"boom {n}"}
+
+
+def test_sink_batches_events_and_clears_wal(monkeypatch, tmp_path: Path) -> None:
+    batches: list[int] = []
+    connects: list[int] = []
+    monkeypatch.setattr(error_log_sink, "execute_values", lambda cur, sql, values: batches.append(len(values)))
+    monkeypatch.setattr(error_log_sink, "_DDL_DONE", set())
+    statements: list[str] = []
+
+    def connect() -> SinkConnStub:
+        connects.append(1)
+        return SinkConnStub(statements)
+
+    sink = error_log_sink.ErrorSink(wal_dir=tmp_path, batch_size=3, flush_interval_s=60, connect=connect)
+    assert sink.submit([_event(i) for i in range(7)]) == 7
+    assert sink.wal_path.exists()
+
+    assert sink.flush(timeout=5)
+    assert sink.close(timeout=5)
+
+    assert sum(batches) == 7 and max(batches) <= 3
+    assert len(connects) == 1
+    assert sum("CREATE TABLE" in sql for sql in statements) == 1
+    assert not sink.wal_path.exists()
+
+
+def test_sink_keeps_wal_when_supabase_is_down_and_next_process_recovers(monkeypatch, tmp_path: Path) -> None:
+    import subprocess
+    import sys
+
+    def broken():
+        raise RuntimeError("network down")
+
+    monkeypatch.setattr(error_log_sink, "LOCAL_FAILURE_LOG", tmp_path / "failures.log")
+    down = error_log_sink.ErrorSink(wal_dir=tmp_path / "wal", flush_interval_s=60, connect=broken)
+    down.submit([_event(1), _event(2)])
+    assert down.close(timeout=5) is False
+    assert len(error_log_sink._read_wal(down.wal_path)) == 2
+
+    # Simula o WAL de um processo que morreu antes de drenar.
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    orphan = down.wal_path.rename(down.wal_path.with_name(f"{dead.pid}.jsonl"))
+
+    sent: list[dict] = []
+    monkeypatch.setattr(error_log_sink, "_insert_events", lambda conn, rows: sent.extend(rows))
+    sink = error_log_sink.ErrorSink(wal_dir=tmp_path / "wal", flush_interval_s=60, connect=lambda: SinkConnStub([]))
+    assert sink.recover() == 2
+    assert not orphan.exists()
+    assert sink.close(timeout=5)
+    assert [e["message"] for e in sent] == ["boom 1", "boom 2"]
+
+
+def test_sync_mode_inserts_immediately(monkeypatch) -> None:
+    sent: list[dict] = []
+    monkeypatch.setattr(error_log_sink, "SINK_MODE", "sync")
+    monkeypatch.setattr(error_log_sink, "_connection", lambda: SinkConnStub([]))
+    monkeypatch.setattr(error_log_sink, "_insert_events", lambda conn, rows: sent.extend(rows))
+
+    assert error_log_sink.persist_error_events([_event(1)]) == 1
+    assert sent == [_event(1)]
+
+
+def test_poison_event_goes_to_dead_letter_without_blocking_the_sink(monkeypatch, tmp_path: Path) -> None:
+    import json
+
+    import psycopg2
+
+    sent: list[str] = []
+    rollbacks: list[int] = []
+
+    def insert(conn, rows):
+        if any("\x00" in row["message"] for row in rows):
+            raise ValueError("A string literal cannot contain NUL (0x00) characters.")
+        sent.extend(row["message"] for row in rows)
+
+    class Conn(SinkConnStub):
+        def rollback(self) -> None:
+            rollbacks.append(1)
+
+    dead_letter = tmp_path / "dead_letter.jsonl"
+    monkeypatch.setattr(error_log_sink, "_insert_events", insert)
+    monkeypatch.setattr(error_log_sink, "DEAD_LETTER_LOG", dead_letter)
+    monkeypatch.setattr(error_log_sink, "LOCAL_FAILURE_LOG", tmp_path / "failures.log")
+    sink = error_log_sink.ErrorSink(wal_dir=tmp_path / "wal", batch_size=3, flush_interval_s=60, connect=lambda: Conn([]))
+
+    poison = _event(2)
+    poison["message"] = "bad \x00 byte"
+    sink.submit([_event(1), poison, _event(3), _event(4)])
+    assert sink.flush(timeout=5)
+    assert sink.close(timeout=5)
+
+    assert sent == ["boom 1", "boom 3", "boom 4"]
+    assert rollbacks
+    (record,) = [json.loads(line) for line in dead_letter.read_text(encoding="utf-8").splitlines()]
+    assert record["error_class"] == "ValueError" and record["event"]["message"] == "bad \x00 byte"
+    assert not sink.wal_path.exists()  # o evento ruim não volta no recover()
+    assert issubclass(psycopg2.IntegrityError, error_log_sink.DATA_ERRORS)
+
+
+def test_wal_is_acknowledged_not_rewritten_after_each_batch(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(error_log_sink, "_insert_events", lambda conn, rows: None)
+    sink = error_log_sink.ErrorSink(wal_dir=tmp_path, batch_size=2, flush_interval_s=60, connect=lambda: SinkConnStub([]))
+
+    with sink._cond:  # sem flusher: aplica o ack à mão
+        sink._append_wal([_event(i) for i in range(5)])
+        sink._pending.extend(_event(i) for i in range(5))
+        wal_before = sink.wal_path.read_text(encoding="utf-8")
+        del sink._pending[:2]
+        sink._ack_wal(2)
+
+    assert sink.wal_path.read_text(encoding="utf-8") == wal_before
+    assert [e["message"] for e in error_log_sink._read_wal(sink.wal_path)] == ["boom 2", "boom 3", "boom 4"]
@@ -0,0 +1,112 @@
+"""Unit tests for the per-table adaptive batch controller in etl.run."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from etl import run as etl_run
+
+
+@pytest.fixture(autouse=True)
+def _adaptive(monkeypatch, tmp_path: Path):
+    monkeypatch.setattr(etl_run, "BATCH_ADAPTIVE", True)
+    monkeypatch.setattr(etl_run, "BATCH_SIZE", 2000)
+    monkeypatch.setattr(etl_run, "BATCH_MIN", 100)
+    monkeypatch.setattr(etl_run, "BATCH_MAX", 20000)
+    monkeypatch.setattr(etl_run, "BATCH_TARGET_SECONDS", 2.0)
+    monkeypatch.setattr(etl_run, "BATCH_STATE_PATH", tmp_path / "etl_batch_sizes.json")
+    monkeypatch.setattr(etl_run, "BATCH_MANIFEST_PATH", tmp_path / "manifest.json")
+    etl_run.BATCH_CONTROLLERS.clear()
+    etl_run.BATCH_SEEDS.clear()
+    yield
+    etl_run.BATCH_CONTROLLERS.clear()
+    etl_run.BATCH_SEEDS.clear()
+
+
+def test_controller_grows_after_clean_streak_and_respects_target() -> None:
+    ctrl = etl_run.AdaptiveBatch("is_mkt_cupons_produtos", 2000)
+
+    # 2000 linhas em 0.2s → ideal = 2.0 / 0.0001 = 20000
+    for _ in range(etl_run.BATCH_GROW_STREAK):
+        ctrl.observe(2000, 0.2, 2000 * 50)
+
+    assert ctrl.size == 3000
+    assert ctrl.bytes_per_row == pytest.approx(50)
+
+
+def test_controller_shrinks_on_slow_round_trip_and_on_rejection() -> None:
+    ctrl = etl_run.AdaptiveBatch("is_pedidos", 8000)
+
+    ctrl.observe(8000, 8.0)  # 1ms/linha → ideal 2000, mas no máximo metade por passo
+    assert ctrl.size == 4000
+
+    ctrl.reject()
+    assert ctrl.size == 2000
+    assert ctrl.rejections == 1
+
+    for _ in range(10):
+        ctrl.reject()
+    assert ctrl.size == etl_run.BATCH_MIN
+
+
+def test_controller_caps_size_by_bytes_per_row(monkeypatch) -> None:
+    monkeypatch.setattr(etl_run, "BATCH_MAX_BYTES", 1_000_000)
+    ctrl = etl_run.AdaptiveBatch("is_pedidos", 4000)
+
+    ctrl.observe(4000, 0.1, 4000 * 1000)  # 1 KB/linha → no máximo 1000 linhas
+
+    assert ctrl.size == 2000  # encolhe no máximo pela metade por round-trip
+    ctrl.observe(2000, 0.05, 2000 * 1000)
+    assert ctrl.size == 1000
+
+
+def test_fixed_mode_keeps_global_batch_size(monkeypatch) -> None:
+    monkeypatch.setattr(etl_run, "BATCH_ADAPTIVE", False)
+
+    ctrl = etl_run.batch_controller("is_pedidos")
+    ctrl.observe(2000, 10.0)
+    ctrl.reject()
+
+    assert etl_run.batch_size_for("is_pedidos") == 2000
+    assert ctrl.size == 2000
+
+
+def test_batch_state_roundtrip_seeds_next_run(tmp_path: Path) -> None:
+    etl_run.batch_controller("is_pedidos").size = 3500
+    etl_run.batch_controller("is_pedidos_pagamentos.original_id").size = 900
+
+    payload = etl_run.save_batch_state()
+    assert payload["sizes"] == {"is_pedidos": 3500, "is_pedidos_pagamentos.original_id": 900}
+
+    seeds = etl_run.load_batch_state()
+    assert seeds == {"is_pedidos": 3500, "is_pedidos_pagamentos.original_id": 900}
+    assert etl_run.batch_size_for("is_pedidos") == 3500
+    assert etl_run.batch_size_for("is_produtos") == 2000
+
+
+def test_batch_state_falls_back_to_manifest(tmp_path: Path) -> None:
+    (tmp_path / "manifest.json").write_text(
+        json.dumps({"etl": {"batch_sizes": {"is_pedidos_itens": 6000}}}), encoding="utf-8"
+    )
+
+    assert etl_run.load_batch_state() == {"is_pedidos_itens": 6000}
+
+
+def test_upsert_in_chunks_follows_controller(monkeypatch) -> None:
+    pages: list[int] = []
+
+    def fake_upsert(conn, table, rows, conflict_col="id"):
+        pages.append(len(rows))
+        etl_run.batch_controller(table).size = 300
+        return len(rows), 0
+
+    monkeypatch.setattr(etl_run, "pg_upsert", fake_upsert)
+    etl_run.batch_controller("is_clientes_pf").size = 500
+
+    ok, err = etl_run.upsert_in_chunks(object(), "is_clientes_pf", [{"cliente_id": i} for i in range(1200)])
+
+    assert (ok, err) == (1200, 0)
+    assert pages == [500, 300, 300, 100]
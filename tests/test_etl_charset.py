@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import etl.run as run
+
+
+class CharsetCursor:
+    def __init__(self, columns: list[dict[str, Any]], samples: dict[str, list[dict[str, Any]]]):
+        self._columns = columns
+        self._samples = samples
+        self._pending: list[dict[str, Any]] = []
+        self.queries: list[str] = []
+
+    def execute(self, sql: str, params: Any = None) -> None:
+        self.queries.append(sql)
+        if "information_schema.columns" in sql:
+            self._pending = list(self._columns)
+            return
+        table = sql.split(" FROM `", 1)[1].split("`", 1)[0]
+        self._pending = list(self._samples.get(table, []))
+
+    def fetchall(self) -> list[dict[str, Any]]:
+        return self._pending
+
+
+@pytest.fixture(autouse=True)
+def _reset_plan(monkeypatch, tmp_path: Path):
+    monkeypatch.setattr(run, "CHARSET_REPORT_PATH", tmp_path / "etl_charset_report.json")
+    monkeypatch.setattr(run, "EXEC_ORDER", ["is_clientes"])
+    run.reset_charset_plan()
+    yield
+    run.reset_charset_plan()
+
+
+def _col(name: str, data_type: str = "varchar", charset: str | None = "latin1") -> dict[str, Any]:
+    return {"table_name": "is_clientes", "column_name": name, "data_type": data_type, "charset": charset}
+
+
+def test_classify_raw_text_detects_encodings() -> None:
+    assert run.classify_raw_text(b"Maria") == "ascii"
+    assert run.classify_raw_text("João".encode()) == "utf8"
+    assert run.classify_raw_text("João".encode("latin1")) == "latin1"
+    assert run.classify_raw_text("JoÃ£o".encode()) == "double"
+
+
+def test_choose_strategy_per_declared_charset() -> None:
+    assert run.choose_charset_strategy("latin1", {"utf8": 3, "ascii": 9}) == "utf8"
+    assert run.choose_charset_strategy("utf8mb4", {"utf8": 3}) == "session"
+    assert run.choose_charset_strategy("latin1", {"latin1": 2}) == "session"
+    assert run.choose_charset_strategy("latin1", {"utf8": 2, "latin1": 1}) == "mixed"
+    assert run.choose_charset_strategy("utf8", {"double": 1}) == "mixed"
+    # amostra truncada sem nenhum valor não-ASCII na coluna: sem evidência, reparo segue ativo
+    assert run.choose_charset_strategy("latin1", {"ascii": 9}, exhaustive=False) == "mixed"
+    assert run.choose_charset_strategy("latin1", {}, exhaustive=False) == "mixed"
+    assert run.choose_charset_strategy("latin1", {"ascii": 9}, exhaustive=True) == "session"
+
+
+def test_build_charset_plan_reads_binary_once_and_reports_mixed(tmp_path: Path) -> None:
+    cursor = CharsetCursor(
+        columns=[
+            _col("id", "int", None),
+            _col("nome"),
+            _col("cidade"),
+            _col("email_log"),
+        ],
+        samples={
+            "is_clientes": [
+                {"nome": "João".encode(), "cidade": "São Paulo".encode(), "email_log": b"a@b.com"},
+                {"nome": "Inês".encode(), "cidade": "Maceió".encode("latin1"), "email_log": None},
+            ]
+        },
+    )
+
+    plan = run.build_charset_plan(cursor)
+
+    assert plan == {"is_clientes": {"nome": "utf8", "cidade": "mixed"}}
+    sql = run.source_select_sql("is_clientes")
+    assert sql.startswith("SELECT `id`,CAST(`nome` AS BINARY) AS `nome`,CAST(`cidade` AS BINARY) AS `cidade`")
+    assert run.needs_mojibake_repair("is_clientes", "cidade") is True
+    assert run.needs_mojibake_repair("is_clientes", "nome") is False
+    assert run.needs_mojibake_repair("is_pedidos", "obs") is True  # tabela sem plano: legado
+
+    rows = run.decode_source_rows(
+        "is_clientes",
+        [{"id": 1, "nome": bytearray("João".encode()), "cidade": "Maceió".encode("latin1")}],
+    )
+    assert rows == [{"id": 1, "nome": "João", "cidade": "Maceió"}]
+
+    report = json.loads((tmp_path / "etl_charset_report.json").read_text(encoding="utf-8"))
+    assert report["mixed_columns"] == ["is_clientes.cidade"]
+    assert report["tables"]["is_clientes"]["nome"]["strategy"] == "utf8"
+    assert "email_log" not in report["tables"]["is_clientes"]
+
+
+def test_mojibake_repair_only_runs_on_planned_columns() -> None:
+    run.SOURCE_COLUMNS_ORDERED["is_clientes"] = ["id", "nome"]
+    run.CHARSET_PLAN["is_clientes"] = {}
+
+    # Coluna "session": texto já correto não passa mais pelo reparo por valor.
+    assert run.safe_str("Ã‰ nome literal", "nome", "is_clientes") == "Ã‰ nome literal"
+
+    run.CHARSET_PLAN["is_clientes"] = {"nome": "mixed"}
+    assert run.safe_str("JoÃ£o", "nome", "is_clientes") == "João"
+
+
+def test_source_select_without_plan_keeps_legacy_query() -> None:
+    assert run.source_select_sql("is_pedidos_fretes_envios") == "SELECT * FROM `is_pedidos_fretes_envios`"
+    assert run.source_select_sql("is_pedidos", ["id", "obs"]) == "SELECT `id`,`obs` FROM `is_pedidos`"
+
+
+def test_capped_sample_keeps_repair_on_columns_without_evidence(monkeypatch) -> None:
+    monkeypatch.setattr(run, "CHARSET_SAMPLE_ROWS", 2)
+    cursor = CharsetCursor(
+        columns=[_col("id", "int", None), _col("nome"), _col("obs")],
+        samples={
+            "is_clientes": [
+                {"nome": "João".encode(), "obs": None},
+                {"nome": "Inês".encode(), "obs": b"ok"},
+            ]
+        },
+    )
+
+    plan = run.build_charset_plan(cursor)
+
+    # "obs" não teve valor não-ASCII nas 2 linhas amostradas (LIMIT atingido): fica mista
+    assert plan == {"is_clientes": {"nome": "utf8", "obs": "mixed"}}
+    assert run.needs_mojibake_repair("is_clientes", "obs") is True
+
+
+def test_repair_strategy_is_resolved_once_per_column(monkeypatch) -> None:
+    run.SOURCE_COLUMNS_ORDERED["is_clientes"] = ["id", "nome"]
+    run.CHARSET_PLAN["is_clientes"] = {"nome": "mixed"}
+    calls: list[tuple[str, str]] = []
+    real = run.needs_mojibake_repair
+    monkeypatch.setattr(run, "needs_mojibake_repair", lambda t, c: calls.append((t, c)) or real(t, c))
+    mapping = {"id": "id", "nome": "nome", "visivel": "visivel"}
+
+    rows = [run.transform_row({"id": i, "nome": "JoÃ£o", "visivel": 1}, "is_clientes", mapping) for i in (1, 2, 3)]
+
+    assert [row["nome"] for row in rows] == ["João"] * 3
+    assert sorted(calls) == [("is_clientes", "id"), ("is_clientes", "nome"), ("is_clientes", "visivel")]
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from etl import run as etl_run
+from scripts.etl_checkpoint import CheckpointStore
+
+
+class PgCursorStub:
+    def __init__(self, sink: list[tuple]) -> None:
+        self.sink = sink
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, sql: str, params: tuple | None = None) -> None:
+        if params is not None:
+            self.sink.append(params)
+        elif "CREATE TABLE" in sql:
+            self.sink.append(("DDL",))
+
+
+class PgConnStub:
+    def __init__(self, sink: list[tuple]) -> None:
+        self.sink = sink
+        self.closed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def cursor(self) -> PgCursorStub:
+        return PgCursorStub(self.sink)
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+@pytest.fixture(autouse=True)
+def _reset_resume_state(monkeypatch):
+    monkeypatch.setattr(etl_run, "CHECKPOINT", None)
+    etl_run.RESUME_UPSERT_TABLES.clear()
+    yield
+    etl_run.RESUME_UPSERT_TABLES.clear()
+
+
+def test_local_checkpoint_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "etl_checkpoint.json"
+    store = CheckpointStore(run_id="gha-1-1", path=path, connect=None)
+    store.reset()
+    store.start_table("is_usuarios", 0)
+    store.finish_table("is_usuarios", 10, 0)
+    store.start_table("is_pedidos", 2)
+    store.advance("is_pedidos", 4000, 3990, 10)
+
+    resumed = CheckpointStore(run_id="gha-1-1", path=path, connect=None)
+    assert resumed.load() == "local"
+    assert resumed.done_tables() == {"is_usuarios"}
+    pedidos = resumed.get("is_pedidos")
+    assert (pedidos.status, pedidos.last_id, pedidos.rows_ok, pedidos.rows_err) == ("running", 4000, 3990, 10)
+
+    other = CheckpointStore(run_id="gha-2-1", path=path, connect=None)
+    assert other.load() is None and other.tables == {}
+
+
+def test_supabase_writes_are_throttled_and_disabled_after_failure(tmp_path: Path) -> None:
+    writes: list[tuple] = []
+    conns: list[PgConnStub] = []
+
+    def connect() -> PgConnStub:
+        conns.append(PgConnStub(writes))
+        return conns[-1]
+
+    store = CheckpointStore(run_id="r1", path=tmp_path / "cp.json", pg_interval_s=3600, connect=connect)
+    store.start_table("is_pedidos", 2)
+    store.advance("is_pedidos", 100, 100, 0)
+    store.advance("is_pedidos", 200, 200, 0)
+    store.finish_table("is_pedidos", 250, 0)
+    store.start_table("is_pedidos_itens", 3)
+
+    assert writes[0] == ("DDL",) and writes.count(("DDL",)) == 1
+    assert [w[3] for w in writes[1:]] == ["running", "done", "running"]
+    assert writes[2][4] == 200
+    assert len(conns) == 1 and not conns[0].closed  # uma conexão para o run inteiro
+    store.close()
+    assert conns[0].closed
+
+    warnings: list[str] = []
+
+    def broken():
+        raise RuntimeError("network down")
+
+    failing = CheckpointStore(run_id="r2", path=tmp_path / "cp2.json", connect=broken, warn=warnings.append)
+    failing.start_table("is_usuarios", 0)
+    failing.finish_table("is_usuarios", 1, 0)
+    assert len(warnings) == 1
+    assert CheckpointStore(run_id="r2", path=tmp_path / "cp2.json", connect=None).load() == "local"
+
+
+def test_plan_resume_reruns_producers_of_unfinished_consumers(tmp_path: Path) -> None:
+    store = CheckpointStore(run_id="r1", path=tmp_path / "cp.json", connect=None)
+    for table in ("is_clientes", "is_clientes_pf", "is_usuarios", "is_mkt_cupons", "is_mkt_cupons_produtos"):
+        store.finish_table(table, 1, 0)
+    store.start_table("is_clientes_pj", 1)
+    tables = {"is_clientes", "is_clientes_pf", "is_clientes_pj", "is_usuarios", "is_mkt_cupons",
+              "is_mkt_cupons_produtos", "is_pedidos"}
+
+    skip, rerun = etl_run.plan_resume(store, tables)
+
+    assert skip == {"is_clientes_pf", "is_usuarios", "is_mkt_cupons", "is_mkt_cupons_produtos"}
+    assert rerun == {"is_clientes", "is_clientes_pj"}
+
+
+def test_snapshot_row_counts_include_tables_done_in_resumed_run(monkeypatch, tmp_path: Path) -> None:
+    store = CheckpointStore(run_id="r1", path=tmp_path / "cp.json", connect=None)
+    store.finish_table("is_clientes", 120, 0)
+    store.finish_table("is_usuarios", 7, 0)
+    store.advance("is_pedidos", 50, 50, 0)  # parcial: este run regrava
+    monkeypatch.setattr(etl_run, "CHECKPOINT", store)
+    monkeypatch.setattr(etl_run, "RESUME_RUN_ID", "r1")
+
+    counts = etl_run.snapshot_row_counts({"is_pedidos": {"ok": 90, "err": 1}, "is_usuarios": {"ok": 7, "err": 0}})
+
+    assert counts == {"is_clientes": 120, "is_usuarios": 7, "is_pedidos": 90}
+
+
+def test_generic_table_continues_after_last_committed_id(monkeypatch, tmp_path: Path) -> None:
+    store = CheckpointStore(run_id="r1", path=tmp_path / "cp.json", connect=None)
+    store.start_table("is_usuarios", 0)
+    store.advance("is_usuarios", 40, 38, 2)
+    monkeypatch.setattr(etl_run, "CHECKPOINT", store)
+    etl_run.RESUME_UPSERT_TABLES.add("is_usuarios")
+
+    class Cursor:
+        def __init__(self) -> None:
+            self.sql = ""
+            self.batches = [[{"id": 41}, {"id": 42}], [{"id": 43}]]
+
+        def execute(self, sql: str) -> None:
+            self.sql = sql
+
+        def fetchmany(self, _size: int) -> list[dict[str, Any]]:
+            return self.batches.pop(0) if self.batches else []
+
+    def fake_flush(pg, table, batch, conflict_col, ok, err):
+        return [], ok + len(batch), err
+
+    monkeypatch.setattr(etl_run, "transform_row", lambda row, table, mapping: {"id": f"u{row['id']}"})
+    monkeypatch.setattr(etl_run, "pg_flush", fake_flush)
+    monkeypatch.setattr(etl_run, "batch_size_for", lambda table: 2)
+    cursor = Cursor()
+
+    ok, err = etl_run._process_generic(
+        cursor, object(), "is_usuarios", "is_usuarios", {"id": "id"}, "id", None, {}
+    )
+
+    assert cursor.sql.endswith("WHERE `id` > 40 ORDER BY `id`")
+    assert (ok, err) == (41, 2)
+    assert store.get("is_usuarios").last_id == 42  # último batch commitado dentro do loop
+
+
+def test_resumed_tables_are_written_idempotently(monkeypatch) -> None:
+    statements: list[str] = []
+
+    class Cursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    class Conn:
+        def cursor(self):
+            return Cursor()
+
+        def commit(self) -> None:
+            pass
+
+    monkeypatch.setattr("psycopg2.extras.execute_values", lambda cur, sql, values, page_size: statements.append(sql))
+    monkeypatch.setattr(etl_run, "WRITE_MODE", "insert")
+    etl_run.RESUME_UPSERT_TABLES.update({"is_usuarios", "is_mkt_cupons_produtos"})
+
+    etl_run.pg_upsert(Conn(), "is_usuarios", [{"id": "u1", "nome": "Ana"}], "id")
+    etl_run.pg_upsert(Conn(), "is_mkt_cupons_produtos", [{"cupom_id": "c", "produto_id": "p"}], "cupom_id,produto_id")
+    etl_run.pg_upsert(Conn(), "is_pedidos", [{"id": "p1", "total": 1}], "id")
+
+    assert 'ON CONFLICT ("id") DO UPDATE SET "nome" = EXCLUDED."nome"' in statements[0]
+    assert statements[1].endswith('ON CONFLICT ("cupom_id", "produto_id") DO NOTHING')
+    assert "ON CONFLICT" not in statements[2]
@@ -0,0 +1,104 @@
+"""Refresh das mv_dashboard_* e ciclo do etl_snapshots no fim do ETL."""
+
+from __future__ import annotations
+
+import json
+
+from etl import run as etl_run
+
+
+class CursorStub:
+    def __init__(self, conn: "ConnStub") -> None:
+        self.conn = conn
+        self._result: list = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, sql: str, params=None) -> None:
+        self.conn.statements.append((" ".join(sql.split()), params))
+        if "FROM pg_matviews" in sql:
+            self._result = list(self.conn.matviews.items())
+        elif "to_regclass" in sql:
+            self._result = [("is_pedidos",), ("is_financeiro_lancamentos",)]
+        elif sql.startswith("INSERT INTO public.etl_snapshots"):
+            if self.conn.fail_snapshots:
+                raise RuntimeError('relation "public.etl_snapshots" does not exist')
+            self._result = [(42,)]
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0]
+
+
+class ConnStub:
+    def __init__(self, matviews: dict[str, bool], fail_snapshots: bool = False) -> None:
+        self.matviews = matviews
+        self.fail_snapshots = fail_snapshots
+        self.statements: list[tuple[str, object]] = []
+        self.rollback_calls = 0
+
+    def cursor(self) -> CursorStub:
+        return CursorStub(self)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        self.rollback_calls += 1
+
+
+def test_refresh_is_concurrent_only_for_populated_views() -> None:
+    conn = ConnStub({"mv_dashboard_pedidos": True, "mv_dashboard_financeiro": False})
+
+    timings = etl_run.refresh_dashboard_views(conn)
+
+    refreshes = [sql for sql, _ in conn.statements if sql.startswith("REFRESH")]
+    assert refreshes == [
+        "REFRESH MATERIALIZED VIEW CONCURRENTLY public.mv_dashboard_pedidos",
+        "REFRESH MATERIALIZED VIEW public.mv_dashboard_financeiro",
+    ]
+    assert set(timings) == {"mv_dashboard_pedidos", "mv_dashboard_financeiro"}
+    # estatísticas das tabelas-base antes do primeiro REFRESH
+    sqls = [sql for sql, _ in conn.statements]
+    first_refresh = next(i for i, sql in enumerate(sqls) if sql.startswith("REFRESH"))
+    analyzed = [i for i, sql in enumerate(sqls) if sql.startswith("ANALYZE")]
+    assert sqls[analyzed[0]] == 'ANALYZE public."is_pedidos"'
+    assert len(analyzed) == 2 and max(analyzed) < first_refresh
+
+
+def test_missing_views_are_skipped() -> None:
+    conn = ConnStub({})
+
+    assert etl_run.refresh_dashboard_views(conn) == {}
+    assert not any(sql.startswith(("REFRESH", "ANALYZE")) for sql, _ in conn.statements)
+
+
+def test_snapshot_opens_running_and_closes_with_row_counts() -> None:
+    conn = ConnStub({})
+
+    snapshot_id = etl_run.snapshot_begin(conn)
+    etl_run.snapshot_finish(conn, snapshot_id, "success", {"is_pedidos": 10})
+
+    assert snapshot_id == 42
+    stale, opened, closed = (sql for sql, _ in conn.statements)
+    assert stale.startswith("UPDATE public.etl_snapshots SET status = 'failed'")
+    assert opened.startswith("INSERT INTO public.etl_snapshots")
+    status, row_counts, target = conn.statements[-1][1]
+    assert (status, json.loads(row_counts), target) == ("success", {"is_pedidos": 10}, 42)
+
+
+def test_snapshot_is_optional_without_migration_003() -> None:
+    conn = ConnStub({}, fail_snapshots=True)
+
+    snapshot_id = etl_run.snapshot_begin(conn)
+    etl_run.snapshot_finish(conn, snapshot_id, "success", {})
+
+    assert snapshot_id is None
+    assert conn.rollback_calls == 1
+    assert len(conn.statements) == 2  # nada é gravado no fim
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+from pathlib import Path
+
+from etl import run as etl_run
+from scripts import error_log_sink
+from scripts.etl_error_groups import ErrorAggregator, message_template, write_errors_jsonl
+
+
+def test_message_template_masks_variable_parts() -> None:
+    first = message_template(
+        'insert or update on table "is_pedidos" violates foreign key constraint "fk_cliente"\n'
+        "DETAIL:  Key (cliente_id)=(2a6b2c31-0f2a-4dfd-8cde-7b4b9b3f1c5a) is not present in table."
+    )
+    second = message_template(
+        'insert or update on table "is_pedidos" violates foreign key constraint "fk_cliente"\n'
+        "DETAIL:  Key (cliente_id)=(0b0b2c31-0f2a-4dfd-8cde-7b4b9b3f1c99) is not present in table."
+    )
+
+    assert first == second
+    assert "Key (cliente_id)=(?)" in first
+    assert message_template("value 42 out of range for 'abc'") == "value <n> out of range for '?'"
+    assert message_template("is_pedidos_itens row") == "is_pedidos_itens row"
+
+
+def test_aggregator_counts_everything_and_bounds_samples() -> None:
+    agg = ErrorAggregator(sample_size=2)
+    for legacy_id in range(1, 6):
+        agg.add({"table": "is_pedidos", "stage": "row_insert", "probable_constraint": "fk_cliente",
+                 "legacy_id": str(legacy_id), "message": f"cliente {legacy_id} missing"})
+    agg.add({"table": "is_pedidos", "stage": "transform", "probable_constraint": None,
+             "legacy_id": None, "message": "bad date"})
+
+    groups = agg.groups()
+    assert agg.total == 6 and len(agg) == 2
+    top = groups[0].as_dict()
+    assert (top["count"], top["first_legacy_id"], top["last_legacy_id"]) == (5, "1", "5")
+    assert [s["legacy_id"] for s in top["samples"]] == ["1", "2"]
+    assert "samples" not in agg.summary()[0]
+
+
+def test_record_etl_error_aggregates_beyond_capture_cap(monkeypatch) -> None:
+    monkeypatch.setattr(etl_run, "MAX_CAPTURED_ERRORS", 3)
+    etl_run.ETL_ERRORS.clear()
+    etl_run.ERROR_GROUPS.clear()
+
+    for legacy_id in range(10):
+        etl_run.record_etl_error("is_usuarios", legacy_id, f"duplicate key value {legacy_id}", stage="row_insert")
+
+    assert len(etl_run.ETL_ERRORS) == 3
+    assert etl_run.ERROR_GROUPS.total == 10
+    assert etl_run.ERROR_GROUPS.groups()[0].last_legacy_id == "9"
+    etl_run.ETL_ERRORS.clear()
+    etl_run.ERROR_GROUPS.clear()
+
+
+def test_report_writes_groups_and_compressed_rows(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(etl_run, "ERROR_REPORT_PATH", tmp_path / "etl_errors.json")
+    monkeypatch.setattr(etl_run, "ERROR_ROWS_PATH", tmp_path / "etl_errors.jsonl.gz")
+    etl_run.ETL_ERRORS.clear()
+    etl_run.ERROR_GROUPS.clear()
+    etl_run.record_etl_error("is_pedidos", 1, "boom 1", stage="transform")
+    etl_run.record_etl_error("is_pedidos", 2, "boom 2", stage="transform")
+
+    payload = etl_run.write_etl_error_report(2)
+
+    assert payload["group_count"] == 1 and payload["captured_errors"] == 2
+    assert "errors" not in payload
+    with gzip.open(tmp_path / "etl_errors.jsonl.gz", "rt", encoding="utf-8") as fh:
+        rows = [json.loads(line) for line in fh]
+    assert [r["legacy_id"] for r in rows] == ["1", "2"]
+    saved = json.loads((tmp_path / "etl_errors.json").read_text(encoding="utf-8"))
+    assert saved["groups"][0]["template"] == "boom <n>"
+    etl_run.ETL_ERRORS.clear()
+    etl_run.ERROR_GROUPS.clear()
+
+
+def test_groups_csv_matches_copy_columns(tmp_path: Path) -> None:
+    group = {"table": "is_pedidos", "stage": "row_insert", "probable_constraint": None, "template": 'a "b", c',
+             "count": 3, "first_legacy_id": "1", "last_legacy_id": "9", "samples": [{"legacy_id": "1"}]}
+
+    rows = list(csv.reader(error_log_sink.error_groups_csv("r1", [group])))
+
+    assert rows == [["r1", "is_pedidos", "row_insert", "", 'a "b", c', "3", "1", "9", '[{"legacy_id": "1"}]']]
+    assert write_errors_jsonl(tmp_path / "x.jsonl.gz", iter([])) == 0
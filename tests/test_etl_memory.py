@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import datetime as dt
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from etl import run as etl_run
+from scripts.etl_metrics import RunMetrics
+
+
+@pytest.fixture(autouse=True)
+def _isolated_memory_state(monkeypatch, tmp_path: Path):
+    monkeypatch.setattr(etl_run, "SPILL_DIR", tmp_path / "spill")
+    monkeypatch.setattr(etl_run, "METRICS", RunMetrics(run_id="test-mem"))
+    etl_run.ETL_ERRORS.clear()
+    etl_run.ETL_ERRORS_SPILL.clear()
+    etl_run.MEMORY_HOLDERS.clear()
+    yield
+    etl_run.ETL_ERRORS.clear()
+    etl_run.ETL_ERRORS_SPILL.clear()
+    etl_run.MEMORY_HOLDERS.clear()
+
+
+def _rss_sequence(monkeypatch, *values: float) -> None:
+    readings = list(values)
+    monkeypatch.setattr(etl_run, "current_rss_mb", lambda: readings.pop(0) if len(readings) > 1 else readings[0])
+
+
+def test_spill_list_keeps_order_and_types_across_spills(tmp_path: Path) -> None:
+    rows = etl_run.SpillList("pf_list")
+    rows.append({"cliente_id": "a", "nascimento": dt.date(1990, 1, 2)})
+    assert rows.spill() == 1
+    rows.extend([{"cliente_id": "b", "saldo": Decimal("1.50")}, {"cliente_id": "c"}])
+
+    assert len(rows) == 3 and rows.in_memory == 2
+    assert [r["cliente_id"] for r in rows] == ["a", "b", "c"]
+    assert list(rows)[0]["nascimento"] == dt.date(1990, 1, 2)
+    assert list(rows)[1]["saldo"] == Decimal("1.50")
+
+    rows.clear()
+    assert not rows
+    assert list((tmp_path / "spill").iterdir()) == []
+
+
+def test_budget_disabled_never_reads_rss(monkeypatch) -> None:
+    monkeypatch.setattr(etl_run, "MAX_RSS_MB", 0.0)
+    monkeypatch.setattr(etl_run, "current_rss_mb", lambda: pytest.fail("RSS lido sem orçamento"))
+
+    etl_run.check_memory_budget("fetch is_pedidos")
+
+
+def test_budget_spills_holders_and_errors_before_failing(monkeypatch) -> None:
+    monkeypatch.setattr(etl_run, "MAX_RSS_MB", 100.0)
+    monkeypatch.setattr(etl_run, "RSS_SPILL_RATIO", 0.8)
+    pf_list = etl_run.register_memory_holder("pf_list", etl_run.SpillList("pf_list"))
+    pf_list.extend({"cliente_id": str(i)} for i in range(5))
+    etl_run.record_etl_error("is_pedidos", 7, "boom", stage="transform")
+
+    _rss_sequence(monkeypatch, 85.0, 70.0)
+    etl_run.check_memory_budget("fetch is_pedidos")
+
+    assert pf_list.in_memory == 0 and len(pf_list) == 5
+    assert etl_run.ETL_ERRORS == []
+    assert [e["legacy_id"] for e in etl_run.captured_etl_errors()] == ["7"]
+    event = etl_run.METRICS.memory_events[-1]
+    assert event["kind"] == "spill"
+    assert event["moved"] == {"pf_list": 5, "etl_errors": 1}
+
+
+def test_budget_exceeded_raises_with_diagnosis(monkeypatch) -> None:
+    monkeypatch.setattr(etl_run, "MAX_RSS_MB", 100.0)
+    etl_run.register_memory_holder("cupom_codigos", {"A", "B"})
+    monkeypatch.setitem(etl_run.VALID_FK_IDS, "is_clientes", {"1", "2", "3"})
+    _rss_sequence(monkeypatch, 130.0)
+
+    with etl_run.METRICS.track_table("is_pedidos", 3):
+        with pytest.raises(etl_run.MemoryBudgetExceeded) as info:
+            etl_run.check_memory_budget("fetch is_pedidos")
+
+    diagnosis = info.value.diagnosis
+    assert diagnosis["table"] == "is_pedidos"
+    assert diagnosis["holders"]["cupom_codigos"] == 2
+    assert diagnosis["holders"]["valid_fk_ids"] >= 3
+    assert "ETL_MAX_RSS_MB=100" in str(info.value)
+    assert etl_run.METRICS.memory_events[-1]["kind"] == "budget_exceeded"
+
+
+class _PagedCursor:
+    """Cursor sem fetchall: só serve fetchmany, como exige iter_source_rows."""
+
+    def __init__(self, rows: list[dict]) -> None:
+        self.rows = rows
+        self.pages = 0
+
+    def execute(self, sql: str) -> None:
+        pass
+
+    def fetchmany(self, size: int) -> list[dict]:
+        page, self.rows = self.rows[:size], self.rows[size:]
+        self.pages += 1
+        return page
+
+
+def test_categoria_slug_map_streams_and_keeps_budget_error(monkeypatch) -> None:
+    monkeypatch.setattr(etl_run, "BATCH_SIZE", 2)
+    rows = [{"id": i, "chave": f"cat-{i}" if i != 3 else ""} for i in range(1, 6)]
+
+    cursor = _PagedCursor(list(rows))
+    assert etl_run.build_categoria_slug_map(cursor) == {"cat-1": 1, "cat-2": 2, "cat-4": 4, "cat-5": 5}
+    assert cursor.pages == 4
+
+    monkeypatch.setattr(etl_run, "MAX_RSS_MB", 100.0)
+    _rss_sequence(monkeypatch, 130.0)
+    with pytest.raises(etl_run.MemoryBudgetExceeded):
+        etl_run.build_categoria_slug_map(_PagedCursor(list(rows)))
+
+
+def test_upsert_in_chunks_consumes_generators(monkeypatch) -> None:
+    pages: list[int] = []
+
+    def fake_upsert(conn, table, rows, conflict_col="id"):
+        pages.append(len(rows))
+        return len(rows), 0
+
+    monkeypatch.setattr(etl_run, "pg_upsert", fake_upsert)
+    monkeypatch.setattr(etl_run, "batch_size_for", lambda table: 4)
+
+    ok, err = etl_run.upsert_in_chunks(object(), "is_clientes_pf", ({"cliente_id": i} for i in range(10)))
+
+    assert (ok, err) == (10, 0)
+    assert pages == [4, 4, 2]
+
+
+def test_profile_records_rss_per_table_and_block() -> None:
+    metrics = RunMetrics(run_id="r1")
+    started_tracing = metrics.start_tracemalloc(frames=1)
+    try:
+        with metrics.track_table("is_clientes", 0):
+            hoard = [bytearray(1024) for _ in range(256)]
+        with metrics.track_table("is_usuarios", 0):
+            pass
+        with metrics.track_table("is_pedidos", 2):
+            pass
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    payload = metrics.to_dict()
+    clientes = payload["tables"]["is_clientes"]
+    assert clientes["rss_start_mb"] is not None and clientes["rss_growth_mb"] is not None
+    assert clientes["top_alloc_sites"] and clientes["top_alloc_sites"][0]["growth_kb"] > 0
+    assert set(payload["blocks"]) == {"0", "2"}
+    assert payload["blocks"]["0"]["tables"] == ["is_clientes", "is_usuarios"]
+    assert payload["blocks"]["0"]["peak_rss_mb"] is not None
+    assert len(hoard) == 256
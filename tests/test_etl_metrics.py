@@ -0,0 +1,96 @@
+"""Unit tests for per-table stage metrics (scripts/etl_metrics.py)."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from etl import run as etl_run
+from scripts import etl_metrics
+
+
+def test_stage_seconds_add_up_to_wall_time(monkeypatch) -> None:
+    clock = iter([0.0, 10.0])
+    monkeypatch.setattr(etl_metrics.time, "monotonic", lambda: next(clock))
+    metrics = etl_metrics.RunMetrics(run_id="run-1")
+
+    with metrics.track_table("is_pedidos", block=2):
+        metrics.add_extract(3.0, 5000)
+        metrics.add_load("is_pedidos", 4.0, nbytes=1024, batches=2, retry_splits=1)
+        metrics.add_self_ref("is_pedidos", 1.0, nbytes=128)
+    metrics.set_result("is_pedidos", 4990, 10)
+
+    item = metrics.to_dict()["tables"]["is_pedidos"]
+    assert item["transform_seconds"] == 2.0
+    assert item["rows_read"] == 5000
+    assert item["rows_per_second"] == 500.0
+    assert item["bytes_sent"] == 1152
+    assert (item["batches"], item["retry_splits"], item["block"]) == (2, 1, 2)
+
+
+def test_write_emits_json_and_prometheus_textfile(tmp_path: Path) -> None:
+    metrics = etl_metrics.RunMetrics(run_id="run-1")
+    metrics.add_load("is_clientes", 1.5, nbytes=10, batches=1)
+    metrics.set_result("is_clientes", 10, 0)
+
+    metrics.write(total_seconds=2.0, status="success", json_path=tmp_path / "p.json", prom_path=tmp_path / "p.prom")
+
+    payload = json.loads((tmp_path / "p.json").read_text(encoding="utf-8"))
+    assert payload["status"] == "success"
+    prom = (tmp_path / "p.prom").read_text(encoding="utf-8")
+    assert "# TYPE etl_table_stage_seconds gauge" in prom
+    assert 'etl_table_stage_seconds{run_id="run-1",table="is_clientes",stage="load"} 1.5' in prom
+    assert 'etl_run_seconds{run_id="run-1"} 2.0' in prom
+
+
+def test_compare_profiles_flags_regressions_only_above_threshold() -> None:
+    old = {"tables": {
+        "is_pedidos": {"wall_seconds": 100.0, "load_seconds": 60.0, "rows_per_second": 1000.0},
+        "is_produtos": {"wall_seconds": 0.2},
+    }}
+    new = {"tables": {
+        "is_pedidos": {"wall_seconds": 110.0, "load_seconds": 90.0, "rows_per_second": 700.0},
+        "is_produtos": {"wall_seconds": 0.9},
+        "is_novos": {"wall_seconds": 1.0},
+    }}
+
+    rows = etl_metrics.compare_profiles(old, new, threshold_pct=20.0)
+    flagged = {(r["table"], r["metric"]) for r in rows if r["regression"]}
+
+    assert flagged == {("is_pedidos", "load_seconds"), ("is_pedidos", "rows_per_second")}
+    assert not any(r["table"] == "is_produtos" for r in rows)  # abaixo de min_seconds
+    assert any(r["table"] == "is_novos" and r["metric"] == "presence" for r in rows)
+
+
+def test_pg_upsert_records_load_batches_and_retry_splits(monkeypatch) -> None:
+    metrics = etl_metrics.RunMetrics(run_id="run-1")
+    monkeypatch.setattr(etl_run, "METRICS", metrics)
+
+    def fake_execute_values(cur, sql, values, page_size):
+        if any(row[0] == "bad" for row in values):
+            raise RuntimeError("bad row")
+
+    class Conn:
+        def cursor(self):
+            class Cur:
+                def __enter__(self):
+                    return self
+
+                def __exit__(self, *exc):
+                    return False
+            return Cur()
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
+    monkeypatch.setattr("psycopg2.extras.execute_values", fake_execute_values)
+    batch = [{"id": "ok-1", "__legacy_id": "1"}, {"id": "bad", "__legacy_id": "2"}]
+
+    etl_run.pg_upsert(Conn(), "is_test_metrics", batch, "id")
+
+    item = metrics.to_dict()["tables"]["is_test_metrics"]
+    assert item["batches"] == 4
+    assert item["retry_splits"] == 1
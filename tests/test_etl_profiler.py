@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import json
+import pstats
+from collections import Counter
+from pathlib import Path
+
+from scripts import etl_profiler
+
+
+def _busy_transform(n: int) -> int:
+    total = 0
+    for i in range(n):
+        total += len(str(i * 7).zfill(12))
+    return total
+
+
+def test_resolve_mode_aliases() -> None:
+    assert etl_profiler.resolve_mode(None) == "off"
+    assert etl_profiler.resolve_mode("0") == "off"
+    assert etl_profiler.resolve_mode("1") == "sample"
+    assert etl_profiler.resolve_mode(" CProfile ") == "cprofile"
+    assert etl_profiler.resolve_mode("flamegraph") == "off"
+
+
+def test_hot_functions_and_collapsed_output() -> None:
+    stacks: Counter[tuple[str, ...]] = Counter(
+        {
+            ("run_etl", "_process_generic", "transform_column"): 6,
+            ("run_etl", "_process_generic", "pg_upsert"): 3,
+            ("run_etl", "_process_generic"): 1,
+        }
+    )
+
+    hot = etl_profiler.hot_functions(stacks, top_n=2)
+    assert [item["function"] for item in hot] == ["transform_column", "pg_upsert"]
+    assert hot[0]["self_pct"] == 60.0
+    assert hot[0]["inclusive_samples"] == 6
+
+    collapsed = etl_profiler.render_collapsed(stacks)
+    assert collapsed.splitlines()[0] == "run_etl;_process_generic;transform_column 6"
+
+
+def test_disabled_profiler_writes_nothing(tmp_path: Path) -> None:
+    profiler = etl_profiler.EtlProfiler(mode="off", out_dir=tmp_path / "profile")
+
+    with profiler.profile_table("is_pedidos"):
+        _busy_transform(1000)
+
+    assert profiler.write_summary() is None
+    assert not (tmp_path / "profile").exists()
+
+
+def test_cprofile_mode_writes_per_table_artifacts(tmp_path: Path) -> None:
+    profiler = etl_profiler.EtlProfiler(mode="cprofile", out_dir=tmp_path, interval_ms=1, run_id="r-1")
+
+    with profiler.profile_table("is_pedidos"):
+        _busy_transform(200_000)
+
+    files = profiler.tables["is_pedidos"].files
+    assert files == {"collapsed": "is_pedidos.collapsed", "pstats": "is_pedidos.pstats", "top": "is_pedidos.top.txt"}
+
+    stats = pstats.Stats(str(tmp_path / "is_pedidos.pstats"))
+    assert any(func[2] == "_busy_transform" for func in stats.stats)  # type: ignore[attr-defined]
+
+    collapsed = (tmp_path / "is_pedidos.collapsed").read_text(encoding="utf-8")
+    assert "_busy_transform" in collapsed
+    assert all(not line.split(";")[0].startswith("profile_table") for line in collapsed.splitlines())
+    assert "# cProfile (tottime)" in (tmp_path / "is_pedidos.top.txt").read_text(encoding="utf-8")
+
+    summary = json.loads(profiler.write_summary().read_text(encoding="utf-8"))  # type: ignore[union-attr]
+    assert summary["run_id"] == "r-1"
+    assert summary["tables"]["is_pedidos"]["samples"] > 0
@@ -5,18 +5,6 @@ from typing import Any
 import etl.run as run
 
 
-class FetchAllCursor:
-    def __init__(self, rows: list[dict[str, Any]]):
-        self._rows = rows
-        self.sql: str | None = None
-
-    def execute(self, sql: str) -> None:
-        self.sql = sql
-
-    def fetchall(self) -> list[dict[str, Any]]:
-        return list(self._rows)
-
-
 class FetchManyCursor:
     def __init__(self, batches: list[list[dict[str, Any]]]):
         self._batches = list(batches)
@@ -47,30 +35,32 @@ def test_process_categorias_applies_parent_id_in_second_phase(monkeypatch) -> No
     monkeypatch.setattr(run, "pg_flush", fake_pg_flush)
     monkeypatch.setattr(run, "_apply_self_ref_updates", fake_apply)
 
-    cursor = FetchAllCursor(
+    cursor = FetchManyCursor(
         [
-            {
-                "id": 1,
-                "slug": "root",
-                "chave": "root",
-                "titulo": "Root",
-                "title": None,
-                "description": None,
-                "descricao": None,
-                "status": 1,
-                "pai": None,
-            },
-            {
-                "id": 2,
-                "slug": "child",
-                "chave": "child",
-                "titulo": "Child",
-                "title": None,
-                "description": None,
-                "descricao": None,
-                "status": 1,
-                "pai": "root",
-            },
+            [
+                {
+                    "id": 1,
+                    "slug": "root",
+                    "chave": "root",
+                    "titulo": "Root",
+                    "title": None,
+                    "description": None,
+                    "descricao": None,
+                    "status": 1,
+                    "pai": None,
+                },
+                {
+                    "id": 2,
+                    "slug": "child",
+                    "chave": "child",
+                    "titulo": "Child",
+                    "title": None,
+                    "description": None,
+                    "descricao": None,
+                    "status": 1,
+                    "pai": "root",
+                },
+            ]
         ]
     )
 
@@ -0,0 +1,101 @@
+"""Classificação de status pré-calculada (status_classification / pedidos_status)."""
+
+from __future__ import annotations
+
+from etl import run as etl_run
+
+
+class CursorStub:
+    def __init__(self, conn: "ConnStub") -> None:
+        self.conn = conn
+        self._result: list = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, sql: str, params=None) -> None:
+        self.conn.statements.append((" ".join(sql.split()), params))
+        if "to_regclass" in sql:
+            self._result = [(self.conn.migrated,)]
+        elif sql.startswith("SELECT DISTINCT i.status"):
+            self._result = list(self.conn.statuses)
+        elif "INSERT INTO public.pedidos_status" in sql:
+            self.rowcount = 7
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0]
+
+
+class ConnStub:
+    def __init__(self, statuses: list[tuple[str, str]], migrated: bool = True) -> None:
+        self.statuses = statuses
+        self.migrated = migrated
+        self.statements: list[tuple[str, object]] = []
+        self.upserted: list[tuple] = []
+        self.commits = 0
+
+    def cursor(self) -> CursorStub:
+        return CursorStub(self)
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        pass
+
+
+def test_classify_status_follows_migration_004_priority() -> None:
+    assert etl_run.classify_status("Entregue")["classe"] == "Finalizado"
+    assert etl_run.classify_status("ENVIADO")["classe"] == "Enviado"
+    assert etl_run.classify_status("Cartão em Produção") == {
+        "classe": "Em Produção", "prioridade": 3, "is_finalizado": False, "encerra_atraso": False,
+    }
+    assert etl_run.classify_status("Arquivo fora do Padrão")["classe"] == "Problema no Arquivo"
+    assert etl_run.classify_status("Envio/conferencia") == {
+        "classe": "Em Análise", "prioridade": 5, "is_finalizado": False, "encerra_atraso": False,
+    }
+    # 'Concluído' finaliza o pedido mas não tira do atraso (como na 004)
+    concluido = etl_run.classify_status("Concluído")
+    assert concluido["is_finalizado"] and not concluido["encerra_atraso"]
+    assert etl_run.classify_status("Cancelado")["encerra_atraso"]
+
+
+def test_build_upserts_distinct_statuses_and_rebuilds_pedidos_status(monkeypatch) -> None:
+    import psycopg2.extras
+
+    conn = ConnStub([("3", "Entregue"), ("Impressão", "Impressão")])
+
+    def fake_execute_values(cur, sql, rows, **kwargs):
+        cur.conn.statements.append((" ".join(sql.split()), None))
+        cur.conn.upserted.extend(rows)
+
+    monkeypatch.setattr(psycopg2.extras, "execute_values", fake_execute_values)
+
+    summary = etl_run.build_status_classification(conn)
+
+    assert summary == {"status": 2, "pedidos": 7}
+    assert conn.upserted == [
+        ("3", "Entregue", "Finalizado", 1, True, True),
+        ("Impressão", "Impressão", "Em Produção", 3, False, False),
+    ]
+    sqls = [sql for sql, _ in conn.statements]
+    assert sqls.index("TRUNCATE public.pedidos_status") < next(
+        i for i, sql in enumerate(sqls) if sql.startswith("INSERT INTO public.pedidos_status")
+    )
+    classes = conn.statements[-1][1][0]
+    assert classes == ["Finalizado", "Enviado", "Em Produção", "Problema no Arquivo", "Em Análise"]
+
+
+def test_build_is_skipped_without_migration_014() -> None:
+    conn = ConnStub([], migrated=False)
+
+    assert etl_run.build_status_classification(conn) is None
+    assert len(conn.statements) == 1
+    assert conn.commits == 1
@@ -102,3 +102,42 @@ def test_erp_id_stays_numeric_while_primary_id_remains_uuid(table: str, row: dic
     assert transformed is not None
     assert transformed["erp_id"] == 123
     assert transformed["id"] == etl_run.uuid5_for(table, 123)
+
+
+def test_json_payloads_are_decoded_once_and_invalid_ones_counted(monkeypatch) -> None:
+    decoded: list[str] = []
+    original_loads = etl_run.json_loads
+
+    def counting_loads(text):
+        decoded.append(text)
+        return original_loads(text)
+
+    monkeypatch.setattr(etl_run, "json_loads", counting_loads)
+    monkeypatch.setattr(etl_run, "VALID_FK_IDS", {"is_pedidos": {"7"}})
+    etl_run.JSON_INVALID_COUNTS.clear()
+
+    frete = etl_run.transform_pedidos_fretes_entregas(
+        {"id": 1, "pedido": 7, "tipo": "PAC", "detalhes": '{"titulo": "SEDEX", "prazo": 3, "custo": "12.5"}'}
+    )
+    assert frete is not None
+    assert (frete["metodo_titulo"], frete["prazo_dias"], frete["valor"]) == ("SEDEX", 3, 12.5)
+    assert len(decoded) == 1
+
+    broken = etl_run.transform_pedidos_fretes_entregas(
+        {"id": 2, "pedido": 7, "tipo": "PAC", "detalhes": "{titulo: SEDEX"}
+    )
+    assert broken is not None and broken["metodo_titulo"] == "PAC"
+
+    mapping = etl_run.COLUMN_MAPPING["is_pedidos_fretes_detalhes"]
+    row = etl_run.transform_row(
+        {"id": 3, "pedido": 7, "endereco": '{"cep": "60000-000"}', "conteudo": "not json"},
+        "is_pedidos_fretes_detalhes",
+        mapping,
+    )
+    assert row["endereco_json"] == '{"cep": "60000-000"}'
+    assert etl_run.JSON_INVALID_COUNTS == {
+        "is_pedidos_fretes_entregas": {"detalhes": 1},
+        "is_pedidos_fretes_detalhes": {"conteudo_json": 1},
+    }
+    assert etl_run.json_invalid_total() == 2
+    etl_run.JSON_INVALID_COUNTS.clear()
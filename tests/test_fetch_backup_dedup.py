@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+from scripts import fetch_backup
+
+
+def _probe(**overrides) -> fetch_backup.BackupProbeResult:
+    values = {
+        "protocol": "ftp",
+        "remote_dir": "/public_html/.well-known/backup-jet",
+        "target_date": None,
+        "selected_file": "nblgrafica_app-2026-04-05.sql",
+        "matched_files": 3,
+        "size_bytes": 459_276_288,
+        "modified_at": datetime(2026, 4, 5, 3, 12, 0),
+    }
+    values.update(overrides)
+    return fetch_backup.BackupProbeResult(**values)
+
+
+LAST_LOADED = {
+    "run_id": "gha-1-1",
+    "name": "nblgrafica_app-2026-04-05.sql",
+    "sha256": "abc",
+    "remote_size_bytes": 459_276_288,
+    "remote_modified_at": "2026-04-05T03:12:00",
+}
+
+
+def test_same_remote_file_needs_name_size_and_mtime() -> None:
+    assert fetch_backup.same_remote_file(_probe(), LAST_LOADED)
+    assert not fetch_backup.same_remote_file(_probe(selected_file="nblgrafica_app-2026-04-06.sql"), LAST_LOADED)
+    assert not fetch_backup.same_remote_file(_probe(size_bytes=459_276_289), LAST_LOADED)
+    assert not fetch_backup.same_remote_file(_probe(modified_at=datetime(2026, 4, 6, 3, 12)), LAST_LOADED)
+    # Sem MLSD não há tamanho/mtime: nunca assume que não mudou.
+    assert not fetch_backup.same_remote_file(_probe(size_bytes=None, modified_at=None), LAST_LOADED)
+    assert not fetch_backup.same_remote_file(_probe(), None)
+
+
+def test_dump_sha256_hashes_content_whatever_the_codec(tmp_path: Path) -> None:
+    payload = b"INSERT INTO is_pedidos VALUES (1);\n" * 1000
+    plain = tmp_path / "dump.sql"
+    plain.write_bytes(payload)
+    packed = tmp_path / "dump.sql.gz"
+    packed.write_bytes(gzip.compress(payload))
+
+    expected = hashlib.sha256(payload).hexdigest()
+    assert fetch_backup.dump_sha256(plain) == expected
+    assert fetch_backup.dump_sha256(packed) == expected
+    assert (tmp_path / "dump.sql.gz.sha256").read_text().startswith(expected)
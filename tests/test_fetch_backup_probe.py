@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import dataclasses
+import re
 from datetime import date, datetime
 from pathlib import Path
 
@@ -31,9 +33,35 @@ def _make_config(tmp_path: Path, protocol: str = "ftp") -> fetch_backup.BackupCo
         ftp_timeout=30,
         ftp_retries=3,
         ftp_blocksize=1024,
+        reconnect_backoff_s=0,
     )
 
 
+class IdleFTP:
+    def __init__(self, commands: list[str] | None = None) -> None:
+        self.commands = commands if commands is not None else []
+
+    def voidcmd(self, cmd: str) -> str:
+        self.commands.append(cmd)
+        return "200 OK"
+
+    def quit(self) -> None:
+        self.commands.append("QUIT")
+
+    def close(self) -> None:
+        pass
+
+
+def _fake_listing(monkeypatch: pytest.MonkeyPatch, entries, logins: list[int] | None = None) -> None:
+    def _connect(cfg, use_tls):
+        if logins is not None:
+            logins.append(1)
+        return IdleFTP()
+
+    monkeypatch.setattr(fetch_backup, "_connect_ftp", _connect)
+    monkeypatch.setattr(fetch_backup, "_list_ftp_entries", lambda ftp: entries)
+
+
 def test_probe_backup_source_success_ftp(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
     config = _make_config(tmp_path)
     entries = [
@@ -41,7 +69,7 @@ def test_probe_backup_source_success_ftp(monkeypatch: pytest.MonkeyPatch, tmp_pa
         fetch_backup.BackupEntry("nblgrafica_app-2026-04-05.sql", datetime(2026, 4, 5, 3, 0, 0), 20),
     ]
 
-    monkeypatch.setattr(fetch_backup, "_list_ftp_entries", lambda cfg, use_tls: entries)
+    _fake_listing(monkeypatch, entries)
 
     result = fetch_backup.probe_backup_source(date(2026, 4, 5), config=config)
 
@@ -61,7 +89,7 @@ def test_probe_backup_source_raises_explicit_authentication_error(
     def _raise(*args, **kwargs):
         raise fetch_backup.BackupSourceError("authentication", "FTP login failed: 530 Login authentication failed")
 
-    monkeypatch.setattr(fetch_backup, "_list_ftp_entries", _raise)
+    monkeypatch.setattr(fetch_backup, "_connect_ftp", _raise)
 
     with pytest.raises(fetch_backup.BackupSourceError, match="authentication") as exc_info:
         fetch_backup.probe_backup_source(date(2026, 4, 5), config=config)
@@ -78,7 +106,7 @@ def test_probe_backup_source_raises_explicit_remote_dir_error(
     def _raise(*args, **kwargs):
         raise fetch_backup.BackupSourceError("remote_dir", "FTP could not enter '/public_html/.well-known/backup-jet'")
 
-    monkeypatch.setattr(fetch_backup, "_list_ftp_entries", _raise)
+    monkeypatch.setattr(fetch_backup, "_connect_ftp", _raise)
 
     with pytest.raises(fetch_backup.BackupSourceError, match="remote_dir") as exc_info:
         fetch_backup.probe_backup_source(date(2026, 4, 5), config=config)
@@ -93,7 +121,7 @@ def test_probe_backup_source_raises_when_no_matching_file(
     config = _make_config(tmp_path)
     entries = [fetch_backup.BackupEntry("other_backup.sql", datetime(2026, 4, 5, 3, 0, 0), 10)]
 
-    monkeypatch.setattr(fetch_backup, "_list_ftp_entries", lambda cfg, use_tls: entries)
+    _fake_listing(monkeypatch, entries)
 
     with pytest.raises(fetch_backup.BackupSourceError, match="no_matching_files") as exc_info:
         fetch_backup.probe_backup_source(date(2026, 4, 5), config=config)
@@ -108,7 +136,7 @@ def test_probe_backup_source_raises_when_selected_file_is_empty(
     config = _make_config(tmp_path)
     entries = [fetch_backup.BackupEntry("nblgrafica_app-2026-04-05.sql", datetime(2026, 4, 5, 3, 0, 0), 0)]
 
-    monkeypatch.setattr(fetch_backup, "_list_ftp_entries", lambda cfg, use_tls: entries)
+    _fake_listing(monkeypatch, entries)
 
     with pytest.raises(fetch_backup.BackupSourceError, match="invalid_file") as exc_info:
         fetch_backup.probe_backup_source(date(2026, 4, 5), config=config)
@@ -133,11 +161,11 @@ def test_fetch_backup_downloads_file_selected_by_probe(
     )
     captured: dict[str, object] = {}
 
-    monkeypatch.setattr(fetch_backup, "probe_backup_source", lambda target_date=None, config=None: selected)
+    monkeypatch.setattr(fetch_backup, "probe_backup_source", lambda target_date=None, config=None, session=None: selected)
 
-    def _fake_download(filename: str, *, config=None) -> Path:
+    def _fake_download(filename: str, *, config=None, session=None) -> Path:
         captured["filename"] = filename
-        captured["config"] = config
+        captured["config"] = session.config
         return expected
 
     monkeypatch.setattr(fetch_backup, "download_backup_file", _fake_download)
@@ -153,7 +181,7 @@ def test_download_backup_keeps_selected_file_even_if_older_than_retention(
     monkeypatch: pytest.MonkeyPatch,
     tmp_path: Path,
 ) -> None:
-    config = _make_config(tmp_path)
+    config = dataclasses.replace(_make_config(tmp_path), cache_codec="none")
     selected = tmp_path / "nblgrafica_app-2026-03-19.sql"
     stale_other = tmp_path / "nblgrafica_app-2026-03-18.sql"
     stale_other.write_text("old", encoding="utf-8")
@@ -162,10 +190,86 @@ def test_download_backup_keeps_selected_file_even_if_older_than_retention(
         selected.write_text("selected", encoding="utf-8")
         return selected
 
-    monkeypatch.setattr(fetch_backup, "_fetch_ftp_file", _fake_fetch)
+    monkeypatch.setattr(fetch_backup, "_fetch_remote_file", _fake_fetch)
 
     result = fetch_backup.download_backup_file("nblgrafica_app-2026-03-19.sql", config=config)
 
     assert result == selected.resolve()
     assert selected.exists()
     assert not stale_other.exists()
+
+
+def test_download_backup_reuses_compressed_cache(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    config = dataclasses.replace(_make_config(tmp_path), cache_codec="gzip")
+    plain = tmp_path / "nblgrafica_app-2026-03-19.sql"
+    plain.write_text("CREATE TABLE t (id int);\n", encoding="utf-8")
+    cached = fetch_backup._cache_local(plain, config)
+    assert cached.name == "nblgrafica_app-2026-03-19.sql.gz" and not plain.exists()
+
+    def _no_fetch(*args, **kwargs) -> Path:
+        raise AssertionError("cached dump downloaded again")
+
+    monkeypatch.setattr(fetch_backup, "_fetch_remote_file", _no_fetch)
+
+    assert fetch_backup.download_backup_file(plain.name, config=config) == cached.resolve()
+
+    # sem sidecar (compressão interrompida) o cache não vale: baixa de novo
+    fetch_backup.dump_codec.sidecar_path(cached).unlink()
+    with pytest.raises(AssertionError, match="downloaded again"):
+        fetch_backup.download_backup_file(plain.name, config=config)
+
+
+def test_purge_removes_expired_and_orphaned_partial_downloads(tmp_path: Path) -> None:
+    today = date.today()
+    kept = tmp_path / f"nblgrafica_app-{today.isoformat()}.sql.zst"
+    kept.write_bytes(b"dump")
+    finished = tmp_path / f"nblgrafica_app-{today.isoformat()}.sql"  # sobra do download antes do cache zstd
+    expired = tmp_path / "nblgrafica_app-2020-01-01.sql"
+    yesterday = tmp_path / f"nblgrafica_app-{date.fromordinal(today.toordinal() - 1).isoformat()}.sql"
+    leftovers = [
+        finished.with_name(finished.name + ".part"),
+        finished.with_name(finished.name + ".segments.json"),
+        expired.with_name(expired.name + ".part"),
+        expired.with_name(expired.name + ".segments.json"),
+        yesterday.with_name(yesterday.name + ".part"),
+        yesterday.with_name(yesterday.name + ".segments.json"),
+    ]
+    for path in leftovers:
+        path.write_bytes(b"partial")
+    unrelated = tmp_path / "outro-2020-01-01.sql.part"
+    unrelated.write_bytes(b"x")
+
+    fetch_backup._purge_old_backups(
+        7,
+        local_dir=tmp_path,
+        pattern=re.compile(r"^nblgrafica_app-(\d{4}-\d{2}-\d{2})\.sql$"),
+        prefix="nblgrafica_app-",
+        extension=".sql",
+        keep_paths=(kept,),
+    )
+
+    assert kept.exists() and unrelated.exists()
+    assert [path.name for path in leftovers if path.exists()] == []
+
+
+def test_purge_keeps_a_resumable_partial_download(tmp_path: Path) -> None:
+    today = date.today()
+    pending = tmp_path / f"nblgrafica_app-{today.isoformat()}.sql"
+    part = pending.with_name(pending.name + ".part")
+    state = pending.with_name(pending.name + ".segments.json")
+    part.write_bytes(b"partial")
+    state.write_text("{}", encoding="utf-8")
+    older = tmp_path / f"nblgrafica_app-{date.fromordinal(today.toordinal() - 2).isoformat()}.sql"
+    older.write_bytes(b"dump")
+
+    fetch_backup._purge_old_backups(
+        7,
+        local_dir=tmp_path,
+        pattern=re.compile(r"^nblgrafica_app-(\d{4}-\d{2}-\d{2})\.sql$"),
+        prefix="nblgrafica_app-",
+        extension=".sql",
+        keep_paths=(older,),
+    )
+
+    # o dump de hoje ainda não terminou e é mais novo que o mantido: será retomado
+    assert part.exists() and state.exists() and older.exists()
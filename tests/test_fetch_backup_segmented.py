@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import dataclasses
+from pathlib import Path
+
+import pytest
+
+from scripts import fetch_backup
+
+PAYLOAD = bytes(range(256)) * 40  # 10 KB
+
+
+def _config(tmp_path: Path, **overrides) -> fetch_backup.BackupConfig:
+    base = dataclasses.replace(
+        fetch_backup.load_backup_config(),
+        local_dir=tmp_path,
+        ftp_retries=2,
+        ftp_blocksize=700,
+        download_segments=4,
+        min_segment_bytes=1024,
+        reconnect_backoff_s=0,
+    )
+    return dataclasses.replace(base, **overrides)
+
+
+def _reader(requested: list[tuple[int, int]], fail_once: set[int] | None = None, always_fail: set[int] | None = None):
+    fail_once = set(fail_once or ())
+
+    def read_range(segment, download) -> None:
+        requested.append((segment.index, segment.position))
+        if always_fail and segment.index in always_fail:
+            download.write(segment, PAYLOAD[segment.position : segment.position + 100])
+            raise ConnectionError("connection reset")
+        while segment.remaining > 0:
+            chunk = PAYLOAD[segment.position : segment.position + min(700, segment.remaining)]
+            download.write(segment, chunk)
+            if segment.index in fail_once:
+                fail_once.discard(segment.index)
+                raise ConnectionError("timed out")
+
+    return read_range
+
+
+def test_plan_segments_covers_file_and_skips_small_files(tmp_path: Path) -> None:
+    config = _config(tmp_path)
+
+    plan = fetch_backup._plan_segments(len(PAYLOAD), config)
+
+    assert len(plan) == 4
+    assert plan[0].start == 0 and plan[-1].end == len(PAYLOAD)
+    assert all(a.end == b.start for a, b in zip(plan, plan[1:]))
+    assert fetch_backup._plan_segments(1500, config) == []
+    assert fetch_backup._plan_segments(len(PAYLOAD), _config(tmp_path, download_segments=1)) == []
+
+
+def test_segmented_download_retries_segment_from_its_position(tmp_path: Path) -> None:
+    config = _config(tmp_path)
+    target = tmp_path / "nblgrafica_app-2026-04-05.sql"
+    requested: list[tuple[int, int]] = []
+
+    path = fetch_backup._segmented_download(
+        config, target.name, target, len(PAYLOAD), label="FTP", read_range=_reader(requested, fail_once={1})
+    )
+
+    assert path.read_bytes() == PAYLOAD
+    retried = [position for index, position in requested if index == 1]
+    assert retried == [2560, 2560 + 700]
+    assert not (tmp_path / f"{target.name}.part").exists()
+    assert not (tmp_path / f"{target.name}.segments.json").exists()
+
+
+def test_segment_retries_back_off_exponentially(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    config = _config(tmp_path, ftp_retries=4, reconnect_backoff_s=10)
+    target = tmp_path / "nblgrafica_app-2026-04-05.sql"
+    delays: list[float] = []
+    backoff = fetch_backup._backoff
+    monkeypatch.setattr(
+        fetch_backup, "_backoff", lambda *args, **kwargs: backoff(*args, **{**kwargs, "wait": delays.append})
+    )
+
+    with pytest.raises(fetch_backup.BackupSourceError):
+        fetch_backup._segmented_download(
+            config, target.name, target, len(PAYLOAD), label="FTP", read_range=_reader([], always_fail={2})
+        )
+
+    assert delays == [10, 20, 30]  # 10 * 2**n, limitado a 30s; sem espera depois da última tentativa
+
+
+def test_failed_download_resumes_only_missing_ranges(tmp_path: Path) -> None:
+    config = _config(tmp_path, ftp_retries=1)
+    target = tmp_path / "nblgrafica_app-2026-04-05.sql"
+
+    with pytest.raises(fetch_backup.BackupSourceError):
+        fetch_backup._segmented_download(
+            config, target.name, target, len(PAYLOAD), label="FTP", read_range=_reader([], always_fail={2})
+        )
+    assert not target.exists()
+    saved = fetch_backup._load_segment_state(tmp_path / f"{target.name}.segments.json", target.name, len(PAYLOAD))
+    unfinished = {segment.index: segment.position for segment in saved if segment.remaining > 0}
+    assert unfinished[2] == 5120 + 100
+
+    requested: list[tuple[int, int]] = []
+    path = fetch_backup._segmented_download(
+        config, target.name, target, len(PAYLOAD), label="FTP", read_range=_reader(requested)
+    )
+
+    assert path.read_bytes() == PAYLOAD
+    assert dict(requested) == unfinished  # segmentos completos não são baixados de novo
+
+
+class FakeDataSocket:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def recv(self, size: int) -> bytes:
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def close(self) -> None:
+        pass
+
+
+class FakeFTP:
+    def __init__(self, log: list[str]) -> None:
+        self.log = log
+
+    def size(self, filename: str) -> int:
+        return len(PAYLOAD)
+
+    def voidcmd(self, cmd: str) -> str:
+        return "200 OK"
+
+    def transfercmd(self, cmd: str, rest: int | None = None) -> FakeDataSocket:
+        self.log.append(f"{cmd} REST {rest}")
+        return FakeDataSocket(PAYLOAD[rest or 0 :])
+
+    def abort(self) -> None:
+        self.log.append("ABOR")
+
+    def quit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def test_ftp_fetch_uses_parallel_ranged_retr(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    config = _config(tmp_path)
+    commands: list[str] = []
+    monkeypatch.setattr(fetch_backup, "_connect_ftp", lambda cfg, use_tls: FakeFTP(commands))
+
+    with fetch_backup.BackupSession(config) as session:
+        path = fetch_backup._fetch_remote_file(session, "dump.sql", tmp_path)
+
+    assert path.read_bytes() == PAYLOAD
+    assert sorted(c for c in commands if c.startswith("RETR")) == [
+        "RETR dump.sql REST 0",
+        "RETR dump.sql REST 2560",
+        "RETR dump.sql REST 5120",
+        "RETR dump.sql REST 7680",
+    ]
+    assert commands.count("ABOR") == 4
+    assert session.logins == 1  # SIZE na conexão da sessão; os ranges abrem as suas
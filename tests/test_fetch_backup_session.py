@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import dataclasses
+import ftplib
+import time
+from pathlib import Path
+
+import pytest
+
+from scripts import fetch_backup
+
+DUMP = b"".join(f"INSERT INTO is_pedidos VALUES ({i});\n".encode() for i in range(500))
+NAME = "nblgrafica_app-2026-04-05.sql"
+
+
+def _config(tmp_path: Path, **overrides) -> fetch_backup.BackupConfig:
+    base = dataclasses.replace(
+        fetch_backup.load_backup_config(),
+        protocol="ftp",
+        local_dir=tmp_path,
+        ftp_retries=3,
+        ftp_blocksize=1024,
+        download_segments=1,
+        cache_codec="none",
+        reconnect_backoff_s=0,
+    )
+    return dataclasses.replace(base, **overrides)
+
+
+class DataSocket:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def recv(self, size: int) -> bytes:
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def close(self) -> None:
+        pass
+
+
+class SourceFTP:
+    """Fake control connection that records every command it receives."""
+
+    def __init__(self, commands: list[str], *, fail_mlsd: int = 0, drop_after_retr: bool = False) -> None:
+        self.commands = commands
+        self.fail_mlsd = fail_mlsd
+        self.drop_after_retr = drop_after_retr
+
+    def mlsd(self):
+        self.commands.append("MLSD")
+        if self.fail_mlsd:
+            self.fail_mlsd -= 1
+            raise EOFError("connection closed")
+        return iter([(NAME, {"modify": "20260405030000", "size": str(len(DUMP))})])
+
+    def voidcmd(self, cmd: str) -> str:
+        self.commands.append(cmd)
+        return "200 OK"
+
+    def size(self, filename: str) -> int:
+        self.commands.append(f"SIZE {filename}")
+        return len(DUMP)
+
+    def transfercmd(self, cmd: str, rest: int | None = None) -> DataSocket:
+        self.commands.append(cmd)
+        return DataSocket(DUMP[rest or 0 :])
+
+    def voidresp(self) -> str:
+        if self.drop_after_retr:
+            raise EOFError("control connection closed by server")
+        return "226 Transfer complete"
+
+    def quit(self) -> None:
+        self.commands.append("QUIT")
+
+    def close(self) -> None:
+        pass
+
+
+def _patch_connect(monkeypatch: pytest.MonkeyPatch, factory) -> list[int]:
+    logins: list[int] = []
+
+    def _connect(cfg, use_tls):
+        logins.append(1)
+        return factory(len(logins))
+
+    monkeypatch.setattr(fetch_backup, "_connect_ftp", _connect)
+    return logins
+
+
+def test_probe_size_and_download_share_one_login(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    commands: list[str] = []
+    logins = _patch_connect(monkeypatch, lambda n: SourceFTP(commands))
+
+    with fetch_backup.BackupSession(_config(tmp_path)) as session:
+        probe = fetch_backup.probe_backup_source(session=session)
+        path = fetch_backup.download_backup_file(probe.selected_file, session=session)
+
+    assert path.read_bytes() == DUMP
+    assert len(logins) == 1
+    assert commands == ["MLSD", "TYPE I", f"SIZE {NAME}", "TYPE I", f"RETR {NAME}", "QUIT"]
+    assert {"connect", "list", "size", "download"} <= set(session.report()["timings_s"])
+
+
+def test_transient_failure_reconnects_with_backoff(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    commands: list[str] = []
+    logins = _patch_connect(monkeypatch, lambda n: SourceFTP(commands, fail_mlsd=1 if n < 3 else 0))
+    delays: list[float] = []
+    monkeypatch.setattr(fetch_backup.time, "sleep", delays.append)
+
+    with fetch_backup.BackupSession(_config(tmp_path, reconnect_backoff_s=2)) as session:
+        entries = session.list_entries()
+
+    assert [entry.name for entry in entries] == [NAME]
+    assert len(logins) == 3 and session.reconnects == 2
+    assert delays == [2, 4]
+
+
+def test_permanent_errors_are_not_retried(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    calls: list[int] = []
+
+    def _refuse(cfg, use_tls):
+        calls.append(1)
+        raise fetch_backup.BackupSourceError("authentication", "FTP login failed: 530")
+
+    monkeypatch.setattr(fetch_backup, "_connect_ftp", _refuse)
+    with pytest.raises(fetch_backup.BackupSourceError, match="authentication"):
+        fetch_backup.BackupSession(_config(tmp_path)).list_entries()
+    assert calls == [1]
+
+    class MissingFTP(SourceFTP):
+        def transfercmd(self, cmd: str, rest: int | None = None) -> DataSocket:
+            raise ftplib.error_perm("550 No such file")
+
+    logins = _patch_connect(monkeypatch, lambda n: MissingFTP([]))
+    with fetch_backup.BackupSession(_config(tmp_path)) as session:
+        with pytest.raises(fetch_backup.BackupSourceError, match="invalid_file"):
+            b"".join(session.iter_file(NAME))
+    assert len(logins) == 1
+
+
+def test_complete_transfer_survives_lost_control_connection(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    commands: list[str] = []
+    logins = _patch_connect(monkeypatch, lambda n: SourceFTP(commands, drop_after_retr=n == 1))
+
+    with fetch_backup.BackupSession(_config(tmp_path)) as session:
+        path = session.retrieve(NAME, tmp_path / NAME, size=len(DUMP))
+        assert path.read_bytes() == DUMP
+        assert session.size(NAME) == len(DUMP)  # próxima operação reconecta
+
+    assert len(logins) == 2
+    assert commands.count(f"RETR {NAME}") == 1
+
+
+def test_idle_control_connection_gets_noop(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    commands: list[str] = []
+    _patch_connect(monkeypatch, lambda n: SourceFTP(commands))
+
+    with fetch_backup.BackupSession(_config(tmp_path, keepalive_s=0.05)) as session:
+        session.list_entries()
+        deadline = time.monotonic() + 2
+        while "NOOP" not in commands and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert "NOOP" in commands
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import json
+import math
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pgserver = pytest.importorskip("pgserver")
+psycopg2 = pytest.importorskip("psycopg2")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "archive"))
+
+from data import rollups  # noqa: E402
+
+MIGRATION = PROJECT_ROOT / "migrations" / "017_finance_rollup_rpcs.sql"
+START, END = date(2026, 3, 1), date(2026, 3, 31)
+
+FINANCEIRO = [
+    # (competencia_mes, tipo, valor, categoria)
+    ("2026-03-01", "Entrada", 5000, "Vendas"),
+    ("2026-03-01", "Entrada", None, "Vendas"),
+    ("2026-03-01", "Saída", 300, "Zelo"),
+    ("2026-03-01", "Saída", 300, "Água"),  # empate: code point põe "Zelo" antes de "Água"
+    ("2026-03-01", "Saída", 120, "  Aluguel "),
+    ("2026-03-01", "Saída", 80, "Aluguel　"),
+    ("2026-03-01", "Saída", 50, "Frete_Correios"),
+    ("2026-03-01", "Saída", 40, "Frete@Correios"),
+    ("2026-03-01", "Saída", 35, None),
+    ("2026-03-01", "Saída", 20, "Taxas "),
+    ("2026-03-01", "Saída", 10, "Energia"),
+    ("2026-03-01", None, 999, "Sem tipo"),
+    ("2026-04-01", "Saída", 777, "Fora do período"),
+]
+
+PEDIDOS = [
+    # (pedido_id, cliente_nome, data_criacao, valor_total, qtde_itens, status_pedido)
+    (1, "joão silva", "2026-03-02 10:00:00+00", 100, 1, "Entregue"),
+    (2, "JOÃO SILVA", "2026-03-03 10:00:00+00", 250, 2, "Entregue"),
+    (3, "João_Silva", "2026-03-04 10:00:00+00", 250, 1, "Produção"),
+    (4, "o'neil 2nd", "2026-03-04 10:00:00+00", 250, 3, "Produção"),
+    (5, None, "2026-03-05 10:00:00+00", 80, 1, "Sem Status"),
+    (6, "Ângela", "2026-03-06 10:00:00+00", 350, 1, "Entregue"),
+    (7, "Zeca", "2026-03-06 11:00:00+00", 350, 1, "Entregue"),
+    (8, "Zeca", "2026-03-07 11:00:00+00", None, 0, "Cancelado"),
+    (9, "Fora", "2026-04-01 00:00:00+00", 9999, 1, "Entregue"),
+    (10, "Último Segundo", "2026-03-31 23:59:59+00", 10, 1, "Entregue"),
+    (11, "Último Segundo", "2026-03-31 23:59:59.5+00", 5, 1, "Entregue"),
+]
+
+
+@pytest.fixture(scope="module")
+def pg(tmp_path_factory):
+    server = pgserver.get_server(tmp_path_factory.mktemp("pg"), cleanup_mode="stop")
+    conn = psycopg2.connect(server.get_uri())
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SET TIME ZONE 'UTC'")
+        for role in ("anon", "authenticated"):
+            cur.execute(f"DO $$ BEGIN CREATE ROLE {role}; EXCEPTION WHEN duplicate_object THEN NULL; END $$")
+        cur.execute(
+            "CREATE TABLE public.mv_dashboard_financeiro ("
+            " lancamento_id serial, competencia_mes date, tipo text, valor numeric, categoria text)"
+        )
+        cur.execute(
+            "CREATE TABLE public.mv_dashboard_pedidos (pedido_id int, cliente_nome text,"
+            " data_criacao timestamptz, valor_total numeric, qtde_itens int, status_pedido text)"
+        )
+        cur.executemany(
+            "INSERT INTO public.mv_dashboard_financeiro (competencia_mes, tipo, valor, categoria) VALUES (%s, %s, %s, %s)",
+            FINANCEIRO,
+        )
+        cur.executemany("INSERT INTO public.mv_dashboard_pedidos VALUES (%s, %s, %s, %s, %s, %s)", PEDIDOS)
+        cur.execute(MIGRATION.read_text(encoding="utf-8"))
+    yield conn
+    conn.close()
+
+
+def _view_rows(pg, view: str, date_column: str, id_column: str) -> pd.DataFrame:
+    """Rows as fetch_view_data gets them from PostgREST: same filter, same order, JSON numbers."""
+    with pg.cursor() as cur:
+        cur.execute(
+            f"SELECT row_to_json(v)::text FROM public.{view} v"
+            f" WHERE {date_column} >= %s AND {date_column} < %s"
+            f" ORDER BY {date_column} DESC, {id_column} DESC",
+            (f"{START}T00:00:00", f"{END + timedelta(days=1)}T00:00:00"),
+        )
+        return pd.DataFrame([json.loads(text) for (text,) in cur.fetchall()])
+
+
+def _rpc(pg, name: str, *args) -> dict:
+    with pg.cursor() as cur:
+        cur.execute(f"SELECT public.{name}({', '.join(['%s'] * len(args))})::text", args)
+        return json.loads(cur.fetchone()[0])
+
+
+def _plain(value):
+    """pandas/numpy scalars → Python, NaN → None, numbers rounded (numeric × float64)."""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(float(value), 6)
+    return value
+
+
+def test_finance_rollup_rpc_matches_pandas_fallback(pg) -> None:
+    via_rpc = _rpc(pg, "get_finance_rollup", START, END)
+    via_pandas = rollups.finance_rollup_from_df(
+        _view_rows(pg, "mv_dashboard_financeiro", "competencia_mes", "lancamento_id")
+    )
+
+    assert _plain(via_rpc) == _plain(via_pandas)
+    assert [c["categoria"] for c in via_rpc["categorias"]][:4] == ["Zelo", "Água", "Aluguel", "Frete Correios"]
+    assert via_rpc["categorias_donut"][-1]["categoria"] == "OUTROS"
+
+
+def test_sales_rollup_rpc_matches_pandas_fallback(pg) -> None:
+    via_rpc = _rpc(pg, "get_sales_rollup", START, END, 10)
+    via_pandas = rollups.sales_rollup_from_df(_view_rows(pg, "mv_dashboard_pedidos", "data_criacao", "pedido_id"))
+
+    assert _plain(via_rpc) == _plain(via_pandas)
+    assert via_rpc["top_clientes"][0] == {"cliente_nome": "João Silva", "valor_total": 600}
+    assert {"cliente_nome": "O'Neil 2Nd", "valor_total": 250} in via_rpc["top_clientes"]
+    assert {"cliente_nome": "-", "valor_total": 80} in via_rpc["top_clientes"]
+    # período semiaberto: entra 23:59:59.5 do último dia, não entra 00:00 do dia seguinte
+    assert via_rpc["pedidos"] == 10
+    assert {"cliente_nome": "Último Segundo", "valor_total": 15} in via_rpc["top_clientes"]
+    # empate em 350 e 250: data_criacao desc, depois pedido_id desc (ordem do fetch)
+    assert [p["cliente_nome"] for p in via_rpc["top_pedidos"][:5]] == [
+        "Zeca", "Ângela", "O'Neil 2Nd", "João Silva", "João Silva"
+    ]
+
+
+def test_title_case_matches_str_title(pg) -> None:
+    names = ["joão da silva", "MARIA-JOSÉ", "o'neil 2nd", "  ângela  ", "ÉDER 3º", "d'ávila", "x", ""]
+    with pg.cursor() as cur:
+        cur.execute("SELECT public.dashboard_title_case(n) FROM unnest(%s::text[]) WITH ORDINALITY AS t(n, i) ORDER BY i", (names,))
+        assert [row[0] for row in cur.fetchall()] == [name.title() for name in names]
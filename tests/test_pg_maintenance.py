@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from scripts import pg_maintenance
+from scripts.truncate_supabase import EXEC_ORDER
+
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConn") -> None:
+        self.conn = conn
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def execute(self, sql: str, params=None) -> None:
+        if "pg_stat_user_tables" in sql:
+            return
+        with self.conn.db.lock:
+            self.conn.db.statements.append(sql)
+        if "is_pedidos_itens" in sql and sql.startswith("ANALYZE"):
+            raise RuntimeError("canceling statement due to lock timeout")
+
+    def fetchall(self):
+        return list(self.conn.db.dead.items())
+
+
+class FakeConn:
+    def __init__(self, db: "FakeDB") -> None:
+        self.db = db
+        self.autocommit = False
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def close(self) -> None:
+        self.db.closed += 1
+
+
+class FakeDB:
+    def __init__(self, dead: dict[str, int]) -> None:
+        self.dead = dead
+        self.statements: list[str] = []
+        self.connections: list[FakeConn] = []
+        self.closed = 0
+        self.lock = threading.Lock()
+
+    def connect(self, url: str) -> FakeConn:
+        conn = FakeConn(self)
+        self.connections.append(conn)
+        return conn
+
+
+def test_groups_follow_etl_blocks_and_skip_empty_tables() -> None:
+    profile = {"tables": {
+        "is_pedidos_itens": {"block": 3, "rows_ok": 10},
+        "is_pedidos": {"block": 2, "rows_ok": 5},
+        "is_financeiro_lancamentos": {"block": 2, "rows_ok": 7},
+        "is_mkt_regras": {"block": 0, "rows_ok": 0},
+    }}
+
+    assert pg_maintenance.loaded_table_groups(profile) == [
+        ["is_financeiro_lancamentos", "is_pedidos"],
+        ["is_pedidos_itens"],
+    ]
+    assert pg_maintenance.loaded_table_groups(None) == [list(EXEC_ORDER)]
+
+
+def test_vacuums_only_tables_with_dead_tuples_and_records_failures(monkeypatch: pytest.MonkeyPatch) -> None:
+    db = FakeDB({"is_pedidos": 5000, "is_pedidos_itens": 3})
+    monkeypatch.setenv("SUPABASE_DB_URL", "postgresql://fake/db")
+    monkeypatch.setattr(pg_maintenance.psycopg2, "connect", db.connect)
+
+    report = pg_maintenance.run_maintenance(
+        [["is_clientes", "is_pedidos"], ["is_pedidos_itens"]], workers=2, vacuum_min_dead=1000
+    )
+
+    assert report["tables"]["is_pedidos"]["action"] == "vacuum_analyze"
+    assert report["tables"]["is_clientes"]["action"] == "analyze"
+    assert report["failed"] == ["is_pedidos_itens"]
+    assert "lock timeout" in report["tables"]["is_pedidos_itens"]["error"]
+    assert all(item["seconds"] >= 0 for item in report["tables"].values())
+    # o bloco seguinte só começa depois do anterior
+    assert db.statements[-1] == 'ANALYZE public."is_pedidos_itens"'
+    assert 'VACUUM (ANALYZE) public."is_pedidos"' in db.statements
+    assert all(conn.autocommit for conn in db.connections)
+    assert db.closed == len(db.connections) <= 3  # consulta de pg_stat + um por worker
+
+
+def test_default_run_analyzes_existing_dashboard_matviews_last(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    profile = tmp_path / "etl_profile.json"
+    profile.write_text('{"tables": {"is_pedidos": {"block": 2, "rows_ok": 5}}}', encoding="utf-8")
+    db = FakeDB({"is_pedidos": 0, "mv_dashboard_pedidos": 0})
+    monkeypatch.setenv("SUPABASE_DB_URL", "postgresql://fake/db")
+    monkeypatch.setattr(pg_maintenance, "PROFILE_JSON_PATH", profile)
+    monkeypatch.setattr(pg_maintenance.psycopg2, "connect", db.connect)
+
+    report = pg_maintenance.run_maintenance(workers=1)
+
+    assert list(report["tables"]) == ["is_pedidos", "mv_dashboard_pedidos"]  # mv_dashboard_financeiro não existe
+    assert db.statements[-1] == 'ANALYZE public."mv_dashboard_pedidos"'
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import json
+
 from etl import run as etl_run
 
 
@@ -114,3 +116,25 @@ def test_pg_upsert_repairs_finance_constraint_rows(monkeypatch) -> None:
     assert calls[-1][0][3] is None
     assert len(etl_run.ETL_ERRORS) == 1
     assert etl_run.ETL_ERRORS[0]["stage"] == "batch_insert"
+
+
+def test_pg_upsert_passes_json_text_through_without_reencoding(monkeypatch) -> None:
+    calls: list[list[tuple]] = []
+
+    def fake_execute_values(cur, sql, values, page_size):
+        calls.append(list(values))
+
+    def fail_loads(*_args, **_kwargs):
+        raise AssertionError("pg_upsert must not decode JSON text")
+
+    monkeypatch.setattr("psycopg2.extras.execute_values", fake_execute_values)
+    monkeypatch.setattr(etl_run, "json_loads", fail_loads)
+
+    raw = '{"cep": "60000-000", "cidade": "Fortaleza"}'
+    batch = [{"id": "frete-1", "__legacy_id": "1", "endereco_json": raw, "conteudo_json": {"itens": 2}}]
+
+    ok, err = etl_run.pg_upsert(ConnStub(), "is_pedidos_fretes_detalhes", batch, "id")
+
+    assert (ok, err) == (1, 0)
+    assert calls[0][0][1] is raw
+    assert json.loads(calls[0][0][2].dumps(calls[0][0][2].adapted)) == {"itens": 2}
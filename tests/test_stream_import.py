@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import dataclasses
+import gzip
+import hashlib
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from scripts import fetch_backup, import_dump
+
+DUMP = b"".join(f"INSERT INTO is_pedidos VALUES ({i});\n".encode() for i in range(2000))
+
+
+def _config(tmp_path: Path) -> fetch_backup.BackupConfig:
+    return dataclasses.replace(
+        fetch_backup.load_backup_config(), local_dir=tmp_path, ftp_retries=2, ftp_blocksize=4096, reconnect_backoff_s=0
+    )
+
+
+def test_tee_writes_copy_and_sha_only_after_last_chunk(tmp_path: Path) -> None:
+    finalized: list[Path] = []
+    tee = fetch_backup.DumpTee(iter([DUMP[:100], DUMP[100:]]), tmp_path / "dump.sql", finalize=finalized.append)
+
+    chunks = iter(tee)
+    next(chunks)
+    assert not (tmp_path / "dump.sql").exists()
+    assert b"".join([DUMP[:100], *chunks]) == DUMP
+
+    assert (tmp_path / "dump.sql").read_bytes() == DUMP
+    assert tee.sha256 == hashlib.sha256(DUMP).hexdigest()
+    assert tee.complete and tee.size == len(DUMP)
+    assert finalized == [tmp_path / "dump.sql"]
+
+
+class FlakyDataSocket:
+    def __init__(self, data: bytes, fail_after: int | None) -> None:
+        self.data = data
+        self.fail_after = fail_after
+
+    def recv(self, size: int) -> bytes:
+        if self.fail_after is not None and self.fail_after <= 0:
+            raise TimeoutError("timed out")
+        chunk, self.data = self.data[:size], self.data[size:]
+        if self.fail_after is not None:
+            self.fail_after -= len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        pass
+
+
+class StreamFTP:
+    def __init__(self, rests: list[int | None]) -> None:
+        self.rests = rests
+
+    def voidcmd(self, cmd: str) -> str:
+        return "200 OK"
+
+    def transfercmd(self, cmd: str, rest: int | None = None) -> FlakyDataSocket:
+        self.rests.append(rest)
+        fail_after = 8192 if len(self.rests) == 1 else None
+        return FlakyDataSocket(DUMP[rest or 0 :], fail_after)
+
+    def voidresp(self) -> str:
+        return "226 Transfer complete"
+
+    def quit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def test_remote_stream_reconnects_at_same_offset(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    rests: list[int | None] = []
+    monkeypatch.setattr(fetch_backup, "_connect_ftp", lambda cfg, use_tls: StreamFTP(rests))
+
+    with fetch_backup.BackupSession(dataclasses.replace(_config(tmp_path), protocol="ftp")) as session:
+        data = b"".join(session.iter_file("dump.sql"))
+
+    assert data == DUMP
+    assert rests == [None, 8192]
+    assert session.reconnects == 1
+
+
+def _fake_mysql(monkeypatch: pytest.MonkeyPatch, out: Path) -> None:
+    monkeypatch.setattr(import_dump, "_mysql_cmd", lambda: ["sh", "-c", f"cat > '{out}'"])
+
+
+def test_stream_import_pipes_plain_and_gzip_dumps(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    out = tmp_path / "mysql_stdin.sql"
+    _fake_mysql(monkeypatch, out)
+
+    assert import_dump._import_stream(iter([DUMP[:10], DUMP[10:]]), "dump.sql") == len(DUMP)
+    assert out.read_bytes() == DUMP
+
+    packed = gzip.compress(DUMP)
+    import_dump._import_stream(iter([packed[:50], packed[50:]]), "dump.sql.gz")
+    assert out.read_bytes() == DUMP
+
+
+def test_stream_import_fails_when_download_breaks(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(import_dump, "_mysql_cmd", lambda: ["sh", "-c", "cat > /dev/null"])
+
+    def broken():
+        yield DUMP[:100]
+        raise fetch_backup.BackupSourceError("connectivity", "FTP stream failed")
+
+    with pytest.raises(fetch_backup.BackupSourceError):
+        import_dump._import_stream(broken(), "dump.sql")
+
+    monkeypatch.setattr(import_dump, "_mysql_cmd", lambda: ["sh", "-c", "echo 'ERROR 1064' >&2; exit 1"])
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        import_dump._import_stream(iter([DUMP] * 50), "dump.sql")
+    assert "ERROR 1064" in info.value.stderr
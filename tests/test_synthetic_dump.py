@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import re
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from etl import run as etl_run
+from scripts import benchmark_etl
+from scripts import generate_synthetic_dump as gen
+
+
+def _inserted_rows(sql: str, table: str) -> list[str]:
+    rows: list[str] = []
+    for line in sql.splitlines():
+        if line.startswith(f"INSERT INTO `{table}` VALUES "):
+            body = line[len(f"INSERT INTO `{table}` VALUES ("):-2]
+            rows.extend(body.split("),("))
+    return rows
+
+
+def test_source_tables_cover_exec_order_without_derived_tables() -> None:
+    tables = gen.source_tables()
+
+    assert "is_clientes_pf" not in tables
+    assert "is_mkt_cupons_produtos" not in tables
+    assert "is_pedidos_fretes_envios" in tables
+    assert "is_pedidos_fretes_entregas" not in tables
+    assert tables.index("is_clientes") < tables.index("is_pedidos") < tables.index("is_pedidos_historico")
+    assert set(tables) == set(gen.BASE_ROWS)
+
+
+def test_columns_match_what_the_etl_reads() -> None:
+    clientes = {spec.name: spec.kind for spec in gen.table_columns("is_clientes")}
+    expected = set(etl_run.COLUMN_MAPPING["is_clientes"].values()) | set(gen.EXTRA_SOURCE_COLUMNS["is_clientes"])
+    assert set(clientes) == expected
+    assert clientes["id"] == "pk"
+    assert clientes["tipo"] == "cliente_tipo"
+    assert clientes["pdv"] == "int"  # TABLE_TYPE_OVERRIDES
+    assert clientes["pagarme_id"] == "text"  # não é FK
+
+    historico = {spec.name: spec for spec in gen.table_columns("is_pedidos_historico")}
+    assert historico["status"].kind == "status_fk"
+    assert (historico["pedido"].kind, historico["pedido"].ref) == ("fk", "is_pedidos")
+
+    pagamentos = {spec.name: spec.kind for spec in gen.table_columns("is_pedidos_pagamentos")}
+    assert pagamentos["original"] == "self_ref"
+    assert pagamentos["parcelas"] == "parcelas"
+
+
+def test_dump_is_deterministic_and_injects_requested_dirt() -> None:
+    dirty = gen.DirtyRatios(nulls=0.0).override(["zero_dates=0.5", "orphan_fks=0.0", "mojibake=1"])
+    tables = ["is_extras_status", "is_clientes", "is_pedidos", "is_pedidos_historico"]
+
+    first, second = io.StringIO(), io.StringIO()
+    stats = gen.write_dump(first, 0.01, dirty, seed=7, anchor=date(2026, 1, 31), tables=tables)
+    gen.write_dump(second, 0.01, dirty, seed=7, anchor=date(2026, 1, 31), tables=tables)
+    sql = first.getvalue()
+
+    assert sql == second.getvalue()
+    assert stats.rows == {t: gen.rows_for(t, 0.01) for t in tables}
+    assert len(_inserted_rows(sql, "is_clientes")) == stats.rows["is_clientes"]
+    assert "0000-00-00 00:00:00" in sql
+    assert "Ã" in sql  # mojibake
+    assert stats.injected["zero_dates"] > 0
+    assert "orphan_fks" not in stats.injected
+    assert "CREATE TABLE `is_pedidos` (" in sql
+    assert "DEFAULT CHARSET=latin1" in sql
+
+    pedidos = _inserted_rows(sql, "is_pedidos")
+    clientes_total = gen.rows_for("is_clientes", 0.01)
+    cliente_col = [s.name for s in gen.table_columns("is_pedidos")].index("cliente")
+    for row in pedidos[:50]:
+        value = row.split(",")[cliente_col]
+        assert value == "NULL" or 1 <= int(value) <= clientes_total
+
+
+def test_dirty_override_rejects_unknown_keys() -> None:
+    with pytest.raises(ValueError):
+        gen.DirtyRatios().override(["typo=0.1"])
+    with pytest.raises(ValueError):
+        gen.DirtyRatios().override(["mojibake=2"])
+
+
+def test_generate_dump_gzip_writes_sidecar(tmp_path: Path) -> None:
+    output = tmp_path / "dump.sql.gz"
+
+    stats = gen.generate_dump(output, scale=0.001, tables=["is_extras_status", "is_produtos_categorias"])
+
+    with gzip.open(output, "rt", encoding="utf-8") as fh:
+        sql = fh.read()
+    assert sql.endswith("-- Dump completed\n")
+    assert re.search(r"INSERT INTO `is_produtos_categorias` VALUES \(1,", sql)
+    sidecar = json.loads((tmp_path / "dump.sql.gz.json").read_text(encoding="utf-8"))
+    assert sidecar["rows"] == stats.rows
+    assert sidecar["bytes_written"] == output.stat().st_size
+
+
+def test_sql_literal_escapes_like_mysqldump() -> None:
+    assert gen.sql_literal(None) == "NULL"
+    assert gen.sql_literal(12.5) == "12.5"
+    assert gen.sql_literal("d'água\n\\") == "'d\\'água\\n\\\\'"
+
+
+def test_benchmark_result_is_profile_compatible(tmp_path: Path) -> None:
+    dump = tmp_path / "d.sql"
+    dump.write_text("-- vazio\n", encoding="utf-8")
+    profile = {
+        "run_id": "bench-1x",
+        "peak_rss_mb": 120.0,
+        "tables": {"is_pedidos": {"wall_seconds": 4.0, "extract_seconds": 1.0, "transform_seconds": 2.0,
+                                  "load_seconds": 1.0, "self_ref_seconds": 0.0, "rows_ok": 90, "rows_err": 10}},
+    }
+
+    result = benchmark_etl.build_result(1.0, dump, {"fetch": {"wall_seconds": 0.5}}, profile, None)
+
+    assert set(result["tables"]) == {"__fetch__", "is_pedidos"}
+    assert result["etl"]["transform_seconds"] == 2.0
+    assert result["etl"]["rows"] == 100
+    with pytest.raises(ValueError):
+        benchmark_etl.assert_local_pg("postgresql://u:p@db.supabase.co:5432/postgres", allow_remote=False)
+    benchmark_etl.assert_local_pg("postgresql://u:p@127.0.0.1:5433/etl_bench", allow_remote=False)
+
+
+def test_benchmark_etl_stage_keeps_checkpoint_and_batch_state_in_a_temp_dir(monkeypatch, tmp_path: Path) -> None:
+    seen: dict = {}
+
+    def fake_run(cmd, *, cwd, env, stdout, stderr):
+        seen.update(env)
+        Path(env["ETL_BATCH_STATE_PATH"]).write_text("{}", encoding="utf-8")
+        return type("Proc", (), {"returncode": 0})()
+
+    monkeypatch.setenv("ETL_RESUME_RUN_ID", "run-de-producao")
+    monkeypatch.setattr(benchmark_etl.subprocess, "run", fake_run)
+
+    stage, profile = benchmark_etl.stage_etl("postgresql://127.0.0.1/etl_bench", tmp_path, "bench-1x")
+
+    state_dir = Path(seen["ETL_CHECKPOINT_PATH"]).parent
+    assert Path(seen["ETL_BATCH_STATE_PATH"]).parent == state_dir
+    assert tmp_path not in state_dir.parents and not state_dir.exists()
+    assert "ETL_RESUME_RUN_ID" not in seen
+    assert (tmp_path / "etl_batch_sizes.json").exists()
+    assert stage["returncode"] == 0 and profile == {}
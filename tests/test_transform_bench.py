@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from bench import transform_bench as tb
+
+
+def test_every_case_runs_on_a_small_corpus_and_is_in_the_baseline() -> None:
+    cases = tb.build_cases(rows=40)
+    results = tb.run_cases(cases, repeats=1)
+
+    assert set(results) == set(tb.load_baseline()["cases"])
+    for metrics in results.values():
+        assert metrics["ns_per_row"] > 0
+        assert metrics["alloc_peak_bytes_per_row"] >= 0
+
+
+def test_only_filter_accepts_prefixes() -> None:
+    names = [case.name for case in tb.build_cases(rows=5, only=["transform_row", "to_ts"])]
+
+    assert names[0] == "to_ts"
+    assert all(name == "to_ts" or name.startswith("transform_row:") for name in names)
+    assert len(names) == 1 + len(tb.TRANSFORM_ROW_TABLES)
+
+
+def test_compare_flags_slowdowns_and_allocation_growth_beyond_tolerance() -> None:
+    baseline = {
+        "cases": {
+            "to_int": {"ns_per_row": 200.0, "alloc_peak_bytes_per_row": 16.0},
+            "to_ts": {"ns_per_row": 1000.0, "alloc_peak_bytes_per_row": 400.0},
+        }
+    }
+    results = {
+        "to_int": {"ns_per_row": 240.0, "alloc_peak_bytes_per_row": 60.0},  # +40ns e +44B: ruído
+        "to_ts": {"ns_per_row": 3000.0, "alloc_peak_bytes_per_row": 500.0},
+        "to_bool": {"ns_per_row": 150.0, "alloc_peak_bytes_per_row": 8.0},
+    }
+
+    rows = tb.compare_to_baseline(results, baseline, time_tolerance=0.30, alloc_tolerance=0.10)
+    flagged = {(row["case"], row["metric"]) for row in rows if row["regression"]}
+
+    assert flagged == {("to_ts", "ns_per_row"), ("to_ts", "alloc_peak_bytes_per_row")}
+    assert any(row["case"] == "to_bool" and row["old"] is None for row in rows)
+
+
+def test_write_baseline_merges_cases(tmp_path: Path) -> None:
+    path = tmp_path / "baseline.json"
+    tb.write_baseline({"to_int": {"ns_per_row": 1.0, "alloc_peak_bytes_per_row": 0.0}}, rows=10, path=path)
+    tb.write_baseline({"to_ts": {"ns_per_row": 2.0, "alloc_peak_bytes_per_row": 0.0}}, rows=10, path=path)
+
+    assert set(tb.load_baseline(path)["cases"]) == {"to_int", "to_ts"}
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import datetime as dt
+from decimal import Decimal
+
+import pytest
+
+from scripts import verify_parity
+from scripts.verify_parity import (
+    RangeDigest,
+    TableSpec,
+    canonical_row,
+    canonical_value,
+    digest_row_text,
+    digest_sql,
+    digest_text,
+)
+
+SPEC = TableSpec("is_demo", "is_demo", {"id": "id", "nome": "nome", "valor": "valor"}, ("id", "nome", "valor"), True)
+KINDS = {"id": "int", "nome": "text", "valor": "number"}
+
+
+class FakeSource:
+    def __init__(self, rows: dict[int, dict]) -> None:
+        self.rows_by_id = rows
+        self.reads: list[tuple[int, int]] = []
+        self.conn = self
+
+    def bounds(self, spec: TableSpec):
+        return min(self.rows_by_id), max(self.rows_by_id)
+
+    def rows(self, spec: TableSpec, low: int, high: int):
+        self.reads.append((low, high))
+        for key in sorted(self.rows_by_id):
+            if low <= key < high:
+                yield str(key), self.rows_by_id[key]
+
+    def close(self) -> None:
+        pass
+
+
+class FakeTarget(FakeSource):
+    """Stands in for Postgres: the digest is aggregated "server side", rows are only read at leaves."""
+
+    def __init__(self, rows: dict[int, dict]) -> None:
+        super().__init__(rows)
+        self.digests: list[tuple[int, int]] = []
+
+    def count(self, spec: TableSpec) -> int:
+        return len(self.rows_by_id)
+
+    def column_kinds(self, spec: TableSpec) -> dict[str, str]:
+        return KINDS
+
+    def digest(self, spec: TableSpec, low: int, high: int, keys: list[str]) -> RangeDigest:
+        self.digests.append((low, high))
+        found = RangeDigest()
+        # ordem diferente da origem: o digest não pode depender dela
+        for key in sorted(self.rows_by_id, reverse=True):
+            if low <= key < high:
+                found.add(digest_row_text(self.rows_by_id[key], spec.columns, KINDS))
+        return found
+
+    def rows(self, spec: TableSpec, low: int, high: int, keys: list[str]):
+        for key, row in reversed(list(super().rows(spec, low, high))):
+            yield key, canonical_row(row, spec.columns)
+
+
+def _rows(n: int) -> dict[int, dict]:
+    return {i: {"id": i, "nome": f"item {i}", "valor": i * 1.5} for i in range(1, n + 1)}
+
+
+def _compare(source: FakeSource, target: FakeTarget, **overrides) -> dict:
+    options = {"workers": 3, "range_size": 100, "leaf_size": 8, "max_samples": 10, **overrides}
+    return verify_parity.compare_table(SPEC, lambda: (source, target), **options)
+
+
+def test_canonical_form_matches_transformed_and_loaded_values() -> None:
+    assert canonical_value(12.5) == canonical_value(Decimal("12.50"))
+    assert canonical_value(0.0) == canonical_value(Decimal("0.00")) == "0"
+    assert canonical_value("2026-01-05T10:00:00") == canonical_value(
+        dt.datetime(2026, 1, 5, 7, 0, tzinfo=dt.timezone(dt.timedelta(hours=-3)))
+    )
+    assert canonical_value('{"b": 1, "a": [2]}', "extra_json") == canonical_value({"a": [2], "b": 1})
+    assert canonical_value(None) != canonical_value("") != canonical_value("None")
+    assert canonical_value(True) == "t"
+
+
+def test_equal_tables_compare_only_top_level_ranges() -> None:
+    source, target = FakeSource(_rows(450)), FakeTarget(_rows(450))
+
+    result = _compare(source, target)
+
+    assert result["status"] == "ok"
+    assert (result["source_rows"], result["target_rows"], result["ranges"]) == (450, 450, 5)
+    assert result["ranges_compared"] == 5
+    assert sorted(source.reads) == [(1, 101), (101, 201), (201, 301), (301, 401), (401, 451)]
+    assert len(target.digests) == 5 and target.reads == []
+
+
+def test_mismatch_is_drilled_down_to_the_diverging_id_and_column() -> None:
+    loaded = _rows(450)
+    loaded[237]["valor"] = 999.0
+    del loaded[310]
+    source, target = FakeSource(_rows(450)), FakeTarget(loaded)
+
+    result = _compare(source, target)
+
+    assert result["status"] == "mismatch"
+    assert result["ranges_mismatched"] == 2
+    assert result["diverging_columns"] == ["valor"]
+    assert result["mismatches"] == {"value_mismatch": 1, "missing_in_target": 1}
+    by_id = {sample["id"]: sample for sample in result["samples"]}
+    assert by_id["237"]["expected"] == {"valor": "355.5"} and by_id["237"]["actual"] == {"valor": "999"}
+    assert by_id["310"]["kind"] == "missing_in_target"
+    # só as faixas divergentes são bisseccionadas; as íntegras são lidas uma vez
+    intact = sorted(r for r in source.reads if r[0] < 201 or r[0] >= 401)
+    assert intact == [(1, 101), (101, 201), (401, 451)]
+    assert min(high - low for low, high in source.reads) <= 8
+    # linhas do destino só são lidas nas folhas divergentes
+    assert target.reads and all(high - low <= 8 for low, high in target.reads)
+    assert all(low < 401 and high > 201 for low, high in target.reads)
+
+
+def test_digest_text_renders_source_values_like_the_target_column() -> None:
+    assert digest_text(12.5, "number") == digest_text(Decimal("12.50"), "number") == "12.5"
+    assert digest_text("12.500", "number") == "12.5"
+    assert digest_text(0.0, "number") == "0" and digest_text(1e-05, "number") == "0.00001"
+    assert digest_text("2026-01-05 10:00:00", "timestamptz") == digest_text(
+        dt.datetime(2026, 1, 5, 7, 0, tzinfo=dt.timezone(dt.timedelta(hours=-3))), "timestamptz"
+    ) == "2026-01-05T10:00:00"
+    assert digest_text("2026-01-05", "timestamp") == "2026-01-05T00:00:00"
+    assert digest_text(dt.datetime(2026, 1, 5, 10, 0, 0, 250000), "timestamp") == "2026-01-05T10:00:00.250000"
+    assert digest_text("2026-01-05 00:00:00", "date") == "2026-01-05"
+    assert digest_text(False, "bool") == "f" and digest_text(None, "bool") is None
+    # jsonb imprime chaves por (tamanho, bytes), ", "/": " e numerics como gravados
+    assert digest_text('{"bb": 1.50, "a": [2, "ç"], "c": null}', "json") == '{"a": [2, "ç"], "c": null, "bb": 1.50}'
+    assert digest_text({"a": True, "b": 0.5}, "json") == '{"a": true, "b": 0.5}'
+    assert digest_text("2026-01-05 10:00:00", "text") == "2026-01-05 10:00:00"
+
+
+def test_digest_sql_aggregates_in_postgres_and_marks_nulls() -> None:
+    kinds = {"id": "int", "nome": "text", "valor": "number"}
+    row = {"id": 1, "nome": None, "valor": Decimal("2.10")}
+    assert digest_row_text(row, SPEC.columns, kinds) == "id=1\x1fnome!\x1fvalor=2.1"
+    sql = digest_sql(SPEC, kinds, "id >= %s AND id < %s")
+    assert sql.startswith("SELECT COUNT(*), COALESCE(SUM(('x' || left(md5(")
+    assert "'nome' || COALESCE('=' || \"nome\"::text, '!')" in sql
+    assert "trim_scale(\"valor\"::text::numeric)::text" in sql
+    assert sql.endswith('FROM public."is_demo" WHERE id >= %s AND id < %s')
+
+
+def test_rows_outside_the_source_ranges_fail_the_table() -> None:
+    loaded = _rows(50)
+    loaded[5000] = {"id": 5000, "nome": "órfã", "valor": 1}
+
+    result = _compare(FakeSource(_rows(50)), FakeTarget(loaded))
+
+    assert result["status"] == "mismatch"
+    assert result["target_rows_outside_ranges"] == 1
+
+
+def test_special_processor_tables_are_rejected() -> None:
+    with pytest.raises(ValueError, match="special processor"):
+        TableSpec.for_table("is_clientes")
+    spec = TableSpec.for_table("is_extras_status")
+    assert spec.int_pk and spec.columns[0] == "id"
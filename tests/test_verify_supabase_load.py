@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import json
 import os
+import threading
 from pathlib import Path
 from unittest.mock import patch
 
@@ -12,16 +13,64 @@ import pytest
 from scripts.verify_supabase_load import _parse_min_rows_by_table, verify_supabase_load
 
 
+class FakeDatabase:
+    """Answers the verifier's queries by kind, whatever order the workers run them in."""
+
+    def __init__(
+        self,
+        tables: dict[str, tuple[list[str], int]],
+        *,
+        age_hours: float | None = 2.0,
+        rows_after: int = 0,
+        reltuples: dict[str, float] | None = None,
+    ):
+        self.tables = tables
+        self.age_hours = age_hours
+        self.rows_after = rows_after
+        self.reltuples = reltuples or {}
+        self.executed: list[str] = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def connect(self, *args, **kwargs) -> "ConnStub":
+        with self._lock:
+            self.connections += 1
+        return ConnStub(self)
+
+    def queries(self, needle: str) -> list[str]:
+        return [q for q in self.executed if needle in q]
+
+
 class CursorStub:
-    def __init__(self, fetch_values: list[tuple | None]):
-        self._values = iter(fetch_values)
-        self.executed: list[tuple[str, tuple | None]] = []
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+        self._result: list[tuple] = []
 
     def execute(self, query: str, params=None) -> None:
-        self.executed.append((query, params))
+        with self.db._lock:
+            self.db.executed.append(query)
+        if "FROM pg_class" in query:
+            self._result = [
+                (name, self.db.reltuples.get(name, float(count)), column)
+                for name, (columns, count) in self.db.tables.items()
+                if name in params[0]
+                for column in columns
+            ]
+        elif "MAX(" in query:
+            self._result = [(self.db.age_hours,)]
+        elif "COUNT(*)" in query and "WHERE" in query:
+            self._result = [(self.db.rows_after,)]
+        elif "COUNT(*)" in query:
+            table = query.split('"')[1]
+            self._result = [(self.db.tables[table][1],)]
+        else:
+            self._result = []
 
     def fetchone(self):
-        return next(self._values)
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
 
     def __enter__(self):
         return self
@@ -31,17 +80,15 @@ class CursorStub:
 
 
 class ConnStub:
-    def __init__(self, cursor: CursorStub):
-        self._cursor = cursor
+    def __init__(self, db: FakeDatabase):
+        self._db = db
+        self.autocommit = False
 
     def cursor(self) -> CursorStub:
-        return self._cursor
+        return CursorStub(self._db)
 
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc, tb):
-        return False
+    def close(self) -> None:
+        pass
 
 
 def _base_env(tmp_path: Path) -> dict[str, str]:
@@ -60,13 +107,10 @@ def _base_env(tmp_path: Path) -> dict[str, str]:
 def test_verify_success_with_recency(tmp_path: Path):
     env = _base_env(tmp_path)
 
-    # fetchone order:
-    # count(is_pedidos), count(is_clientes), has(updated_at), has(created_at), max_age_hours
-    cursor = CursorStub([(10,), (5,), None, (1,), (2.0,)])
-    conn = ConnStub(cursor)
+    db = FakeDatabase({"is_pedidos": (["id", "created_at"], 10), "is_clientes": (["id"], 5)}, age_hours=2.0)
 
     with patch.dict(os.environ, env, clear=False):
-        with patch("scripts.verify_supabase_load.psycopg2.connect", return_value=conn):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
             verify_supabase_load()
 
     baseline = json.loads((tmp_path / "verify_baseline.json").read_text(encoding="utf-8"))
@@ -76,15 +120,16 @@ def test_verify_success_with_recency(tmp_path: Path):
     assert diagnostics["status"] == "success"
     assert diagnostics["counts"]["is_pedidos"] == 10
     assert diagnostics["recency"]["selected_column"] == "created_at"
+    assert len(db.queries("FROM pg_class")) == 1
+    assert not db.queries("information_schema")
 
 
 def test_verify_fails_when_key_table_empty(tmp_path: Path):
     env = _base_env(tmp_path)
-    cursor = CursorStub([(0,)])
-    conn = ConnStub(cursor)
+    db = FakeDatabase({"is_pedidos": (["id", "created_at"], 0), "is_clientes": (["id"], 5)})
 
     with patch.dict(os.environ, env, clear=False):
-        with patch("scripts.verify_supabase_load.psycopg2.connect", return_value=conn):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
             with pytest.raises(RuntimeError, match="is_pedidos"):
                 verify_supabase_load()
     diagnostics = json.loads((tmp_path / "verify_diagnostics.json").read_text(encoding="utf-8"))
@@ -102,14 +147,15 @@ def test_verify_fallback_to_baseline_when_no_recency_column(tmp_path: Path):
         encoding="utf-8",
     )
 
-    # counts, has(updated_at)=None, has(created_at)=None
-    cursor = CursorStub([(101,), (50,), None, None])
-    conn = ConnStub(cursor)
+    db = FakeDatabase({"is_pedidos": (["id"], 101), "is_clientes": (["id"], 50)})
 
     with patch.dict(os.environ, env, clear=False):
-        with patch("scripts.verify_supabase_load.psycopg2.connect", return_value=conn):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
             verify_supabase_load()
 
+    diagnostics = json.loads((tmp_path / "verify_diagnostics.json").read_text(encoding="utf-8"))
+    assert diagnostics["recency"]["baseline_previous_count"] == 100
+
 
 def test_verify_success_with_min_date_threshold(tmp_path: Path):
     env = _base_env(tmp_path)
@@ -118,14 +164,15 @@ def test_verify_success_with_min_date_threshold(tmp_path: Path):
     env["VERIFY_MIN_DATE_COLUMNS"] = "created_at,updated_at"
     env["VERIFY_MIN_DATE_MIN_ROWS"] = "1"
 
-    # counts, has(updated_at)=None, has(created_at)=1, max_age, has(created_at)=1, rows_after
-    cursor = CursorStub([(10,), (5,), None, (1,), (2.0,), (1,), (123,)])
-    conn = ConnStub(cursor)
+    db = FakeDatabase({"is_pedidos": (["id", "created_at"], 10), "is_clientes": (["id"], 5)}, rows_after=123)
 
     with patch.dict(os.environ, env, clear=False):
-        with patch("scripts.verify_supabase_load.psycopg2.connect", return_value=conn):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
             verify_supabase_load()
 
+    diagnostics = json.loads((tmp_path / "verify_diagnostics.json").read_text(encoding="utf-8"))
+    assert diagnostics["min_date"]["rows_after"] == 123
+
 
 def test_verify_fails_when_no_rows_after_min_date(tmp_path: Path):
     env = _base_env(tmp_path)
@@ -134,16 +181,68 @@ def test_verify_fails_when_no_rows_after_min_date(tmp_path: Path):
     env["VERIFY_MIN_DATE_COLUMNS"] = "created_at,updated_at"
     env["VERIFY_MIN_DATE_MIN_ROWS"] = "1"
 
-    # counts, has(updated_at)=None, has(created_at)=1, max_age, has(created_at)=1, rows_after=0
-    cursor = CursorStub([(10,), (5,), None, (1,), (2.0,), (1,), (0,)])
-    conn = ConnStub(cursor)
+    db = FakeDatabase({"is_pedidos": (["id", "created_at"], 10), "is_clientes": (["id"], 5)}, rows_after=0)
 
     with patch.dict(os.environ, env, clear=False):
-        with patch("scripts.verify_supabase_load.psycopg2.connect", return_value=conn):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
             with pytest.raises(RuntimeError, match="VERIFY_MIN_DATE"):
                 verify_supabase_load()
 
 
+def test_estimate_mode_counts_only_tables_near_threshold(tmp_path: Path):
+    env = _base_env(tmp_path)
+    env["VERIFY_TABLES"] = "is_pedidos,is_clientes,is_financeiro_lancamentos"
+    env["VERIFY_MIN_ROWS_BY_TABLE"] = "is_pedidos:1000,is_financeiro_lancamentos:97985"
+    env["VERIFY_COUNT_MODE"] = "estimate"
+    db = FakeDatabase(
+        {
+            "is_pedidos": (["id", "created_at"], 5000),
+            "is_clientes": (["id"], 50),
+            "is_financeiro_lancamentos": (["id"], 98000),
+        },
+        reltuples={"is_pedidos": 4980.0, "is_clientes": -1.0, "is_financeiro_lancamentos": 97990.0},
+    )
+
+    with patch.dict(os.environ, env, clear=False):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
+            verify_supabase_load()
+
+    diagnostics = json.loads((tmp_path / "verify_diagnostics.json").read_text(encoding="utf-8"))
+    assert diagnostics["count_source"] == {
+        "is_pedidos": "estimate",  # 4980 estimado >> 1000
+        "is_clientes": "exact",  # reltuples = -1: nunca analisada
+        "is_financeiro_lancamentos": "exact",  # perto do mínimo
+    }
+    assert diagnostics["counts"]["is_financeiro_lancamentos"] == 98000
+    assert db.queries("ANALYZE")
+    assert not db.queries('COUNT(*) FROM "is_pedidos"')
+
+
+def test_checks_run_on_a_bounded_pool(tmp_path: Path):
+    env = _base_env(tmp_path)
+    env["VERIFY_WORKERS"] = "2"
+    db = FakeDatabase({"is_pedidos": (["id", "created_at"], 10), "is_clientes": (["id"], 5)})
+
+    with patch.dict(os.environ, env, clear=False):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
+            verify_supabase_load()
+
+    # 1 conexão para o catálogo + no máximo VERIFY_WORKERS para as 3 checagens
+    assert 2 <= db.connections <= 3
+    assert len(db.queries("COUNT(*)")) == 2 and len(db.queries("MAX(")) == 1
+
+
+def test_missing_table_fails_from_catalog(tmp_path: Path):
+    env = _base_env(tmp_path)
+    db = FakeDatabase({"is_pedidos": (["id", "created_at"], 10)})
+
+    with patch.dict(os.environ, env, clear=False):
+        with patch("scripts.verify_supabase_load.psycopg2.connect", side_effect=db.connect):
+            with pytest.raises(RuntimeError, match="is_clientes"):
+                verify_supabase_load()
+    assert not db.queries("COUNT(*)")
+
+
 def test_parse_min_rows_by_table_overrides_default() -> None:
     tables = ["is_pedidos", "is_clientes_pf", "is_clientes_pj"]
     parsed = _parse_min_rows_by_table(